@@ -20,7 +20,7 @@ class Image(pyqtgraph.ImageView):
 
 
 def main():
-    applet = SimpleApplet(Image)
+    applet = SimpleApplet(Image, default_max_fps=30)
     applet.add_dataset("img", "image data (2D numpy array)")
     applet.run()
 
@@ -14,6 +14,7 @@ class HistogramPlot(pyqtgraph.PlotWidget):
         self.timer = QTimer()
         self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.length_warning)
+        self.curve = None
 
     def data_changed(self, value, metadata, persist, mods, title):
         try:
@@ -29,9 +30,10 @@ class HistogramPlot(pyqtgraph.PlotWidget):
 
         if len(y) and len(x) == len(y) + 1:
             self.timer.stop()
-            self.clear()
-            self.plot(x, y, stepMode=True, fillLevel=0,
-                      brush=(0, 0, 255, 150))
+            if self.curve is None:
+                self.curve = self.plot(stepMode=True, fillLevel=0,
+                                       brush=(0, 0, 255, 150))
+            self.curve.setData(x, y)
             self.setTitle(title)
         else:
             if not self.timer.isActive():
@@ -39,13 +41,14 @@ class HistogramPlot(pyqtgraph.PlotWidget):
 
     def length_warning(self):
         self.clear()
+        self.curve = None
         text = "⚠️ dataset lengths mismatch:\n"\
             "There should be one more bin boundaries than there are Y values"
         self.addItem(pyqtgraph.TextItem(text))
 
 
 def main():
-    applet = TitleApplet(HistogramPlot)
+    applet = TitleApplet(HistogramPlot, default_max_fps=30)
     applet.add_dataset("y", "Y values")
     applet.add_dataset("x", "Bin boundaries", required=False)
     applet.run()
@@ -5,7 +5,32 @@ import PyQt6  # make sure pyqtgraph imports Qt6
 from PyQt6.QtCore import QTimer
 import pyqtgraph
 
-from artiq.applets.simple import TitleApplet
+from artiq.applets.simple import TitleApplet, dataset_appends
+
+
+# Series longer than this are downsampled and clipped to the view.
+LARGE_SERIES = 10000
+
+
+class _Series:
+    """Numpy copy of a dataset, extended in place when the dataset is only
+    appended to."""
+    def __init__(self):
+        self.buf = np.empty(0)
+        self.n = 0
+
+    def update(self, value, appended):
+        if appended is None or self.n + appended != len(value):
+            self.buf = np.array(value, dtype=float)
+            self.n = len(self.buf)
+        elif appended:
+            if self.n + appended > len(self.buf):
+                buf = np.empty(max(2*len(self.buf), self.n + appended))
+                buf[:self.n] = self.buf[:self.n]
+                self.buf = buf
+            self.buf[self.n:self.n + appended] = value[-appended:]
+            self.n += appended
+        return self.buf[:self.n]
 
 
 class XYPlot(pyqtgraph.PlotWidget):
@@ -18,15 +43,36 @@ class XYPlot(pyqtgraph.PlotWidget):
         self.mismatch = {'X values': False,
                          'Error bars': False,
                          'Fit values': False}
+        self.x_series = _Series()
+        self.y_series = _Series()
+        self.curve = None
+        self.errbars = None
+        self.fit_curve = None
+        self.large = False
+
+    def _set_large(self, large):
+        if large != self.large:
+            self.large = large
+            self.setDownsampling(auto=large, mode="peak")
+            self.setClipToView(large)
+
+    def _clear(self):
+        self.clear()
+        self.curve = None
+        self.errbars = None
+        self.fit_curve = None
 
     def data_changed(self, value, metadata, persist, mods, title):
         try:
             y = value[self.args.y]
         except KeyError:
             return
+        y = self.y_series.update(y, dataset_appends(mods, self.args.y))
         x = value.get(self.args.x)
         if x is None:
             x = np.arange(len(y))
+        else:
+            x = self.x_series.update(x, dataset_appends(mods, self.args.x))
         error = value.get(self.args.error)
         fit = value.get(self.args.fit)
 
@@ -55,22 +101,32 @@ class XYPlot(pyqtgraph.PlotWidget):
                 self.timer.start(1000)
             return
 
-        self.clear()
-        self.plot(x, y, pen=None, symbol="x")
+        # Existing plot items are updated rather than recreated, unless
+        # error bars or fit appeared or disappeared.
+        if (self.curve is None
+                or (error is None) != (self.errbars is None)
+                or (fit is None) != (self.fit_curve is None)):
+            self._clear()
+            self.curve = self.plot(pen=None, symbol="x")
+            if error is not None:
+                self.errbars = pyqtgraph.ErrorBarItem()
+                self.addItem(self.errbars)
+            if fit is not None:
+                self.fit_curve = self.plot()
+        self._set_large(len(y) > LARGE_SERIES)
+        self.curve.setData(x, y)
         self.setTitle(title)
         if error is not None:
             # See https://github.com/pyqtgraph/pyqtgraph/issues/211
             if hasattr(error, "__len__") and not isinstance(error, np.ndarray):
                 error = np.array(error)
-            errbars = pyqtgraph.ErrorBarItem(
-                x=np.array(x), y=np.array(y), height=error)
-            self.addItem(errbars)
+            self.errbars.setData(x=x, y=y, height=error)
         if fit is not None:
             xi = np.argsort(x)
-            self.plot(x[xi], fit[xi])
+            self.fit_curve.setData(x[xi], np.asarray(fit)[xi])
 
     def length_warning(self):
-        self.clear()
+        self._clear()
         text = "⚠️ dataset lengths mismatch:\n"
         errors = ', '.join([k for k, v in self.mismatch.items() if v])
         text = ' '.join([errors, "should have the same length as Y values"])
@@ -78,7 +134,7 @@ class XYPlot(pyqtgraph.PlotWidget):
 
 
 def main():
-    applet = TitleApplet(XYPlot)
+    applet = TitleApplet(XYPlot, default_max_fps=30)
     applet.add_dataset("y", "Y values")
     applet.add_dataset("x", "X values", required=False)
     applet.add_dataset("error", "Error bars for each X value", required=False)
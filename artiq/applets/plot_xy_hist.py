@@ -168,7 +168,7 @@ class XYHistPlot(QtWidgets.QSplitter):
 
 
 def main():
-    applet = SimpleApplet(XYHistPlot)
+    applet = SimpleApplet(XYHistPlot, default_max_fps=30)
     applet.add_dataset("xs", "1D array of point abscissas")
     applet.add_dataset("histogram_bins",
                        "1D array of histogram bin boundaries")
@@ -3,6 +3,7 @@ import argparse
 import asyncio
 import os
 import string
+import time
 
 from qasync import QEventLoop, QtWidgets, QtCore
 
@@ -12,11 +13,41 @@ from sipyco import pyon
 from sipyco.pipe_ipc import AsyncioChildComm
 
 from artiq.language.scan import ScanObject
+from artiq.gui.shm_datasets import SharedDatasetReader, StaleSharedDataset
 
 
 logger = logging.getLogger(__name__)
 
 
+def dataset_appends(mods, key):
+    """Returns the number of elements appended to the dataset ``key`` by
+    ``mods``, or ``None`` if ``mods`` modified it in any other way (including
+    replacing it).
+
+    Applets can use this in ``data_changed`` to extend what they display
+    instead of rebuilding it from the complete dataset.
+    """
+    n = 0
+    for mod in mods:
+        if mod["action"] == "init":
+            return None
+        if mod["path"]:
+            if mod["path"][0] != key:
+                continue
+            if mod["path"] == [key, 1] and mod["action"] == "append":
+                n += 1
+            else:
+                return None
+        elif mod["key"] == key:
+            # datasets sent through shared memory are replaced as a whole,
+            # with the number of appended elements if that is all that
+            # changed
+            if "appended" not in mod:
+                return None
+            n += mod["appended"]
+    return n
+
+
 class _AppletRequestInterface:
     def __init__(self):
         raise NotImplementedError
@@ -115,6 +146,16 @@ class AppletRequestRPC(_AppletRequestInterface):
 
 
 class AppletIPCClient(AsyncioChildComm):
+    def __init__(self, address):
+        AsyncioChildComm.__init__(self, address)
+        self.shm_reader = SharedDatasetReader()
+        # set while waiting for the parent to resend all datasets
+        self.resync_pending = False
+
+    def close(self):
+        self.shm_reader.close()
+        AsyncioChildComm.close(self)
+
     def set_close_cb(self, close_cb):
         self.close_cb = close_cb
 
@@ -140,6 +181,29 @@ class AppletIPCClient(AsyncioChildComm):
         else:
             return reply["size_w"], reply["size_h"]
 
+    def _resolve_shm(self, mod, shm_refs):
+        # Large arrays are not sent through the pipe, only a notification
+        # that a new version is ready in shared memory.
+        if mod["action"] == "init":
+            self.shm_reader.resolve_struct(mod["struct"], shm_refs)
+        elif mod["action"] == "setitem" and not mod["path"]:
+            key = mod["key"]
+            if key in shm_refs:
+                persist, _, metadata = mod["value"]
+                value = self.shm_reader.resolve(key, shm_refs[key])
+                mod["value"] = (persist, value, metadata)
+            else:
+                self.shm_reader.discard(key)
+        elif mod["action"] == "delitem" and not mod["path"]:
+            self.shm_reader.discard(mod["key"])
+
+    def _request_resync(self):
+        # Subscribing again makes the parent send an "init" mod with the
+        # current values of all datasets; the mods received before it are
+        # superseded by it and dropped.
+        self.resync_pending = True
+        self.write_pyon(self.subscription)
+
     async def listen(self):
         data = None
         while True:
@@ -151,6 +215,18 @@ class AppletIPCClient(AsyncioChildComm):
                     return
                 elif action == "mod":
                     mod = obj["mod"]
+                    if self.resync_pending:
+                        if mod["action"] != "init":
+                            continue
+                        self.resync_pending = False
+                    if "shm" in obj:
+                        try:
+                            self._resolve_shm(mod, obj["shm"])
+                        except StaleSharedDataset:
+                            logger.debug("shared dataset overwritten before "
+                                         "it was read, resynchronizing")
+                            self._request_resync()
+                            continue
                     if mod["action"] == "init":
                         data = self.init_cb(mod["struct"])
                     else:
@@ -164,9 +240,11 @@ class AppletIPCClient(AsyncioChildComm):
                 self.close_cb()
 
     def subscribe(self, datasets, init_cb, mod_cb, dataset_prefixes=[], *, loop):
-        self.write_pyon({"action": "subscribe",
-                         "datasets": datasets,
-                         "dataset_prefixes": dataset_prefixes})
+        self.subscription = {"action": "subscribe",
+                             "datasets": datasets,
+                             "dataset_prefixes": dataset_prefixes,
+                             "shm": True}
+        self.write_pyon(self.subscription)
         self.init_cb = init_cb
         self.mod_cb = mod_cb
         self.listen_task = loop.create_task(self.listen())
@@ -191,7 +269,7 @@ class AppletIPCClient(AsyncioChildComm):
 
 class SimpleApplet:
     def __init__(self, main_widget_class, cmd_description=None,
-                 default_update_delay=0.0):
+                 default_update_delay=0.0, default_max_fps=0.0):
         self.main_widget_class = main_widget_class
 
         self.argparser = argparse.ArgumentParser(description=cmd_description)
@@ -200,6 +278,12 @@ class SimpleApplet:
             "--update-delay", type=float, default=default_update_delay,
             help="time to wait after a mod (buffering other mods) "
                  "before updating (default: %(default).2f)")
+        self.argparser.add_argument(
+            "--max-fps", type=float, default=default_max_fps,
+            help="buffer mods and update at most this many times per second, "
+                 "further slowing down when updates take long to render; "
+                 "ignored if an update delay is set, 0 to disable "
+                 "(default: %(default).1f)")
 
         group = self.argparser.add_argument_group("standalone mode (default)")
         group.add_argument(
@@ -217,6 +301,7 @@ class SimpleApplet:
         self._arggroup_datasets = self.argparser.add_argument_group("datasets")
 
         self.dataset_args = set()
+        self.next_update = 0.0
 
     def add_dataset(self, name, help=None, required=True):
         kwargs = dict()
@@ -330,8 +415,16 @@ class SimpleApplet:
         self.main_widget.data_changed(value, metadata, persist, mod_buffer)
 
     def flush_mod_buffer(self):
-        self.emit_data_changed(self.data, self.mod_buffer)
-        del self.mod_buffer
+        start = time.monotonic()
+        try:
+            self.emit_data_changed(self.data, self.mod_buffer)
+        finally:
+            del self.mod_buffer
+        # Keep at least as much idle time as rendering took, so that an
+        # applet with slow updates does not saturate the CPU.
+        render_time = time.monotonic() - start
+        min_interval = 1/self.args.max_fps if self.args.max_fps else 0.0
+        self.next_update = start + max(min_interval, 2*render_time)
 
     def sub_mod(self, mod):
         if not self.filter_mod(mod):
@@ -344,6 +437,13 @@ class SimpleApplet:
                 self.mod_buffer = [mod]
                 self.loop.call_later(self.args.update_delay,
                                      self.flush_mod_buffer)
+        elif self.args.max_fps:
+            if hasattr(self, "mod_buffer"):
+                self.mod_buffer.append(mod)
+            else:
+                self.mod_buffer = [mod]
+                delay = max(self.next_update - time.monotonic(), 0)
+                self.loop.call_later(delay, self.flush_mod_buffer)
         else:
             self.emit_data_changed(self.data, [mod])
 
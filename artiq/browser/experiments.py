@@ -282,10 +282,26 @@ class LocalDatasetDB:
     def get(self, key):
         return self._data.backing_store[key][1]
 
+    def get_many(self, keys=None, prefix=None):
+        data = self._data.backing_store
+        if keys is None:
+            keys = [key for key in data if key.startswith(prefix)]
+        return {key: (data[key][1], data[key][2])
+                for key in keys if key in data}
+
     def update(self, mod):
         self.dataset_sub.update(mod)
 
 
+# Worker handlers of an empty device database, whose devices are all dummies.
+dummy_device_db_handlers = {
+    "get_device_db": lambda: {},
+    "get_device_db_snapshot": lambda version=None: {
+        "version": 0, "device_db": {}, "aliases": {}},
+    "get_device": lambda key, resolve_alias=False: {"type": "dummy"},
+}
+
+
 class ExperimentsArea(QtWidgets.QMdiArea):
     def __init__(self, root, dataset_sub):
         QtWidgets.QMdiArea.__init__(self)
@@ -298,12 +314,12 @@ class ExperimentsArea(QtWidgets.QMdiArea):
 
         self._ddb = LocalDatasetDB(dataset_sub)
 
-        self.worker_handlers = {
-            "get_device_db": lambda: {},
-            "get_device": lambda key, resolve_alias=False: {"type": "dummy"},
+        self.worker_handlers = dict(dummy_device_db_handlers)
+        self.worker_handlers.update({
             "get_dataset": self._ddb.get,
+            "get_datasets": self._ddb.get_many,
             "update_dataset": self._ddb.update,
-        }
+        })
 
     def dataset_changed(self, path):
         self.dataset = path
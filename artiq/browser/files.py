@@ -1,54 +1,326 @@
 import logging
 import os
+import hashlib
+import struct
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import h5py
 from PyQt6 import QtCore, QtWidgets, QtGui
 
 from artiq import compat
+from artiq.tools import get_user_cache_dir
+from artiq.gui.tools import LayoutWidget
+from artiq.master.results_catalogue import parse_query
 
 
 logger = logging.getLogger(__name__)
 
 
-def open_h5(info):
-    if not (info.isFile() and info.isReadable() and
-            info.suffix() == "h5"):
-        return
-    try:
-        return h5py.File(info.filePath(), "r")
-    except OSError:  # e.g. file being written (see #470)
-        logger.debug("OSError when opening HDF5 file %s", info.filePath(),
-                     exc_info=True)
-    except:
-        logger.warning("unable to read HDF5 file %s", info.filePath(),
-                       exc_info=True)
+# Datasets larger than this (in bytes) are read after the others, so that
+# selecting a file shows its metadata and small datasets without delay.
+LAZY_LOAD_THRESHOLD = 1 << 20
+
+
+def is_h5(info):
+    return info.isFile() and info.isReadable() and info.suffix() == "h5"
+
+
+def read_metadata(f):
+    expid = compat.pyon_decode(f["expid"][()]) if "expid" in f else dict()
+    start_time = datetime.fromtimestamp(f["start_time"][()]) if "start_time" in f else "<none>"
+    return {
+        "artiq_version": f["artiq_version"].asstr()[()] if "artiq_version" in f else "<none>",
+        "repo_rev": expid.get("repo_rev", "<none>"),
+        "file": expid.get("file", "<none>"),
+        "class_name": expid.get("class_name", "<none>"),
+        "rid": f["rid"][()] if "rid" in f else "<none>",
+        "start_time": start_time,
+    }
+
+
+def index_results(f):
+    """Reads the small archived and output datasets of a results file.
+
+    Returns a dictionary of ``(persist, value, metadata)`` tuples, and a
+    dictionary mapping the keys of the datasets larger than
+    :data:`LAZY_LOAD_THRESHOLD`, whose values are not read, to their
+    HDF5 paths. Outputs take precedence over archived datasets with the
+    same key.
+    """
+    small = {}
+    large = {}
+    for group in "archive", "datasets":
+        if group not in f:
+            continue
+
+        def visitor(k, v):
+            if not isinstance(v, h5py.Dataset):
+                return
+            if group == "datasets" and (k in small or k in large):
+                logger.warning("dataset '%s' is both in archive "
+                               "and outputs", k)
+            small.pop(k, None)
+            large.pop(k, None)
+            if v.nbytes > LAZY_LOAD_THRESHOLD:
+                large[k] = v.name
+            else:
+                # v.attrs is a non-serializable h5py.AttributeManager, need to convert to dict
+                # See https://docs.h5py.org/en/stable/high/attr.html#h5py.AttributeManager
+                small[k] = (True, v[()], dict(v.attrs))
+
+        f[group].visititems(visitor)
+    return small, large
+
+
+class ResultsLoader(QtCore.QObject):
+    """Reads results files in a background thread.
+
+    For each file passed to :meth:`load`, :attr:`indexed` is emitted with
+    the metadata and the small datasets (see :func:`index_results`), then
+    :attr:`dataset_loaded` once per large dataset. Loading a file abandons
+    the loading of the previous one.
+    """
+    indexed = QtCore.pyqtSignal(str, object, object)
+    dataset_loaded = QtCore.pyqtSignal(str, str, object)
+
+    def __init__(self):
+        QtCore.QObject.__init__(self)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.current = None
+
+    def load(self, path):
+        self.current = path
+        self.executor.submit(self._load, path)
 
+    def stop(self):
+        self.current = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, path):
+        if path != self.current:
+            return
+        logger.debug("loading datasets from %s", path)
+        try:
+            with h5py.File(path, "r") as f:
+                try:
+                    metadata = read_metadata(f)
+                except:
+                    logger.warning("unable to read metadata from %s",
+                                   path, exc_info=True)
+                    metadata = None
+                datasets, large = index_results(f)
+                self.indexed.emit(path, metadata, datasets)
+
+                for k, name in large.items():
+                    if path != self.current:
+                        return
+                    v = f[name]
+                    self.dataset_loaded.emit(path, k,
+                                             (True, v[()], dict(v.attrs)))
+        except OSError:  # e.g. file being written (see #470)
+            logger.debug("OSError when opening HDF5 file %s", path,
+                         exc_info=True)
+        except:
+            logger.warning("unable to read HDF5 file %s", path,
+                           exc_info=True)
+
+
+def format_metadata(metadata):
+    return ("artiq_version: {artiq_version}\n"
+            "repo_rev: {repo_rev}\nfile: {file}\n"
+            "class_name: {class_name}\nrid: {rid}\n"
+            "start_time: {start_time}").format(**metadata)
+
+
+# length of the tooltip in the cache files, followed by the tooltip and
+# the thumbnail
+_cache_header = struct.Struct("<I")
+
+
+def _decode_cache_entry(data):
+    try:
+        length, = _cache_header.unpack_from(data)
+        end = _cache_header.size + length
+        if end > len(data):
+            return None
+        return data[_cache_header.size:end].decode(), data[end:]
+    except (struct.error, UnicodeDecodeError):
+        return None
+
+
+class ThumbnailCache(QtCore.QObject):
+    """Thumbnails and metadata tooltips of results files, read by a pool of
+    worker threads.
+
+    They are also stored on disk, keyed by the path and modification time
+    of the results file, so that they are read from the HDF5 file only
+    once. The least recently used cache files are deleted when they take
+    more than ``max_cache_size`` bytes. :attr:`thumbnail_ready` is emitted
+    with the path of a file when its thumbnail and tooltip become available
+    from :meth:`icon` and :meth:`tooltip`.
+
+    Files that cannot be read (e.g. because they are being written) are
+    only read again once their modification time changes.
+    """
+    thumbnail_ready = QtCore.pyqtSignal(str)
+    _read = QtCore.pyqtSignal(str, object, object)
+
+    def __init__(self, cache_dir=None, max_workers=4,
+                 max_cache_size=256*2**20):
+        QtCore.QObject.__init__(self)
+        if cache_dir is None:
+            cache_dir = os.path.join(get_user_cache_dir(), "thumbnails")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_cache_size = max_cache_size
+        self.cache_lock = threading.Lock()
+        self.cache_size = sum(entry.stat().st_size
+                              for entry in os.scandir(cache_dir)
+                              if entry.is_file())
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # path -> (mtime, icon, tooltip), with icon and tooltip None if the
+        # file has no thumbnail or could not be read
+        self.entries = dict()
+        self.pending = set()
+        self.stopped = False
+        self._read.connect(self._thumbnail_read)
+
+    def _entry(self, info):
+        path = info.filePath()
+        mtime = info.lastModified().toMSecsSinceEpoch()
+        try:
+            entry = self.entries[path]
+        except KeyError:
+            pass
+        else:
+            if entry[0] == mtime:
+                return entry
+        if (path, mtime) not in self.pending:
+            self.pending.add((path, mtime))
+            self.executor.submit(self._read_thumbnail, path, mtime)
+        return None
 
-class ThumbnailIconProvider(QtWidgets.QFileIconProvider):
     def icon(self, info):
-        icon = self.hdf5_thumbnail(info)
-        if icon is None:
-            icon = QtWidgets.QFileIconProvider.icon(self, info)
-        return icon
-
-    def hdf5_thumbnail(self, info):
-        f = open_h5(info)
-        if not f:
+        """Returns the thumbnail of a results file, or ``None`` if it has
+        none or if it is still being read."""
+        entry = self._entry(info)
+        return None if entry is None else entry[1]
+
+    def tooltip(self, info):
+        """Returns the metadata of a results file formatted as a tooltip,
+        or ``None`` if it could not be read or if it is still being
+        read."""
+        entry = self._entry(info)
+        return None if entry is None else entry[2]
+
+    def stop(self):
+        self.stopped = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cache_file(self, path, mtime):
+        key = "{}\0{}".format(path, mtime).encode()
+        return os.path.join(self.cache_dir, hashlib.sha1(key).hexdigest())
+
+    def _read_thumbnail(self, path, mtime):
+        if self.stopped:
             return
-        with f:
-            try:
-                t = f["datasets/thumbnail"]
-            except KeyError:
+        cache_file = self._cache_file(path, mtime)
+        entry = None
+        try:
+            with open(cache_file, "rb") as f:
+                entry = _decode_cache_entry(f.read())
+            # keep track of the last use, for eviction
+            os.utime(cache_file)
+        except FileNotFoundError:
+            pass
+        if entry is None:
+            data = self._read_h5(path)
+            if data is None:
+                self._read.emit(path, mtime, None)
                 return
+            self._store(cache_file, data)
+            entry = _decode_cache_entry(data)
+        self._read.emit(path, mtime, entry)
+
+    def _read_h5(self, path):
+        try:
+            with h5py.File(path, "r") as f:
+                try:
+                    tooltip = format_metadata(read_metadata(f))
+                except:
+                    logger.warning("unable to read metadata from %s",
+                                   path, exc_info=True)
+                    tooltip = ""
+                try:
+                    thumbnail = bytes(f["datasets/thumbnail"][()])
+                except KeyError:
+                    # an empty thumbnail records a file without thumbnail
+                    thumbnail = b""
+        except OSError:  # e.g. file being written (see #470)
+            logger.debug("OSError when opening HDF5 file %s", path,
+                         exc_info=True)
+            return None
+        except:
+            logger.warning("unable to read thumbnail from %s",
+                           path, exc_info=True)
+            return None
+        tooltip = tooltip.encode()
+        return _cache_header.pack(len(tooltip)) + tooltip + thumbnail
+
+    def _store(self, cache_file, data):
+        try:
+            with open(cache_file + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(cache_file + ".tmp", cache_file)
+        except OSError:
+            logger.debug("unable to cache thumbnail in %s", cache_file,
+                         exc_info=True)
+            return
+        with self.cache_lock:
+            self.cache_size += len(data)
+            if self.cache_size > self.max_cache_size:
+                self._evict()
+
+    def _evict(self):
+        # deletes the least recently used cache files, down to 3/4 of the
+        # maximum size so that eviction does not happen on every write
+        entries = []
+        for entry in os.scandir(self.cache_dir):
             try:
-                img = QtGui.QImage.fromData(t[()])
-            except:
-                logger.warning("unable to read thumbnail from %s",
-                               info.filePath(), exc_info=True)
-                return
-            pix = QtGui.QPixmap.fromImage(img)
-            return QtGui.QIcon(pix)
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.is_file():
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        self.cache_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.cache_size <= self.max_cache_size*3//4:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self.cache_size -= size
+
+    def _thumbnail_read(self, path, mtime, data):
+        self.pending.discard((path, mtime))
+        if data is None:
+            # not read again until the file is modified
+            self.entries[path] = (mtime, None, None)
+            return
+        tooltip, thumbnail = data
+        icon = None
+        if thumbnail:
+            img = QtGui.QImage.fromData(thumbnail)
+            if img.isNull():
+                logger.warning("unable to read thumbnail from %s", path)
+            else:
+                icon = QtGui.QIcon(QtGui.QPixmap.fromImage(img))
+        self.entries[path] = (mtime, icon, tooltip or None)
+        self.thumbnail_ready.emit(path)
 
 
 class DirsOnlyProxy(QtCore.QSortFilterProxyModel):
@@ -94,26 +366,29 @@ class Hdf5FileSystemModel(QtGui.QFileSystemModel):
         self.setFilter(QtCore.QDir.Filter.Drives | QtCore.QDir.Filter.NoDotAndDotDot |
                        QtCore.QDir.Filter.AllDirs | QtCore.QDir.Filter.Files)
         self.setNameFilterDisables(False)
-        self.setIconProvider(ThumbnailIconProvider())
+        self.thumbnails = ThumbnailCache()
+        self.thumbnails.thumbnail_ready.connect(self.thumbnail_ready)
+
+    def thumbnail_ready(self, path):
+        idx = self.index(path)
+        if idx.isValid():
+            self.dataChanged.emit(idx, idx,
+                                  [QtCore.Qt.ItemDataRole.DecorationRole,
+                                   QtCore.Qt.ItemDataRole.ToolTipRole])
 
     def data(self, idx, role):
-        if role == QtCore.Qt.ItemDataRole.ToolTipRole:
+        if role == QtCore.Qt.ItemDataRole.DecorationRole and idx.column() == 0:
             info = self.fileInfo(idx)
-            h5 = open_h5(info)
-            if h5 is not None:
-                try:
-                    expid = compat.pyon_decode(h5["expid"][()]) if "expid" in h5 else dict()
-                    start_time = datetime.fromtimestamp(h5["start_time"][()]) if "start_time" in h5 else "<none>"
-                    v = ("artiq_version: {}\nrepo_rev: {}\nfile: {}\n"
-                         "class_name: {}\nrid: {}\nstart_time: {}").format(
-                             h5["artiq_version"].asstr()[()] if "artiq_version" in h5 else "<none>",
-                             expid.get("repo_rev", "<none>"),
-                             expid.get("file", "<none>"), expid.get("class_name", "<none>"),
-                             h5["rid"][()] if "rid" in h5 else "<none>", start_time)
-                    return v
-                except:
-                    logger.warning("unable to read metadata from %s",
-                                   info.filePath(), exc_info=True)
+            if is_h5(info):
+                icon = self.thumbnails.icon(info)
+                if icon is not None:
+                    return icon
+        elif role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            info = self.fileInfo(idx)
+            if is_h5(info):
+                tooltip = self.thumbnails.tooltip(info)
+                if tooltip is not None:
+                    return tooltip
         return QtGui.QFileSystemModel.data(self, idx, role)
 
 
@@ -122,13 +397,30 @@ class FilesDock(QtWidgets.QDockWidget):
     dataset_changed = QtCore.pyqtSignal(str)
     metadata_changed = QtCore.pyqtSignal(dict)
 
-    def __init__(self, datasets, browse_root=""):
+    def __init__(self, datasets, browse_root="", catalogue=None):
         QtWidgets.QDockWidget.__init__(self, "Files")
         self.setObjectName("Files")
         self.setFeatures(self.DockWidgetFeature.DockWidgetMovable | self.DockWidgetFeature.DockWidgetFloatable)
 
         self.splitter = QtWidgets.QSplitter()
-        self.setWidget(self.splitter)
+        self.catalogue = catalogue
+        if catalogue is None:
+            self.setWidget(self.splitter)
+        else:
+            grid = LayoutWidget()
+            self.search = QtWidgets.QLineEdit()
+            self.search.setPlaceholderText(
+                "search: RID, class=NAME, file=..., dataset=NAME, ARG=VALUE")
+            self.search.returnPressed.connect(self.search_catalogue)
+            grid.addWidget(self.search, 0, 0)
+            self.search_results = QtWidgets.QListWidget()
+            self.search_results.itemActivated.connect(
+                lambda item: self.select_file(
+                    item.data(QtCore.Qt.ItemDataRole.UserRole)))
+            self.search_results.hide()
+            grid.addWidget(self.search_results, 1, 0)
+            grid.addWidget(self.splitter, 2, 0)
+            self.setWidget(grid)
 
         self.datasets = datasets
 
@@ -163,58 +455,62 @@ class FilesDock(QtWidgets.QDockWidget):
         self.rl.activated.connect(self.list_activated)
         self.splitter.addWidget(self.rl)
 
+        self.loader = ResultsLoader()
+        self.loader.indexed.connect(self.results_indexed)
+        self.loader.dataset_loaded.connect(self.result_loaded)
+
     def tree_current_changed(self, current, previous):
         idx = self.rt.model().mapToSource(current)
         self.rl.setRootIndex(idx)
 
     def list_current_changed(self, current, previous):
         info = self.model.fileInfo(current)
-        f = open_h5(info)
-        if not f:
+        if is_h5(info):
+            self.loader.load(info.filePath())
+
+    def results_indexed(self, path, metadata, datasets):
+        if path != self.loader.current:
             return
-        logger.debug("loading datasets from %s", info.filePath())
-        with f:
-            try:
-                expid = compat.pyon_decode(f["expid"][()]) if "expid" in f else dict()
-                start_time = datetime.fromtimestamp(f["start_time"][()]) if "start_time" in f else "<none>"
-                v = {
-                    "artiq_version": f["artiq_version"].asstr()[()] if "artiq_version" in f else "<none>",
-                    "repo_rev": expid.get("repo_rev", "<none>"),
-                    "file": expid.get("file", "<none>"),
-                    "class_name": expid.get("class_name", "<none>"),
-                    "rid": f["rid"][()] if "rid" in f else "<none>",
-                    "start_time": start_time,
-                }
-                self.metadata_changed.emit(v)
-            except:
-                logger.warning("unable to read metadata from %s",
-                               info.filePath(), exc_info=True)
-
-            rd = {}
-            if "archive" in f:
-                def visitor(k, v):
-                    if isinstance(v, h5py.Dataset):
-                        # v.attrs is a non-serializable h5py.AttributeManager, need to convert to dict
-                        # See https://docs.h5py.org/en/stable/high/attr.html#h5py.AttributeManager
-                        rd[k] = (True, v[()], dict(v.attrs))
-
-                f["archive"].visititems(visitor)
-
-            if "datasets" in f:
-                def visitor(k, v):
-                    if isinstance(v, h5py.Dataset):
-                        if k in rd:
-                            logger.warning("dataset '%s' is both in archive "
-                                           "and outputs", k)
-                        # v.attrs is a non-serializable h5py.AttributeManager, need to convert to dict
-                        # See https://docs.h5py.org/en/stable/high/attr.html#h5py.AttributeManager
-                        rd[k] = (True, v[()], dict(v.attrs))
-
-                f["datasets"].visititems(visitor)
-
-            self.datasets.init(rd)
-
-        self.dataset_changed.emit(info.filePath())
+        if metadata is not None:
+            self.metadata_changed.emit(metadata)
+        self.datasets.init(datasets)
+        self.dataset_changed.emit(path)
+
+    def result_loaded(self, path, key, value):
+        if path != self.loader.current:
+            return
+        self.datasets.update({"action": "setitem", "path": [],
+                              "key": key, "value": value})
+
+    def stop(self):
+        self.loader.stop()
+        self.model.thumbnails.stop()
+
+    def search_catalogue(self):
+        self.search_results.clear()
+        text = self.search.text()
+        if not text.strip():
+            self.search_results.hide()
+            return
+        try:
+            runs = self.catalogue.find(limit=1000, **parse_query(text))
+        except:
+            logger.warning("failed to search results catalogue",
+                           exc_info=True)
+            runs = []
+        for run in runs:
+            start_time = "<none>"
+            if run.start_time is not None:
+                start_time = datetime.fromtimestamp(run.start_time).isoformat(
+                    " ", "seconds")
+            item = QtWidgets.QListWidgetItem("{} RID {} {}".format(
+                start_time, run.rid, run.class_name))
+            item.setToolTip(run.path)
+            item.setData(QtCore.Qt.ItemDataRole.UserRole, run.path)
+            self.search_results.addItem(item)
+        self.search_results.setVisible(bool(runs))
+        if len(runs) == 1:
+            self.select_file(runs[0].path)
 
     def list_activated(self, idx):
         info = self.model.fileInfo(idx)
@@ -1172,6 +1172,7 @@ class Stitcher:
                          initial_whitespace)]
         parser = source_parser.Parser(lexer, version=(3, 6), diagnostic_engine=self.engine)
         function_node = parser.file_input().body[0]
+        self._strip_host_decorators(function_node, host_environment)
 
         # Mangle the name, since we put everything into a single module.
         full_function_name = "{}.{}".format(module_name, host_function.__qualname__)
@@ -1423,6 +1424,26 @@ class Stitcher:
         self.functions[function] = function_type
         return function_type
 
+    def _strip_host_decorators(self, function_node, host_environment):
+        # host_vectorized only changes how the function is called on the host,
+        # and its argument is usually not visible from the function's scope.
+        def resolve(node):
+            if isinstance(node, ast.Name):
+                return host_environment.get(node.id)
+            elif isinstance(node, ast.Attribute):
+                return getattr(resolve(node.value), node.attr, None)
+
+        decorators = []
+        at_locs = []
+        for decorator, at_loc in zip(function_node.decorator_list,
+                                     function_node.at_locs):
+            if not (isinstance(decorator, ast.Call) and
+                    resolve(decorator.func) is language_core.host_vectorized):
+                decorators.append(decorator)
+                at_locs.append(at_loc)
+        function_node.decorator_list = decorators
+        function_node.at_locs = at_locs
+
     def _quote_function(self, function, loc):
         if isinstance(function, SpecializedFunction):
             host_function = function.host_function
@@ -19,6 +19,9 @@ class TBasicBlock(types.TMono):
     def __init__(self):
         super().__init__("label")
 
+# Basic block types carry no parameters, so all blocks share one.
+_basic_block_type = TBasicBlock()
+
 def is_basic_block(typ):
     return isinstance(typ, TBasicBlock)
 
@@ -78,16 +81,35 @@ def rpc_tag(typ, error_handler):
         error_handler(typ)
 
 
+# Shared by all values that have never been used; replaced with a set
+# on the first use.
+_no_uses = frozenset()
+
 class Value:
     """
     An SSA value that keeps track of its uses.
 
     :ivar type: (:class:`.types.Type`) type of this value
-    :ivar uses: (list of :class:`Value`) values that use this value
+    :ivar uses: (set of :class:`Value`) values that use this value
     """
 
+    __slots__ = ("uses", "type")
+
     def __init__(self, typ):
-        self.uses, self.type = set(), typ.find()
+        self.uses, self.type = _no_uses, typ.find()
+
+    def _add_use(self, user):
+        if self.uses is _no_uses:
+            self.uses = {user}
+        else:
+            self.uses.add(user)
+
+    def _remove_use(self, user):
+        self.uses.remove(user)
+
+    def _discard_use(self, user):
+        if self.uses:
+            self.uses.discard(user)
 
     def replace_all_uses_with(self, value):
         for user in set(self.uses):
@@ -103,6 +125,8 @@ class Constant(Value):
     :ivar value: (Python object) value
     """
 
+    __slots__ = ("value",)
+
     def __init__(self, value, typ):
         super().__init__(typ)
         self.value = value
@@ -132,6 +156,8 @@ class NamedValue(Value):
     :ivar function: (:class:`Function`) function containing this value
     """
 
+    __slots__ = ("name", "function", "is_removed")
+
     def __init__(self, typ, name):
         super().__init__(typ)
         self.name, self.function = name, None
@@ -166,17 +192,21 @@ class User(NamedValue):
     :ivar operands: (list of :class:`Value`) operands of this value
     """
 
+    __slots__ = ("operands",)
+
     def __init__(self, operands, typ, name):
         super().__init__(typ, name)
         self.operands = []
         self.set_operands(operands)
 
     def set_operands(self, new_operands):
-        for operand in set(self.operands):
-            operand.uses.remove(self)
+        # An operand may occur several times; adding and discarding
+        # uses is idempotent, so no deduplication is needed.
+        for operand in self.operands:
+            operand._discard_use(self)
         self.operands = new_operands
-        for operand in set(self.operands):
-            operand.uses.add(self)
+        for operand in new_operands:
+            operand._add_use(self)
 
     def drop_references(self):
         self.set_operands([])
@@ -188,8 +218,8 @@ class User(NamedValue):
             if operand == value:
                 self.operands[index] = replacement
 
-        value.uses.remove(self)
-        replacement.uses.add(self)
+        value._remove_use(self)
+        replacement._add_use(self)
 
 class Instruction(User):
     """
@@ -199,6 +229,8 @@ class Instruction(User):
         source location
     """
 
+    __slots__ = ("basic_block", "loc")
+
     def __init__(self, operands, typ, name=""):
         assert isinstance(operands, list)
         assert isinstance(typ, types.Type)
@@ -270,6 +302,8 @@ class Phi(Instruction):
     directly reading :attr:`operands` or calling :meth:`set_operands`.
     """
 
+    __slots__ = ()
+
     def __init__(self, typ, name=""):
         super().__init__([], typ, name)
 
@@ -299,22 +333,22 @@ class Phi(Instruction):
     def add_incoming(self, value, block):
         assert value.type == self.type
         self.operands.append(value)
-        value.uses.add(self)
+        value._add_use(self)
         self.operands.append(block)
-        block.uses.add(self)
+        block._add_use(self)
 
     def remove_incoming_value(self, value):
         index = self.operands.index(value)
         assert index % 2 == 0
-        self.operands[index].uses.remove(self)
-        self.operands[index + 1].uses.remove(self)
+        self.operands[index]._remove_use(self)
+        self.operands[index + 1]._remove_use(self)
         del self.operands[index:index + 2]
 
     def remove_incoming_block(self, block):
         index = self.operands.index(block)
         assert index % 2 == 1
-        self.operands[index - 1].uses.remove(self)
-        self.operands[index].uses.remove(self)
+        self.operands[index - 1]._remove_use(self)
+        self.operands[index]._remove_use(self)
         del self.operands[index - 1:index + 1]
 
     def as_entity(self, type_printer):
@@ -337,6 +371,8 @@ class Terminator(Instruction):
     An SSA instruction that performs control flow.
     """
 
+    __slots__ = ()
+
     def successors(self):
         return [operand for operand in self.operands if isinstance(operand, BasicBlock)]
 
@@ -346,10 +382,12 @@ class BasicBlock(NamedValue):
 
     :ivar instructions: (list of :class:`Instruction`)
     """
+
+    __slots__ = ("instructions",)
     _dump_loc = True
 
     def __init__(self, instructions, name=""):
-        super().__init__(TBasicBlock(), name)
+        super().__init__(_basic_block_type, name)
         self.instructions = []
         self.set_instructions(instructions)
 
@@ -457,6 +495,8 @@ class Argument(NamedValue):
     :ivar loc: (:class:`pythonparser.source.Range` or None)
         source location
     """
+
+    __slots__ = ("loc",)
     def __init__(self, typ, name):
         super().__init__(typ, name)
         self.loc = None
@@ -617,6 +657,8 @@ class EnvironmentArgument(Argument):
     A function argument specifying an outer environment.
     """
 
+    __slots__ = ()
+
     def as_operand(self, type_printer):
         return "environment(...) %{}".format(escape_name(self.name))
 
@@ -626,6 +668,8 @@ class Alloc(Instruction):
     the type of the intsruction.
     """
 
+    __slots__ = ()
+
     def __init__(self, operands, typ, name=""):
         for operand in operands: assert isinstance(operand, Value)
         super().__init__(operands, typ, name)
@@ -648,6 +692,8 @@ class GetLocal(Instruction):
     :ivar var_name: (string) variable name
     """
 
+    __slots__ = ("var_name",)
+
     """
     :param env: (:class:`Value`) local environment
     :param var_name: (string) local variable name
@@ -678,6 +724,8 @@ class SetLocal(Instruction):
     :ivar var_name: (string) variable name
     """
 
+    __slots__ = ("var_name",)
+
     """
     :param env: (:class:`Value`) local environment
     :param var_name: (string) local variable name
@@ -715,6 +763,8 @@ class GetArgFromRemote(Instruction):
     :ivar arg_type: argument type
     """
 
+    __slots__ = ("arg_name", "arg_type")
+
     """
     :param arg_name: (string) argument name
     :param arg_type: argument type
@@ -745,6 +795,8 @@ class GetOptArgFromRemote(GetArgFromRemote):
                  in reference to remote arguments
     """
 
+    __slots__ = ("rcv_count", "index")
+
     """
     :param rcv_count: number of received valuese
     :param index: (integer) index of the current argument, 
@@ -772,6 +824,8 @@ class SubkernelAwaitArgs(Instruction):
     :ivar arg_types: (list of types) types of passed arguments (including optional)
     """
 
+    __slots__ = ("arg_types",)
+
     """
     :param arg_types: (list of types) types of passed arguments (including optional)
     """
@@ -789,6 +843,8 @@ class GetAttr(Instruction):
     :ivar attr: (string) variable name
     """
 
+    __slots__ = ("attr",)
+
     """
     :param obj: (:class:`Value`) object or tuple
     :param attr: (string or integer) attribute or index
@@ -826,6 +882,8 @@ class SetAttr(Instruction):
     :ivar attr: (string) variable name
     """
 
+    __slots__ = ("attr",)
+
     """
     :param obj: (:class:`Value`) object or tuple
     :param attr: (string or integer) attribute
@@ -864,6 +922,8 @@ class Offset(Instruction):
     remain inside the same object (see :class:`GetElem` and LLVM's GetElementPtr).
     """
 
+    __slots__ = ()
+
     """
     :param lst: (:class:`Value`) list
     :param index: (:class:`Value`) index
@@ -888,6 +948,8 @@ class GetElem(Instruction):
     An intruction that loads an element from a list.
     """
 
+    __slots__ = ()
+
     """
     :param lst: (:class:`Value`) list
     :param index: (:class:`Value`) index
@@ -911,6 +973,8 @@ class SetElem(Instruction):
     An intruction that stores an element into a list.
     """
 
+    __slots__ = ()
+
     """
     :param lst: (:class:`Value`) list
     :param index: (:class:`Value`) index
@@ -940,6 +1004,8 @@ class Coerce(Instruction):
     A coercion operation for numbers.
     """
 
+    __slots__ = ()
+
     def __init__(self, value, typ, name=""):
         assert isinstance(value, Value)
         assert isinstance(typ, types.Type)
@@ -958,6 +1024,8 @@ class Arith(Instruction):
     :ivar op: (:class:`pythonparser.ast.operator`) operation
     """
 
+    __slots__ = ("op",)
+
     """
     :param op: (:class:`pythonparser.ast.operator`) operation
     :param lhs: (:class:`Value`) left-hand operand
@@ -993,6 +1061,8 @@ class Compare(Instruction):
     :ivar op: (:class:`pythonparser.ast.cmpop`) operation
     """
 
+    __slots__ = ("op",)
+
     """
     :param op: (:class:`pythonparser.ast.cmpop`) operation
     :param lhs: (:class:`Value`) left-hand operand
@@ -1028,6 +1098,8 @@ class Builtin(Instruction):
     :ivar op: (string) operation name
     """
 
+    __slots__ = ("op",)
+
     """
     :param op: (string) operation name
     """
@@ -1054,6 +1126,8 @@ class BuiltinInvoke(Terminator):
     :ivar op: (string) operation name
     """
 
+    __slots__ = ("op",)
+
     """
     :param op: (string) operation name
     :param normal: (:class:`BasicBlock`) normal target
@@ -1090,6 +1164,8 @@ class Closure(Instruction):
     :ivar target_function: (:class:`Function`) function to invoke
     """
 
+    __slots__ = ("target_function",)
+
     """
     :param func: (:class:`Function`) function
     :param env: (:class:`Value`) outer environment
@@ -1124,6 +1200,8 @@ class Call(Instruction):
         the callee function is cold
     """
 
+    __slots__ = ("arg_exprs", "static_target_function", "is_cold")
+
     """
     :param func: (:class:`Value`) function to call
     :param args: (list of :class:`Value`) function arguments
@@ -1166,6 +1244,8 @@ class Select(Instruction):
     A conditional select instruction.
     """
 
+    __slots__ = ()
+
     """
     :param cond: (:class:`Value`) select condition
     :param if_true: (:class:`Value`) value of select if condition is truthful
@@ -1198,6 +1278,8 @@ class Quote(Instruction):
     :ivar value: (string) operation name
     """
 
+    __slots__ = ("value",)
+
     """
     :param value: (string) operation name
     """
@@ -1218,6 +1300,8 @@ class Branch(Terminator):
     An unconditional branch instruction.
     """
 
+    __slots__ = ()
+
     """
     :param target: (:class:`BasicBlock`) branch target
     """
@@ -1232,15 +1316,17 @@ class Branch(Terminator):
         return self.operands[0]
 
     def set_target(self, new_target):
-        self.operands[0].uses.remove(self)
+        self.operands[0]._remove_use(self)
         self.operands[0] = new_target
-        self.operands[0].uses.add(self)
+        self.operands[0]._add_use(self)
 
 class BranchIf(Terminator):
     """
     A conditional branch instruction.
     """
 
+    __slots__ = ()
+
     """
     :param cond: (:class:`Value`) branch condition
     :param if_true: (:class:`BasicBlock`) branch target if condition is truthful
@@ -1271,6 +1357,8 @@ class IndirectBranch(Terminator):
     An indirect branch instruction.
     """
 
+    __slots__ = ()
+
     """
     :param target: (:class:`Value`) branch target
     :param destinations: (list of :class:`BasicBlock`) all possible values of `target`
@@ -1290,7 +1378,7 @@ class IndirectBranch(Terminator):
         return self.operands[1:]
 
     def add_destination(self, destination):
-        destination.uses.add(self)
+        destination._add_use(self)
         self.operands.append(destination)
 
     def _operands_as_string(self, type_printer):
@@ -1306,6 +1394,8 @@ class Return(Terminator):
         where the return value is sent back through DRTIO
     """
 
+    __slots__ = ("remote_return",)
+
     """
     :param value: (:class:`Value`) return value
     """
@@ -1325,6 +1415,8 @@ class Unreachable(Terminator):
     An instruction used to mark unreachable branches.
     """
 
+    __slots__ = ()
+
     """
     :param target: (:class:`BasicBlock`) branch target
     """
@@ -1339,6 +1431,8 @@ class Raise(Terminator):
     A raise instruction.
     """
 
+    __slots__ = ()
+
     """
     :param value: (:class:`Value`) exception value
     :param exn: (:class:`BasicBlock` or None) exceptional target
@@ -1366,6 +1460,8 @@ class Resume(Terminator):
     A resume instruction.
     """
 
+    __slots__ = ()
+
     """
     :param exn: (:class:`BasicBlock` or None) exceptional target
     """
@@ -1395,6 +1491,8 @@ class Invoke(Terminator):
         the callee function is cold
     """
 
+    __slots__ = ("arg_exprs", "static_target_function", "is_cold")
+
     """
     :param func: (:class:`Value`) function to call
     :param args: (list of :class:`Value`) function arguments
@@ -1460,6 +1558,8 @@ class LandingPad(Terminator):
         exception types corresponding to the basic block operands
     """
 
+    __slots__ = ("types", "has_cleanup")
+
     def __init__(self, cleanup, name=""):
         super().__init__([cleanup], builtins.TException(), name)
         self.types = []
@@ -1484,7 +1584,7 @@ class LandingPad(Terminator):
         assert typ is None or builtins.is_exception(typ)
         self.operands.append(target)
         self.types.append(typ.find() if typ is not None else None)
-        target.uses.add(self)
+        target._add_use(self)
 
     def _operands_as_string(self, type_printer):
         table = []
@@ -1505,6 +1605,8 @@ class Delay(Terminator):
     :ivar interval: (:class:`iodelay.Expr`) expression
     """
 
+    __slots__ = ("interval",)
+
     """
     :param interval: (:class:`iodelay.Expr`) expression
     :param call: (:class:`Call` or ``Constant(None, builtins.TNone())``)
@@ -1527,17 +1629,17 @@ class Delay(Terminator):
         return self.operands[0]
 
     def set_decomposition(self, new_decomposition):
-        self.operands[0].uses.remove(self)
+        self.operands[0]._remove_use(self)
         self.operands[0] = new_decomposition
-        self.operands[0].uses.add(self)
+        self.operands[0]._add_use(self)
 
     def target(self):
         return self.operands[1]
 
     def set_target(self, new_target):
-        self.operands[1].uses.remove(self)
+        self.operands[1]._remove_use(self)
         self.operands[1] = new_target
-        self.operands[1].uses.add(self)
+        self.operands[1]._add_use(self)
 
     def _operands_as_string(self, type_printer):
         result = "decomp {}, to {}".format(self.decomposition().as_operand(type_printer),
@@ -1558,6 +1660,8 @@ class Loop(Terminator):
         expression for trip count
     """
 
+    __slots__ = ("trip_count",)
+
     """
     :param trip_count: (:class:`iodelay.Expr`) expression
     :param indvar: (:class:`Phi`)
@@ -1607,6 +1711,8 @@ class Interleave(Terminator):
     in parallel.
     """
 
+    __slots__ = ()
+
     def __init__(self, destinations, name=""):
         super().__init__(destinations, builtins.TNone(), name)
 
@@ -1617,5 +1723,5 @@ class Interleave(Terminator):
         return self.operands
 
     def add_destination(self, destination):
-        destination.uses.add(self)
+        destination._add_use(self)
         self.operands.append(destination)
@@ -0,0 +1,99 @@
+from artiq.experiment import *
+
+
+class Stage0:
+    kernel_invariants = {"core", "ttl", "duration"}
+
+    def __init__(self, core, ttl, duration):
+        self.core = core
+        self.ttl = ttl
+        self.duration = duration
+        self.count = 0
+
+    @kernel
+    def prepare(self):
+        self.count += 1
+
+    @kernel
+    def step0(self):
+        self.prepare()
+        self.ttl.pulse(self.duration)
+
+
+class Stage1(Stage0):
+    @kernel
+    def step1(self):
+        self.step0()
+        delay(self.duration)
+
+
+class Stage2(Stage1):
+    @kernel
+    def step2(self):
+        self.step1()
+        self.ttl.pulse(2*self.duration)
+
+
+class Stage3(Stage2):
+    @kernel
+    def prepare(self):
+        self.count += 2
+
+    @kernel
+    def step3(self):
+        self.step2()
+        self.prepare()
+
+
+class Stage4(Stage3):
+    @kernel
+    def step4(self):
+        with parallel:
+            self.step3()
+            delay(self.duration)
+
+
+class Stage5(Stage4):
+    @kernel
+    def step5(self):
+        self.step4()
+        at_mu(now_mu() + 8)
+
+
+class Stage6(Stage5):
+    @kernel
+    def step6(self):
+        for _ in range(3):
+            self.step5()
+
+
+class Stage7(Stage6):
+    @kernel
+    def prepare(self):
+        self.count -= 1
+
+    @kernel
+    def step7(self):
+        self.step6()
+        self.step0()
+
+
+class Benchmark(EnvExperiment):
+    """Deep class hierarchies with many instances"""
+    def build(self):
+        self.setattr_device("core")
+        ttls = [self.get_device("ttl" + str(i)) for i in range(4, 8)]
+        self.stage1 = Stage1(self.core, ttls[0], 1*us)
+        self.stage3 = Stage3(self.core, ttls[1], 2*us)
+        self.stage5 = Stage5(self.core, ttls[2], 3*us)
+        self.stages = [Stage7(self.core, ttls[i % len(ttls)], (i + 1)*us)
+                       for i in range(32)]
+
+    @kernel
+    def run(self):
+        self.core.reset()
+        self.stage1.step1()
+        self.stage3.step3()
+        self.stage5.step5()
+        for stage in self.stages:
+            stage.step7()
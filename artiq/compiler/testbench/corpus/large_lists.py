@@ -0,0 +1,29 @@
+from artiq.experiment import *
+
+
+class Benchmark(EnvExperiment):
+    """Large host lists embedded into kernels"""
+    def build(self):
+        self.setattr_device("core")
+        self.setattr_device("ttl4")
+        self.timings = [i*13 % 1000 + 8 for i in range(4096)]
+        self.voltages = [(i % 200)/100. - 1. for i in range(4096)]
+        self.pairs = [(i, i*i % 997) for i in range(1024)]
+        self.masks = [bool(i & 4) for i in range(4096)]
+        self.table = [[j*i for j in range(16)] for i in range(256)]
+
+    @kernel
+    def run(self):
+        self.core.reset()
+        acc = 0.
+        for i in range(len(self.timings)):
+            if self.masks[i]:
+                self.ttl4.pulse_mu(int64(self.timings[i]))
+            acc += self.voltages[i]
+        for (a, b) in self.pairs:
+            delay_mu(int64(a + b))
+        total = 0
+        for row in self.table:
+            for x in row:
+                total += x
+        delay_mu(int64(total % 100))
@@ -0,0 +1,55 @@
+import numpy as np
+
+from artiq.experiment import *
+
+
+class Benchmark(EnvExperiment):
+    """Many RPCs with varied signatures"""
+    def build(self):
+        self.setattr_device("core")
+        self.setattr_device("ttl0")
+
+    def report(self, index: TInt32, value: TFloat) -> TNone:
+        pass
+
+    @rpc(flags={"async"})
+    def report_async(self, values):
+        pass
+
+    def get_int(self) -> TInt32:
+        return 0
+
+    def get_int64(self) -> TInt64:
+        return 0
+
+    def get_float(self) -> TFloat:
+        return 0.
+
+    def get_str(self) -> TStr:
+        return ""
+
+    def get_list(self) -> TList(TInt32):
+        return []
+
+    def get_array(self) -> TArray(TFloat):
+        return np.zeros(1)
+
+    def get_tuple(self) -> TTuple([TInt32, TFloat, TBool]):
+        return 0, 0., False
+
+    def keyword(self, a, b=1, c=2.) -> TNone:
+        pass
+
+    @kernel
+    def run(self):
+        self.core.reset()
+        for i in range(100):
+            self.report(i, self.get_float())
+            self.report_async([i, self.get_int()])
+            self.report_async((self.get_int64(), self.get_str()))
+            self.report_async(self.get_list())
+            self.report_async(self.get_array())
+            self.report_async(self.get_tuple())
+            self.keyword(i, c=1.5)
+            self.keyword(i, b=i)
+            self.ttl0.count(self.ttl0.gate_rising(1*us))
@@ -0,0 +1,42 @@
+from artiq.experiment import *
+
+
+@subkernel(destination=1)
+def accumulate(values: TList(TInt32)) -> TInt32:
+    total = 0
+    for value in values:
+        total += value
+    return total
+
+
+@subkernel(destination=1)
+def scale(value: TFloat, factor: TFloat) -> TFloat:
+    return value*factor
+
+
+@subkernel(destination=1)
+def exchange(count: TInt32):
+    for i in range(count):
+        subkernel_send(0, "index", i)
+
+
+class Benchmark(EnvExperiment):
+    """Subkernel calls, arguments and messages"""
+    def build(self):
+        self.setattr_device("core")
+        self.setattr_device("ttl4")
+
+    @kernel
+    def run(self):
+        self.core.reset()
+        values = [i for i in range(100)]
+        accumulate(values)
+        scale(2.5, 4.0)
+        exchange(16)
+        for _ in range(16):
+            subkernel_recv("index", TInt32)
+        subkernel_await(exchange)
+        total = subkernel_await(accumulate)
+        result = subkernel_await(scale)
+        if total > 0 and result > 0.:
+            self.ttl4.pulse(1*us)
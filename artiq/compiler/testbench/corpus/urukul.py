@@ -0,0 +1,44 @@
+from artiq.experiment import *
+from artiq.coredevice.ad9910 import RAM_DEST_FTW, RAM_MODE_CONT_RAMPUP
+
+
+class Benchmark(EnvExperiment):
+    """Urukul/AD9910 initialization, profile and RAM programming"""
+    def build(self):
+        self.setattr_device("core")
+        self.setattr_device("urukul0_cpld")
+        self.dds = [self.get_device("urukul0_ch" + str(i)) for i in range(4)]
+        self.ttls = [self.get_device("ttl" + str(i)) for i in range(4, 8)]
+        self.frequencies = [80*MHz + i*kHz for i in range(64)]
+        self.amplitudes = [0.1 + 0.8*i/63 for i in range(64)]
+
+    @kernel
+    def program_ram(self, dds):
+        ram = [0]*len(self.frequencies)
+        dds.frequency_to_ram(self.frequencies, ram)
+        dds.set_cfr1(ram_enable=0)
+        dds.cpld.io_update.pulse_mu(8)
+        dds.set_profile_ram(start=0, end=len(ram) - 1, step=250,
+                            profile=0, mode=RAM_MODE_CONT_RAMPUP)
+        dds.set_profile(0)
+        dds.write_ram(ram)
+        dds.set_cfr1(ram_enable=1, ram_destination=RAM_DEST_FTW)
+        dds.cpld.io_update.pulse_mu(8)
+
+    @kernel
+    def run(self):
+        self.core.reset()
+        self.urukul0_cpld.init()
+        for dds in self.dds:
+            dds.init()
+            dds.set_att(10*dB)
+            dds.sw.on()
+        for i in range(len(self.frequencies)):
+            for dds in self.dds:
+                dds.set(self.frequencies[i], amplitude=self.amplitudes[i],
+                        profile=i % 8)
+            delay(10*us)
+        for dds in self.dds:
+            self.program_ram(dds)
+        for ttl in self.ttls:
+            ttl.pulse(1*us)
@@ -0,0 +1,58 @@
+import sys, time, gc, tracemalloc
+from ..module import Module, Source
+
+def generate(size):
+    """Generate a kernel resembling an unrolled loop, with ``size``
+    functions containing arithmetic and conditionals."""
+    lines = []
+    for i in range(size):
+        lines += [
+            "def f{}(x):".format(i),
+            "    y = x * 3 + {}".format(i),
+            "    for j in range(4):",
+            "        if y > j:",
+            "            y = y - x",
+            "        else:",
+            "            y = y + j",
+            "    return y",
+        ]
+    # call the functions in groups, keeping delay expressions shallow
+    groups = range(0, size, 50)
+    for group in groups:
+        lines.append("def g{}(a):".format(group))
+        for i in range(group, min(group + 50, size)):
+            lines.append("    a = f{}(a)".format(i))
+        lines.append("    return a")
+    lines.append("def entrypoint():")
+    lines.append("    a = 0")
+    for group in groups:
+        lines.append("    a = g{}(a)".format(group))
+    return "\n".join(lines) + "\n"
+
+def main():
+    if len(sys.argv) > 2:
+        print("Expected at most one argument (kernel size)", file=sys.stderr)
+        exit(1)
+    size = int(sys.argv[1]) if len(sys.argv) == 2 else 1000
+
+    code = generate(size)
+
+    gc.collect()
+    start = time.perf_counter()
+    module = Module(Source.from_string(code, "<perf_ir>"))
+    end = time.perf_counter()
+    del module
+
+    # tracemalloc slows allocation down, so measure memory in a separate run
+    gc.collect()
+    tracemalloc.start()
+    module = Module(Source.from_string(code, "<perf_ir>"))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    insns = sum(len(list(fn.instructions())) for fn in module.artiq_ir)
+    print("{} functions, {} instructions: {:.2f}s, {:.1f} MiB live, {:.1f} MiB peak".format(
+            size, insns, end - start, current / 2**20, peak / 2**20))
+
+if __name__ == "__main__":
+    main()
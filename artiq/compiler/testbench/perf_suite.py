@@ -0,0 +1,205 @@
+"""
+Hardware-free compiler benchmark suite.
+
+Stitches and compiles each kernel of a corpus for one or more targets,
+measuring the time and the peak Python heap usage of every compilation
+stage. Results are written as JSON and can be compared against a baseline
+produced by an earlier run; the exit status is nonzero if any stage
+regressed by more than the tolerance.
+
+By default, the corpus shipped in the ``corpus`` directory next to this
+file is used. Each corpus file defines an experiment class named
+``Benchmark`` whose ``run`` method is the kernel to compile; the devices
+come from the ``device_db.py`` in the same directory.
+"""
+
+import sys, os, argparse, json, platform, time, gc, tracemalloc, tokenize
+from collections import OrderedDict
+
+from ...language.environment import ProcessArgumentManager
+from ...master.databases import DeviceDB
+from ...master.worker_db import DeviceManager
+from ..module import Module
+from ..embedding import Stitcher
+from ..targets import RV32GTarget, CortexA9Target
+
+
+TARGETS = OrderedDict([
+    ("rv32g", RV32GTarget),
+    ("cortexa9", CortexA9Target),
+])
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "corpus")
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(
+        description="ARTIQ compiler benchmark suite")
+    parser.add_argument("kernels", nargs="*", metavar="FILE",
+                        help="corpus files to compile "
+                             "(default: all files of the shipped corpus)")
+    parser.add_argument("-t", "--target", action="append",
+                        choices=list(TARGETS.keys()),
+                        help="target to compile for; may be given multiple "
+                             "times (default: all targets)")
+    parser.add_argument("-n", "--runs", type=int, default=5,
+                        help="timed runs of each stage; the fastest is "
+                             "reported (default: %(default)d)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write results to this JSON file "
+                             "(default: standard output)")
+    parser.add_argument("-b", "--baseline", default=None,
+                        help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative increase of time or memory over the "
+                             "baseline reported as a regression "
+                             "(default: %(default)s)")
+    return parser
+
+
+def corpus_files(kernels):
+    if kernels:
+        return kernels
+    return sorted(os.path.join(DEFAULT_CORPUS, name)
+                  for name in os.listdir(DEFAULT_CORPUS)
+                  if name.endswith(".py") and name != "device_db.py")
+
+
+def load_benchmark(filename):
+    with tokenize.open(filename) as f:
+        code = compile(f.read(), f.name, "exec")
+    testcase_vars = {"__name__": "testbench", "__file__": filename}
+    exec(code, testcase_vars)
+    return testcase_vars["Benchmark"]
+
+
+def measure(stage, runs, setup=None):
+    """Returns the fastest of ``runs`` executions of ``stage`` and the peak
+    Python heap usage of one further, traced execution.
+
+    If ``setup`` is given, it is called before each execution, outside of
+    the measurement, and its result is passed to ``stage``. This is needed
+    for stages that modify their input."""
+    def prepare():
+        return () if setup is None else (setup(),)
+
+    best = float("inf")
+    for _ in range(runs):
+        args = prepare()
+        gc.collect()
+        start = time.perf_counter()
+        stage(*args)
+        best = min(best, time.perf_counter() - start)
+
+    # tracemalloc slows allocation down, so measure memory separately
+    args = prepare()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"time": best, "peak_memory": peak}
+
+
+def benchmark_kernel(filename, targets, runs):
+    device_mgr = DeviceManager(DeviceDB(
+        os.path.join(os.path.dirname(filename), "device_db.py")))
+    benchmark_cls = load_benchmark(filename)
+    managers = (device_mgr, None, ProcessArgumentManager({}), {})
+
+    def embed():
+        experiment = benchmark_cls(managers)
+        stitcher = Stitcher(core=experiment.core, dmgr=device_mgr)
+        stitcher.stitch_call(experiment.run, (), {})
+        stitcher.finalize()
+        return stitcher
+
+    # embedding and ARTIQ transforms do not depend on the target;
+    # the transforms modify the typed tree, so each run needs a fresh one
+    ref_period = device_mgr.get("core").ref_period
+    module = Module(embed(), ref_period=ref_period)
+    common = OrderedDict([
+        ("embedding", measure(embed, runs)),
+        ("transforms", measure(
+            lambda stitcher: Module(stitcher, ref_period=ref_period), runs,
+            setup=embed)),
+    ])
+
+    results = OrderedDict()
+    for name in targets:
+        target = TARGETS[name]()
+        llvm_ir = target.compile(module)
+        elf_obj = target.assemble(llvm_ir)
+        stages = OrderedDict(common)
+        stages["llvm_optimization"] = measure(
+            lambda: target.compile(module), runs)
+        stages["code_emission"] = measure(
+            lambda: target.assemble(llvm_ir), runs)
+        stages["linking"] = measure(
+            lambda: target.link([elf_obj]), runs)
+        results[name] = stages
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of human-readable regressions of ``results`` with
+    respect to ``baseline``."""
+    regressions = []
+    for kernel, targets in results.items():
+        for target, stages in targets.items():
+            try:
+                base_stages = baseline[kernel][target]
+            except KeyError:
+                continue
+            for stage, metrics in stages.items():
+                if stage not in base_stages:
+                    continue
+                for metric, value in metrics.items():
+                    base_value = base_stages[stage].get(metric)
+                    if not base_value:
+                        continue
+                    ratio = value/base_value
+                    if ratio > 1 + tolerance:
+                        regressions.append(
+                            "{}/{} {} {}: {:.4g} -> {:.4g} ({:+.0%})".format(
+                                kernel, target, stage, metric,
+                                base_value, value, ratio - 1))
+    return regressions
+
+
+def main():
+    args = get_argparser().parse_args()
+    targets = args.target or list(TARGETS.keys())
+
+    results = OrderedDict()
+    for filename in corpus_files(args.kernels):
+        kernel = os.path.splitext(os.path.basename(filename))[0]
+        print("Compiling {}...".format(kernel), file=sys.stderr)
+        results[kernel] = benchmark_kernel(filename, targets, args.runs)
+
+    report = OrderedDict([
+        ("python", platform.python_version()),
+        ("machine", platform.machine()),
+        ("results", results),
+    ])
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
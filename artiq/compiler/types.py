@@ -43,6 +43,8 @@ def _map_find(elts):
 
 
 class Type(object):
+    __slots__ = ()
+
     def __str__(self):
         return TypePrinter().name(self)
 
@@ -54,6 +56,8 @@ class TVar(Type):
     folded into this class.
     """
 
+    __slots__ = ("parent", "rank")
+
     def __init__(self):
         self.parent = self
         self.rank = 0
@@ -555,6 +559,8 @@ class TValue(Type):
     a generic integer type.
     """
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -8,12 +8,14 @@ time results in a collision error.
 # Designed from the data sheets and somewhat after the linux kernel
 # iio driver.
 
+import numpy as np
 from numpy import int32
 
 from artiq.language.core import (kernel, portable, delay_mu, delay, now_mu,
-                                 at_mu)
+                                 at_mu, host_vectorized)
 from artiq.language.units import ns, us
 from artiq.coredevice import spi2 as spi
+from artiq.coredevice.vectorized import round_to_int, raise_first_error
 
 SPI_AD53XX_CONFIG = (0*spi.SPI_OFFLINE | 1*spi.SPI_END |
                      0*spi.SPI_INPUT | 0*spi.SPI_CS_POLARITY |
@@ -80,7 +82,18 @@ def ad53xx_cmd_read_ch(channel, op):
     return AD53XX_CMD_SPECIAL | AD53XX_SPECIAL_READ | (op + (channel << 7))
 
 
+def _voltage_to_mu(voltage, offset_dacs=0x2000, vref=5.):
+    code, valid = round_to_int(
+        (1 << 16) * (np.asarray(voltage) / (4. * np.asarray(vref)))
+        + np.asarray(offset_dacs) * 0x4)
+    valid &= (code >= 0x0) & (code <= 0xffff)
+    if not valid.all():
+        raise_first_error(valid, voltage_to_mu, voltage, offset_dacs, vref)
+    return code
+
+
 # maintain function definition for backward compatibility
+@host_vectorized(_voltage_to_mu)
 @portable
 def voltage_to_mu(voltage, offset_dacs=0x2000, vref=5.):
     """Returns the 16-bit DAC register value required to produce a given output
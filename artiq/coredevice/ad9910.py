@@ -1,9 +1,12 @@
+import numpy as np
 from numpy import int32, int64
 
 from artiq.coredevice import spi2 as spi
 from artiq.coredevice import urukul
 from artiq.coredevice.urukul import DEFAULT_PROFILE, RegIOUpdate
-from artiq.language.core import at_mu, delay, delay_mu, kernel, now_mu, portable
+from artiq.coredevice.vectorized import round_to_int, raise_first_error
+from artiq.language.core import (at_mu, delay, delay_mu, host_vectorized,
+                                 kernel, now_mu, portable)
 from artiq.language.types import TBool, TFloat, TInt32, TInt64, TList, TTuple
 from artiq.language.units import ms, us
 
@@ -721,6 +724,14 @@ class AD9910:
         """
         return self.read16(_AD9910_REG_POW)
 
+    def _frequency_to_ftw(self, frequency):
+        ftw, valid = round_to_int(self.ftw_per_hz * np.asarray(frequency),
+                                  np.int32)
+        if not valid.all():
+            raise_first_error(valid, self.frequency_to_ftw, frequency)
+        return ftw
+
+    @host_vectorized(_frequency_to_ftw)
     @portable(flags={"fast-math"})
     def frequency_to_ftw(self, frequency: TFloat) -> TInt32:
         """Return the 32-bit frequency tuning word corresponding to the given
@@ -735,6 +746,13 @@ class AD9910:
         """
         return ftw / self.ftw_per_hz
 
+    def _turns_to_pow(self, turns):
+        pow_, valid = round_to_int(np.asarray(turns) * 0x10000, np.int32)
+        if not valid.all():
+            raise_first_error(valid, self.turns_to_pow, turns)
+        return pow_ & np.int32(0xffff)
+
+    @host_vectorized(_turns_to_pow)
     @portable(flags={"fast-math"})
     def turns_to_pow(self, turns: TFloat) -> TInt32:
         """Return the 16-bit phase offset word corresponding to the given phase
@@ -747,6 +765,14 @@ class AD9910:
         word."""
         return pow_ / 0x10000
 
+    def _amplitude_to_asf(self, amplitude):
+        asf, valid = round_to_int(np.asarray(amplitude) * 0x3fff, np.int32)
+        valid &= (asf >= 0) & (asf <= 0x3fff)
+        if not valid.all():
+            raise_first_error(valid, self.amplitude_to_asf, amplitude)
+        return asf
+
+    @host_vectorized(_amplitude_to_asf)
     @portable(flags={"fast-math"})
     def amplitude_to_asf(self, amplitude: TFloat) -> TInt32:
         """Return 14-bit amplitude scale factor corresponding to given
@@ -762,6 +788,23 @@ class AD9910:
         amplitude scale factor."""
         return asf / float(0x3fff)
 
+    def _to_ram(self, scalar, convert, values, ram):
+        # Converts all values at once, or lets the portable function raise
+        # the exact same exception (after the same partial writes to ram).
+        n = len(ram)
+        if any(len(v) < n for v in values):
+            return scalar(self, *values, ram)
+        try:
+            ram[:] = convert(*(np.asarray(v)[:n] for v in values))
+        except (ValueError, OverflowError):
+            scalar(self, *values, ram)
+            raise
+
+    def _frequency_to_ram(self, frequency, ram):
+        self._to_ram(AD9910.frequency_to_ram.__wrapped__,
+                     self._frequency_to_ftw, (frequency, ), ram)
+
+    @host_vectorized(_frequency_to_ram)
     @portable(flags={"fast-math"})
     def frequency_to_ram(self, frequency: TList(TFloat), ram: TList(TInt32)):
         """Convert frequency values to RAM profile data.
@@ -775,6 +818,12 @@ class AD9910:
         for i in range(len(ram)):
             ram[i] = self.frequency_to_ftw(frequency[i])
 
+    def _turns_to_ram(self, turns, ram):
+        self._to_ram(AD9910.turns_to_ram.__wrapped__,
+                     lambda turns: self._turns_to_pow(turns) << 16,
+                     (turns, ), ram)
+
+    @host_vectorized(_turns_to_ram)
     @portable(flags={"fast-math"})
     def turns_to_ram(self, turns: TList(TFloat), ram: TList(TInt32)):
         """Convert phase values to RAM profile data.
@@ -788,6 +837,12 @@ class AD9910:
         for i in range(len(ram)):
             ram[i] = self.turns_to_pow(turns[i]) << 16
 
+    def _amplitude_to_ram(self, amplitude, ram):
+        self._to_ram(AD9910.amplitude_to_ram.__wrapped__,
+                     lambda amplitude: self._amplitude_to_asf(amplitude) << 18,
+                     (amplitude, ), ram)
+
+    @host_vectorized(_amplitude_to_ram)
     @portable(flags={"fast-math"})
     def amplitude_to_ram(self, amplitude: TList(TFloat), ram: TList(TInt32)):
         """Convert amplitude values to RAM profile data.
@@ -801,6 +856,14 @@ class AD9910:
         for i in range(len(ram)):
             ram[i] = self.amplitude_to_asf(amplitude[i]) << 18
 
+    def _turns_amplitude_to_ram(self, turns, amplitude, ram):
+        self._to_ram(AD9910.turns_amplitude_to_ram.__wrapped__,
+                     lambda turns, amplitude: (
+                         (self._turns_to_pow(turns) << 16) |
+                         self._amplitude_to_asf(amplitude) << 2),
+                     (turns, amplitude), ram)
+
+    @host_vectorized(_turns_amplitude_to_ram)
     @portable(flags={"fast-math"})
     def turns_amplitude_to_ram(self, turns: TList(TFloat),
                                amplitude: TList(TFloat), ram: TList(TInt32)):
@@ -1,12 +1,14 @@
+import numpy as np
 from numpy import int32, int64
 
 from artiq.language.types import TInt32, TInt64, TFloat, TTuple, TBool
-from artiq.language.core import kernel, delay, portable
+from artiq.language.core import kernel, delay, portable, host_vectorized
 from artiq.language.units import ms, us, ns
 from artiq.coredevice.ad9912_reg import *
 
 from artiq.coredevice import spi2 as spi
 from artiq.coredevice import urukul
+from artiq.coredevice.vectorized import round_to_int, raise_first_error
 
 
 class AD9912:
@@ -216,6 +218,14 @@ class AD9912:
         pow_ = (high >> 16) & 0x3fff
         return ftw, pow_
 
+    def _frequency_to_ftw(self, frequency):
+        ftw, valid = round_to_int(self.ftw_per_hz * np.asarray(frequency),
+                                  np.int64)
+        if not valid.all():
+            raise_first_error(valid, self.frequency_to_ftw, frequency)
+        return ftw & ((np.int64(1) << 48) - 1)
+
+    @host_vectorized(_frequency_to_ftw)
     @portable(flags={"fast-math"})
     def frequency_to_ftw(self, frequency: TFloat) -> TInt64:
         """Returns the 48-bit frequency tuning word corresponding to the given
@@ -231,6 +241,13 @@ class AD9912:
         """
         return ftw / self.ftw_per_hz
 
+    def _turns_to_pow(self, phase):
+        pow_, valid = round_to_int((1 << 14) * np.asarray(phase), np.int32)
+        if not valid.all():
+            raise_first_error(valid, self.turns_to_pow, phase)
+        return pow_ & 0xffff
+
+    @host_vectorized(_turns_to_pow)
     @portable(flags={"fast-math"})
     def turns_to_pow(self, phase: TFloat) -> TInt32:
         """Returns the 16-bit phase offset word corresponding to the given
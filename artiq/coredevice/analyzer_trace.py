@@ -0,0 +1,406 @@
+"""Compressed columnar storage of RTIO analyzer traces.
+
+A trace file holds the messages of an analyzer dump, grouped by RTIO
+channel into chunks of at most ``chunk_size`` messages. Each chunk stores
+its fields as separate columns (with delta-coded times) and is compressed
+with zlib. The file ends with an index giving, for each chunk, its channel,
+the range of message times it covers and its location, so that readers
+only decompress the chunks of the channels and time window they need.
+
+Layout (all integers little-endian)::
+
+    magic, header (:data:`_header`), chunks..., index, footer (:data:`_footer`)
+
+Messages are the same as in raw dumps, and traces convert back to the
+exact raw dump they were created from.
+"""
+
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from artiq.coredevice.comm_analyzer import (
+    MessageType, ExceptionType, OutputMessage, InputMessage, ExceptionMessage,
+    StoppedMessage, DecodedDump, create_channel_handlers,
+    ChannelSignatureManager, decoded_dump_to_vcd,
+    decoded_dump_to_waveform_data)
+
+
+__all__ = ["TRACE_MAGIC", "is_trace", "TraceWriter", "Trace",
+           "dump_to_trace", "trace_to_vcd", "get_rtio_channels",
+           "trace_to_waveform_data"]
+
+
+TRACE_MAGIC = b"ARTIQ analyzer trace\n"
+_VERSION = 1
+
+# version, endian byte of the dump, total_byte_count, error_occurred,
+# log_channel, dds_onehot_sel
+_header = struct.Struct("<IcQbbb")
+# offset of the index, number of index entries, start time
+_footer = struct.Struct("<QQQ")
+
+# pseudo-channel under which stopped messages are stored
+_STOPPED = -1
+
+# messages as sent by the core device
+_raw_dtype = np.dtype([
+    ("data", ">u8"), ("address", ">u4"), ("rtio_counter", ">u8"),
+    ("timestamp", ">u8"), ("type_channel", ">u4")])
+assert _raw_dtype.itemsize == 32
+
+# order and types of the columns of a chunk
+_columns = [
+    ("seq", "<u4"), ("type_channel", "<u4"), ("timestamp", "<u8"),
+    ("rtio_counter", "<u8"), ("address", "<u4"), ("data", "<u8")]
+_delta_columns = {"timestamp", "rtio_counter"}
+
+_record_dtype = np.dtype(_columns + [("channel", "<i8"), ("time", "<u8")])
+
+_index_dtype = np.dtype([
+    ("channel", "<i8"), ("start", "<u8"), ("end", "<u8"),
+    ("count", "<u8"), ("offset", "<u8"), ("size", "<u8")])
+
+
+def _channels_and_times(type_channel, timestamp, rtio_counter):
+    message_type = type_channel & 0b11
+    channel = (type_channel >> 2).astype(np.int64)
+    channel[message_type == MessageType.stopped.value] = _STOPPED
+    # same as comm_analyzer.get_message_time
+    timed = ((message_type == MessageType.output.value)
+             | (message_type == MessageType.input.value))
+    time = np.where(timed, timestamp, rtio_counter)
+    return channel, time
+
+
+def is_trace(data):
+    """Returns True if ``data``, the beginning of a file, is a trace
+    (and not a raw dump)."""
+    return bytes(data[:len(TRACE_MAGIC)]) == TRACE_MAGIC
+
+
+class TraceWriter:
+    """Writes a trace to a binary file object, as the messages arrive.
+
+    Messages of each channel are buffered until a full chunk can be
+    written, so that memory use does not depend on the length of the
+    trace. The trace is only complete after :meth:`close`, which writes the
+    index. The file object is not closed.
+    """
+    def __init__(self, fileobj, endian=">", total_byte_count=0,
+                 error_occurred=False, log_channel=0, dds_onehot_sel=False,
+                 chunk_size=1 << 16, compression_level=6):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.compression_level = compression_level
+        self.pending = dict()
+        self.message_count = 0
+        self.start_time = None
+        self.index = []
+        self.fileobj.write(TRACE_MAGIC)
+        self.fileobj.write(_header.pack(
+            _VERSION, b"E" if endian == ">" else b"e", total_byte_count,
+            error_occurred, log_channel, dds_onehot_sel))
+        self.offset = len(TRACE_MAGIC) + _header.size
+
+    def append(self, data):
+        """Appends messages in the raw format sent by the core device
+        (a multiple of 32 bytes)."""
+        if len(data) % _raw_dtype.itemsize:
+            raise ValueError("incomplete analyzer message")
+        raw = np.frombuffer(data, dtype=_raw_dtype)
+        if not len(raw):
+            return
+        records = np.empty(len(raw), dtype=_record_dtype)
+        records["seq"] = np.arange(self.message_count,
+                                   self.message_count + len(raw))
+        for name, _ in _columns[1:]:
+            records[name] = raw[name]
+        records["channel"], records["time"] = _channels_and_times(
+            records["type_channel"], records["timestamp"],
+            records["rtio_counter"])
+        self.message_count += len(raw)
+
+        nonzero = records["time"][records["time"] != 0]
+        if self.start_time is None and len(nonzero):
+            self.start_time = int(nonzero.min())
+        elif len(nonzero):
+            self.start_time = min(self.start_time, int(nonzero.min()))
+
+        records = records[np.argsort(records["channel"], kind="stable")]
+        channels, first = np.unique(records["channel"], return_index=True)
+        for channel, records in zip(channels.tolist(),
+                                    np.split(records, first[1:])):
+            pending = self.pending.get(channel)
+            if pending is not None:
+                records = np.concatenate([pending, records])
+            while len(records) >= self.chunk_size:
+                self._write_chunk(channel, records[:self.chunk_size])
+                records = records[self.chunk_size:]
+            self.pending[channel] = records
+
+    def _write_chunk(self, channel, records):
+        if not len(records):
+            return
+        records = records[np.argsort(records["time"], kind="stable")]
+        columns = []
+        for name, dtype in _columns:
+            column = records[name].astype(dtype)
+            if name in _delta_columns:
+                column[1:] = np.diff(column)
+            columns.append(column.tobytes())
+        data = zlib.compress(b"".join(columns), self.compression_level)
+        self.fileobj.write(data)
+        self.index.append((channel, records["time"][0], records["time"][-1],
+                           len(records), self.offset, len(data)))
+        self.offset += len(data)
+
+    def close(self):
+        """Writes the remaining chunks and the index."""
+        for channel, records in sorted(self.pending.items()):
+            self._write_chunk(channel, records)
+        self.pending.clear()
+        index = np.array(self.index, dtype=_index_dtype)
+        self.fileobj.write(index.tobytes())
+        self.fileobj.write(_footer.pack(
+            self.offset, len(index),
+            0 if self.start_time is None else self.start_time))
+
+
+def dump_to_trace(dump, fileobj, **kwargs):
+    """Converts a raw analyzer dump to a trace written to ``fileobj``.
+    Keyword arguments are passed to :class:`TraceWriter`."""
+    if dump[0] == ord("E"):
+        endian = ">"
+    elif dump[0] == ord("e"):
+        endian = "<"
+    else:
+        raise ValueError("not an analyzer dump")
+    (sent_bytes, total_byte_count, error_occurred,
+     log_channel, dds_onehot_sel) = struct.unpack(endian + "IQbbb", dump[1:16])
+    if sent_bytes + 16 != len(dump):
+        raise ValueError("analyzer dump has incorrect length "
+                         "(got {}, expected {})".format(
+                            len(dump) - 1, sent_bytes + 15))
+    writer = TraceWriter(fileobj, endian, total_byte_count, error_occurred,
+                         log_channel, dds_onehot_sel, **kwargs)
+    writer.append(memoryview(dump)[16:])
+    writer.close()
+
+
+class Trace:
+    """Reads a trace from a file name (the file is memory-mapped) or from
+    a bytes-like object.
+
+    Only the chunks needed by each read are decompressed.
+    """
+    def __init__(self, source):
+        self._file = None
+        self._mmap = None
+        self.index = None
+        if isinstance(source, (str, os.PathLike)):
+            self._file = open(source, "rb")
+            try:
+                self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            except:
+                self._file.close()
+                raise
+            self.buffer = memoryview(self._mmap)
+        else:
+            self.buffer = memoryview(source).cast("B")
+
+        if not is_trace(self.buffer):
+            self.close()
+            raise ValueError("not an analyzer trace")
+        if len(self.buffer) < len(TRACE_MAGIC) + _header.size + _footer.size:
+            self.close()
+            raise ValueError("analyzer trace is truncated")
+        (version, endian, self.total_byte_count, self.error_occurred,
+         self.log_channel, self.dds_onehot_sel) = _header.unpack_from(
+            self.buffer, len(TRACE_MAGIC))
+        if version != _VERSION:
+            self.close()
+            raise ValueError("unsupported analyzer trace version {}"
+                             .format(version))
+        self.endian = ">" if endian == b"E" else "<"
+
+        index_offset, index_count, self.start_time = _footer.unpack_from(
+            self.buffer, len(self.buffer) - _footer.size)
+        if (index_offset + index_count*_index_dtype.itemsize
+                != len(self.buffer) - _footer.size):
+            self.close()
+            raise ValueError("analyzer trace is truncated")
+        self.index = np.frombuffer(self.buffer, dtype=_index_dtype,
+                                   count=index_count, offset=index_offset)
+        self.message_count = int(self.index["count"].sum())
+        self.channels = sorted(set(self.index["channel"].tolist())
+                               - {_STOPPED})
+
+    def close(self):
+        self.index = None
+        if self.buffer is not None:
+            self.buffer.release()
+            self.buffer = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def time_range(self):
+        """Range ``(first, last)`` of the message times, in machine units,
+        or None if the trace is empty."""
+        if not len(self.index):
+            return None
+        return int(self.index["start"].min()), int(self.index["end"].max())
+
+    def _read_chunk(self, entry):
+        count = int(entry["count"])
+        offset = int(entry["offset"])
+        data = zlib.decompress(self.buffer[offset:offset + int(entry["size"])])
+        records = np.empty(count, dtype=_record_dtype)
+        position = 0
+        for name, dtype in _columns:
+            column = np.frombuffer(data, dtype=dtype, count=count,
+                                   offset=position)
+            if name in _delta_columns:
+                column = np.cumsum(column, dtype=dtype)
+            records[name] = column
+            position += count*column.itemsize
+        records["channel"] = int(entry["channel"])
+        records["time"] = _channels_and_times(
+            records["type_channel"], records["timestamp"],
+            records["rtio_counter"])[1]
+        return records
+
+    def read(self, channels=None, start=None, end=None):
+        """Returns the records of the messages of the given RTIO channels
+        (by default, all) whose time is at least ``start`` and less than
+        ``end``, in the order of the dump, as a numpy structured array.
+        Stopped messages are always included, whatever their time.
+
+        Times are in machine units, as in the messages."""
+        selected = np.ones(len(self.index), dtype=bool)
+        if channels is not None:
+            selected &= np.isin(self.index["channel"], list(channels))
+        if start is not None:
+            selected &= self.index["end"] >= start
+        if end is not None:
+            selected &= self.index["start"] < end
+        selected |= self.index["channel"] == _STOPPED
+        chunks = [self._read_chunk(entry) for entry in self.index[selected]]
+        if not chunks:
+            return np.empty(0, dtype=_record_dtype)
+        records = np.concatenate(chunks)
+        if start is not None or end is not None:
+            in_window = records["channel"] == _STOPPED
+            if start is None:
+                in_window |= records["time"] < end
+            elif end is None:
+                in_window |= records["time"] >= start
+            else:
+                in_window |= ((records["time"] >= start)
+                              & (records["time"] < end))
+            records = records[in_window]
+        return records[np.argsort(records["seq"], kind="stable")]
+
+    def messages(self, channels=None, start=None, end=None):
+        """Like :meth:`read`, but returns a list of messages as returned by
+        :func:`~artiq.coredevice.comm_analyzer.decode_message`."""
+        records = self.read(channels, start, end)
+        message_type = (records["type_channel"] & 0b11).tolist()
+        channel = (records["type_channel"] >> 2).tolist()
+        timestamp = records["timestamp"].tolist()
+        rtio_counter = records["rtio_counter"].tolist()
+        address = records["address"].tolist()
+        data = records["data"].tolist()
+        messages = []
+        for i, ty in enumerate(message_type):
+            if ty == MessageType.output.value:
+                messages.append(OutputMessage(channel[i], timestamp[i],
+                                              rtio_counter[i], address[i],
+                                              data[i]))
+            elif ty == MessageType.input.value:
+                messages.append(InputMessage(channel[i], timestamp[i],
+                                             rtio_counter[i], data[i]))
+            elif ty == MessageType.exception.value:
+                messages.append(ExceptionMessage(
+                    channel[i], rtio_counter[i],
+                    ExceptionType(address[i] & 0xff)))
+            else:
+                messages.append(StoppedMessage(rtio_counter[i]))
+        return messages
+
+    def decoded_dump(self, channels=None, start=None, end=None):
+        """Like :meth:`messages`, but returns a
+        :class:`~artiq.coredevice.comm_analyzer.DecodedDump`."""
+        return DecodedDump(self.log_channel, bool(self.dds_onehot_sel),
+                           self.messages(channels, start, end))
+
+    def to_dump(self):
+        """Returns the raw dump the trace was created from."""
+        records = self.read()
+        raw = np.empty(len(records), dtype=_raw_dtype)
+        for name in _raw_dtype.names:
+            raw[name] = records[name]
+        header = b"E" if self.endian == ">" else b"e"
+        header += struct.pack(self.endian + "IQbbb", raw.nbytes,
+                              self.total_byte_count, self.error_occurred,
+                              self.log_channel, self.dds_onehot_sel)
+        return header + raw.tobytes()
+
+
+def trace_to_vcd(fileobj, devices, trace, uniform_interval=False):
+    decoded_dump_to_vcd(fileobj, devices, trace.decoded_dump(),
+                        uniform_interval)
+
+
+def get_rtio_channels(devices):
+    """Returns a dictionary mapping the names of the waveforms of
+    :func:`~artiq.coredevice.comm_analyzer.get_channel_list` to the RTIO
+    channels their values are decoded from."""
+    rtio_channels = dict()
+    for name, desc in devices.items():
+        manager = ChannelSignatureManager()
+        channel_handlers = create_channel_handlers(
+            manager, {name: desc}, 1e-9, 3e9, False)
+        for channel in channel_handlers:
+            for waveform in manager.channels:
+                rtio_channels[waveform] = channel
+    return rtio_channels
+
+
+def trace_to_waveform_data(devices, trace, names=None, rtio_channels=None):
+    """Like :func:`~artiq.coredevice.comm_analyzer.decoded_dump_to_waveform_data`,
+    but only decodes the messages needed by the waveforms with the given
+    names (by default, all), whose data is the only one returned.
+
+    ``rtio_channels`` is the result of :func:`get_rtio_channels`, which is
+    computed if not given."""
+    channels = None
+    if names is not None and "rtio_slack" not in names:
+        if rtio_channels is None:
+            rtio_channels = get_rtio_channels(devices)
+        # log messages are always needed to list the log waveforms
+        channels = {trace.log_channel}
+        channels.update(rtio_channels[name] for name in names
+                        if name in rtio_channels)
+    waveform_data = decoded_dump_to_waveform_data(
+        devices, trace.decoded_dump(channels), start_time=trace.start_time)
+    if names is not None:
+        waveform_data["data"] = {name: data
+                                 for name, data in waveform_data["data"].items()
+                                 if name in names}
+    return waveform_data
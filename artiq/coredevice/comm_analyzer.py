@@ -709,13 +709,18 @@ def decoded_dump_to_vcd(fileobj, devices, dump, uniform_interval=False):
     decoded_dump_to_target(vcd_manager, devices, dump, uniform_interval)
 
 
-def decoded_dump_to_waveform_data(devices, dump, uniform_interval=False):
+def decoded_dump_to_waveform_data(devices, dump, uniform_interval=False,
+                                  start_time=None):
     manager = WaveformManager()
-    decoded_dump_to_target(manager, devices, dump, uniform_interval)
+    decoded_dump_to_target(manager, devices, dump, uniform_interval,
+                           start_time)
     return manager.trace
 
 
-def decoded_dump_to_target(manager, devices, dump, uniform_interval):
+def decoded_dump_to_target(manager, devices, dump, uniform_interval,
+                           start_time=None):
+    # start_time defaults to the time of the first timed message of the
+    # dump, and is given when the dump only holds some of the channels
     ref_period = get_ref_period(devices)
 
     if ref_period is None:
@@ -747,11 +752,12 @@ def decoded_dump_to_target(manager, devices, dump, uniform_interval):
     stopped_messages = []
 
     manager.set_time(0)
-    start_time = 0
-    for m in messages:
-        start_time = get_message_time(m)
-        if start_time:
-            break
+    if start_time is None:
+        start_time = 0
+        for m in messages:
+            start_time = get_message_time(m)
+            if start_time:
+                break
     if not uniform_interval:
         manager.set_start_time(start_time)
     t0 = start_time
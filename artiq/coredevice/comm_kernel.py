@@ -3,6 +3,7 @@ import logging
 import traceback
 import numpy
 import socket
+import select
 import builtins
 from enum import Enum
 from fractions import Fraction
@@ -172,6 +173,9 @@ class CommKernelDummy:
     def check_system_info(self):
         pass
 
+    def close_if_disconnected(self):
+        return False
+
 
 def incompatible_versions(v1, v2):
     if v1.endswith(".beta") or v2.endswith(".beta"):
@@ -223,6 +227,20 @@ class CommKernel:
         del self.socket
         logger.debug("disconnected")
 
+    def close_if_disconnected(self):
+        """Closes the connection if the core device has closed it, or has
+        sent unsolicited data. The connection is opened again on next use.
+        Returns whether the connection was closed."""
+        if not hasattr(self, "socket"):
+            return False
+        readable, _, _ = select.select([self.socket], [], [], 0)
+        if readable:
+            logger.debug("core device connection lost, closing")
+            self.close()
+            self.read_buffer.clear()
+            return True
+        return False
+
     #
     # Reader interface
     #
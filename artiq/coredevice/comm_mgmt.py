@@ -1,10 +1,12 @@
 from enum import Enum
+from collections import OrderedDict
+import asyncio
 import binascii
 import logging
-import io
+import os
 import struct
 
-from sipyco.keepalive import create_connection
+from sipyco.keepalive import create_connection, async_open_connection
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +40,63 @@ class Reply(Enum):
     RebootImminent = 3
 
 
+def flash_image(bin_paths, endian, chunk_size=1 << 16):
+    """Returns the length of the image that flashes the given binaries, and
+    an iterator over its contents, in chunks.
+
+    The image is made of the binaries (each preceded by its length if there
+    are several) and the CRC32 of everything before it. The files are read
+    only as the chunks are consumed."""
+    bin_paths = list(bin_paths)
+    sizes = [os.path.getsize(filename) for filename in bin_paths]
+    prefix_lengths = len(bin_paths) > 1
+    length = sum(sizes) + 4*(prefix_lengths*len(bin_paths) + 1)
+
+    def chunks():
+        crc = 0
+        for filename, size in zip(bin_paths, sizes):
+            if prefix_lengths:
+                header = struct.pack(endian + "I", size)
+                crc = binascii.crc32(header, crc)
+                yield header
+            read = 0
+            with open(filename, "rb") as fi:
+                while True:
+                    chunk = fi.read(chunk_size)
+                    if not chunk:
+                        break
+                    read += len(chunk)
+                    crc = binascii.crc32(chunk, crc)
+                    yield chunk
+            if read != size:
+                raise IOError("{} changed while it was being flashed"
+                              .format(filename))
+        yield struct.pack(endian + "I", crc)
+    return length, chunks()
+
+
+def _endian_from_reply(endian):
+    if endian == b"e":
+        return "<"
+    elif endian == b"E":
+        return ">"
+    else:
+        raise IOError("Incorrect reply from device: expected e/E.")
+
+
+def _check_reply(ty, expected, error_message=None):
+    if ty == Reply.Error and error_message is not None:
+        raise IOError(error_message)
+    elif ty != expected:
+        raise IOError("Incorrect reply from device: {} (expected {})".
+                      format(ty, expected))
+
+
+_config_read_error = "Device failed to read config. The key may not exist."
+_config_write_error = ("Device failed to write config. More information may "
+                       "be available in the log.")
+
+
 class CommMgmt:
     def __init__(self, host, port=1380, drtio_dest=0):
         self.host = host
@@ -50,13 +109,7 @@ class CommMgmt:
         self.socket = create_connection(self.host, self.port)
         self.socket.sendall(b"ARTIQ management\n")
         self._write_int8(self.drtio_dest)
-        endian = self._read(1)
-        if endian == b"e":
-            self.endian = "<"
-        elif endian == b"E":
-            self.endian = ">"
-        else:
-            raise IOError("Incorrect reply from device: expected e/E.")
+        self.endian = _endian_from_reply(self._read(1))
 
     def close(self):
         if not hasattr(self, "socket"):
@@ -90,13 +143,13 @@ class CommMgmt:
         self._write_bytes(value.encode("utf-8"))
 
     def _read(self, length):
-        r = bytes()
+        r = bytearray()
         while len(r) < length:
             rn = self.socket.recv(min(8192, length - len(r)))
             if not rn:
                 raise ConnectionResetError("Connection closed")
             r += rn
-        return r
+        return bytes(r)
 
     def _read_header(self):
         ty = Reply(*struct.unpack("B", self._read(1)))
@@ -105,10 +158,7 @@ class CommMgmt:
         return ty
 
     def _read_expect(self, ty):
-        header = self._read_header()
-        if header != ty:
-            raise IOError("Incorrect reply from device: {} (expected {})".
-                          format(header, ty))
+        _check_reply(self._read_header(), ty)
 
     def _read_int32(self):
         (value, ) = struct.unpack(self.endian + "l", self._read(4))
@@ -139,24 +189,15 @@ class CommMgmt:
     def config_read(self, key):
         self._write_header(Request.ConfigRead)
         self._write_string(key)
-        ty = self._read_header()
-        if ty == Reply.Error:
-            raise IOError("Device failed to read config. The key may not exist.")
-        elif ty != Reply.ConfigData:
-            raise IOError("Incorrect reply from device: {} (expected {})".
-                          format(ty, Reply.ConfigData))
+        _check_reply(self._read_header(), Reply.ConfigData,
+                     _config_read_error)
         return self._read_bytes()
 
     def config_write(self, key, value):
         self._write_header(Request.ConfigWrite)
         self._write_string(key)
         self._write_bytes(value)
-        ty = self._read_header()
-        if ty == Reply.Error:
-            raise IOError("Device failed to write config. More information may be available in the log.")
-        elif ty != Reply.Success:
-            raise IOError("Incorrect reply from device: {} (expected {})".
-                          format(ty, Reply.Success))
+        _check_reply(self._read_header(), Reply.Success, _config_write_error)
 
     def config_remove(self, key):
         self._write_header(Request.ConfigRemove)
@@ -177,18 +218,189 @@ class CommMgmt:
     def flash(self, bin_paths):
         self._write_header(Request.Flash)
 
-        with io.BytesIO() as image_buf:
-            for filename in bin_paths:
-                with open(filename, "rb") as fi:
-                    bin_ = fi.read()
-                    if (len(bin_paths) > 1):
-                        image_buf.write(
-                            struct.pack(self.endian + "I", len(bin_)))
-                    image_buf.write(bin_)
+        length, chunks = flash_image(bin_paths, self.endian)
+        self._write_int32(length)
+        for chunk in chunks:
+            self._write(chunk)
 
-            crc = binascii.crc32(image_buf.getvalue())
-            image_buf.write(struct.pack(self.endian + "I", crc))
+        self._read_expect(Reply.RebootImminent)
 
-            self._write_bytes(image_buf.getvalue())
 
-        self._read_expect(Reply.RebootImminent)
+class AsyncCommMgmt:
+    """Management connection to a core device or DRTIO satellite, using
+    asyncio. It supports the same operations as :class:`CommMgmt`, as
+    coroutines."""
+    def __init__(self, host, port=1380, drtio_dest=0):
+        self.host = host
+        self.port = port
+        self.drtio_dest = drtio_dest
+        self._writer = None
+
+    async def open(self):
+        if self._writer is not None:
+            return
+        reader, writer = await async_open_connection(self.host, self.port)
+        try:
+            writer.write(b"ARTIQ management\n")
+            writer.write(struct.pack("B", self.drtio_dest))
+            self._reader, self._writer = reader, writer
+            self.endian = _endian_from_reply(await self._read(1))
+        except:
+            writer.close()
+            self._writer = None
+            raise
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        logger.debug("disconnected")
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    # Protocol elements
+
+    async def _write_header(self, ty):
+        await self.open()
+
+        logger.debug("sending message: type=%r", ty)
+        self._writer.write(struct.pack("B", ty.value))
+
+    def _write_int32(self, value):
+        self._writer.write(struct.pack(self.endian + "l", value))
+
+    def _write_bytes(self, value):
+        self._write_int32(len(value))
+        self._writer.write(value)
+
+    def _write_string(self, value):
+        self._write_bytes(value.encode("utf-8"))
+
+    async def _read(self, length):
+        await self._writer.drain()
+        try:
+            return await self._reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise ConnectionResetError("Connection closed")
+
+    async def _read_header(self):
+        ty = Reply(*struct.unpack("B", await self._read(1)))
+        logger.debug("receiving message: type=%r", ty)
+
+        return ty
+
+    async def _read_expect(self, ty):
+        _check_reply(await self._read_header(), ty)
+
+    async def _read_int32(self):
+        (value, ) = struct.unpack(self.endian + "l", await self._read(4))
+        return value
+
+    async def _read_bytes(self):
+        return await self._read(await self._read_int32())
+
+    async def _read_string(self):
+        return (await self._read_bytes()).decode("utf-8")
+
+    # External API
+
+    async def get_log(self):
+        await self._write_header(Request.GetLog)
+        await self._read_expect(Reply.LogContent)
+        return await self._read_string()
+
+    async def clear_log(self):
+        await self._write_header(Request.ClearLog)
+        await self._read_expect(Reply.Success)
+
+    async def pull_log(self):
+        """Returns an asynchronous iterator over the log messages of the
+        device, as they are produced."""
+        await self._write_header(Request.PullLog)
+        while True:
+            yield await self._read_string()
+
+    async def config_read(self, key):
+        await self._write_header(Request.ConfigRead)
+        self._write_string(key)
+        _check_reply(await self._read_header(), Reply.ConfigData,
+                     _config_read_error)
+        return await self._read_bytes()
+
+    async def config_write(self, key, value):
+        await self._write_header(Request.ConfigWrite)
+        self._write_string(key)
+        self._write_bytes(value)
+        _check_reply(await self._read_header(), Reply.Success,
+                     _config_write_error)
+
+    async def config_remove(self, key):
+        await self._write_header(Request.ConfigRemove)
+        self._write_string(key)
+        await self._read_expect(Reply.Success)
+
+    async def config_erase(self):
+        await self._write_header(Request.ConfigErase)
+        await self._read_expect(Reply.Success)
+
+    async def reboot(self):
+        await self._write_header(Request.Reboot)
+        await self._read_expect(Reply.RebootImminent)
+
+    async def debug_allocator(self):
+        await self._write_header(Request.DebugAllocator)
+        await self._writer.drain()
+
+    async def flash(self, bin_paths):
+        await self._write_header(Request.Flash)
+
+        length, chunks = flash_image(bin_paths, self.endian)
+        self._write_int32(length)
+        for chunk in chunks:
+            self._writer.write(chunk)
+            await self._writer.drain()
+
+        await self._read_expect(Reply.RebootImminent)
+
+
+async def run_on_devices(targets, operation, port=1380, max_concurrency=16):
+    """Runs an operation on several core devices and DRTIO satellites
+    concurrently.
+
+    :param targets: list of ``(host, drtio_dest)`` pairs.
+    :param operation: coroutine function called with an open
+        :class:`AsyncCommMgmt` for each target.
+    :param max_concurrency: maximum number of hosts handled at the same
+        time. The destinations of one host are handled one after the other,
+        over separate connections.
+
+    Returns a list with, for each target in order, the result of the
+    operation or the exception it raised."""
+    by_host = OrderedDict()
+    for i, (host, drtio_dest) in enumerate(targets):
+        by_host.setdefault(host, []).append((i, drtio_dest))
+    results = [None]*len(targets)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_host(host, destinations):
+        async with semaphore:
+            for i, drtio_dest in destinations:
+                try:
+                    async with AsyncCommMgmt(host, port, drtio_dest) as mgmt:
+                        results[i] = await operation(mgmt)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.debug("operation on %s (destination %d) failed",
+                                 host, drtio_dest, exc_info=True)
+                    results[i] = e
+
+    await asyncio.gather(*(run_host(host, destinations)
+                           for host, destinations in by_host.items()))
+    return results
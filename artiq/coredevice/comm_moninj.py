@@ -3,6 +3,8 @@ import logging
 import struct
 from enum import Enum
 
+import numpy as np
+
 from sipyco.keepalive import async_open_connection
 
 __all__ = ["TTLProbe", "TTLOverride", "CommMonInj"]
@@ -11,6 +13,31 @@ __all__ = ["TTLProbe", "TTLOverride", "CommMonInj"]
 logger = logging.getLogger(__name__)
 
 
+# Version 1 is the protocol spoken by the core device, with one packet per
+# monitor event. Version 2 is only spoken by aqctl_moninj_proxy, and adds
+# frames carrying batches of monitor events.
+PROTOCOL_VERSION_BATCH = 2
+
+# Layout of a monitor event in a batch frame. This is also the layout of the
+# payload of a single monitor event packet.
+monitor_event_dtype = np.dtype([("channel", "<i4"),
+                                ("probe", "i1"),
+                                ("value", "<i8")])
+
+
+def encode_monitor_batch(events):
+    """Encodes a batch frame from a list of ``(channel, probe, value)``
+    tuples."""
+    array = np.array(events, dtype=monitor_event_dtype)
+    return struct.pack("<bL", 2, len(array)) + array.tobytes()
+
+
+def decode_monitor_batch(payload):
+    """Decodes the events of a batch frame (without its type and count) into
+    a list of ``(channel, probe, value)`` tuples."""
+    return np.frombuffer(payload, dtype=monitor_event_dtype).tolist()
+
+
 class TTLProbe(Enum):
     level = 0
     oe = 1
@@ -27,8 +54,9 @@ class CommMonInj:
         self.monitor_cb = monitor_cb
         self.injection_status_cb = injection_status_cb
         self.disconnect_cb = disconnect_cb
+        self.protocol_version = 1
 
-    async def connect(self, host, port=1383):
+    async def _open_connection(self, host, port):
         self._reader, self._writer = await async_open_connection(
             host,
             port,
@@ -37,8 +65,35 @@ class CommMonInj:
             max_fails=3,
         )
 
+    async def _negotiate_batch(self, timeout=5.0):
+        self._writer.write("ARTIQ moninj {}\n".format(
+            PROTOCOL_VERSION_BATCH).encode())
+        try:
+            line = await asyncio.wait_for(self._reader.readline(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        if not line.startswith(b"ARTIQ moninj "):
+            return False
+        self.protocol_version = int(line[len(b"ARTIQ moninj "):])
+        return True
+
+    async def connect(self, host, port=1383, batch=False):
+        """Connects to a core device or to a moninj proxy.
+
+        With ``batch``, the batched protocol is requested. This is only
+        supported by ``aqctl_moninj_proxy``; if the proxy is too old to
+        understand the request, the connection is reopened with the regular
+        protocol.
+        """
+        await self._open_connection(host, port)
+
         try:
-            self._writer.write(b"ARTIQ moninj\n")
+            if batch and not await self._negotiate_batch():
+                self._writer.close()
+                await self._open_connection(host, port)
+                batch = False
+            if not batch:
+                self._writer.write(b"ARTIQ moninj\n")
             self._receive_task = asyncio.create_task(self._receive_cr())
         except:
             self._writer.close()
@@ -92,6 +147,12 @@ class CommMonInj:
                     payload = await self._reader.readexactly(6)
                     channel, override, value = struct.unpack("<lbb", payload)
                     self.injection_status_cb(channel, override, value)
+                elif ty == b"\x02" and self.protocol_version >= PROTOCOL_VERSION_BATCH:
+                    count, = struct.unpack("<L", await self._reader.readexactly(4))
+                    payload = await self._reader.readexactly(
+                        count*monitor_event_dtype.itemsize)
+                    for channel, probe, value in decode_monitor_batch(payload):
+                        self.monitor_cb(channel, probe, value)
                 else:
                     raise ValueError("Unknown packet type", ty)
         except Exception:
@@ -127,6 +127,17 @@ class Core:
         """
         self.comm.close()
 
+    def notify_reuse(self):
+        """Called when the driver is kept open by a worker for a later
+        experiment (see :meth:`~artiq.master.worker_db.DeviceManager.close_devices`).
+        Drops the connection to the core device if it has been closed in the
+        meantime, e.g. because another client has connected or the core
+        device has rebooted. The system information of the core device is
+        then checked again on the next kernel run."""
+        if self.comm.close_if_disconnected():
+            self.first_run = True
+        self.analyzer_proxy = None
+
     def compile(self, function, args, kwargs, set_result=None,
                 attribute_writeback=True, print_as_rpc=True,
                 target=None, destination=0, subkernel_arg_types=[],
@@ -0,0 +1,302 @@
+"""Parsing and local storage of the core device log."""
+
+import logging
+import math
+import os
+import re
+import struct
+import time
+
+
+__all__ = ["TRACE", "parse_log", "LogStore"]
+
+
+# Level of the TRACE messages of the firmware, as defined by sipyco.logs.
+TRACE = 5
+
+_levels = {
+    "TRACE": TRACE,
+    "DEBUG": logging.DEBUG,
+    " INFO": logging.INFO,
+    " WARN": logging.WARNING,
+    "ERROR": logging.ERROR
+}
+
+_line_re = re.compile(
+    r"^\[\s*(.+?)\] (TRACE|DEBUG| INFO| WARN|ERROR)\((.+?)\): (.*)$",
+    re.MULTILINE)
+
+
+def _device_time(text):
+    # e.g. "2.000000s", the time since the core device started
+    try:
+        return float(text.rstrip("s"))
+    except ValueError:
+        return None
+
+
+def _append_continuation(records, text):
+    text = text.strip("\n")
+    if not text:
+        return
+    if records:
+        records[-1][3] += "\n" + text
+    else:
+        records.append([None, logging.INFO, "", text])
+
+
+def parse_log(text):
+    """Parses core device log text into a list of ``(device_time, level,
+    name, message)`` records, where ``device_time`` is the time in seconds
+    since the core device started, as written by the firmware, and ``name``
+    is the firmware module that emitted the message (e.g.
+    ``runtime::session``).
+
+    Lines that do not start a message are appended to the previous
+    message. If there is none, they form a message at the INFO level with
+    an empty name and no device time."""
+    records = []
+    position = 0
+    for match in _line_re.finditer(text):
+        if match.start() > position:
+            _append_continuation(records, text[position:match.start()])
+        device_time, level, name, message = match.groups()
+        records.append([_device_time(device_time), _levels[level], name,
+                        message])
+        position = match.end()
+    if position < len(text):
+        _append_continuation(records, text[position:])
+    return [tuple(record) for record in records]
+
+
+# receive time, device time (NaN if unknown), level, length of name,
+# length of message
+_record = struct.Struct("<ddbHI")
+# Index entry of each write to a segment: receive time, offset in the
+# segment, maximum level of the records written.
+_index_entry = struct.Struct("<dQb")
+
+_segment_suffix = ".corelog"
+_index_suffix = ".index"
+
+
+def _decode_records(data):
+    records = []
+    position = 0
+    while position + _record.size <= len(data):
+        timestamp, device_time, level, name_length, message_length = \
+            _record.unpack_from(data, position)
+        position += _record.size
+        end = position + name_length + message_length
+        if end > len(data):
+            # truncated by an interrupted write
+            break
+        name = data[position:position + name_length].decode()
+        message = data[position + name_length:end].decode()
+        if math.isnan(device_time):
+            device_time = None
+        records.append((timestamp, device_time, level, name, message))
+        position = end
+    return records
+
+
+def _read_index(filename):
+    # Returns the (receive time, offset, maximum level) of the writes to a
+    # segment, or None if the segment has no index.
+    try:
+        with open(filename + _index_suffix, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    # ignore a partially written entry
+    length = len(data) - len(data) % _index_entry.size
+    return list(_index_entry.iter_unpack(data[:length]))
+
+
+def _read_chunks(filename, chunks):
+    # Decodes the records of the given (start offset, end offset) byte
+    # ranges of a segment, with end None for the end of the file.
+    records = []
+    with open(filename, "rb") as f:
+        for start, end in chunks:
+            f.seek(start)
+            data = f.read() if end is None else f.read(end - start)
+            records += _decode_records(data)
+    return records
+
+
+class LogStore:
+    """Append-only store of core device log records, kept in a directory.
+
+    Records are written to segment files whose name is the time of their
+    first record, which serves as a time index for queries. Each segment
+    has an index file with the receive time, offset and maximum level of
+    each write, so that queries only decode the parts of the segments that
+    can match. A new segment is started when the current one exceeds
+    ``segment_size`` bytes, and the oldest segments are deleted so that at
+    most ``max_segments`` are kept. Each instance starts a new segment, so
+    records are never appended after a record that was only partially
+    written.
+
+    Records hold both the host time (in seconds since the epoch) at which
+    they were received, which is forced to be non-decreasing, and the time
+    written by the firmware, which orders the records received together
+    and is reset when the core device restarts.
+
+    :meth:`query` can be called from another thread than :meth:`append`.
+    """
+    def __init__(self, directory, segment_size=16*2**20, max_segments=64):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        os.makedirs(directory, exist_ok=True)
+        # (time of first record, file name), in time order
+        self.segments = sorted(
+            (int(filename[:-len(_segment_suffix)])*1e-6,
+             os.path.join(directory, filename))
+            for filename in os.listdir(directory)
+            if filename.endswith(_segment_suffix))
+        self.last_timestamp = 0.
+        if self.segments:
+            first, filename = self.segments[-1]
+            index = _read_index(filename)
+            if index:
+                self.last_timestamp = index[-1][0]
+            elif index is None:
+                records = _read_chunks(filename, [(0, None)])
+                self.last_timestamp = records[-1][0] if records else first
+            else:
+                self.last_timestamp = first
+        self._file = None
+        self._index_file = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._index_file.close()
+            self._file = None
+            self._index_file = None
+
+    def _start_segment(self, timestamp):
+        self.close()
+        filename = os.path.join(self.directory, "{:020d}{}".format(
+            int(timestamp*1e6), _segment_suffix))
+        self._file = open(filename, "ab")
+        self._index_file = open(filename + _index_suffix, "ab")
+        segments = self.segments.copy()
+        if segments and segments[-1][1] == filename:
+            # several segments started within one microsecond
+            segments.pop()
+        segments.append((timestamp, filename))
+        removed = segments[:-self.max_segments]
+        # replaced rather than modified, for queries in other threads
+        self.segments = segments[-self.max_segments:]
+        for _, filename in removed:
+            os.unlink(filename)
+            try:
+                os.unlink(filename + _index_suffix)
+            except FileNotFoundError:
+                pass
+
+    def append(self, records, timestamp=None):
+        """Stores ``(device_time, level, name, message)`` records (as
+        returned by :func:`parse_log`), received at the given time (by
+        default, now), with a single write."""
+        if timestamp is None:
+            timestamp = time.time()
+        timestamp = max(timestamp, self.last_timestamp)
+        self.last_timestamp = timestamp
+
+        data = bytearray()
+        max_level = logging.NOTSET
+        for device_time, level, name, message in records:
+            if device_time is None:
+                device_time = math.nan
+            name = name.encode()
+            message = message.encode()
+            data += _record.pack(timestamp, device_time, level,
+                                 len(name), len(message))
+            data += name
+            data += message
+            max_level = max(max_level, level)
+        if not data:
+            return
+        if self._file is None or self._file.tell() >= self.segment_size:
+            self._start_segment(timestamp)
+        offset = self._file.tell()
+        self._file.write(data)
+        self._file.flush()
+        # written after the records, so that entries always point to
+        # complete records
+        self._index_file.write(_index_entry.pack(timestamp, offset,
+                                                 max_level))
+        self._index_file.flush()
+
+    def _matching_chunks(self, filename, start, end, level):
+        index = _read_index(filename)
+        if index is None:
+            return [(0, None)]
+        chunks = []
+        for i, (timestamp, offset, max_level) in enumerate(index):
+            if end is not None and timestamp >= end:
+                break
+            if ((start is not None and timestamp < start)
+                    or max_level < level):
+                continue
+            # the last write also covers records whose index entry was
+            # not written
+            chunk_end = index[i + 1][1] if i + 1 < len(index) else None
+            if chunks and chunks[-1][1] == offset:
+                chunks[-1] = (chunks[-1][0], chunk_end)
+            else:
+                chunks.append((offset, chunk_end))
+        return chunks
+
+    def query(self, start=None, end=None, level=logging.NOTSET, module=None,
+              limit=None):
+        """Returns the stored ``(timestamp, device_time, level, name,
+        message)`` records that were received at or after ``start`` and
+        before ``end``, with a level of at least ``level``, and that were
+        emitted by ``module`` or one of its submodules (with either ``::``
+        or ``.`` separators). ``timestamp`` is the receive time and
+        ``device_time`` the time written by the firmware, if any.
+
+        The records are returned in time order. If there are more than
+        ``limit`` matching records, only the most recent ones are returned.
+        """
+        if module is not None:
+            module = module.replace(".", "::")
+            submodule = module + "::"
+        segments = self.segments
+        selected = []
+        count = 0
+        for i in reversed(range(len(segments))):
+            first, filename = segments[i]
+            if end is not None and first >= end:
+                continue
+            # segment names are rounded down to the microsecond
+            if (start is not None and i + 1 < len(segments)
+                    and segments[i + 1][0] + 1e-6 < start):
+                break
+            try:
+                records = _read_chunks(filename, self._matching_chunks(
+                    filename, start, end, level))
+            except FileNotFoundError:
+                # deleted by append() since the query started
+                break
+            records = [
+                record for record in records
+                if (start is None or record[0] >= start)
+                and (end is None or record[0] < end)
+                and record[2] >= level
+                and (module is None or record[3] == module
+                     or record[3].startswith(submodule))]
+            selected.append(records)
+            count += len(records)
+            if limit is not None and count >= limit:
+                break
+        result = [record for records in reversed(selected)
+                  for record in records]
+        if limit is not None:
+            result = result[len(result) - limit:] if limit else []
+        return result
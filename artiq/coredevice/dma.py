@@ -6,9 +6,11 @@ alone could achieve.
 """
 
 from artiq.language.core import syscall, kernel
-from artiq.language.types import TInt32, TInt64, TStr, TNone, TTuple, TBool
+from artiq.language.types import (TInt32, TInt64, TStr, TBytes, TNone, TTuple,
+                                  TBool)
 from artiq.coredevice.exceptions import DMAError
 
+import numpy as np
 from numpy import int64
 
 
@@ -20,6 +22,10 @@ def dma_record_start(name: TStr) -> TNone:
 def dma_record_stop(duration: TInt64, enable_ddma: TBool) -> TNone:
     raise NotImplementedError("syscall not simulated")
 
+@syscall
+def dma_record_append(data: TBytes) -> TNone:
+    raise NotImplementedError("syscall not simulated")
+
 @syscall
 def dma_erase(name: TStr) -> TNone:
     raise NotImplementedError("syscall not simulated")
@@ -33,6 +39,54 @@ def dma_playback(timestamp: TInt64, ptr: TInt32, enable_ddma: TBool) -> TNone:
     raise NotImplementedError("syscall not simulated")
 
 
+# See gateware/rtio/dma.py.
+_HEADER_LENGTH = 1 + 3 + 8 + 1  # length, channel, timestamp, address
+
+
+def _as_bytes(values, dtype):
+    # little-endian bytes of each row of values
+    values = np.ascontiguousarray(values, dtype)
+    return values.view(np.uint8).reshape(len(values), -1)
+
+
+def encode_trace(timestamp, channel, address, data):
+    """Encodes RTIO output events into a DMA trace, in the format produced
+    by recording them in a kernel.
+
+    Each argument is a one-dimensional array (or scalar, broadcast to the
+    other arguments) with one element per event, except ``data``, which may
+    also be two-dimensional for events with several 32-bit data words, one
+    row per event. Timestamps are in machine units, relative to the start of
+    the playback. ``channel`` is the 24-bit RTIO channel number including the
+    DRTIO destination, i.e. the target of the event shifted right by 8 bits.
+
+    Events are played back in the order in which they are given. The result
+    can be concatenated with other encoded traces, and uploaded with
+    :meth:`CoreDMA.upload`.
+    """
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    if data.ndim != 2 or not 1 <= data.shape[1] <= 16:
+        raise ValueError("data must have between 1 and 16 words per event")
+    timestamp, channel, address = np.broadcast_arrays(
+        timestamp, channel, address, data[:, 0])[:3]
+    if np.any(channel < 0) or np.any(channel >= 1 << 24):
+        raise ValueError("channel must be between 0 and 2**24 - 1")
+    if np.any(address < 0) or np.any(address > 255):
+        raise ValueError("address must be between 0 and 255")
+    words = data.shape[1]
+    length = _HEADER_LENGTH + 4*words
+
+    records = np.empty((len(data), length), np.uint8)
+    records[:, 0] = length
+    records[:, 1:4] = _as_bytes(channel, "<u4")[:, :3]
+    records[:, 4:12] = _as_bytes(timestamp, "<i8")
+    records[:, 12] = address
+    records[:, 13:] = _as_bytes(data.astype(np.int64) & 0xffffffff, "<u4")
+    return records.tobytes()
+
+
 class DMARecordContextManager:
     """Context manager returned by :meth:`CoreDMA.record()`.
 
@@ -91,6 +145,19 @@ class CoreDMA:
         self.recorder.enable_ddma = enable_ddma
         return self.recorder
 
+    @kernel
+    def upload(self, name, trace, duration, enable_ddma=False):
+        """Stores a trace encoded on the host with :func:`encode_trace` under
+        the given name, as if it had been recorded with :meth:`record`.
+        ``duration`` is the amount of time (in machine units) by which
+        playing back the trace advances the timeline cursor.
+
+        Any previously recorded trace with the same name is overwritten."""
+        self.epoch += 1
+        dma_record_start(name)
+        dma_record_append(trace)
+        dma_record_stop(duration, enable_ddma)
+
     @kernel
     def erase(self, name):
         """Removes the DMA trace with the given name from storage."""
@@ -1,13 +1,15 @@
 """RTIO driver for the Fastino 32-channel, 16-bit, 2.5 MS/s per channel
 streaming DAC.
 """
+import numpy as np
 from numpy import int32, int64
 
-from artiq.language.core import kernel, portable, delay, delay_mu
+from artiq.language.core import kernel, portable, delay, delay_mu, host_vectorized
 from artiq.coredevice.rtio import (rtio_output, rtio_output_wide,
                                    rtio_input_data)
 from artiq.language.units import ns
 from artiq.language.types import TInt32, TList
+from artiq.coredevice.vectorized import round_to_int, raise_first_error
 
 
 class Fastino:
@@ -143,6 +145,15 @@ class Fastino:
             raise ValueError("Group index LSBs must be zero")
         rtio_output_wide(self.channel | dac, data)
 
+    def _voltage_to_mu(self, voltage):
+        data, valid = round_to_int((0x8000/10.)*np.asarray(voltage), np.int32)
+        data = data.astype(np.int64) + 0x8000
+        valid &= (data >= 0) & (data <= 0xffff)
+        if not valid.all():
+            raise_first_error(valid, self.voltage_to_mu, voltage)
+        return data.astype(np.int32)
+
+    @host_vectorized(_voltage_to_mu)
     @portable
     def voltage_to_mu(self, voltage):
         """Convert SI volts to DAC machine units.
@@ -155,6 +166,21 @@ class Fastino:
             raise ValueError("DAC voltage out of bounds")
         return data
 
+    def _voltage_group_to_mu(self, voltage, data):
+        n = len(voltage)
+        if len(data) < (n + 1)//2:
+            return Fastino.voltage_group_to_mu.__wrapped__(self, voltage, data)
+        try:
+            mu = self._voltage_to_mu(voltage)
+        except (ValueError, OverflowError):
+            # raise the same exception after the same writes to data
+            Fastino.voltage_group_to_mu.__wrapped__(self, voltage, data)
+            raise
+        packed = mu[0::2].copy()
+        packed[:n//2] |= mu[1::2] << 16
+        data[:len(packed)] = packed
+
+    @host_vectorized(_voltage_group_to_mu)
     @portable
     def voltage_group_to_mu(self, voltage, data):
         """Convert SI volts to packed DAC channel group machine units.
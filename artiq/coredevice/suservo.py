@@ -1,11 +1,14 @@
 from math import ceil, log2
 
-from artiq.language.core import kernel, delay, delay_mu, portable
+import numpy as np
+
+from artiq.language.core import kernel, delay, delay_mu, portable, host_vectorized
 from artiq.language.types import TFloat, TInt32, TTuple
 from artiq.language.units import us, ns
 from artiq.coredevice.rtio import rtio_output, rtio_input_data
 from artiq.coredevice import spi2 as spi
 from artiq.coredevice import ad9910, urukul, sampler
+from artiq.coredevice.vectorized import round_to_int, raise_first_error
 
 
 COEFF_WIDTH = 18
@@ -526,6 +529,14 @@ class Channel:
         """
         self.set_dds_offset_mu(profile, self.dds_offset_to_mu(offset))
 
+    def _dds_offset_to_mu(self, offset):
+        offset_mu, valid = round_to_int(
+            np.asarray(offset) * (1 << COEFF_WIDTH - 1))
+        if not valid.all():
+            raise_first_error(valid, self.dds_offset_to_mu, offset)
+        return offset_mu
+
+    @host_vectorized(_dds_offset_to_mu)
     @portable
     def dds_offset_to_mu(self, offset):
         """Convert IIR offset (negative setpoint) from units of full scale to
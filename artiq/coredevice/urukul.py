@@ -1,9 +1,12 @@
 from abc import abstractmethod
 
+import numpy as np
 from numpy import int32, int64
 
 from artiq.coredevice import spi2 as spi
-from artiq.language.core import at_mu, delay, delay_mu, kernel, now_mu, portable
+from artiq.coredevice.vectorized import round_to_int, raise_first_error
+from artiq.language.core import (at_mu, delay, delay_mu, host_vectorized,
+                                 kernel, now_mu, portable)
 from artiq.language.types import TBool, TFloat, TInt32, TInt64
 from artiq.language.units import ms, us
 
@@ -904,6 +907,15 @@ class CPLD:
         """
         return (255 - (att_mu & 0xFF)) / 8
 
+    def _att_to_mu(self, att):
+        att_mu, valid = round_to_int(np.asarray(att) * 8, np.int32)
+        code = 255 - att_mu.astype(np.int64)
+        valid &= (code >= 0) & (code <= 255)
+        if not valid.all():
+            raise_first_error(valid, self.att_to_mu, att)
+        return code.astype(np.int32)
+
+    @host_vectorized(_att_to_mu)
     @portable(flags={"fast-math"})
     def att_to_mu(self, att: TFloat) -> TInt32:
         """Convert an attenuation setting in dB to machine units.
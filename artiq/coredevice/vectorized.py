@@ -0,0 +1,29 @@
+"""Helpers for the vectorized host implementations of driver unit conversions
+(see :func:`artiq.language.core.host_vectorized`)."""
+
+import numpy as np
+
+
+def round_to_int(values, dtype=np.int64):
+    """Rounds ``values`` like Python's ``round`` (i.e. half to even), and
+    converts them to ``dtype``.
+
+    :return: The converted values, and a mask of the values that could be
+        converted. Values that are not finite or outside the range of
+        ``dtype`` cannot be converted, and are replaced with 0.
+    """
+    rounded = np.rint(np.asarray(values, dtype=float))
+    low = float(np.iinfo(dtype).min)
+    valid = (rounded >= low) & (rounded < -low)
+    return np.where(valid, rounded, 0).astype(dtype), valid
+
+
+def raise_first_error(valid, scalar, *args):
+    """Raises the exception that the scalar conversion function ``scalar``
+    raises for the first element of ``args`` (broadcast together) where
+    ``valid`` is false."""
+    args = np.broadcast_arrays(*args)
+    i = np.unravel_index(np.argmin(valid), valid.shape)
+    scalar(*(arg[i].item() for arg in args))
+    raise OverflowError("Value out of bounds for int64")
+
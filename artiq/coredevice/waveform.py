@@ -0,0 +1,416 @@
+"""Host-side compilation of sampled waveforms into Shuttler spline segments
+and Phaser Miqro windows.
+
+The Shuttler compilers approximate a sampled waveform by the smallest number
+of spline segments found by a greedy search, such that the output of the
+spline interpolators stays within a given tolerance of the waveform at every
+sample. The fit is verified against a bit-exact model of the interpolator
+accumulators in :mod:`artiq.gateware.shuttler`, which is also available as
+:func:`play_dcbias` and :func:`play_dds`.
+
+The compiled segments are returned as flat integer arrays that can be passed
+to a kernel in a single RPC, or played back while recording a DMA trace::
+
+    @kernel
+    def play(self, durations, coefficients):
+        for i in range(len(durations)):
+            self.dcbias.set_waveform(int32(coefficients[4*i]),
+                                     int32(coefficients[4*i + 1]),
+                                     coefficients[4*i + 2],
+                                     coefficients[4*i + 3])
+            self.trigger.trigger(1 << self.channel)
+            delay_mu((durations[i] - 9)*int64(self.core.ref_multiplier))
+
+``set_waveform`` writes one coefficient word per RTIO cycle (9 for
+:class:`artiq.coredevice.shuttler.DCBias` and 14 for
+:class:`artiq.coredevice.shuttler.DDS`), which sets the minimum duration of a
+segment.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from artiq.language.units import ns
+
+
+__all__ = ["SHUTTLER_PERIOD", "SHUTTLER_CORDIC_GAIN", "ShuttlerSegments",
+           "compile_dcbias", "compile_dds", "play_dcbias", "play_dds",
+           "phaser_window_to_mu", "compile_phaser_window"]
+
+
+#: Shuttler interpolator sample period (one RTIO cycle).
+SHUTTLER_PERIOD = 8*ns
+#: Constant gain of the Shuttler DDS CORDIC.
+SHUTTLER_CORDIC_GAIN = 1.64676
+
+_MASK32 = (1 << 32) - 1
+_MASK48 = (1 << 48) - 1
+# Machine units per volt of the Shuttler DAC (see shuttler_volt_to_mu)
+_MU_PER_VOLT = (1 << 16)/20.
+
+#: Compiled spline segments.
+#:
+#: ``durations`` holds the duration of each segment in RTIO cycles, and
+#: ``coefficients`` the ``set_waveform`` arguments of all segments
+#: concatenated (``a0, a1, a2, a3`` for DC-bias splines and
+#: ``b0, b1, b2, b3, c0, c1, c2`` for DDS splines), as ``int64`` arrays.
+ShuttlerSegments = namedtuple("ShuttlerSegments", "durations coefficients")
+
+
+def _spline(registers, n):
+    # Values of the first register of a chain of accumulators
+    # (r[0] += r[1], r[1] += r[2], ... on every cycle) over n cycles, modulo
+    # 2**64. The registers are non-negative integers.
+    values = np.full(n, registers[-1], dtype=np.uint64)
+    for register in reversed(registers[:-1]):
+        accumulated = np.empty(n, dtype=np.uint64)
+        if n:
+            accumulated[0] = register
+            accumulated[1:] = np.cumsum(values[:-1], dtype=np.uint64)
+            accumulated[1:] += np.uint64(register)
+        values = accumulated
+    return values
+
+
+def _to_int16(values):
+    return (values & np.uint64(0xffff)).astype(np.uint16).view(np.int16)
+
+
+def _dcbias_samples(a0, a1, a2, a3, n):
+    registers = [(a0 & 0xffff) << 32, (a1 & _MASK32) << 16,
+                 a2 & _MASK48, a3 & _MASK48]
+    return _to_int16(_spline(registers, n) >> np.uint64(32))
+
+
+def _phase_samples(za, c0, c1, c2, n):
+    # Phase words of n cycles, and the phase accumulator after them.
+    za = _spline([za, c1 & _MASK32, c2 & _MASK32], n + 1) & np.uint64(_MASK32)
+    phase = ((za[:n] >> np.uint64(16)) + np.uint64(c0 & 0xffff)) \
+        & np.uint64(0xffff)
+    return phase.astype(np.int64), int(za[n])
+
+
+def _segments(segments, width):
+    durations = np.asarray(segments.durations, dtype=np.int64)
+    coefficients = np.asarray(segments.coefficients, dtype=np.int64)
+    if coefficients.shape != (width*len(durations),):
+        raise ValueError("coefficients do not match durations")
+    return durations, coefficients.reshape(-1, width)
+
+
+def play_dcbias(segments):
+    """Computes the output of a DC-bias spline interpolator
+    (:class:`artiq.coredevice.shuttler.DCBias`) playing back ``segments``.
+
+    The model is bit-exact with the gateware.
+
+    :param segments: :class:`ShuttlerSegments`, e.g. from
+        :func:`compile_dcbias`.
+    :return: The DAC codes (before the pre-DAC gain and offset) of each RTIO
+        cycle, as an ``int16`` array.
+    """
+    durations, coefficients = _segments(segments, 4)
+    samples = [_dcbias_samples(*(int(c) for c in coefficient), int(duration))
+               for duration, coefficient in zip(durations, coefficients)]
+    return np.concatenate([np.empty(0, dtype=np.int16)] + samples)
+
+
+def play_dds(segments, clear=True):
+    """Computes the amplitude and phase of a DDS spline interpolator
+    (:class:`artiq.coredevice.shuttler.DDS`) playing back ``segments``.
+
+    The model is bit-exact with the gateware up to the CORDIC input. The
+    output of the channel is approximately
+    ``SHUTTLER_CORDIC_GAIN*amplitude*cos(2*pi*phase/2**16)``.
+
+    :param segments: :class:`ShuttlerSegments`, e.g. from
+        :func:`compile_dds`.
+    :param clear: Whether the phase clear bit of the channel is set (see
+        :meth:`artiq.coredevice.shuttler.Config.set_clr`).
+    :return: The amplitude (``int16``, in DAC machine units) and phase
+        (``int64``, in units of 1/2**16 turns) of each RTIO cycle.
+    """
+    durations, coefficients = _segments(segments, 7)
+    amplitudes = [np.empty(0, dtype=np.int16)]
+    phases = [np.empty(0, dtype=np.int64)]
+    za = 0
+    for duration, coefficient in zip(durations, coefficients):
+        b0, b1, b2, b3, c0, c1, c2 = (int(c) for c in coefficient)
+        if clear:
+            za = 0
+        amplitudes.append(_dcbias_samples(b0, b1, b2, b3, int(duration)))
+        phase, za = _phase_samples(za, c0, c1, c2, int(duration))
+        phases.append(phase)
+    return np.concatenate(amplitudes), np.concatenate(phases)
+
+
+def _resample(t, *values):
+    t = np.asarray(t, dtype=float)
+    values = [np.asarray(v, dtype=float) for v in values]
+    if t.ndim != 1 or not len(t) or any(v.shape != t.shape for v in values):
+        raise ValueError("times and values must be non-empty 1D arrays "
+                         "of the same length")
+    if np.any(np.diff(t) <= 0):
+        raise ValueError("times must be strictly increasing")
+    n = int(np.floor((t[-1] - t[0])/SHUTTLER_PERIOD + 1e-6)) + 1
+    grid = t[0] + np.arange(n)*SHUTTLER_PERIOD
+    return [np.interp(grid, t, v) for v in values]
+
+
+def _binomials(n, order):
+    k = np.arange(n, dtype=float)
+    return [np.ones(n), k, k*(k - 1)/2, k*(k - 1)*(k - 2)/6][:order + 1]
+
+
+def _fit(y, quanta):
+    # Least-squares fit of y[k] ~ sum_j c[j]*binomial(k, j)*quanta[j] with
+    # integer c[j], i.e. of the initial values of a chain of accumulators.
+    # The highest order is quantized first, and the lower orders refitted to
+    # compensate for its quantization error.
+    basis = _binomials(len(y), len(quanta) - 1)
+    residual = np.array(y, dtype=float)
+    coefficients = [0]*len(quanta)
+    for j in reversed(range(min(len(quanta), len(y)))):
+        columns = np.stack(basis[:j + 1], axis=1)
+        scale = np.abs(columns).max(axis=0)
+        solution = np.linalg.lstsq(columns/scale, residual, rcond=None)[0]
+        c = solution[j]/scale[j]/quanta[j]
+        if not np.isfinite(c) or abs(c) >= 1 << 62:
+            return None
+        coefficients[j] = int(np.rint(c))
+        residual -= coefficients[j]*quanta[j]*basis[j]
+    return coefficients
+
+
+def _fits(value, bits):
+    return -(1 << (bits - 1)) <= value < 1 << (bits - 1)
+
+
+def _fit_cubic(y, tolerance):
+    # DC-bias or DDS amplitude spline for target DAC codes y. The output is
+    # truncated, hence the half LSB offset.
+    # The first sample is exact, so the neighbours of the fitted initial
+    # value are tried as well.
+    c = _fit(y + 0.5, [1, 2.**-16, 2.**-32, 2.**-32])
+    if (c is None or not _fits(c[1], 32)
+            or not _fits(c[2], 48) or not _fits(c[3], 48)):
+        return None
+    for a0 in c[0], c[0] - 1:
+        if not _fits(a0, 16):
+            continue
+        c[0] = a0 & 0xffff
+        if np.all(np.abs(_dcbias_samples(*c, len(y)) - y) <= tolerance):
+            return c
+    return None
+
+
+def _fit_quadratic(phase, za, tolerance):
+    # DDS phase spline for target phases in turns, given the phase
+    # accumulator at the start of the segment.
+    phase = phase - np.floor(phase[0])
+    c = _fit(phase*(1 << 32) - za + (1 << 15), [1 << 16, 1, 1])
+    if c is None or not _fits(c[1], 32) or not _fits(c[2], 32):
+        return None
+    c[0] &= 0xffff
+    words, za = _phase_samples(za, *c, len(phase))
+    error = (words - phase*(1 << 16) + (1 << 15)) % (1 << 16) - (1 << 15)
+    if np.any(np.abs(error) > tolerance):
+        return None
+    return c, za
+
+
+def _segment(n, fit, min_duration, max_duration, state):
+    # Greedy segmentation: each segment is extended as far as fit(start,
+    # length, state) succeeds, using an exponential then binary search.
+    # fit returns the coefficients and the state after the segment, or None.
+    if min_duration < 1:
+        raise ValueError("minimum duration must be at least one cycle")
+    durations = []
+    coefficients = []
+    start = 0
+    while start < n:
+        remaining = n - start
+        length = min(min_duration, remaining)
+        best = fit(start, length, state)
+        if best is None:
+            raise ValueError("waveform cannot be approximated within the "
+                             "tolerance at sample {}".format(start))
+        upper = remaining
+        if max_duration is not None:
+            upper = min(upper, max_duration)
+        bad = None
+        while length < upper:
+            trial = min(2*length, upper)
+            result = fit(start, trial, state)
+            if result is None:
+                bad = trial
+                break
+            length, best = trial, result
+        while bad is not None and bad - length > 1:
+            trial = (length + bad)//2
+            result = fit(start, trial, state)
+            if result is None:
+                bad = trial
+            else:
+                length, best = trial, result
+        segment, state = best
+        durations.append(length)
+        coefficients.extend(segment)
+        start += length
+    return ShuttlerSegments(np.array(durations, dtype=np.int64),
+                            np.array(coefficients, dtype=np.int64))
+
+
+def _volt_to_mu(volts):
+    mu = volts*_MU_PER_VOLT
+    if np.any(mu < -(1 << 15)) or np.any(mu > (1 << 15) - 1):
+        raise ValueError("waveform out of the DAC range")
+    return mu
+
+
+def compile_dcbias(t, voltage, tolerance, min_duration=10,
+                   max_duration=None):
+    """Compiles a sampled waveform into DC-bias spline segments
+    (see :class:`artiq.coredevice.shuttler.DCBias`).
+
+    The waveform is linearly interpolated to the Shuttler sample period
+    :data:`SHUTTLER_PERIOD`, starting at ``t[0]``.
+
+    :param t: Sample times in seconds.
+    :param voltage: Waveform samples in volts.
+    :param tolerance: Maximum deviation of the spline output from the
+        interpolated waveform, in volts. This should be at least one DAC
+        LSB (about 0.3 mV).
+    :param min_duration: Minimum segment duration in RTIO cycles. The
+        default leaves enough time to write the coefficients of the next
+        segment and trigger it.
+    :param max_duration: Maximum segment duration in RTIO cycles, or None.
+    :return: :class:`ShuttlerSegments`. The output of the last segment keeps
+        evolving after its duration; append a constant sample to hold the
+        final value.
+    """
+    y = _volt_to_mu(_resample(t, voltage)[0])
+    tolerance_mu = tolerance*_MU_PER_VOLT
+
+    def fit(start, length, state):
+        c = _fit_cubic(y[start:start + length], tolerance_mu)
+        return None if c is None else (c, None)
+
+    return _segment(len(y), fit, min_duration, max_duration, None)
+
+
+def compile_dds(t, amplitude, phase, amplitude_tolerance, phase_tolerance,
+                clear=True, min_duration=15, max_duration=None):
+    """Compiles a sampled amplitude and phase into DDS spline segments
+    (see :class:`artiq.coredevice.shuttler.DDS`).
+
+    The amplitude and phase are linearly interpolated to the Shuttler sample
+    period :data:`SHUTTLER_PERIOD`, starting at ``t[0]``. The phase is relative
+    to the first trigger.
+
+    :param t: Sample times in seconds.
+    :param amplitude: Output amplitude samples in volts, including the CORDIC
+        gain.
+    :param phase: Phase samples in turns. The phase must be unwrapped, i.e.
+        continuous.
+    :param amplitude_tolerance: Maximum deviation of the output amplitude, in
+        volts.
+    :param phase_tolerance: Maximum deviation of the phase, in turns. This
+        should be at least 1/2**16.
+    :param clear: Whether the phase clear bit of the channel is set (see
+        :meth:`artiq.coredevice.shuttler.Config.set_clr`). If not, the phase
+        accumulator carries over from one segment to the next.
+    :param min_duration: Minimum segment duration in RTIO cycles.
+    :param max_duration: Maximum segment duration in RTIO cycles, or None.
+    :return: :class:`ShuttlerSegments`.
+    """
+    amplitude, phase = _resample(t, amplitude, phase)
+    y = _volt_to_mu(amplitude/SHUTTLER_CORDIC_GAIN)
+    amplitude_tolerance_mu = \
+        amplitude_tolerance*_MU_PER_VOLT/SHUTTLER_CORDIC_GAIN
+    phase_tolerance_mu = phase_tolerance*(1 << 16)
+
+    def fit(start, length, za):
+        b = _fit_cubic(y[start:start + length], amplitude_tolerance_mu)
+        if b is None:
+            return None
+        c = _fit_quadratic(phase[start:start + length], 0 if clear else za,
+                           phase_tolerance_mu)
+        if c is None:
+            return None
+        c, za = c
+        return b + c, za
+
+    return _segment(len(y), fit, min_duration, max_duration, 0)
+
+
+def phaser_window_to_mu(iq, period=4*ns, order=3):
+    """Converts window samples like
+    :meth:`artiq.coredevice.phaser.Miqro.set_window`, for many samples at
+    once.
+
+    :param iq: Window samples, either as an array of I and Q pairs or as a
+        complex array, in units of full scale.
+    :param period: Desired window sample period in SI units.
+    :param order: Interpolation order (0 to 3).
+    :return: The encoded samples (``int32`` array) and the ``rate`` and
+        ``shift`` arguments of
+        :meth:`artiq.coredevice.phaser.Miqro.set_window_mu`.
+    """
+    iq = np.asarray(iq)
+    if np.iscomplexobj(iq):
+        iq = np.stack([iq.real, iq.imag], axis=-1)
+    iq = np.asarray(iq, dtype=float).reshape(-1, 2)
+    rate = int(round(period/(4*ns)))
+    if rate < 1 or rate > 1 << 12:
+        raise ValueError("rate out of bounds")
+    gain = 1.
+    for _ in range(order):
+        gain *= rate
+    shift = 0
+    while gain >= 2.:
+        shift += 1
+        gain *= .5
+    scale = ((1 << 15) - 1)/gain
+    i = np.rint(iq[:, 0]*scale).astype(np.int64)
+    q = np.rint(iq[:, 1]*scale).astype(np.int64)
+    iq_mu = ((i & 0xffff) | (q << 16)).astype(np.int32)
+    return iq_mu, rate, shift
+
+
+def compile_phaser_window(t, iq, order=3, max_length=0x3fe):
+    """Compiles a sampled IQ envelope into a Phaser Miqro window (see
+    :class:`artiq.coredevice.phaser.Miqro`).
+
+    The smallest interpolation rate for which the window fits in
+    ``max_length`` samples is used, and the envelope is linearly
+    interpolated to the corresponding sample period, starting at ``t[0]``.
+    The samples are used directly as the interpolator input.
+
+    :param t: Sample times in seconds.
+    :param iq: Envelope samples, either as an array of I and Q pairs or as a
+        complex array, in units of full scale.
+    :param order: Interpolation order (0 to 3).
+    :param max_length: Maximum number of window samples.
+    :return: The encoded samples (``int32`` array) and the ``rate`` and
+        ``shift`` arguments of
+        :meth:`artiq.coredevice.phaser.Miqro.set_window_mu`.
+    """
+    iq = np.asarray(iq)
+    if np.iscomplexobj(iq):
+        iq = np.stack([iq.real, iq.imag], axis=-1)
+    t = np.asarray(t, dtype=float)
+    iq = np.asarray(iq, dtype=float)
+    if iq.shape != t.shape + (2,):
+        raise ValueError("times and samples must have the same length")
+    duration = (t[-1] - t[0])/(4*ns)
+    rate = max(1, int(np.ceil(duration/max(max_length - 1, 1) - 1e-6)))
+    while int(np.floor(duration/rate + 1e-6)) + 1 > max_length:
+        rate += 1
+    if rate > 1 << 12:
+        raise ValueError("window too long")
+    grid = t[0] + np.arange(int(np.floor(duration/rate + 1e-6)) + 1)*rate*4*ns
+    samples = np.stack([np.interp(grid, t, iq[:, 0]),
+                        np.interp(grid, t, iq[:, 1])], axis=-1)
+    return phaser_window_to_mu(samples, rate*4*ns, order)
@@ -717,7 +717,7 @@ class _DeviceManager:
             new_mi_connection = CommMonInj(self.monitor_cb, self.injection_status_cb,
                                            self.disconnect_cb)
             try:
-                await new_mi_connection.connect(self.mi_addr, self.mi_port)
+                await new_mi_connection.connect(self.mi_addr, self.mi_port, batch=True)
             except Exception:
                 logger.error("failed to connect to moninj. Is aqctl_moninj_proxy running?",
                              exc_info=True)
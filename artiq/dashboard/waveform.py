@@ -1,7 +1,7 @@
 import os
+import io
 import asyncio
 import logging
-import bisect
 import itertools
 import math
 
@@ -15,7 +15,7 @@ from sipyco import pyon
 
 from artiq import compat
 from artiq.tools import exc_to_warning, short_format
-from artiq.coredevice import comm_analyzer
+from artiq.coredevice import comm_analyzer, analyzer_trace
 from artiq.coredevice.comm_analyzer import WaveformType
 from artiq.gui.tools import LayoutWidget, get_open_file_name, get_save_file_name
 from artiq.gui.models import DictSyncTreeSepModel
@@ -26,6 +26,9 @@ logger = logging.getLogger(__name__)
 
 WAVEFORM_MIN_HEIGHT = 50
 WAVEFORM_MAX_HEIGHT = 200
+# Above this many samples per horizontal pixel, waveforms are drawn from
+# their multi-resolution index instead of sample by sample.
+LOD_SAMPLES_PER_PIXEL = 4
 
 
 class ProxyClient():
@@ -115,6 +118,78 @@ class _BackgroundItem(pg.GraphicsWidgetAnchor, pg.GraphicsWidget):
         self.item.setBrush(brush)
 
 
+class _LevelOfDetail:
+    """Multi-resolution index of a waveform for drawing.
+
+    Level ``l`` groups the samples into time buckets of width ``2**l`` and
+    stores, for each non-empty bucket, the time of its first sample, the
+    minimum, maximum and last values, and the number of transitions. A level
+    is only stored if it has at most half as many buckets as the previous
+    stored level (or as there are samples), so that the index holds fewer
+    entries than the waveform.
+    """
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.levels = []
+
+        bucket = x
+        first_x, ymin, ymax, ylast = x, y, y, y
+        count = np.ones(len(x), dtype=np.int64)
+        level = 0
+        while len(bucket) > 1:
+            # no buckets merge before the bucket width reaches the smallest
+            # gap between them
+            gap = int(np.min(np.diff(bucket)))
+            shift = max(gap.bit_length() - 1, 1)
+            level += shift
+            bucket = bucket >> shift
+            starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+            # keep widening the buckets of the last stored level until they
+            # merge into at most half as many
+            if 2*len(starts) > len(bucket):
+                continue
+            ends = np.append(starts[1:], len(bucket)) - 1
+            bucket = bucket[starts]
+            first_x = first_x[starts]
+            ymin = np.minimum.reduceat(ymin, starts)
+            ymax = np.maximum.reduceat(ymax, starts)
+            ylast = ylast[ends]
+            count = np.add.reduceat(count, starts)
+            self.levels.append((level, first_x, ymin, ymax, ylast, count))
+
+    def visible(self, xmin, xmax, npixels):
+        """Returns the points to draw for the time window ``[xmin, xmax]``
+        on ``npixels`` pixels, and whether they are the raw samples.
+
+        The sample preceding the window is included, so that the value held
+        at the left edge is drawn."""
+        i = max(np.searchsorted(self.x, xmin, "right") - 1, 0)
+        j = np.searchsorted(self.x, xmax, "right") + 1
+        if j - i <= LOD_SAMPLES_PER_PIXEL*npixels:
+            return self.x[i:j], self.y[i:j], True
+
+        bucket_width = (xmax - xmin)/npixels
+        chosen = None
+        for lod in self.levels:
+            if 2**lod[0] > bucket_width:
+                break
+            chosen = lod
+        if chosen is None:
+            return self.x[i:j], self.y[i:j], True
+        _, first_x, ymin, ymax, ylast, _ = chosen
+        i = max(np.searchsorted(first_x, xmin, "right") - 1, 0)
+        j = np.searchsorted(first_x, xmax, "right") + 1
+        # each bucket is drawn as a vertical bar spanning its values,
+        # followed by the value it ends with
+        x = np.repeat(first_x[i:j], 3)
+        y = np.empty(len(x))
+        y[0::3] = ymin[i:j]
+        y[1::3] = ymax[i:j]
+        y[2::3] = ylast[i:j]
+        return x, y, False
+
+
 class _BaseWaveform(pg.PlotWidget):
     cursorMove = QtCore.pyqtSignal(float)
 
@@ -138,8 +213,9 @@ class _BaseWaveform(pg.PlotWidget):
         self.precision = precision
         self.unit = unit
 
-        self.x_data = []
+        self.x_data = np.empty(0, dtype=np.int64)
         self.y_data = []
+        self.lod = None
 
         self.plot_item = self.getPlotItem()
         self.plot_item.hideButtons()
@@ -156,6 +232,8 @@ class _BaseWaveform(pg.PlotWidget):
         self.view_box.setMouseEnabled(x=True, y=False)
         self.view_box.disableAutoRange(axis=pg.ViewBox.YAxis)
         self.view_box.setLimits(xMin=0, minXRange=20)
+        self.view_box.sigXRangeChanged.connect(lambda *_: self._updateDisplay())
+        self.view_box.sigResized.connect(lambda *_: self._updateDisplay())
 
         self.title_label = pg.LabelItem(self.name, parent=self.plot_item)
         self.title_label.anchor(itemPos=(0, 0), parentPos=(0, 0), offset=(0, 0))
@@ -183,9 +261,35 @@ class _BaseWaveform(pg.PlotWidget):
 
     def setData(self, data):
         if len(data) == 0:
-            self.x_data, self.y_data = [], []
+            self.x_data, self.y_data = np.empty(0, dtype=np.int64), []
         else:
-            self.x_data, self.y_data = zip(*data)
+            x_data, self.y_data = zip(*data)
+            self.x_data = np.array(x_data, dtype=np.int64)
+
+    def setDisplayData(self, x, y):
+        if len(x) == 0:
+            self.lod = None
+        else:
+            self.lod = _LevelOfDetail(np.asarray(x, dtype=np.int64),
+                                      np.asarray(y, dtype=np.float64))
+        self._updateDisplay()
+
+    def _updateDisplay(self):
+        xmin, xmax = self.view_box.viewRange()[0]
+        if self.lod is None:
+            self.plot_data_item.setData(x=[], y=[])
+            self.onDetailChange(xmin, xmax, False)
+            return
+        npixels = max(int(self.view_box.width()), 1)
+        x, y, raw = self.lod.visible(xmin, xmax, npixels)
+        self.plot_data_item.setData(x=x, y=y)
+        self.onDetailChange(xmin, xmax, raw)
+
+    def onDetailChange(self, xmin, xmax, raw):
+        """Called after the displayed time window or level of detail has
+        changed. ``raw`` indicates that individual samples are drawn, which
+        is when per-sample decorations should be shown."""
+        pass
 
     def onDataChange(self, data):
         raise NotImplementedError
@@ -194,7 +298,7 @@ class _BaseWaveform(pg.PlotWidget):
         self.cursor.setValue(x)
         if len(self.x_data) < 1:
             return
-        ind = bisect.bisect_left(self.x_data, x) - 1
+        ind = np.searchsorted(self.x_data, x, "left") - 1
         dr = self.plot_data_item.dataRect()
         self.cursor_y = None
         if dr is not None and 0 <= ind < len(self.y_data):
@@ -230,39 +334,44 @@ class BitWaveform(_BaseWaveform):
         _BaseWaveform.__init__(self, name, width, precision, unit, parent)
         self.plot_item.showGrid(x=True, y=False)
         self._arrows = []
+        self._repeats = np.empty(0, dtype=np.int64)
+
+    def _clearArrows(self):
+        for arw in self._arrows:
+            self.removeItem(arw)
+        self._arrows = []
 
     def onDataChange(self, data):
         try:
             self.setData(data)
-            for arw in self._arrows:
-                self.removeItem(arw)
-            self._arrows = []
-            l = len(data)
-            display_y = np.empty(l)
-            display_x = np.empty(l)
             display_map = {
                 "X": 0.5,
                 "1": 1,
                 "0": 0
             }
-            previous_y = None
-            for i, coord in enumerate(data):
-                x, y = coord
-                dis_y = display_map[y]
-                if previous_y == y:
-                    arw = pg.ArrowItem(pxMode=True, angle=90)
-                    self.addItem(arw)
-                    self._arrows.append(arw)
-                    arw.setPos(x, dis_y)
-                display_y[i] = dis_y
-                display_x[i] = x
-                previous_y = y
-            self.plot_data_item.setData(x=display_x, y=display_y)
+            display_y = np.array([display_map[y] for y in self.y_data],
+                                 dtype=np.float64)
+            # samples that repeat the previous value are marked with arrows
+            self._repeats = np.flatnonzero(display_y[1:] == display_y[:-1]) + 1
+            self.setDisplayData(self.x_data, display_y)
         except:
             logger.error("Error when displaying waveform: %s", self.name, exc_info=True)
-            for arw in self._arrows:
-                self.removeItem(arw)
-            self.plot_data_item.setData(x=[], y=[])
+            self._repeats = np.empty(0, dtype=np.int64)
+            self.setDisplayData([], [])
+
+    def onDetailChange(self, xmin, xmax, raw):
+        self._clearArrows()
+        if not raw or not len(self._repeats):
+            return
+        i = np.searchsorted(self.x_data, xmin, "left")
+        j = np.searchsorted(self.x_data, xmax, "right")
+        lo = np.searchsorted(self._repeats, i, "left")
+        hi = np.searchsorted(self._repeats, j, "left")
+        for ind in self._repeats[lo:hi]:
+            arw = pg.ArrowItem(pxMode=True, angle=90)
+            self.addItem(arw)
+            self._arrows.append(arw)
+            arw.setPos(self.x_data[ind], self.lod.y[ind])
 
     def onCursorMove(self, x):
         _BaseWaveform.onCursorMove(self, x)
@@ -279,14 +388,15 @@ class AnalogWaveform(_BaseWaveform):
     def onDataChange(self, data):
         try:
             self.setData(data)
-            self.plot_data_item.setData(x=self.x_data, y=self.y_data)
+            y = np.array(self.y_data, dtype=np.float64)
+            self.setDisplayData(self.x_data, y)
             if len(data) > 0:
-                max_y = max(self.y_data)
-                min_y = min(self.y_data)
+                max_y = np.max(y)
+                min_y = np.min(y)
                 self.plot_item.setRange(yRange=(min_y, max_y), padding=0.1)
         except:
             logger.error("Error when displaying waveform: %s", self.name, exc_info=True)
-            self.plot_data_item.setData(x=[], y=[])
+            self.setDisplayData([], [])
 
     def onCursorMove(self, x):
         _BaseWaveform.onCursorMove(self, x)
@@ -302,50 +412,44 @@ class BitVectorWaveform(_BaseWaveform):
         _BaseWaveform.__init__(self, name, width, precision, parent)
         self._labels = []
         self._format_string = "{:0=" + str(math.ceil(width / 4)) + "X}"
-        self.view_box.sigTransformChanged.connect(self._update_labels)
         self.plot_item.showGrid(x=True, y=False)
 
-    def _update_labels(self):
-        for label in self._labels:
-            self.removeItem(label)
-        xmin, xmax = self.view_box.viewRange()[0]
-        left_label_i = bisect.bisect_left(self.x_data, xmin)
-        right_label_i = bisect.bisect_right(self.x_data, xmax) + 1
+    def _clearLabels(self):
+        for lbl in self._labels:
+            self.removeItem(lbl)
+        self._labels = []
+
+    def onDetailChange(self, xmin, xmax, raw):
+        self._clearLabels()
+        if not raw:
+            return
+        left_label_i = np.searchsorted(self.x_data, xmin, "left")
+        right_label_i = np.searchsorted(self.x_data, xmax, "right") + 1
         for i, j in itertools.pairwise(range(left_label_i, right_label_i)):
+            if i >= len(self.x_data):
+                break
             x1 = self.x_data[i]
             x2 = self.x_data[j] if j < len(self.x_data) else self.stopped_x
-            lbl = self._labels[i]
+            lbl = pg.TextItem(
+                self._format_string.format(int(self.y_data[i], 2)), anchor=(0, 0.5))
+            lbl.setPos(x1, 0.5)
+            lbl.setTextWidth(100)
             bounds = lbl.boundingRect()
             bounds_view = self.view_box.mapSceneToView(bounds)
             if bounds_view.boundingRect().width() < x2 - x1:
                 self.addItem(lbl)
+                self._labels.append(lbl)
 
     def onDataChange(self, data):
         try:
             self.setData(data)
-            for lbl in self._labels:
-                self.plot_item.removeItem(lbl)
-            self._labels = []
-            l = len(data)
-            display_x = np.empty(l * 2)
-            display_y = np.empty(l * 2)
-            for i, coord in enumerate(data):
-                x, y = coord
-                display_x[i * 2] = x
-                display_x[i * 2 + 1] = x
-                display_y[i * 2] = 0
-                display_y[i * 2 + 1] = int(int(y) != 0)
-                lbl = pg.TextItem(
-                    self._format_string.format(int(y, 2)), anchor=(0, 0.5))
-                lbl.setPos(x, 0.5)
-                lbl.setTextWidth(100)
-                self._labels.append(lbl)
-            self.plot_data_item.setData(x=display_x, y=display_y)
+            display_x = np.repeat(self.x_data, 2)
+            display_y = np.zeros(len(display_x))
+            display_y[1::2] = [int(int(y) != 0) for y in self.y_data]
+            self.setDisplayData(display_x, display_y)
         except:
             logger.error("Error when displaying waveform: %s", self.name, exc_info=True)
-            for lbl in self._labels:
-                self.plot_item.removeItem(lbl)
-            self.plot_data_item.setData(x=[], y=[])
+            self.setDisplayData([], [])
 
     def onCursorMove(self, x):
         _BaseWaveform.onCursorMove(self, x)
@@ -362,39 +466,46 @@ class LogWaveform(_BaseWaveform):
         self.plot_data_item.opts['pen'] = None
         self.plot_data_item.opts['symbol'] = 'x'
         self._labels = []
+        self._label_x = np.empty(0, dtype=np.int64)
+        self._label_msg = []
         self.plot_item.showGrid(x=True, y=False)
 
+    def _clearLabels(self):
+        for lbl in self._labels:
+            self.plot_item.removeItem(lbl)
+        self._labels = []
+
     def onDataChange(self, data):
         try:
             self.setData(data)
-            for lbl in self._labels:
-                self.plot_item.removeItem(lbl)
-            self._labels = []
-            self.plot_data_item.setData(
-                x=self.x_data, y=np.ones(len(self.x_data)))
-            if len(data) == 0:
-                return
-            old_x = data[0][0]
-            old_msg = data[0][1]
-            for x, msg in data[1:]:
-                if x == old_x:
-                    old_msg += "\n" + msg
+            # messages with the same timestamp share a label
+            label_x = []
+            self._label_msg = []
+            for x, msg in data:
+                if label_x and label_x[-1] == x:
+                    self._label_msg[-1] += "\n" + msg
                 else:
-                    lbl = pg.TextItem(old_msg)
-                    self.addItem(lbl)
-                    self._labels.append(lbl)
-                    lbl.setPos(old_x, 1)
-                    old_msg = msg
-                    old_x = x
-            lbl = pg.TextItem(old_msg)
-            self.addItem(lbl)
-            self._labels.append(lbl)
-            lbl.setPos(old_x, 1)
+                    label_x.append(x)
+                    self._label_msg.append(msg)
+            self._label_x = np.array(label_x, dtype=np.int64)
+            self.setDisplayData(self.x_data, np.ones(len(self.x_data)))
         except:
             logger.error("Error when displaying waveform: %s", self.name, exc_info=True)
-            for lbl in self._labels:
-                self.plot_item.removeItem(lbl)
-            self.plot_data_item.setData(x=[], y=[])
+            self._label_x = np.empty(0, dtype=np.int64)
+            self._label_msg = []
+            self.setDisplayData([], [])
+
+    def onDetailChange(self, xmin, xmax, raw):
+        self._clearLabels()
+        if not raw:
+            return
+        i = max(np.searchsorted(self._label_x, xmin, "right") - 1, 0)
+        j = np.searchsorted(self._label_x, xmax, "right")
+        for x, msg in zip(self._label_x[i:j], self._label_msg[i:j]):
+            lbl = pg.TextItem(msg)
+            self.addItem(lbl)
+            self._labels.append(lbl)
+            lbl.setPos(x, 1)
 
 
 # pg.GraphicsView ignores dragEnterEvent but not dragLeaveEvent
@@ -612,6 +723,10 @@ class _WaveformModel(QtCore.QAbstractTableModel):
     def update_all(self, waveform_data):
         self.update_data(waveform_data, 0, self.rowCount())
 
+    def names(self, top=0, bottom=None):
+        name_col = self.headers.index("name")
+        return [row[name_col] for row in self.backing_struct[top:bottom]]
+
 
 class _CursorTimeControl(QtWidgets.QLineEdit):
     submit = QtCore.pyqtSignal(float)
@@ -715,7 +830,8 @@ class WaveformDock(QtWidgets.QDockWidget):
         self._waveform_model = _WaveformModel()
 
         self._ddb = None
-        self._dump = None
+        self._rtio_channels = dict()
+        self._trace = None
 
         self._waveform_data = {
             "timescale": 1,
@@ -763,6 +879,7 @@ class WaveformDock(QtWidgets.QDockWidget):
         self._file_menu = QtWidgets.QMenu()
         self._add_async_action("Open trace...", self.load_trace)
         self._add_async_action("Save trace...", self.save_trace)
+        self._add_async_action("Save trace as raw dump...", self.save_dump)
         self._add_async_action("Save trace as VCD...", self.save_vcd)
         self._add_async_action("Open channel list...", self.load_channels)
         self._add_async_action("Save channel list...", self.save_channels)
@@ -791,18 +908,37 @@ class WaveformDock(QtWidgets.QDockWidget):
             lambda: asyncio.ensure_future(exc_to_warning(coro())))
         self._file_menu.addAction(action)
 
+    def _decode_waveforms(self, names):
+        # waveforms are only decoded when they are first shown
+        names = [name for name in names
+                 if name not in self._waveform_data['data']]
+        if self._trace is None or not names:
+            return
+        waveform_data = analyzer_trace.trace_to_waveform_data(
+            self._ddb, self._trace, names, self._rtio_channels)
+        self._waveform_data['data'].update(waveform_data['data'])
+
     def _add_channels(self):
         channels = self._add_channel_dialog.channels
         count = self._waveform_model.rowCount()
         self._waveform_model.extend(channels)
+        self._decode_waveforms(self._waveform_model.names(count))
         self._waveform_model.update_data(self._waveform_data['data'],
                                          count,
                                          count + len(channels))
 
     def on_dump_receive(self, dump):
-        self._dump = dump
-        decoded_dump = comm_analyzer.decode_dump(dump)
-        waveform_data = comm_analyzer.decoded_dump_to_waveform_data(self._ddb, decoded_dump)
+        f = io.BytesIO()
+        analyzer_trace.dump_to_trace(dump, f)
+        self._set_trace(analyzer_trace.Trace(f.getvalue()))
+
+    def _set_trace(self, trace):
+        if self._trace is not None:
+            self._trace.close()
+        self._trace = trace
+        waveform_data = analyzer_trace.trace_to_waveform_data(
+            self._ddb, trace, self._waveform_model.names(),
+            self._rtio_channels)
         self._waveform_data.update(waveform_data)
         self._channel_model.update(self._waveform_data['logs'])
         self._waveform_model.update_all(self._waveform_data['data'])
@@ -822,13 +958,19 @@ class WaveformDock(QtWidgets.QDockWidget):
         self._current_dir = os.path.dirname(filename)
         try:
             with open(filename, 'rb') as f:
-                dump = f.read()
-            self.on_dump_receive(dump)
+                is_trace = analyzer_trace.is_trace(
+                    f.read(len(analyzer_trace.TRACE_MAGIC)))
+            if is_trace:
+                self._set_trace(analyzer_trace.Trace(filename))
+            else:
+                with open(filename, 'rb') as f:
+                    dump = f.read()
+                self.on_dump_receive(dump)
         except:
             logger.error("Failed to open analyzer trace", exc_info=True)
 
     async def save_trace(self):
-        if self._dump is None:
+        if self._trace is None:
             logger.error("No analyzer trace stored in dashboard, "
                          "try loading from file or fetching from device")
             return
@@ -842,13 +984,36 @@ class WaveformDock(QtWidgets.QDockWidget):
             return
         self._current_dir = os.path.dirname(filename)
         try:
+            # copied first, as the trace may be mapped from that file
+            data = bytes(self._trace.buffer)
             with open(filename, 'wb') as f:
-                f.write(self._dump)
+                f.write(data)
         except:
             logger.error("Failed to save analyzer trace", exc_info=True)
 
+    async def save_dump(self):
+        if self._trace is None:
+            logger.error("No analyzer trace stored in dashboard, "
+                         "try loading from file or fetching from device")
+            return
+        try:
+            filename = await get_save_file_name(
+                self,
+                "Save Analyzer Dump",
+                self._current_dir,
+                "All files (*.*)")
+        except asyncio.CancelledError:
+            return
+        self._current_dir = os.path.dirname(filename)
+        try:
+            dump = self._trace.to_dump()
+            with open(filename, 'wb') as f:
+                f.write(dump)
+        except:
+            logger.error("Failed to save analyzer dump", exc_info=True)
+
     async def save_vcd(self):
-        if self._dump is None:
+        if self._trace is None:
             logger.error("No analyzer trace stored in dashboard, "
                          "try loading from file or fetching from device")
             return
@@ -862,7 +1027,7 @@ class WaveformDock(QtWidgets.QDockWidget):
             return
         self._current_dir = os.path.dirname(filename)
         try:
-            decoded_dump = comm_analyzer.decode_dump(self._dump)
+            decoded_dump = self._trace.decoded_dump()
             with open(filename, 'w') as f:
                 comm_analyzer.decoded_dump_to_vcd(f, self._ddb, decoded_dump)
         except:
@@ -881,6 +1046,7 @@ class WaveformDock(QtWidgets.QDockWidget):
         try:
             channel_list = compat.pyon_load_file(filename)
             self._waveform_model.import_list(channel_list)
+            self._decode_waveforms(self._waveform_model.names())
             self._waveform_model.update_all(self._waveform_data['data'])
         except:
             logger.error("Failed to open channel list", exc_info=True)
@@ -903,6 +1069,7 @@ class WaveformDock(QtWidgets.QDockWidget):
 
     def _process_ddb(self):
         channel_list = comm_analyzer.get_channel_list(self._ddb)
+        self._rtio_channels = analyzer_trace.get_rtio_channels(self._ddb)
         self._channel_model.clear()
         self._channel_model.update(channel_list)
         desc = self._ddb.get("core_analyzer")
@@ -923,5 +1090,7 @@ class WaveformDock(QtWidgets.QDockWidget):
         self._process_ddb()
 
     async def stop(self):
+        if self._trace is not None:
+            self._trace.close()
         if self.proxy_client is not None:
             await self.proxy_client.close()
@@ -161,6 +161,7 @@ static mut API: &'static [(&'static str, *const ())] = &[
 
     api!(dma_record_start = ::dma_record_start),
     api!(dma_record_stop = ::dma_record_stop),
+    api!(dma_record_append = ::dma_record_append),
     api!(dma_erase = ::dma_erase),
     api!(dma_retrieve = ::dma_retrieve),
     api!(dma_playback = ::dma_playback),
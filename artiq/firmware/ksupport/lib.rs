@@ -296,6 +296,18 @@ extern "C-unwind" fn dma_record_stop(duration: i64, enable_ddma: bool) {
     }
 }
 
+extern "C-unwind" fn dma_record_append(data: CSlice<u8>) {
+    unsafe {
+        if !DMA_RECORDER.active {
+            raise!("DMAError", "DMA is not recording")
+        }
+
+        // keep the records output by the kernel so far in order
+        dma_record_flush();
+        send(&DmaRecordAppend(data.as_ref()));
+    }
+}
+
 #[inline(always)]
 unsafe fn dma_record_output_prepare(timestamp: i64, target: i32,
                                     words: usize) -> &'static mut [u8] {
@@ -4,7 +4,6 @@ import argparse
 import asyncio
 import struct
 import logging
-import re
 
 from sipyco.pc_rpc import Server
 from sipyco import common_args
@@ -13,6 +12,7 @@ from sipyco.tools import SignalHandler
 from sipyco.keepalive import async_open_connection
 
 from artiq.coredevice.comm_mgmt import Request, Reply
+from artiq.coredevice.corelog import parse_log, LogStore
 
 logger = logging.getLogger(__name__)
 
@@ -28,21 +28,59 @@ def get_argparser():
     parser.add_argument("-s", "--drtio-dest", default=0,
                         metavar="DRTIO_DEST", type=int,
                         help="specifies the DRTIO destination")
+
+    group = parser.add_argument_group("storage")
+    group.add_argument("--store", default=None, metavar="DIRECTORY",
+                       help="also keep the log messages in this directory, "
+                            "where they can be queried through RPC")
+    group.add_argument("--store-segment-size", default=16, type=int,
+                       metavar="MIB",
+                       help="size of the files of the store, in MiB "
+                            "(default: %(default)s)")
+    group.add_argument("--store-max-segments", default=64, type=int,
+                       help="number of files kept in the store; older "
+                            "messages are deleted (default: %(default)s)")
     return parser
 
 
-class PingTarget:
+class CoreLog:
+    def __init__(self, store=None):
+        self.store = store
+
     def ping(self):
         return True
 
-
-async def get_logs_sim(host):
+    async def query(self, start=None, end=None, level=logging.NOTSET,
+                    module=None, limit=10000):
+        """Returns the stored log messages, as ``(timestamp, device_time,
+        level, name, message)`` tuples. See
+        :meth:`artiq.coredevice.corelog.LogStore.query` for the meaning of
+        the arguments."""
+        if self.store is None:
+            raise ValueError("Log storage is not enabled (use --store)")
+        # in a thread, so that the reception of log messages continues
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.store.query, start, end, level, module, limit)
+
+
+def process_logs(text, store):
+    records = parse_log(text)
+    if store is not None:
+        store.append(records)
+    for _, level, name, message in records:
+        name = "firmware." + name.replace("::", ".")
+        if logging.getLogger(name).isEnabledFor(level):
+            log_with_name(name, level, message)
+
+
+async def get_logs_sim(host, store):
     while True:
         await asyncio.sleep(2)
-        log_with_name("firmware.simulation", logging.INFO, "hello " + host)
+        process_logs("[     2.000000s]  INFO(simulation): hello " + host,
+                     store)
 
 
-async def get_logs(host, drtio_dest):
+async def get_logs(host, drtio_dest, store):
     try:
         reader, writer = await async_open_connection(
             host,
@@ -66,23 +104,7 @@ async def get_logs(host, drtio_dest):
         while True:
             length, = struct.unpack(endian + "l", await reader.readexactly(4))
             log = await reader.readexactly(length)
-
-            for line in log.decode("utf-8").splitlines():
-                m = re.match(r"^\[.+?\] (TRACE|DEBUG| INFO| WARN|ERROR)\((.+?)\): (.+)$", line)
-                levelname = m.group(1)
-                if levelname == 'TRACE':
-                    level = logging.TRACE
-                elif levelname == 'DEBUG':
-                    level = logging.DEBUG
-                elif levelname == ' INFO':
-                    level = logging.INFO
-                elif levelname == ' WARN':
-                    level = logging.WARN
-                elif levelname == 'ERROR':
-                    level = logging.ERROR
-                name = 'firmware.' + m.group(2).replace('::', '.')
-                text = m.group(3)
-                log_with_name(name, level, text)
+            process_logs(log.decode("utf-8", errors="replace"), store)
     except asyncio.CancelledError:
         raise
     except:
@@ -93,6 +115,11 @@ def main():
     args = get_argparser().parse_args()
     common_args.init_logger_from_args(args)
 
+    store = None
+    if args.store is not None:
+        store = LogStore(args.store, args.store_segment_size*2**20,
+                         args.store_max_segments)
+
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
@@ -100,9 +127,10 @@ def main():
         signal_handler.setup()
         try:
             get_logs_task = loop.create_task(
-                get_logs_sim(args.core_addr) if args.simulation else get_logs(args.core_addr, args.drtio_dest))
+                get_logs_sim(args.core_addr, store) if args.simulation
+                else get_logs(args.core_addr, args.drtio_dest, store))
             try:
-                server = Server({"corelog": PingTarget()}, None, True)
+                server = Server({"corelog": CoreLog(store)}, None, True)
                 loop.run_until_complete(server.start(common_args.bind_address_from_args(args), args.port))
                 try:
                     _, pending = loop.run_until_complete(asyncio.wait(
@@ -120,6 +148,8 @@ def main():
             signal_handler.teardown()
     finally:
         loop.close()
+        if store is not None:
+            store.close()
 
 if __name__ == "__main__":
     main()
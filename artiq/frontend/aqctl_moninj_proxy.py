@@ -11,7 +11,8 @@ from sipyco.tools import AsyncioServer, SignalHandler, atexit_register_coroutine
 from sipyco.pc_rpc import Server
 from sipyco import common_args
 
-from artiq.coredevice.comm_moninj import CommMonInj
+from artiq.coredevice.comm_moninj import (CommMonInj, PROTOCOL_VERSION_BATCH,
+                                          encode_monitor_batch)
 
 
 logger = logging.getLogger(__name__)
@@ -122,10 +123,15 @@ class MonitorMux:
 
 
 class ProxyConnection:
-    def __init__(self, monitor_mux, reader, writer):
+    def __init__(self, monitor_mux, reader, writer, batch_period=None):
         self.monitor_mux = monitor_mux
         self.reader = reader
         self.writer = writer
+        # If set, monitor events are coalesced, keeping only the latest value
+        # per (channel, probe), and sent in batches at this period.
+        self.batch_period = batch_period
+        self.pending_monitor = dict()
+        self.flush_handle = None
 
     async def handle(self):
         try:
@@ -152,28 +158,64 @@ class ProxyConnection:
                 else:
                     raise ValueError
         finally:
+            if self.flush_handle is not None:
+                self.flush_handle.cancel()
             self.monitor_mux.remove_listener(self)
 
+    def flush_monitor(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        events = [(channel, probe, value)
+                  for (channel, probe), value in self.pending_monitor.items()]
+        self.pending_monitor.clear()
+        self.writer.write(encode_monitor_batch(events))
+
     def monitor_cb(self, channel, probe, value):
-        packet = struct.pack("<blbq", 0, channel, probe, value)
-        self.writer.write(packet)
+        if self.batch_period is None:
+            packet = struct.pack("<blbq", 0, channel, probe, value)
+            self.writer.write(packet)
+        else:
+            self.pending_monitor[(channel, probe)] = value
+            if self.flush_handle is None:
+                self.flush_handle = asyncio.get_running_loop().call_later(
+                    self.batch_period, self.flush_monitor)
 
     def injection_status_cb(self, channel, override, value):
+        # keep the order of the events received from the core device
+        if self.pending_monitor:
+            self.flush_monitor()
         packet = struct.pack("<blbb", 1, channel, override, value)
         self.writer.write(packet)
 
 
 class ProxyServer(AsyncioServer):
-    def __init__(self, monitor_mux):
+    def __init__(self, monitor_mux, batch_period=0.02):
         AsyncioServer.__init__(self)
         self.monitor_mux = monitor_mux
+        self.batch_period = batch_period
 
     async def _handle_connection_cr(self, reader, writer):
         line = await reader.readline()
-        if line != b"ARTIQ moninj\n":
+        if line == b"ARTIQ moninj\n":
+            # same protocol as the core device
+            batch_period = None
+        elif line.startswith(b"ARTIQ moninj "):
+            # batched protocol, the client announces the highest version
+            # it supports
+            try:
+                version = int(line[len(b"ARTIQ moninj "):])
+            except ValueError:
+                logger.error("incorrect magic")
+                return
+            version = min(version, PROTOCOL_VERSION_BATCH)
+            writer.write("ARTIQ moninj {}\n".format(version).encode())
+            batch_period = self.batch_period if version >= PROTOCOL_VERSION_BATCH else None
+        else:
             logger.error("incorrect magic")
             return
-        await ProxyConnection(self.monitor_mux, reader, writer).handle()
+        await ProxyConnection(self.monitor_mux, reader, writer,
+                              batch_period).handle()
 
 
 def get_argparser():
@@ -186,6 +228,10 @@ def get_argparser():
     ])
     parser.add_argument("core_addr", metavar="CORE_ADDR",
                         help="hostname or IP address of the core device")
+    parser.add_argument("--batch-period", default=0.02, type=float,
+                        help="period in seconds at which coalesced monitor "
+                             "events are sent to clients supporting batches "
+                             "(default: %(default)s)")
     return parser
 
 
@@ -218,7 +264,7 @@ def main():
                              monitor_mux.disconnect_cb)
     monitor_mux.comm_moninj = comm_moninj
 
-    proxy_server = ProxyServer(monitor_mux)
+    proxy_server = ProxyServer(monitor_mux, args.batch_period)
 
     async def run_moninj_proxy():
         await comm_moninj.connect(args.core_addr)
@@ -18,6 +18,7 @@ from artiq import __artiq_dir__ as artiq_dir
 from artiq.tools import get_user_config_dir
 from artiq.gui import state, applets, models, log
 from artiq.browser import datasets, files, experiments
+from artiq.master.results_catalogue import ResultsCatalogue
 
 
 logger = logging.getLogger(__name__)
@@ -34,6 +35,11 @@ def get_argparser():
     parser.add_argument("--browse-root", default="",
                         help="root path for directory tree "
                         "(default %(default)s)")
+    parser.add_argument("--catalogue", default=None,
+                        help="results catalogue to search, created with "
+                        "artiq_results in the results directory it indexes "
+                        "(default: catalogue.sqlite in the browse root, "
+                        "if present)")
     parser.add_argument(
         "-s", "--server", default="::1",
         help="hostname or IP of the master to connect to "
@@ -49,7 +55,7 @@ def get_argparser():
 
 class Browser(QtWidgets.QMainWindow):
     def __init__(self, smgr, dataset_sub, dataset_ctl, browse_root,
-                 *, loop=None):
+                 *, catalogue=None, loop=None):
         QtWidgets.QMainWindow.__init__(self)
         smgr.register(self)
 
@@ -73,7 +79,7 @@ class Browser(QtWidgets.QMainWindow):
             QtCore.Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         self.setCentralWidget(self.experiments)
 
-        self.files = files.FilesDock(dataset_sub, browse_root)
+        self.files = files.FilesDock(dataset_sub, browse_root, catalogue)
         smgr.register(self.files)
 
         self.files.dataset_activated.connect(
@@ -156,8 +162,18 @@ def main():
     smgr = state.StateManager(args.db_file)
 
     dataset_ctl = datasets.DatasetCtl(args.server, args.port)
+    if args.catalogue is None:
+        default_catalogue = os.path.join(args.browse_root, "catalogue.sqlite")
+        if os.path.exists(default_catalogue):
+            args.catalogue = default_catalogue
+    catalogue = None
+    if args.catalogue is not None:
+        catalogue = ResultsCatalogue(os.path.dirname(args.catalogue),
+                                     args.catalogue)
+        atexit.register(catalogue.close)
+
     browser = Browser(smgr, dataset_sub, dataset_ctl, args.browse_root,
-                      loop=loop)
+                      catalogue=catalogue, loop=loop)
     widget_log_handler.callback = browser.log.model.append
 
     if os.name == "nt":
@@ -174,6 +190,8 @@ def main():
 
     browser.show()
     loop.run_until_complete(browser.exit_request.wait())
+    # do not wait for queued thumbnails and datasets at exit
+    browser.files.stop()
 
 
 if __name__ == "__main__":
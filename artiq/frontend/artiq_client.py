@@ -20,6 +20,7 @@ from sipyco.tools import SignalHandler, SimpleSSLConfig
 
 from artiq.tools import (scale_from_metadata, short_format, parse_arguments,
                          parse_devarg_override)
+from artiq.master.log import log_batch_channel
 from artiq import compat
 from artiq import __version__ as artiq_version
 
@@ -135,6 +136,11 @@ def get_argparser():
         choices=["schedule", "log", "ccb", "devices", "datasets",
                  "interactive-args"],
         help="select object to show: %(choices)s")
+    parser_show.add_argument(
+        "--log-level", default=None,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="minimum level of the log messages sent by the master "
+             "(default: all)")
 
     subparsers.add_parser(
         "scan-devices", help="trigger a device database (re)scan")
@@ -352,7 +358,15 @@ def _print_log_record(record):
 
 
 def _show_log(args):
-    subscriber = Receiver("log", [_print_log_record])
+    level = logging.NOTSET
+    if args.log_level is not None:
+        level = getattr(logging, args.log_level)
+
+    def print_log_batch(batch):
+        for record in batch:
+            if record[0] >= level:
+                _print_log_record(record)
+    subscriber = Receiver(log_batch_channel(level), [print_log_batch])
     port = 1067 if args.port is None else args.port
     ssl_config = SimpleSSLConfig(*args.ssl) if args.ssl else None
     _run_subscriber(args.server, port, subscriber, ssl_config)
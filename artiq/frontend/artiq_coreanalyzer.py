@@ -9,6 +9,7 @@ from artiq.master.databases import DeviceDB
 from artiq.master.worker_db import DeviceManager
 from artiq.coredevice.comm_analyzer import (get_analyzer_dump,
                                             decode_dump, decoded_dump_to_vcd)
+from artiq.coredevice.analyzer_trace import is_trace, Trace, dump_to_trace
 
 
 def get_argparser():
@@ -20,13 +21,16 @@ def get_argparser():
                         help="device database file (default: '%(default)s')")
 
     parser.add_argument("-r", "--read-dump", type=str, default=None,
-                        help="read raw dump file instead of accessing device")
+                        help="read raw dump or trace file instead of "
+                             "accessing device")
     parser.add_argument("-p", "--print-decoded", default=False,
                         action="store_true", help="print raw decoded messages")
     parser.add_argument("-w", "--write-vcd", type=str, default=None,
                         help="format and write contents to VCD file")
     parser.add_argument("-d", "--write-dump", type=str, default=None,
                         help="write raw dump file")
+    parser.add_argument("-t", "--write-trace", type=str, default=None,
+                        help="write compressed trace file")
 
     parser.add_argument("-u", "--vcd-uniform-interval", action="store_true",
                         help="emit uniform time intervals between timed VCD "
@@ -41,14 +45,19 @@ def main():
     common_args.init_logger_from_args(args)
 
     if (not args.print_decoded
-            and args.write_vcd is None and args.write_dump is None):
-        print("No action selected, use -p, -w and/or -d. See -h for help.")
+            and args.write_vcd is None and args.write_dump is None
+            and args.write_trace is None):
+        print("No action selected, use -p, -w, -d and/or -t. "
+              "See -h for help.")
         sys.exit(1)
 
     device_mgr = DeviceManager(DeviceDB(args.device_db))
     if args.read_dump:
         with open(args.read_dump, "rb") as f:
             dump = f.read()
+        if is_trace(dump):
+            with Trace(dump) as trace:
+                dump = trace.to_dump()
     else:
         core_addr = device_mgr.get_desc("core")["arguments"]["host"]
         dump = get_analyzer_dump(core_addr)
@@ -66,6 +75,9 @@ def main():
     if args.write_dump:
         with open(args.write_dump, "wb") as f:
             f.write(dump)
+    if args.write_trace:
+        with open(args.write_trace, "wb") as f:
+            dump_to_trace(dump, f)
 
 
 if __name__ == "__main__":
@@ -1,18 +1,22 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
 import os
 import struct
+import sys
 import tempfile
 import atexit
 
+from prettytable import PrettyTable
+
 from sipyco import common_args
 
 from artiq import __version__ as artiq_version
 from artiq.flashing import bit2bin, discover_bins
 from artiq.master.databases import DeviceDB
 from artiq.coredevice.comm_kernel import CommKernel
-from artiq.coredevice.comm_mgmt import CommMgmt
+from artiq.coredevice.comm_mgmt import CommMgmt, run_on_devices
 
 
 def get_argparser():
@@ -25,9 +29,19 @@ def get_argparser():
     common_args.verbosity_args(parser)
     parser.add_argument("--device-db", default="device_db.py",
                        help="device database file (default: '%(default)s')")
-    parser.add_argument("-D", "--device", default=None,
+    parser.add_argument("-D", "--device", default=[], action="append",
                         help="use specified core device address instead of "
-                             "reading device database")
+                             "reading device database (can be given several "
+                             "times)")
+    parser.add_argument("--device-list", default=None, metavar="FILE",
+                        help="file listing the addresses of the core "
+                             "devices, one per line, each optionally "
+                             "followed by the DRTIO destinations that "
+                             "receive the command")
+    parser.add_argument("-j", "--jobs", default=16, type=int,
+                        help="maximum number of core devices handled "
+                             "concurrently when there are several "
+                             "(default: %(default)s)")
 
     tools = parser.add_subparsers(dest="tool")
     tools.required = True
@@ -107,24 +121,49 @@ def get_argparser():
                                         help="show heap layout")
 
     # manage target
-    p_drtio_dest = parser.add_argument("-s", "--drtio-dest", default=0,
+    p_drtio_dest = parser.add_argument("-s", "--drtio-dest", default=[],
+                                       action="append",
                                        metavar="DRTIO_DEST", type=int,
                                        help="specify DRTIO destination that "
-                                            "receives this command")
+                                            "receives this command (can be "
+                                            "given several times)")
 
     return parser
 
 
-def main():
-    args = get_argparser().parse_args()
-    common_args.init_logger_from_args(args)
-
-    if args.device is None:
+def read_device_list(filename):
+    targets = []
+    with open(filename) as f:
+        for line in f:
+            fields = line.split("#")[0].split()
+            if fields:
+                destinations = [int(d) for d in fields[1:]] or [None]
+                targets += [(fields[0], d) for d in destinations]
+    return targets
+
+
+def get_targets(args):
+    """Returns the ``(address, DRTIO destination)`` pairs that receive the
+    command."""
+    devices = [(device, None) for device in args.device]
+    if args.device_list is not None:
+        devices += read_device_list(args.device_list)
+    if not devices:
         ddb = DeviceDB(args.device_db)
         core_addr = ddb.get("core", resolve_alias=True)["arguments"]["host"]
-    else:
-        core_addr = args.device
-    mgmt = CommMgmt(core_addr, drtio_dest=args.drtio_dest)
+        devices = [(core_addr, None)]
+    destinations = args.drtio_dest or [0]
+    targets = []
+    for address, drtio_dest in devices:
+        if drtio_dest is None:
+            targets += [(address, d) for d in destinations]
+        else:
+            targets.append((address, drtio_dest))
+    return targets
+
+
+def run_single(args, core_addr, drtio_dest):
+    mgmt = CommMgmt(core_addr, drtio_dest=drtio_dest)
 
     if args.tool == "log":
         if args.action == "clear":
@@ -154,17 +193,7 @@ def main():
             mgmt.config_erase()
 
     if args.tool == "flash":
-        retrieved_bins = discover_bins(args.path, args.srcbuild)
-
-        if len(retrieved_bins) == 0:
-            raise FileNotFoundError("neither risc-v nor zynq binaries were found")
-
-        if "boot" in retrieved_bins.keys() and len(retrieved_bins) > 1:
-            raise ValueError("both risc-v and zynq binaries were found, "
-                             "please clean up your build directory. ")
-
-        bins = retrieved_bins.values()
-        mgmt.flash(bins)
+        mgmt.flash(get_bins(args))
 
     if args.tool == "reboot":
         mgmt.reboot()
@@ -174,5 +203,108 @@ def main():
             mgmt.debug_allocator()
 
 
+def get_bins(args):
+    retrieved_bins = discover_bins(args.path, args.srcbuild)
+
+    if len(retrieved_bins) == 0:
+        raise FileNotFoundError("neither risc-v nor zynq binaries were found")
+
+    if "boot" in retrieved_bins.keys() and len(retrieved_bins) > 1:
+        raise ValueError("both risc-v and zynq binaries were found, "
+                         "please clean up your build directory. ")
+
+    return list(retrieved_bins.values())
+
+
+def run_batch(args, targets):
+    # Runs the command on all targets concurrently and prints the outcome as
+    # a table, with a column for each value that is read.
+    columns = []
+    if args.tool == "config" and args.action == "read":
+        columns = list(args.string)
+        output_files = {(address, drtio_dest, key):
+                        filename.format(address=address, dest=drtio_dest)
+                        for address, drtio_dest in targets
+                        for key, filename in args.file}
+        if len(set(output_files.values())) != len(output_files):
+            raise ValueError("file names must contain {address} and {dest} "
+                             "when reading from several devices")
+    if args.tool == "config" and args.action == "write":
+        values = [(key, value.encode("utf-8")) for key, value in args.string]
+        for key, filename in args.file:
+            with open(filename, "rb") as fi:
+                values.append((key, fi.read()))
+    if args.tool == "flash":
+        bins = get_bins(args)
+
+    async def operation(mgmt):
+        result = []
+        if args.tool == "log":
+            if args.action == "clear":
+                await mgmt.clear_log()
+            if args.action == None:
+                result.append(await mgmt.get_log())
+        if args.tool == "config":
+            if args.action == "read":
+                for key in args.string:
+                    value = await mgmt.config_read(key)
+                    result.append(value.decode("utf-8"))
+                for key, filename in args.file:
+                    value = await mgmt.config_read(key)
+                    with open(output_files[mgmt.host, mgmt.drtio_dest, key],
+                              "wb") as fi:
+                        fi.write(value)
+            if args.action == "write":
+                for key, value in values:
+                    await mgmt.config_write(key, value)
+            if args.action == "remove":
+                for key in args.key:
+                    await mgmt.config_remove(key)
+            if args.action == "erase":
+                await mgmt.config_erase()
+        if args.tool == "flash":
+            await mgmt.flash(bins)
+        if args.tool == "reboot":
+            await mgmt.reboot()
+        if args.tool == "debug":
+            if args.action == "allocator":
+                await mgmt.debug_allocator()
+        return result
+
+    results = asyncio.run(run_on_devices(targets, operation,
+                                         max_concurrency=args.jobs))
+
+    if args.tool == "log" and args.action == None:
+        for (address, drtio_dest), result in zip(targets, results):
+            if not isinstance(result, Exception):
+                print("==> {} (destination {}) <==".format(address,
+                                                         drtio_dest))
+                print(result[0], end="")
+        results = [r if isinstance(r, Exception) else [] for r in results]
+
+    table = PrettyTable(["Device", "Destination", "Status"] + columns)
+    table.align = "l"
+    for (address, drtio_dest), result in zip(targets, results):
+        if isinstance(result, Exception):
+            status = "{}: {}".format(type(result).__name__, result)
+            result = [""]*len(columns)
+        else:
+            status = "ok"
+        table.add_row([address, drtio_dest, status] + result)
+    print(table)
+    return all(not isinstance(result, Exception) for result in results)
+
+
+def main():
+    args = get_argparser().parse_args()
+    common_args.init_logger_from_args(args)
+
+    targets = get_targets(args)
+    if len(targets) == 1:
+        run_single(args, *targets[0])
+    elif not run_batch(args, targets):
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
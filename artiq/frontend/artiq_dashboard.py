@@ -20,11 +20,20 @@ from artiq import __artiq_dir__ as artiq_dir, __version__ as artiq_version
 from artiq.tools import get_user_config_dir
 from artiq.gui.models import ModelSubscriber
 from artiq.gui import state, log
+from artiq.master.log import log_batch_channel
 from artiq.dashboard import (experiments, shortcuts, explorer,
                              moninj, datasets, schedule, applets_ccb,
                              waveform, interactive_args)
 
 
+def _log_depth(value):
+    depth = int(value)
+    if depth < 1:
+        raise argparse.ArgumentTypeError(
+            "log depth must be at least 1, got {}".format(depth))
+    return depth
+
+
 def get_argparser():
     parser = argparse.ArgumentParser(description="ARTIQ Dashboard")
     parser.add_argument("--version", action="version",
@@ -64,6 +73,14 @@ def get_argparser():
     parser.add_argument(
         "--analyzer-proxy-timer-backoff", default=1.1, type=float,
         help="retry timer backoff multiplier to core analyzer proxy, (default: %(default)s)")
+    parser.add_argument(
+        "--log-depth", default=10000, type=_log_depth,
+        help="maximum number of entries kept by each log dock (default: %(default)s)")
+    parser.add_argument(
+        "--log-level", default=None,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="minimum level of the log messages sent by the master "
+             "(default: all)")
     common_args.verbosity_args(parser)
     return parser
 
@@ -188,9 +205,13 @@ def main():
         atexit_register_coroutine(subscriber.close, loop=loop)
         sub_clients[notifier_name] = subscriber
 
+    log_level = logging.NOTSET
+    if args.log_level is not None:
+        log_level = getattr(logging, args.log_level)
     broadcast_clients = dict()
-    for target in "log", "ccb":
-        client = Receiver(target, [], report_disconnect)
+    for target, channel in (("log", log_batch_channel(log_level)),
+                            ("ccb", "ccb")):
+        client = Receiver(channel, [], report_disconnect)
         loop.run_until_complete(client.connect(
             args.server, args.port_broadcast, ssl_config=ssl_config))
         atexit_register_coroutine(client.close, loop=loop)
@@ -261,9 +282,13 @@ def main():
         rpc_clients["schedule"], sub_clients["schedule"])
     smgr.register(d_schedule)
 
-    logmgr = log.LogDockManager(main_window)
+    logmgr = log.LogDockManager(main_window, args.log_depth)
     smgr.register(logmgr)
-    broadcast_clients["log"].notify_cbs.append(logmgr.append_message)
+    def append_log_batch(batch):
+        for message in batch:
+            if message[0] >= log_level:
+                logmgr.append_message(message)
+    broadcast_clients["log"].notify_cbs.append(append_log_batch)
     widget_log_handler.callback = logmgr.append_message
 
     # lay out docks
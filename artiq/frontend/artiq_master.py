@@ -14,7 +14,7 @@ from sipyco import common_args
 from sipyco.tools import atexit_register_coroutine, SignalHandler, SimpleSSLConfig
 
 from artiq import __version__ as artiq_version
-from artiq.master.log import log_args, init_log
+from artiq.master.log import log_args, init_log, LogBroadcaster
 from artiq.master.databases import (DeviceDB, DatasetDB,
                                     InteractiveArgDB)
 from artiq.master.scheduler import Scheduler
@@ -51,6 +51,10 @@ def get_argparser():
     group.add_argument(
         "-r", "--repository", default="repository",
         help="path to the repository (default: %(default)s)")
+    group.add_argument(
+        "--git-checkout-cache", default=4, type=int,
+        help="number of checkouts of the Git repository kept for reuse "
+             "(default: %(default)s)")
     group.add_argument(
         "--experiment-subdir", default="",
         help=("path to the experiment folder from the repository root "
@@ -62,6 +66,13 @@ def get_argparser():
                              "to identify master instead of server address")
     parser.add_argument("--log-submissions", default=None,
                         help="log experiment submissions to specified file")
+    parser.add_argument("--reuse-workers", default=0, type=int,
+                        metavar="N",
+                        help="keep up to N idle worker processes of completed "
+                             "experiments, and reuse them (with their "
+                             "controller clients and core device connection) "
+                             "for later experiments from the same repository "
+                             "revision (default: %(default)s)")
 
     return parser
 
@@ -85,7 +96,11 @@ def main():
         bind, args.port_broadcast, ssl_config=ssl_config))
     atexit_register_coroutine(server_broadcast.stop, loop=loop)
 
-    log_forwarder.callback = lambda msg: server_broadcast.broadcast("log", msg)
+    log_broadcaster = LogBroadcaster(server_broadcast.broadcast,
+                                     rate=args.log_rate, burst=args.log_burst)
+    log_broadcaster.start(loop=loop)
+    atexit_register_coroutine(log_broadcaster.stop, loop=loop)
+    log_forwarder.callback = log_broadcaster.put
     def ccb_issue(service, *args, **kwargs):
         msg = {
             "service": service,
@@ -103,14 +118,14 @@ def main():
     worker_handlers = dict()
 
     if args.git:
-        repo_backend = GitBackend(args.repository)
+        repo_backend = GitBackend(args.repository, args.git_checkout_cache)
     else:
         repo_backend = FilesystemBackend(args.repository)
     experiment_db = ExperimentDB(repo_backend, worker_handlers, args.experiment_subdir, loop=loop)
     atexit.register(experiment_db.close)
 
     scheduler = Scheduler(RIDCounter(), worker_handlers, experiment_db,
-                          args.log_submissions)
+                          args.log_submissions, args.reuse_workers)
     scheduler.start(loop=loop)
     atexit_register_coroutine(scheduler.stop, loop=loop)
 
@@ -121,8 +136,10 @@ def main():
     worker_handlers.update({
         "get_device_db": device_db.get_device_db,
         "get_device": device_db.get,
+        "get_device_db_snapshot": device_db.get_snapshot,
         "get_dataset": dataset_db.get,
         "get_dataset_metadata": dataset_db.get_metadata,
+        "get_datasets": dataset_db.get_many,
         "update_dataset": dataset_db.update,
         "get_interactive_arguments": get_interactive_arguments,
         "scheduler_submit": scheduler.submit,
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import time
+from datetime import datetime
+
+from sipyco import common_args
+
+from artiq.master.results_catalogue import ResultsCatalogue, parse_query
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_argparser():
+    parser = argparse.ArgumentParser(
+        description="ARTIQ results catalogue tool")
+
+    common_args.verbosity_args(parser)
+    parser.add_argument("-r", "--results", default="results",
+                        help="results directory (default: '%(default)s')")
+    parser.add_argument("-c", "--catalogue", default=None,
+                        help="catalogue database file "
+                             "(default: catalogue.sqlite in the results "
+                             "directory)")
+
+    action = parser.add_subparsers(dest="action")
+    action.required = True
+
+    p_update = action.add_parser("update",
+                                 help="index new and modified results files")
+    p_update.add_argument("--full", default=False, action="store_true",
+                          help="scan all directories, including those that "
+                               "have not been modified since the last update")
+    p_update.add_argument("--watch", default=None, type=float,
+                          metavar="SECONDS",
+                          help="keep running, updating the catalogue at this "
+                               "interval")
+
+    p_find = action.add_parser("find", help="search the catalogue")
+    p_find.add_argument("query", nargs="*",
+                        help="search terms: RID, class=NAME, "
+                             "file=SUBSTRING, rev=REV, dataset=NAME, "
+                             "or ARGUMENT=VALUE")
+    p_find.add_argument("--since", default=None,
+                        type=datetime.fromisoformat,
+                        help="earliest start time (ISO 8601)")
+    p_find.add_argument("--until", default=None,
+                        type=datetime.fromisoformat,
+                        help="latest start time (ISO 8601)")
+    p_find.add_argument("-n", "--limit", default=100, type=int,
+                        help="maximum number of results "
+                             "(default: %(default)s)")
+    p_find.add_argument("-d", "--datasets", default=False,
+                        action="store_true",
+                        help="also list the datasets of each result")
+
+    return parser
+
+
+def update(catalogue, args):
+    while True:
+        start = time.monotonic()
+        count = catalogue.update(full=args.full)
+        logger.info("indexed %d files in %.1f s",
+                    count, time.monotonic() - start)
+        if args.watch is None:
+            break
+        args.full = False
+        time.sleep(args.watch)
+
+
+def find(catalogue, args):
+    query = parse_query(" ".join(args.query))
+    if args.since is not None:
+        query["since"] = args.since.timestamp()
+    if args.until is not None:
+        query["until"] = args.until.timestamp()
+    for run in catalogue.find(limit=args.limit, **query):
+        start_time = "<none>"
+        if run.start_time is not None:
+            start_time = datetime.fromtimestamp(run.start_time).isoformat(
+                " ", "seconds")
+        print("{}  RID {}  {}  {}:{}".format(
+            start_time, run.rid, run.path, run.file, run.class_name))
+        if args.datasets:
+            for dataset in catalogue.get_datasets(run.path):
+                value = "" if dataset.value is None else dataset.value
+                print("    {} {} {} {}".format(
+                    dataset.name, dataset.dtype, dataset.shape, value))
+
+
+def main():
+    args = get_argparser().parse_args()
+    common_args.init_logger_from_args(args)
+    with ResultsCatalogue(args.results, args.catalogue) as catalogue:
+        if args.action == "update":
+            update(catalogue, args)
+        elif args.action == "find":
+            find(catalogue, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,12 @@ import unittest
 import random
 import itertools
 
+import numpy as np
 from migen import *
 from misoc.interconnect import wishbone
 
 from artiq.coredevice.exceptions import RTIOUnderflow, RTIODestinationUnreachable
+from artiq.coredevice.dma import encode_trace
 from artiq.gateware import rtio
 from artiq.gateware.rtio import dma, cri
 from artiq.gateware.rtio.phy import ttl_simple
@@ -102,6 +104,14 @@ class TB(Module):
         self.submodules.dut = dma.DMA(bus, dw)
 
 
+class HostTraceTB(Module):
+    def __init__(self, trace, ws, dw):
+        bus = wishbone.Interface(ws*8)
+        self.submodules.memory = wishbone.SRAM(
+            1024, init=pack(trace + b"\x00", ws, dw), bus=bus)
+        self.submodules.dut = dma.DMA(bus, dw)
+
+
 test_writes_full_stack = [
     (0, 32, 0, 1),
     (1, 40, 0, 1),
@@ -214,3 +224,37 @@ class TestDMA(unittest.TestCase):
                            for channel, timestamp, _, _ in test_writes_full_stack]
         self.assertEqual(ttl_changes[32], correct_changes)
         self.assertEqual(ttl_changes[64], correct_changes)
+
+    def test_host_encoded_trace(self):
+        channel = np.array([0x01, 0x901, 0x82, 0x81])
+        timestamp = np.array([0x23, 0x902, 0x289, 0x288])
+        address = np.array([0x12, 0x11, 0x99, 0x88])
+        data = np.array([0x33, 0xffffffff, 0x80000000, 0x8888])
+        wide = [[0x11223344, 0x55667788, 0x99]]
+        trace = (encode_trace(timestamp, channel, address, data) +
+                 encode_trace(0x10000, 0x10, 0x20, wide))
+        expected = list(zip(channel, timestamp, address, data)) + [
+            (0x10, 0x10000, 0x20, 0x99_55667788_11223344)]
+
+        for dw in 32, 64:
+            tb = HostTraceTB(trace, 64, dw)
+            received = []
+
+            @passive
+            def rtio_sim():
+                dut_cri = tb.dut.cri
+                while True:
+                    cmd = yield dut_cri.cmd
+                    if cmd == cri.commands["write"]:
+                        channel = yield dut_cri.chan_sel
+                        timestamp = yield dut_cri.o_timestamp
+                        address = yield dut_cri.o_address
+                        data = yield dut_cri.o_data
+                        received.append((channel, timestamp, address, data))
+                        yield dut_cri.o_status.eq(1)
+                        yield
+                        yield dut_cri.o_status.eq(0)
+                    yield
+
+            run_simulation(tb, [do_dma(tb.dut, 0), rtio_sim()])
+            self.assertEqual(received, expected)
@@ -0,0 +1,44 @@
+import unittest
+import random
+
+from artiq.sim.sed import *
+from artiq.gateware.test.rtio.test_sed_lane_distributor import (
+    simulate, LANE_COUNT)
+
+
+def _random_events(rng, n, channels=16):
+    # mostly increasing timestamps, with simultaneous events and rewinds
+    events = []
+    timestamp = 80
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.2:
+            timestamp -= rng.randrange(64)
+        elif r < 0.7:
+            timestamp += rng.randrange(1, 32)
+        events.append((rng.randrange(channels), max(timestamp, 0)))
+    return events
+
+
+class TestSEDModelLaneDistributor(unittest.TestCase):
+    def test_lane_distributor(self):
+        rng = random.Random(0)
+        for _ in range(4):
+            events = _random_events(rng, 100)
+            compensation = [rng.randrange(-2, 4) for _ in range(256)]
+            output, access_results = simulate(events, compensation,
+                                              wait=False)
+
+            model = SEDModel(LANE_COUNT, fifo_depth=1 << 20,
+                             compensation=compensation)
+            channel, timestamp = zip(*events)
+            # the simulation has a minimum coarse timestamp of 0
+            replay = model.replay(channel, timestamp, write_interval=0,
+                                  start=-model.underflow_margin)
+
+            status = {"ok": STATUS_OK, "underflow": STATUS_UNDERFLOW,
+                      "sequence_error": STATUS_SEQUENCE_ERROR}
+            self.assertEqual(replay.status.tolist(),
+                             [status[s] for s, _ in access_results])
+            self.assertEqual(replay.lane[replay.lane >= 0].tolist(),
+                             [lane for lane, *_ in output])
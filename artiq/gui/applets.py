@@ -18,6 +18,7 @@ from sipyco import pyon
 
 from artiq.gui.entries import procdesc_to_entry, EntryTreeWidget
 from artiq.gui.tools import QDockWidgetCloseDetect, LayoutWidget
+from artiq.gui.shm_datasets import SharedDatasetStore, is_shm_eligible
 
 
 logger = logging.getLogger(__name__)
@@ -91,13 +92,18 @@ class EntryArea(EntryTreeWidget):
 
 
 class AppletIPCServer(AsyncioParentComm):
-    def __init__(self, dataset_sub, dataset_ctl, expmgr):
+    def __init__(self, dataset_sub, dataset_ctl, expmgr, shm_store=None):
         AsyncioParentComm.__init__(self)
         self.dataset_sub = dataset_sub
         self.dataset_ctl = dataset_ctl
         self.expmgr = expmgr
         self.datasets = set()
         self.dataset_prefixes = []
+        self.shm_store = shm_store
+        # set when the applet announces support for shared memory
+        self.use_shm = False
+        # datasets currently sent to the applet through shared memory
+        self.shm_keys = set()
 
     def write_pyon(self, obj):
         self.write(pyon.encode(obj).encode() + b"\n")
@@ -119,6 +125,56 @@ class AppletIPCServer(AsyncioParentComm):
         return {"action": "init",
                 "struct": struct}
 
+    def _share_init(self, mod):
+        shm_refs = dict()
+        struct = dict()
+        self.shm_keys.clear()
+        for k, (persist, value, metadata) in mod["struct"].items():
+            if is_shm_eligible(value):
+                shm_refs[k] = self.shm_store.publish(k, value)
+                self.shm_keys.add(k)
+                value = None
+            struct[k] = (persist, value, metadata)
+        return {"action": "init", "struct": struct}, shm_refs
+
+    def _share_mod(self, key, mod):
+        # Any modification of a dataset that is (or was) in shared memory
+        # is turned into a replacement of the whole dataset.
+        try:
+            persist, value, metadata = self.dataset_sub.model.backing_store[key]
+        except KeyError:
+            if key in self.shm_keys:
+                self.shm_keys.discard(key)
+                self.shm_store.discard(key)
+            return mod, dict()
+        if is_shm_eligible(value):
+            self.shm_keys.add(key)
+            ref = self.shm_store.publish(key, value, mod)
+            shared_mod = {"action": "setitem", "path": [], "key": key,
+                          "value": (persist, None, metadata)}
+            # lets applets tell appends from other changes, see
+            # artiq.applets.simple.dataset_appends
+            if mod["action"] == "append" and mod["path"] == [key, 1]:
+                shared_mod["appended"] = 1
+            return shared_mod, {key: ref}
+        elif key in self.shm_keys:
+            self.shm_keys.discard(key)
+            self.shm_store.discard(key)
+            mod = {"action": "setitem", "path": [], "key": key,
+                   "value": (persist, value, metadata)}
+        return mod, dict()
+
+    def _write_mod(self, mod):
+        if not self.use_shm:
+            self.write_pyon({"action": "mod", "mod": mod})
+            return
+        if mod["action"] == "init":
+            mod, shm_refs = self._share_init(mod)
+        else:
+            key = mod["path"][0] if mod["path"] else mod["key"]
+            mod, shm_refs = self._share_mod(key, mod)
+        self.write_pyon({"action": "mod", "mod": mod, "shm": shm_refs})
+
     def _on_mod(self, mod):
         if mod["action"] == "init":
             if not (self.datasets or self.dataset_prefixes):
@@ -136,7 +192,7 @@ class AppletIPCServer(AsyncioParentComm):
             elif mod["action"] in {"setitem", "delitem"}:
                 if not self._is_dataset_subscribed(mod["key"]):
                     return
-        self.write_pyon({"action": "mod", "mod": mod})
+        self._write_mod(mod)
 
     async def serve(self, embed_cb):
         self.dataset_sub.notify_cbs.append(self._on_mod)
@@ -154,10 +210,12 @@ class AppletIPCServer(AsyncioParentComm):
                     elif action == "subscribe":
                         self.datasets = obj["datasets"]
                         self.dataset_prefixes = obj["dataset_prefixes"]
+                        self.use_shm = (self.shm_store is not None
+                                        and obj.get("shm", False))
                         if self.dataset_sub.model is not None:
                             mod = self._synthesize_init(
                                 self.dataset_sub.model.backing_store)
-                            self.write_pyon({"action": "mod", "mod": mod})
+                            self._write_mod(mod)
                     elif action == "set_dataset":
                         await self.dataset_ctl.set(obj["key"], obj["value"], metadata=obj["metadata"], persist=obj["persist"])
                     elif action == "update_dataset":
@@ -188,7 +246,8 @@ class AppletIPCServer(AsyncioParentComm):
 
 
 class _AppletDock(QDockWidgetCloseDetect):
-    def __init__(self, dataset_sub, dataset_ctl, expmgr, uid, name, spec, extra_substitutes):
+    def __init__(self, dataset_sub, dataset_ctl, expmgr, uid, name, spec, extra_substitutes,
+                 shm_store=None):
         QDockWidgetCloseDetect.__init__(self, "Applet: " + name)
         self.setObjectName("applet" + str(uid))
 
@@ -202,6 +261,7 @@ class _AppletDock(QDockWidgetCloseDetect):
         self.applet_name = name
         self.spec = spec
         self.extra_substitutes = extra_substitutes
+        self.shm_store = shm_store
 
         self.starting_stopping = False
 
@@ -217,7 +277,8 @@ class _AppletDock(QDockWidgetCloseDetect):
             return
         self.starting_stopping = True
         try:
-            self.ipc = AppletIPCServer(self.dataset_sub, self.dataset_ctl, self.expmgr)
+            self.ipc = AppletIPCServer(self.dataset_sub, self.dataset_ctl, self.expmgr,
+                                       self.shm_store)
             env = os.environ.copy()
             env["PYTHONUNBUFFERED"] = "1"
             env["ARTIQ_APPLET_EMBED"] = self.ipc.get_address()
@@ -428,6 +489,7 @@ class AppletsDock(QtWidgets.QDockWidget):
         self.expmgr = expmgr
         self.extra_substitutes = extra_substitutes
         self.applet_uids = set()
+        self.shm_store = SharedDatasetStore()
 
         self.background_tasks = BackgroundTaskPool(loop)
 
@@ -528,7 +590,8 @@ class AppletsDock(QtWidgets.QDockWidget):
             self.table.itemChanged.connect(self.item_changed)
 
     def create(self, item, name, spec):
-        dock = _AppletDock(self.dataset_sub, self.dataset_ctl, self.expmgr, item.applet_uid, name, spec, self.extra_substitutes)
+        dock = _AppletDock(self.dataset_sub, self.dataset_ctl, self.expmgr, item.applet_uid, name, spec,
+                           self.extra_substitutes, self.shm_store)
         self.main_window.addDockWidget(QtCore.Qt.DockWidgetArea.RightDockWidgetArea, dock)
         dock.setFloating(True)
         self.background_tasks.create(dock.start())
@@ -704,6 +767,7 @@ class AppletsDock(QtWidgets.QDockWidget):
                 else:
                     raise ValueError
         await walk(self.table.invisibleRootItem())
+        self.shm_store.close()
 
     def save_state_item(self, wi):
         state = []
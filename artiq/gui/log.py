@@ -9,11 +9,15 @@ from artiq.gui.tools import (LayoutWidget, log_level_to_name,
                              QDockWidgetCloseDetect)
 
 
-class _ModelItem:
-    def __init__(self, parent, row):
-        self.parent = parent
-        self.row = row
-        self.children_by_row = []
+class _LogEntry:
+    __slots__ = ("severity", "source", "timestamp", "lines", "seq")
+
+    def __init__(self, severity, source, timestamp, lines, seq):
+        self.severity = severity
+        self.source = source
+        self.timestamp = timestamp
+        self.lines = lines
+        self.seq = seq
 
 
 class _LogFilterProxyModel(QtCore.QSortFilterProxyModel):
@@ -25,17 +29,18 @@ class _LogFilterProxyModel(QtCore.QSortFilterProxyModel):
 
     def filterAcceptsRow(self, source_row, source_parent):
         source = self.sourceModel()
+        entry = source.entry_at(source_row, source_parent)
+        if entry.severity < self.filter_level:
+            return False
+
+        regex = self.filterRegularExpression()
+        if not regex.pattern():
+            return True
         index0 = source.index(source_row, 0, source_parent)
         index1 = source.index(source_row, 1, source_parent)
-        level = source.data(index0, QtCore.Qt.ItemDataRole.UserRole)
-
-        if level >= self.filter_level:
-            regex = self.filterRegularExpression()
-            index0_text = source.data(index0, QtCore.Qt.ItemDataRole.DisplayRole)
-            msg_text = source.data(index1, QtCore.Qt.ItemDataRole.DisplayRole)
-            return (regex.match(index0_text).hasMatch() or regex.match(msg_text).hasMatch())
-        else:
-            return False
+        index0_text = source.data(index0, QtCore.Qt.ItemDataRole.DisplayRole)
+        msg_text = source.data(index1, QtCore.Qt.ItemDataRole.DisplayRole)
+        return (regex.match(index0_text).hasMatch() or regex.match(msg_text).hasMatch())
 
     def apply_filter_level(self, filter_level):
         self.filter_level = getattr(logging, filter_level)
@@ -43,15 +48,27 @@ class _LogFilterProxyModel(QtCore.QSortFilterProxyModel):
 
 
 class _Model(QtCore.QAbstractItemModel):
-    def __init__(self, palette):
+    """Log model backed by a fixed-capacity ring buffer.
+
+    Appending and evicting entries are O(1). Continuation lines of
+    multi-line messages do not have their own objects: child indices
+    point to the entry they belong to, and are created on demand.
+    """
+    def __init__(self, palette, depth=10000):
         QtCore.QAbstractTableModel.__init__(self)
 
         self.headers = ["Timestamp", "Source", "Message"]
-        self.children_by_row = []
 
-        self.entries = []
+        if depth < 1:
+            raise ValueError("log depth must be at least 1")
+        self.depth = depth
+        self.ring = [None]*depth
+        # ring index of the oldest entry
+        self.head = 0
+        self.count = 0
+        # sequence number of the next appended entry
+        self.next_seq = 0
         self.pending_entries = []
-        self.depth = 1000
         timer = QtCore.QTimer(self)
         timer.timeout.connect(self.timer_tick)
         timer.start(100)
@@ -75,94 +92,110 @@ class _Model(QtCore.QAbstractItemModel):
             return self.headers[col]
         return None
 
+    def _entry(self, row):
+        return self.ring[(self.head + row) % self.depth]
+
+    def entry_at(self, row, parent):
+        if parent.isValid():
+            return self._entry(parent.row())
+        else:
+            return self._entry(row)
+
     def rowCount(self, parent):
         if parent.isValid():
-            item = parent.internalPointer()
-            return len(item.children_by_row)
+            if parent.internalPointer() is not self or parent.column() != 0:
+                return 0
+            return len(self._entry(parent.row()).lines) - 1
         else:
-            return len(self.entries)
+            return self.count
 
     def columnCount(self, parent):
         return len(self.headers)
 
     def append(self, v):
-        severity, source, timestamp, message = v
-        self.pending_entries.append((severity, source, timestamp,
-                                     message.splitlines()))
+        self.pending_entries.append(v)
 
     def clear(self):
-        self.beginRemoveRows(QtCore.QModelIndex(), 0, len(self.entries)-1)
-        self.entries.clear()
-        self.children_by_row.clear()
+        if not self.count:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), 0, self.count-1)
+        self.ring = [None]*self.depth
+        self.head = 0
+        self.count = 0
         self.endRemoveRows()
 
     def timer_tick(self):
         if not self.pending_entries:
             return
-        nrows = len(self.entries)
         records = self.pending_entries
         self.pending_entries = []
+        # records that would be evicted right away are never inserted
+        if len(records) > self.depth:
+            self.next_seq += len(records) - self.depth
+            records = records[-self.depth:]
+
+        overflow = self.count + len(records) - self.depth
+        if overflow > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow-1)
+            for i in range(overflow):
+                self.ring[(self.head + i) % self.depth] = None
+            self.head = (self.head + overflow) % self.depth
+            self.count -= overflow
+            self.endRemoveRows()
 
+        nrows = self.count
         self.beginInsertRows(QtCore.QModelIndex(), nrows, nrows+len(records)-1)
-        self.entries.extend(records)
-        for rec in records:
-            item = _ModelItem(self, len(self.children_by_row))
-            self.children_by_row.append(item)
-            for i in range(len(rec[3])-1):
-                item.children_by_row.append(_ModelItem(item, i))
+        tail = self.head + nrows
+        for i, (severity, source, timestamp, message) in enumerate(records):
+            self.ring[(tail + i) % self.depth] = _LogEntry(
+                severity, source, timestamp, message.splitlines() or [""],
+                self.next_seq)
+            self.next_seq += 1
+        self.count += len(records)
         self.endInsertRows()
 
-        if len(self.entries) > self.depth:
-            start = len(self.entries) - self.depth
-            self.beginRemoveRows(QtCore.QModelIndex(), 0, start-1)
-            self.entries = self.entries[start:]
-            self.children_by_row = self.children_by_row[start:]
-            for child in self.children_by_row:
-                child.row -= start
-            self.endRemoveRows()
-
     def index(self, row, column, parent):
         if parent.isValid():
-            parent_item = parent.internalPointer()
-            return self.createIndex(row, column,
-                                    parent_item.children_by_row[row])
+            return self.createIndex(row, column, self._entry(parent.row()))
         else:
-            return self.createIndex(row, column, self.children_by_row[row])
+            return self.createIndex(row, column, self)
 
     def parent(self, index):
         if index.isValid():
-            parent = index.internalPointer().parent
-            if parent is self:
+            entry = index.internalPointer()
+            if entry is self:
                 return QtCore.QModelIndex()
             else:
-                return self.createIndex(parent.row, 0, parent)
+                row = entry.seq - self._entry(0).seq
+                return self.createIndex(row, 0, self)
         else:
             return QtCore.QModelIndex()
 
     def full_entry(self, index):
         if not index.isValid():
             return
-        item = index.internalPointer()
-        if item.parent is self:
-            msgnum = item.row
-        else:
-            msgnum = item.parent.row
-        return self.entries[msgnum][3]
+        entry = index.internalPointer()
+        if entry is self:
+            entry = self._entry(index.row())
+        return entry.lines
 
     def data(self, index, role):
         if not index.isValid():
             return
 
-        item = index.internalPointer()
-        if item.parent is self:
-            msgnum = item.row
+        entry = index.internalPointer()
+        if entry is self:
+            msgnum = index.row()
+            entry = self._entry(msgnum)
+            lineno = 0
         else:
-            msgnum = item.parent.row
+            msgnum = None
+            lineno = index.row() + 1
 
         if role == QtCore.Qt.ItemDataRole.FontRole and index.column() == 2:
             return self.fixed_font
         elif role == QtCore.Qt.ItemDataRole.BackgroundRole:
-            level = self.entries[msgnum][0]
+            level = entry.severity
             if level >= logging.ERROR:
                 return self.error_bg
             elif level >= logging.WARNING:
@@ -170,46 +203,40 @@ class _Model(QtCore.QAbstractItemModel):
             else:
                 return self.default_bg
         elif role == QtCore.Qt.ItemDataRole.ForegroundRole:
-            level = self.entries[msgnum][0]
+            level = entry.severity
             if level <= logging.DEBUG:
                 return self.debug_fg
             else:
                 return self.default_fg
         elif role == QtCore.Qt.ItemDataRole.DisplayRole:
-            v = self.entries[msgnum]
             column = index.column()
-            if item.parent is self:
+            if lineno == 0:
                 if column == 0:
                     # use time delta instead of actual time when delta is small
                     if msgnum > 0:
-                        delta = v[2] - self.entries[msgnum-1][2]
+                        delta = entry.timestamp - self._entry(msgnum-1).timestamp
                         if delta <= 30:
                             return "+{:.9f}".format(delta)
-                    return time.strftime("%m/%d %H:%M:%S", time.localtime(v[2]))
+                    return time.strftime("%m/%d %H:%M:%S", time.localtime(entry.timestamp))
                 elif column == 1:
-                    return v[1]
+                    return entry.source
                 else:
-                    return v[3][0]
+                    return entry.lines[0]
             else:
                 if column == 0 or column == 1:
                     return ""
                 else:
-                    return v[3][item.row+1]
+                    return entry.lines[lineno]
         elif role == QtCore.Qt.ItemDataRole.ToolTipRole:
-            v = self.entries[msgnum]
-            if item.parent is self:
-                lineno = 0
-            else:
-                lineno = item.row + 1
-            return (log_level_to_name(v[0]) + ", " +
-                time.strftime("%m/%d %H:%M:%S", time.localtime(v[2])) +
-                "\n" + v[3][lineno])
+            return (log_level_to_name(entry.severity) + ", " +
+                time.strftime("%m/%d %H:%M:%S", time.localtime(entry.timestamp)) +
+                "\n" + entry.lines[lineno])
         elif role == QtCore.Qt.ItemDataRole.UserRole:
-            return self.entries[msgnum][0]
+            return entry.severity
 
 
 class LogDock(QDockWidgetCloseDetect):
-    def __init__(self, manager, name):
+    def __init__(self, manager, name, depth=10000):
         QDockWidgetCloseDetect.__init__(self, "Log")
         self.setObjectName(name)
 
@@ -273,7 +300,7 @@ class LogDock(QDockWidgetCloseDetect):
         cw = QtGui.QFontMetrics(self.font()).averageCharWidth()
         self.log.header().resizeSection(0, 26*cw)
 
-        self.model = _Model(self.palette())
+        self.model = _Model(self.palette(), depth)
         self.proxy_model = _LogFilterProxyModel()
         self.proxy_model.setSourceModel(self.model)
         self.log.setModel(self.proxy_model)
@@ -372,8 +399,9 @@ class LogDock(QDockWidgetCloseDetect):
 
 
 class LogDockManager:
-    def __init__(self, main_window):
+    def __init__(self, main_window, depth=10000):
         self.main_window = main_window
+        self.depth = depth
         self.docks = dict()
 
     def append_message(self, msg):
@@ -387,7 +415,7 @@ class LogDockManager:
             n += 1
             name = "log" + str(n)
 
-        dock = LogDock(self, name)
+        dock = LogDock(self, name, self.depth)
         self.docks[name] = dock
         if add_to_area:
             self.main_window.addDockWidget(QtCore.Qt.DockWidgetArea.RightDockWidgetArea, dock)
@@ -417,7 +445,7 @@ class LogDockManager:
         if self.docks:
             raise NotImplementedError
         for name, dock_state in state.items():
-            dock = LogDock(self, name)
+            dock = LogDock(self, name, self.depth)
             self.docks[name] = dock
             dock.restore_state(dock_state)
             self.main_window.addDockWidget(QtCore.Qt.DockWidgetArea.RightDockWidgetArea, dock)
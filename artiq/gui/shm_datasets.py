@@ -0,0 +1,230 @@
+"""Shared-memory transport of large array datasets to embedded applets.
+
+The dashboard copies each large array dataset once into a shared-memory
+segment, and embedded applets copy it out of that segment instead of
+receiving the value PYON-encoded through their IPC pipe.
+
+Each segment holds two slots that are written alternately, and a header with
+the version currently stored in each slot. The dashboard does not wait for
+applets: a slot may be overwritten (e.g. by several modifications, or by the
+initial values sent to another applet) before an applet reads it, and a
+segment is replaced when its dataset outgrows it. Applets detect this from
+the version header, or from the segment being gone, and then request a full
+resynchronization.
+"""
+
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+
+# Arrays smaller than this are cheaper to send through the pipe.
+SHM_THRESHOLD = 64*1024
+
+# Holds the version of the data in each slot, 0 while it is being written.
+_HEADER_SIZE = 64
+
+# names of the segments created by this process
+_owned_segments = set()
+
+
+def is_shm_eligible(value):
+    return (isinstance(value, np.ndarray)
+            and value.dtype.kind in "biufc"
+            and value.nbytes >= SHM_THRESHOLD)
+
+
+class StaleSharedDataset(Exception):
+    """Raised by :class:`SharedDatasetReader` when the version of a dataset
+    named by a notification is no longer available in shared memory."""
+
+
+def _slot_versions(shm):
+    return np.ndarray((2,), np.uint64, buffer=shm.buf)
+
+
+class _Segment:
+    def __init__(self, slot_size):
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=_HEADER_SIZE + 2*slot_size)
+        _owned_segments.add(self.shm.name)
+        self.versions = _slot_versions(self.shm)
+        self.versions[:] = 0
+        self.version = 0
+        self.shape = None
+        self.dtype = None
+        # keeps the last published mod alive so that its id is not reused
+        self.last_mod = None
+
+    def _slot(self, slot, shape, dtype):
+        return np.ndarray(shape, dtype, buffer=self.shm.buf,
+                          offset=_HEADER_SIZE + slot*self.slot_size)
+
+    def holds(self, value):
+        if (self.version == 0
+                or value.shape != self.shape or value.dtype != self.dtype):
+            return False
+        current = self._slot(self.version % 2, self.shape, self.dtype)
+        try:
+            return np.array_equal(current, value)
+        finally:
+            del current
+
+    def write(self, value):
+        self.version += 1
+        slot = self.version % 2
+        self.versions[slot] = 0
+        dst = self._slot(slot, value.shape, value.dtype)
+        dst[...] = value
+        del dst
+        self.versions[slot] = self.version
+        self.shape = value.shape
+        self.dtype = value.dtype
+        return slot
+
+    def release(self):
+        del self.versions
+        self.shm.close()
+        self.shm.unlink()
+        _owned_segments.discard(self.shm.name)
+
+
+class SharedDatasetStore:
+    """Owns the shared-memory segments holding large array datasets.
+
+    One store is shared by all applet IPC servers of a dock, so that a
+    dataset modification is copied to shared memory once regardless of the
+    number of applets subscribed to it.
+    """
+    def __init__(self):
+        self.segments = dict()
+
+    def publish(self, key, value, mod=None):
+        """Makes the current value of a dataset available in shared memory
+        and returns the reference to send to applets.
+
+        ``mod`` is the modification that caused the update. Applet servers
+        processing the same modification share a single copy. Without
+        ``mod`` (e.g. when sending the initial values to an applet), the
+        current version is reused if it holds the same value, so that the
+        versions still to be read by other applets are not overwritten.
+        """
+        value = np.ascontiguousarray(value)
+        segment = self.segments.get(key)
+        if segment is None or value.nbytes > segment.slot_size:
+            if segment is not None:
+                segment.release()
+            # leave room for datasets that grow by appending
+            slot_size = 1 << max(value.nbytes - 1, 0).bit_length()
+            segment = _Segment(slot_size)
+            self.segments[key] = segment
+            slot = segment.write(value)
+        elif (mod is not None and mod is segment.last_mod
+                or mod is None and segment.holds(value)):
+            slot = segment.version % 2
+        else:
+            slot = segment.write(value)
+        segment.last_mod = mod
+        return {
+            "name": segment.shm.name,
+            "slot": slot,
+            "offset": _HEADER_SIZE + slot*segment.slot_size,
+            "version": segment.version,
+            "shape": value.shape,
+            "dtype": value.dtype.str
+        }
+
+    def discard(self, key):
+        segment = self.segments.pop(key, None)
+        if segment is not None:
+            segment.release()
+
+    def close(self):
+        for segment in self.segments.values():
+            segment.release()
+        self.segments.clear()
+
+
+class SharedDatasetReader:
+    """Applet-side counterpart of :class:`SharedDatasetStore`.
+
+    Arrays returned by :meth:`resolve` are copies that the applet owns.
+    """
+    def __init__(self):
+        self.mappings = dict()
+        self.key_to_name = dict()
+
+    def _attach(self, name):
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            # the dashboard replaced the segment after sending the reference
+            raise StaleSharedDataset(name) from None
+        # The dashboard owns the segment. Without this, the resource
+        # tracker of the applet process would unlink it when the applet
+        # exits.
+        if name not in _owned_segments:
+            try:
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        return shm
+
+    def _detach(self, name):
+        shm = self.mappings.pop(name, None)
+        if shm is not None:
+            shm.close()
+
+    def resolve(self, key, ref):
+        """Returns a copy of the dataset version named by ``ref``.
+
+        Raises :class:`StaleSharedDataset` if that version has been
+        overwritten or its segment has been released.
+        """
+        name = ref["name"]
+        # each dataset has its own segment in the dashboard, and segments
+        # are only replaced when a dataset outgrows them
+        old_name = self.key_to_name.get(key)
+        if old_name is not None and old_name != name:
+            del self.key_to_name[key]
+            self._detach(old_name)
+        shm = self.mappings.get(name)
+        if shm is None:
+            shm = self._attach(name)
+            self.mappings[name] = shm
+        self.key_to_name[key] = name
+
+        versions = _slot_versions(shm)
+        slot, version = ref["slot"], ref["version"]
+        try:
+            if versions[slot] != version:
+                raise StaleSharedDataset(name)
+            src = np.ndarray(tuple(ref["shape"]), np.dtype(ref["dtype"]),
+                             buffer=shm.buf, offset=ref["offset"])
+            value = src.copy()
+            del src
+            # the slot may have been rewritten while it was being copied
+            if versions[slot] != version:
+                raise StaleSharedDataset(name)
+        finally:
+            del versions
+        return value
+
+    def resolve_struct(self, struct, shm_refs):
+        """Replaces the placeholders of shared datasets in ``struct`` (a dict
+        of ``(persist, value, metadata)`` tuples) with their values."""
+        for key, ref in shm_refs.items():
+            persist, _, metadata = struct[key]
+            struct[key] = (persist, self.resolve(key, ref), metadata)
+
+    def discard(self, key):
+        name = self.key_to_name.pop(key, None)
+        if name is not None:
+            self._detach(name)
+
+    def close(self):
+        for shm in self.mappings.values():
+            shm.close()
+        self.mappings.clear()
+        self.key_to_name.clear()
@@ -8,8 +8,8 @@ import numpy
 
 
 __all__ = ["kernel", "portable", "rpc", "subkernel", "syscall", "host_only",
-           "kernel_from_string", "set_time_manager", "set_watchdog_factory",
-           "TerminationRequested"]
+           "host_vectorized", "kernel_from_string", "set_time_manager",
+           "set_watchdog_factory", "TerminationRequested"]
 
 # global namespace for kernels
 kernel_globals = (
@@ -184,6 +184,28 @@ def host_only(function):
     return function
 
 
+def host_vectorized(vectorized):
+    """
+    This decorator adds a vectorized implementation to a portable function.
+
+    When the decorated function is called on the host with a list, tuple or
+    NumPy array as any of its positional arguments, ``vectorized`` is called
+    with the same arguments instead. Kernels always use the portable function.
+
+    The vectorized implementation must give the same results as the portable
+    function executed on the host, and raise the same exceptions.
+    """
+    def inner_decorator(function):
+        @wraps(function)
+        def dispatch(*args, **kwargs):
+            for arg in args:
+                if isinstance(arg, (list, tuple, numpy.ndarray)):
+                    return vectorized(*args, **kwargs)
+            return function(*args, **kwargs)
+        return dispatch
+    return inner_decorator
+
+
 def kernel_from_string(parameters, body_code, decorator=kernel):
     """Build a kernel function from the supplied source code in string form,
     similar to ``exec()``/``eval()``.
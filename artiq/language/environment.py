@@ -256,7 +256,20 @@ class ProcessArgumentManager:
 
 class HasEnvironment:
     """Provides methods to manage the environment of an experiment (arguments,
-    devices, datasets)."""
+    devices, datasets).
+
+    Subclasses can list the keys of the datasets they read in the
+    ``prefetch_datasets`` class attribute. These datasets are then fetched
+    from the master in a single request before :meth:`build` is called,
+    instead of one request for each call to :meth:`get_dataset`.
+
+    Prefetched datasets, and those obtained with :meth:`get_datasets`, are
+    only kept during the build and prepare stages: reading them again in
+    these stages returns the same values, even if the master has changed
+    them in the meantime. From the run stage on, every read of a dataset
+    that was not set by the experiment gets its current value."""
+    prefetch_datasets = ()
+
     def __init__(self, managers_or_parent, *args, **kwargs):
         self.children = []
         if isinstance(managers_or_parent, tuple):
@@ -271,6 +284,9 @@ class HasEnvironment:
             self.__scheduler_defaults = {}
             managers_or_parent.register_child(self)
 
+        if self.prefetch_datasets:
+            self.__dataset_mgr.prefetch(self.prefetch_datasets)
+
         self.__in_build = True
         self.build(*args, **kwargs)
         self.__in_build = False
@@ -473,6 +489,22 @@ class HasEnvironment:
             else:
                 return default
 
+    def get_datasets(self, keys=None, *, prefix=None, archive=True):
+        """Returns a dictionary with the contents of several datasets,
+        given either by their keys or by a common ``prefix`` of their keys.
+
+        This is equivalent to calling :meth:`get_dataset` for each key, but
+        the datasets that are not in the local storage are obtained from the
+        master in a single request. Datasets that do not exist are omitted
+        from the result.
+
+        :param archive: Set to ``False`` to prevent archival together with the run's results.
+            Default is ``True``.
+        """
+        if (keys is None) == (prefix is None):
+            raise ValueError("Exactly one of keys and prefix must be given")
+        return self.__dataset_mgr.get_many(keys, prefix, archive)
+
     def get_dataset_metadata(self, key, default=NoDefault):
         """Returns the metadata of a dataset.
          
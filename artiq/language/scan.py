@@ -7,6 +7,8 @@ import random
 import inspect
 from itertools import product
 
+import numpy as np
+
 from artiq.language.core import *
 from artiq.language.environment import NoDefault, DefaultMissing
 from artiq.language import units
@@ -42,6 +44,119 @@ class ScanObject:
     def describe(self):
         raise NotImplementedError
 
+    def as_array(self):
+        """Returns the values of the scan, in order, as a NumPy array.
+
+        This is faster than iterating on the scan, and convenient for
+        passing a whole scan to a kernel in a single RPC."""
+        return np.array(list(self))
+
+
+class _Permutation:
+    # Pseudorandom permutation of range(n). Up to ``table_size`` points,
+    # the indices are shuffled with random.Random, which gives the same
+    # orders as scans that are not generated lazily. Larger permutations
+    # are evaluated at any index in constant time and memory: a balanced
+    # Feistel network on the smallest even number of bits covering n,
+    # with a keyed 64-bit mixing function as the round function and cycle
+    # walking for indices beyond n. Works on integers and on NumPy arrays
+    # of uint64.
+    table_size = 1 << 16
+    rounds = 8
+    _mask64 = (1 << 64) - 1
+
+    def __init__(self, n, seed=None):
+        self.n = n
+        rng = random.Random(seed)
+        if n <= self.table_size:
+            self.table = list(range(n))
+            rng.shuffle(self.table)
+            return
+        self.table = None
+        self.half_bits = max(1, ((n - 1).bit_length() + 1)//2)
+        self.half_mask = (1 << self.half_bits) - 1
+        self.keys = [rng.getrandbits(64) for _ in range(self.rounds)]
+
+    def _round(self, x, key):
+        # SplitMix64 finalizer of the keyed half
+        x = (x + key) & self._mask64
+        x = ((x ^ (x >> 30))*0xbf58476d1ce4e5b9) & self._mask64
+        x = ((x ^ (x >> 27))*0x94d049bb133111eb) & self._mask64
+        return x ^ (x >> 31)
+
+    def _feistel(self, x):
+        h = self.half_bits
+        m = self.half_mask
+        left, right = x >> h, x & m
+        for key in self.keys:
+            left, right = right, left ^ (self._round(right, key) & m)
+        return (left << h) | right
+
+    def __getitem__(self, i):
+        if self.table is not None:
+            return self.table[i]
+        i = self._feistel(i)
+        while i >= self.n:
+            i = self._feistel(i)
+        return i
+
+    def as_array(self):
+        if self.table is not None:
+            return np.array(self.table, dtype=np.int64)
+        i = self._feistel(np.arange(self.n, dtype=np.uint64))
+        outside = i >= self.n
+        while outside.any():
+            i[outside] = self._feistel(i[outside])
+            outside = i >= self.n
+        return i.astype(np.int64)
+
+
+class _LazySequence:
+    # Scans whose points are computed on the fly from their index. The
+    # list of points is only built if the ``sequence`` attribute is
+    # accessed, e.g. by a kernel.
+    def _value(self, i):
+        raise NotImplementedError
+
+    def _values(self, i):
+        raise NotImplementedError
+
+    def _init_order(self, randomize, seed):
+        if randomize and len(self) > 1:
+            self._permutation = _Permutation(len(self), seed)
+        else:
+            self._permutation = None
+
+    def __getattr__(self, name):
+        if name == "sequence":
+            self.sequence = list(self)
+            return self.sequence
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            type(self).__name__, name))
+
+    def _gen(self):
+        permutation = self._permutation
+        if permutation is None:
+            for i in range(len(self)):
+                yield self._value(i)
+        else:
+            for i in range(len(self)):
+                yield self._value(permutation[i])
+
+    def __iter__(self):
+        if "sequence" in self.__dict__:
+            return iter(self.sequence)
+        return self._gen()
+
+    def as_array(self):
+        if "sequence" in self.__dict__:
+            return np.array(self.sequence)
+        if self._permutation is None:
+            i = np.arange(len(self))
+        else:
+            i = self._permutation.as_array()
+        return self._values(i)
+
 
 class NoScan(ScanObject):
     """A scan object that yields a single value for a specified number
@@ -64,8 +179,11 @@ class NoScan(ScanObject):
         return {"ty": "NoScan", "value": self.value,
                 "repetitions": self.repetitions}
 
+    def as_array(self):
+        return np.full(self.repetitions, self.value)
 
-class RangeScan(ScanObject):
+
+class RangeScan(_LazySequence, ScanObject):
     """A scan object that yields a fixed number of evenly spaced values in a
     range. If ``randomize`` is True the points are randomly ordered."""
     def __init__(self, start, stop, npoints, randomize=False, seed=None):
@@ -75,22 +193,24 @@ class RangeScan(ScanObject):
         self.randomize = randomize
         self.seed = seed
 
-        if npoints == 0:
-            self.sequence = []
-        if npoints == 1:
-            self.sequence = [self.start]
+        if npoints > 1:
+            self._dx = (stop - start)/(npoints - 1)
         else:
-            dx = (stop - start)/(npoints - 1)
-            self.sequence = [i*dx + start for i in range(npoints)]
+            self._dx = 0
+        self._init_order(randomize, seed)
 
-        if randomize:
-            random.Random(seed).shuffle(self.sequence)
+    def _value(self, i):
+        if self.npoints == 1:
+            return self.start
+        return i*self._dx + self.start
 
-    def __iter__(self):
-        return iter(self.sequence)
+    def _values(self, i):
+        if self.npoints == 1:
+            return np.array([self.start])
+        return i*self._dx + self.start
 
     def __len__(self):
-        return self.npoints
+        return max(self.npoints, 0)
 
     def describe(self):
         return {"ty": "RangeScan",
@@ -100,7 +220,7 @@ class RangeScan(ScanObject):
                 "seed": self.seed}
 
 
-class CenterScan(ScanObject):
+class CenterScan(_LazySequence, ScanObject):
     """A scan object that yields evenly spaced values within a span around a
     center. If ``step`` is finite, then ``center`` is always included.
     Values outside ``span`` around center are never included.
@@ -113,20 +233,22 @@ class CenterScan(ScanObject):
         self.seed = seed
 
         if step == 0.:
-            self.sequence = []
+            self._npoints = 0
         else:
-            n = 1 + int(span/(2.*step))
-            self.sequence = [center + sign*i*step
-                             for i in range(n) for sign in [-1, 1]][1:]
+            # center, then alternately below and above it
+            self._npoints = 2*(1 + int(span/(2.*step))) - 1
+        self._init_order(randomize, seed)
 
-        if randomize:
-            random.Random(seed).shuffle(self.sequence)
+    def _value(self, i):
+        j = i + 1
+        return self.center + (2*(j % 2) - 1)*(j//2)*self.step
 
-    def __iter__(self):
-        return iter(self.sequence)
+    def _values(self, i):
+        j = i + 1
+        return self.center + (2*(j % 2) - 1)*(j//2)*self.step
 
     def __len__(self):
-        return len(self.sequence)
+        return max(self._npoints, 0)
 
     def describe(self):
         return {"ty": "CenterScan",
@@ -150,6 +272,9 @@ class ExplicitScan(ScanObject):
     def describe(self):
         return {"ty": "ExplicitScan", "sequence": self.sequence}
 
+    def as_array(self):
+        return np.array(self.sequence)
+
 
 _ty_to_scan = {
     "NoScan": NoScan,
@@ -246,6 +371,20 @@ class Scannable:
         return d
 
 
+class _ScanPoint:
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return ("<ScanPoint " +
+            " ".join("{}={}".format(k, getattr(self, k))
+                     for k in self.__slots__) +
+            ">")
+
+
 class MultiScanManager:
     """
     Makes an iterator that returns elements from the first scan object until
@@ -262,25 +401,28 @@ class MultiScanManager:
         self.names = [a[0] for a in args]
         self.scan_objects = [a[1] for a in args]
 
-        class ScanPoint:
-            def __init__(self, **kwargs):
-                self.attr = set()
-                for k, v in kwargs.items():
-                    setattr(self, k, v)
-                    self.attr.add(k)
-
-            def __repr__(self):
-                return ("<ScanPoint " +
-                    " ".join("{}={}".format(k, getattr(self, k))
-                             for k in self.attr) +
-                    ">")
-
-        self.scan_point_cls = ScanPoint
+        self.scan_point_cls = type("ScanPoint", (_ScanPoint, ), {
+            "__slots__": tuple(self.names),
+            "attr": frozenset(self.names),
+        })
 
     def _gen(self):
+        scan_point_cls = self.scan_point_cls
         for values in product(*self.scan_objects):
-            d = {k: v for k, v in zip(self.names, values)}
-            yield self.scan_point_cls(**d)
+            yield scan_point_cls(*values)
 
     def __iter__(self):
         return self._gen()
+
+    def __len__(self):
+        n = 1
+        for scan_object in self.scan_objects:
+            n *= len(scan_object)
+        return n
+
+    def as_array(self):
+        """Returns all the scan points, in order, as a two-dimensional NumPy
+        array with one row per point and one column per scan object."""
+        columns = np.meshgrid(*(s.as_array() for s in self.scan_objects),
+                              indexing="ij")
+        return np.stack([c.ravel() for c in columns], axis=-1)
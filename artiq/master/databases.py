@@ -20,23 +20,65 @@ def device_db_from_file(filename):
     return mod.__dict__["device_db"]
 
 
+def resolve_aliases(device_db):
+    """Returns a dictionary that maps each alias of the device database to
+    the name of the entry it ultimately refers to. Aliases in a cycle are
+    mapped to ``None``."""
+    aliases = dict()
+    for key, desc in device_db.items():
+        if not isinstance(desc, str):
+            continue
+        seen = {key}
+        while isinstance(desc, str):
+            if desc in seen:
+                target = None
+                break
+            seen.add(desc)
+            target, desc = desc, device_db.get(desc)
+        aliases[key] = target
+    return aliases
+
+
 class DeviceDB:
     def __init__(self, backing_file):
         self.backing_file = backing_file
         self.data = Notifier(device_db_from_file(self.backing_file))
+        self.version = 0
+        self._aliases = None
 
     def scan(self):
         update_from_dict(self.data, device_db_from_file(self.backing_file))
+        self.version += 1
+        self._aliases = None
 
     def get_device_db(self):
         return self.data.raw_view
 
+    def get_aliases(self):
+        """Returns the alias table of the device database (see
+        :func:`resolve_aliases`), which is computed once per scan."""
+        if self._aliases is None:
+            self._aliases = resolve_aliases(self.data.raw_view)
+        return self._aliases
+
+    def get_snapshot(self, version=None):
+        """Returns the contents of the device database together with its
+        alias table and version, or ``None`` if ``version`` is still the
+        current version. The version changes on each :meth:`scan`."""
+        if version == self.version:
+            return None
+        return {
+            "version": self.version,
+            "device_db": self.data.raw_view,
+            "aliases": self.get_aliases()
+        }
+
     def get(self, key, resolve_alias=False):
-        desc = self.data.raw_view[key]
         if resolve_alias:
-            while isinstance(desc, str):
-                desc = self.data.raw_view[desc]
-        return desc
+            key = self.get_aliases().get(key, key)
+            if key is None:
+                raise ValueError("Device alias cycle")
+        return self.data.raw_view[key]
 
     def get_satellite_cpu_target(self, destination):
         return self.data.raw_view["satellite_cpu_targets"][destination]
@@ -86,6 +128,16 @@ class DatasetDB(TaskObject):
     def get_metadata(self, key):
         return self.data.raw_view[key][2]
 
+    def get_many(self, keys=None, prefix=None):
+        """Returns a dictionary that maps the given keys, or all the keys that
+        start with ``prefix``, to the values and metadata of the datasets.
+        Keys that do not exist are omitted."""
+        data = self.data.raw_view
+        if keys is None:
+            keys = [key for key in data if key.startswith(prefix)]
+        return {key: (data[key][1], data[key][2])
+                for key in keys if key in data}
+
     def update(self, mod):
         if mod["path"]:
             key = mod["path"][0]
@@ -1,9 +1,11 @@
 import asyncio
 import os
+import glob
 import tempfile
 import shutil
 import time
 import logging
+from collections import OrderedDict
 
 from sipyco.sync_struct import Notifier, update_from_dict
 
@@ -103,6 +105,7 @@ class ExperimentDB:
     def close(self):
         # The object cannot be used anymore after calling this method.
         self.repo_backend.release_rev(self.cur_rev)
+        self.repo_backend.close()
 
     async def scan_repository(self, new_cur_rev=None):
         if self._scanning:
@@ -176,30 +179,103 @@ class FilesystemBackend:
     def release_rev(self, rev):
         pass
 
+    def close(self):
+        pass
+
+
+_GIT_FILEMODE_LINK = 0o120000
+_GIT_FILEMODE_COMMIT = 0o160000
+
+
+def _remove_checkout_file(root, filename):
+    path = os.path.join(root, filename)
+    if os.path.lexists(path):
+        os.remove(path)
+    directory, name = os.path.split(path)
+    if name.endswith(".py"):
+        for pyc in glob.glob(os.path.join(
+                glob.escape(directory), "__pycache__",
+                glob.escape(name[:-3]) + ".*.pyc")):
+            os.remove(pyc)
+    # remove the directories left empty, except for bytecode
+    while directory != root:
+        pycache = os.path.join(directory, "__pycache__")
+        if os.path.isdir(pycache) and not os.listdir(pycache):
+            os.rmdir(pycache)
+        if os.listdir(directory):
+            break
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
+
 
 class _GitCheckout:
     def __init__(self, git, rev):
         self.path = tempfile.mkdtemp()
         commit = git.get(rev)
         git.checkout_tree(commit, directory=self.path)
+        self.tree = commit.tree
         self.message = commit.message.strip()
         self.ref_count = 1
         logger.info("checked out revision %s into %s", rev, self.path)
 
+    def update(self, git, rev):
+        """Changes the checkout to another revision, only writing the files
+        that differ between the two revisions."""
+        commit = git.get(rev)
+        deltas = list(self.tree.diff_to_tree(commit.tree).deltas)
+        # Delete first, so that files and directories can replace each
+        # other.
+        for delta in deltas:
+            if (delta.status_char() != "A"
+                    and delta.old_file.mode != _GIT_FILEMODE_COMMIT):
+                _remove_checkout_file(self.path, delta.old_file.path)
+        for delta in deltas:
+            new_file = delta.new_file
+            if delta.status_char() == "D" or new_file.mode == _GIT_FILEMODE_COMMIT:
+                continue
+            path = os.path.join(self.path, new_file.path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = git[new_file.id].data
+            if new_file.mode == _GIT_FILEMODE_LINK:
+                os.symlink(data.decode(), path)
+            else:
+                with open(path, "wb") as f:
+                    f.write(data)
+                if new_file.mode & 0o111:
+                    os.chmod(path, os.stat(path).st_mode | 0o111)
+        self.tree = commit.tree
+        self.message = commit.message.strip()
+        self.ref_count = 1
+        logger.info("updated checkout in %s to revision %s (%d files changed)",
+                    self.path, rev, len(deltas))
+
     def dispose(self):
         logger.info("disposing of checkout in folder %s", self.path)
         shutil.rmtree(self.path)
 
 
 class GitBackend:
-    def __init__(self, root):
+    """Repository backend that runs experiments from revisions of a Git
+    repository, each checked out into a temporary directory.
+
+    Up to ``cache_size`` checkouts are kept after they are released, so
+    that experiments submitted for recent revisions can use them directly.
+    Once that many checkouts exist, a new revision is obtained by updating
+    the least recently used checkout that is not in use, which only
+    writes the files that changed between the two revisions.
+    """
+    def __init__(self, root, cache_size=4):
         self.root = os.path.abspath(root)
+        self.cache_size = cache_size
 
         # lazy import - make dependency optional
         import pygit2
 
         self.git = pygit2.Repository(root)
+        # all checkouts, in use or not
         self.checkouts = dict()
+        # checkouts not in use, least recently used first
+        self.idle = OrderedDict()
 
     def get_head_rev(self):
         return str(self.git.head.target)
@@ -218,9 +294,24 @@ class GitBackend:
         rev = self._get_pinned_rev(rev)
         if rev in self.checkouts:
             co = self.checkouts[rev]
+            if not co.ref_count:
+                del self.idle[rev]
             co.ref_count += 1
         else:
-            co = _GitCheckout(self.git, rev)
+            co = None
+            if self.idle and len(self.checkouts) >= self.cache_size:
+                old_rev, co = self.idle.popitem(last=False)
+                del self.checkouts[old_rev]
+                try:
+                    co.update(self.git, rev)
+                except:
+                    logger.warning("failed to update checkout in %s, "
+                                   "checking out again", co.path,
+                                   exc_info=True)
+                    co.dispose()
+                    co = None
+            if co is None:
+                co = _GitCheckout(self.git, rev)
             self.checkouts[rev] = co
         return co.path, co.message, rev
 
@@ -228,5 +319,15 @@ class GitBackend:
         co = self.checkouts[rev]
         co.ref_count -= 1
         if not co.ref_count:
+            self.idle[rev] = co
+            while len(self.checkouts) > self.cache_size and self.idle:
+                old_rev, old_co = self.idle.popitem(last=False)
+                old_co.dispose()
+                del self.checkouts[old_rev]
+
+    def close(self):
+        """Disposes of the checkouts that are not in use."""
+        for rev, co in self.idle.items():
             co.dispose()
             del self.checkouts[rev]
+        self.idle.clear()
@@ -1,7 +1,11 @@
+import asyncio
+import bisect
 import logging
 import logging.handlers
+import time
 
 from sipyco.logs import SourceFilter
+from sipyco.tools import TaskObject
 
 
 class LogForwarder(logging.Handler):
@@ -17,6 +21,116 @@ class LogForwarder(logging.Handler):
                            message))
 
 
+# Minimum levels of the records sent on the batched log broadcast channels.
+LOG_BATCH_LEVELS = (logging.NOTSET, logging.DEBUG, logging.INFO,
+                    logging.WARNING, logging.ERROR)
+
+
+def log_batch_channel(level):
+    """Returns the name of the broadcast channel with batches of log records
+    that contains (at least) all the records at ``level`` and above."""
+    i = bisect.bisect_right(LOG_BATCH_LEVELS, level) - 1
+    return "log_batch_{}".format(LOG_BATCH_LEVELS[max(i, 0)])
+
+
+class _TokenBucket:
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+        self.suppressed = 0
+
+    def take(self, now):
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.last)*self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.suppressed += 1
+        return False
+
+
+class LogBroadcaster(TaskObject):
+    """Broadcasts the log records collected by :class:`LogForwarder` to
+    the clients of the master.
+
+    Records are sent periodically, as lists, on the channels given by
+    :func:`log_batch_channel`, so that clients only receive the levels they
+    request. For compatibility, each record is also sent on its own on the
+    ``log`` channel.
+
+    The records of each source (e.g. each worker) are rate-limited with a
+    token bucket of ``burst`` records refilled at ``rate`` records per
+    second. Records that exceed this are dropped, and their number is
+    reported in a warning from the same source at most once per
+    ``report_period``. Records at the WARNING level and above are never
+    dropped.
+    """
+    def __init__(self, broadcast, period=0.1, rate=100., burst=1000.,
+                 report_period=1.):
+        self.broadcast = broadcast
+        self.period = period
+        self.rate = rate
+        self.burst = burst
+        self.report_period = report_period
+        self.pending = []
+        self.buckets = dict()
+        self.last_report = None
+
+    def put(self, record):
+        level, source = record[:2]
+        if level < logging.WARNING and self.rate is not None:
+            now = time.monotonic()
+            bucket = self.buckets.get(source)
+            if bucket is None:
+                bucket = _TokenBucket(self.rate, self.burst, now)
+                self.buckets[source] = bucket
+            if not bucket.take(now):
+                return
+        self.pending.append(record)
+
+    def _report_suppressed(self):
+        now = time.monotonic()
+        if (self.last_report is not None
+                and now - self.last_report < self.report_period):
+            return
+        self.last_report = now
+        for source, bucket in list(self.buckets.items()):
+            if bucket.suppressed:
+                self.pending.append((
+                    logging.WARNING, source, time.time(),
+                    "{}:{} log messages suppressed by the rate limit of "
+                    "the master".format(__name__, bucket.suppressed)))
+                bucket.suppressed = 0
+            elif bucket.tokens >= bucket.burst:
+                # full bucket, same as a new one
+                del self.buckets[source]
+
+    def flush(self):
+        """Sends the pending records."""
+        self._report_suppressed()
+        records, self.pending = self.pending, []
+        if not records:
+            return
+        for record in records:
+            self.broadcast("log", record)
+        for level in LOG_BATCH_LEVELS:
+            batch = [record for record in records if record[0] >= level]
+            if not batch:
+                break
+            self.broadcast(log_batch_channel(level), batch)
+
+    async def _do(self):
+        try:
+            while True:
+                await asyncio.sleep(self.period)
+                self.flush()
+        finally:
+            self.flush()
+
+
 def log_args(parser):
     group = parser.add_argument_group("logging")
     group.add_argument("-v", "--verbose", default=0, action="count",
@@ -30,6 +144,14 @@ def log_args(parser):
                        help="number of old log files to keep, or 0 to keep "
                             "all log files. '.<yyyy>-<mm>-<dd>' is added "
                             "to the base filename (default: %(default)d)")
+    group.add_argument("--log-rate", type=float, default=100.,
+                       help="maximum sustained rate of log messages "
+                            "broadcast from each source, in messages per "
+                            "second (default: %(default)s)")
+    group.add_argument("--log-burst", type=int, default=1000,
+                       help="number of log messages that each source can "
+                            "send in a burst above the maximum rate "
+                            "(default: %(default)s)")
 
 
 def init_log(args):
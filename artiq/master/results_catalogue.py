@@ -0,0 +1,381 @@
+"""Searchable catalogue of the results directory.
+
+The catalogue is an SQLite database recording, for each results file, the
+RID, timestamps and expid of the run, its arguments, and the names and
+shapes of its datasets (with the values of the scalar ones). It is updated
+incrementally by :meth:`ResultsCatalogue.update`, which only opens results
+files that are new or have changed since the previous update, and skips the
+hour directories that have not changed.
+"""
+
+import os
+import re
+import time
+import json
+import logging
+import sqlite3
+from collections import namedtuple
+
+import h5py
+import numpy as np
+from sipyco import pyon
+
+from artiq import compat
+
+
+logger = logging.getLogger(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    rid INTEGER,
+    start_time REAL,
+    run_time REAL,
+    file TEXT,
+    class_name TEXT,
+    repo_rev TEXT,
+    artiq_version TEXT,
+    expid TEXT,
+    UNIQUE (directory, name)
+);
+CREATE INDEX IF NOT EXISTS runs_rid ON runs (rid);
+CREATE INDEX IF NOT EXISTS runs_class_name ON runs (class_name);
+CREATE INDEX IF NOT EXISTS runs_start_time ON runs (start_time);
+CREATE TABLE IF NOT EXISTS arguments (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS arguments_name ON arguments (name, value);
+CREATE INDEX IF NOT EXISTS arguments_run ON arguments (run);
+CREATE TABLE IF NOT EXISTS datasets (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    archived INTEGER NOT NULL,
+    shape TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS datasets_name ON datasets (name);
+CREATE INDEX IF NOT EXISTS datasets_run ON datasets (run);
+CREATE TABLE IF NOT EXISTS directories (
+    directory TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    scan_time REAL NOT NULL
+);
+"""
+
+
+Run = namedtuple("Run", "path rid start_time run_time file class_name "
+                        "repo_rev artiq_version")
+Dataset = namedtuple("Dataset", "name archived shape dtype value")
+
+
+def _sql_value(value):
+    # values that SQLite can compare natively are stored as such, others
+    # as their PYON representation
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bytes):
+        value = value.decode(errors="replace")
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return pyon.encode(value)
+
+
+def _read_run(f):
+    expid = compat.pyon_decode(f["expid"][()]) if "expid" in f else dict()
+    run = {
+        "rid": int(f["rid"][()]) if "rid" in f else None,
+        "start_time": float(f["start_time"][()]) if "start_time" in f else None,
+        "run_time": float(f["run_time"][()]) if "run_time" in f else None,
+        "file": expid.get("file"),
+        "class_name": expid.get("class_name"),
+        "repo_rev": expid.get("repo_rev"),
+        "artiq_version": f["artiq_version"].asstr()[()] if "artiq_version" in f else None,
+        "expid": pyon.encode(expid),
+    }
+    arguments = [(k, _sql_value(v))
+                 for k, v in expid.get("arguments", dict()).items()]
+
+    datasets = []
+    for group, archived in ("archive", True), ("datasets", False):
+        if group not in f:
+            continue
+
+        def visitor(k, v):
+            if isinstance(v, h5py.Dataset):
+                value = None
+                if v.shape == () and v.dtype.kind in "biufcSU":
+                    value = v[()]
+                    if isinstance(value, (complex, np.complexfloating)):
+                        value = None
+                datasets.append((k, archived, json.dumps(v.shape),
+                                 v.dtype.str, _sql_value(value)))
+        f[group].visititems(visitor)
+    return run, arguments, datasets
+
+
+_date_re = re.compile("\\d\\d\\d\\d-\\d\\d-\\d\\d")
+_hour_re = re.compile("\\d\\d(-\\d\\d)?")
+
+
+class ResultsCatalogue:
+    """Catalogue of the results files under ``results_dir``.
+
+    :param filename: SQLite database file. By default, ``catalogue.sqlite``
+        in the results directory.
+    :param settle_time: directories that have been modified less than this
+        many seconds before an update are scanned again at the next update,
+        as results files in them may still be rewritten.
+    """
+    def __init__(self, results_dir="results", filename=None,
+                 settle_time=24*3600):
+        self.results_dir = results_dir
+        if filename is None:
+            filename = os.path.join(results_dir, "catalogue.sqlite")
+        self.settle_time = settle_time
+        self.db = sqlite3.connect(filename)
+        # allow readers while updating
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _hour_directories(self):
+        try:
+            days = sorted(os.listdir(self.results_dir))
+        except FileNotFoundError:
+            return
+        for day in days:
+            if not _date_re.fullmatch(day):
+                continue
+            try:
+                hours = sorted(os.listdir(os.path.join(self.results_dir, day)))
+            except OSError:
+                continue
+            for hour in hours:
+                if _hour_re.fullmatch(hour):
+                    yield day + "/" + hour
+
+    def update(self, full=False):
+        """Indexes the new and modified results files, and removes the
+        deleted ones from the catalogue. Returns the number of files
+        indexed.
+
+        If ``full`` is true, all directories are scanned, even those that
+        have not been modified since the previous update."""
+        scanned = {directory: (mtime, scan_time)
+                   for directory, mtime, scan_time in self.db.execute(
+                       "SELECT directory, mtime, scan_time FROM directories")}
+        indexed = 0
+        present = set()
+        for directory in self._hour_directories():
+            present.add(directory)
+            path = os.path.join(self.results_dir, directory)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if not full and directory in scanned:
+                last_mtime, scan_time = scanned[directory]
+                if (mtime == last_mtime
+                        and scan_time - mtime > self.settle_time):
+                    continue
+            scan_time = time.time()
+            count, complete = self._scan_directory(directory)
+            indexed += count
+            with self.db:
+                if complete:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+                        (directory, mtime, scan_time))
+                else:
+                    # retry the unreadable files next time
+                    self.db.execute(
+                        "DELETE FROM directories WHERE directory=?",
+                        (directory, ))
+        indexed_directories = {directory for directory, in self.db.execute(
+            "SELECT DISTINCT directory FROM runs")}
+        with self.db:
+            for directory in (indexed_directories | scanned.keys()) - present:
+                self.db.execute("DELETE FROM runs WHERE directory=?",
+                                (directory, ))
+                self.db.execute("DELETE FROM directories WHERE directory=?",
+                                (directory, ))
+        return indexed
+
+    def _scan_directory(self, directory):
+        known = {name: (id, mtime, size)
+                 for id, name, mtime, size in self.db.execute(
+                     "SELECT id, name, mtime, size FROM runs "
+                     "WHERE directory=?", (directory, ))}
+        path = os.path.join(self.results_dir, directory)
+        count = 0
+        complete = True
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return 0, False
+        for entry in entries:
+            if not entry.name.endswith(".h5"):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            previous = known.pop(entry.name, None)
+            if (previous is not None
+                    and previous[1:] == (st.st_mtime, st.st_size)):
+                continue
+            try:
+                with h5py.File(entry.path, "r") as f:
+                    run, arguments, datasets = _read_run(f)
+            except OSError:  # e.g. file being written (see #470)
+                logger.debug("unable to open %s", entry.path, exc_info=True)
+                complete = False
+                continue
+            except:
+                logger.warning("unable to index %s", entry.path,
+                               exc_info=True)
+                complete = False
+                continue
+            with self.db:
+                if previous is not None:
+                    self.db.execute("DELETE FROM runs WHERE id=?",
+                                    (previous[0], ))
+                run_id = self.db.execute(
+                    "INSERT INTO runs (directory, name, mtime, size, rid, "
+                    "start_time, run_time, file, class_name, repo_rev, "
+                    "artiq_version, expid) "
+                    "VALUES (:directory, :name, :mtime, :size, :rid, "
+                    ":start_time, :run_time, :file, :class_name, :repo_rev, "
+                    ":artiq_version, :expid)",
+                    dict(run, directory=directory, name=entry.name,
+                         mtime=st.st_mtime, size=st.st_size)).lastrowid
+                self.db.executemany(
+                    "INSERT INTO arguments VALUES (?, ?, ?)",
+                    [(run_id, k, v) for k, v in arguments])
+                self.db.executemany(
+                    "INSERT INTO datasets VALUES (?, ?, ?, ?, ?, ?)",
+                    [(run_id, ) + d for d in datasets])
+            count += 1
+        with self.db:
+            for id, _, _ in known.values():
+                self.db.execute("DELETE FROM runs WHERE id=?", (id, ))
+        return count, complete
+
+    def find(self, rid=None, file=None, class_name=None, repo_rev=None,
+             text=None, arguments=None, datasets=None, since=None,
+             until=None, limit=None):
+        """Returns the runs matching all the given criteria, most recent
+        first, as a list of :class:`Run`.
+
+        :param file: substring of the experiment file name.
+        :param text: case-insensitive substring of the experiment file name
+            or class name.
+        :param arguments: dictionary of argument values.
+        :param datasets: names of datasets that must be present.
+        :param since: earliest start time (UNIX timestamp).
+        :param until: latest start time (UNIX timestamp).
+        """
+        conditions = []
+        parameters = []
+        for column, value in (("rid", rid), ("class_name", class_name),
+                              ("repo_rev", repo_rev)):
+            if value is not None:
+                conditions.append("{}=?".format(column))
+                parameters.append(value)
+        if file is not None:
+            conditions.append("instr(file, ?) > 0")
+            parameters.append(file)
+        if text is not None:
+            conditions.append("(instr(lower(file), lower(?)) > 0 "
+                              "OR instr(lower(class_name), lower(?)) > 0)")
+            parameters += [text, text]
+        if since is not None:
+            conditions.append("start_time>=?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("start_time<=?")
+            parameters.append(until)
+        for name, value in (arguments or dict()).items():
+            conditions.append("id IN (SELECT run FROM arguments "
+                              "WHERE name=? AND value=?)")
+            parameters += [name, _sql_value(value)]
+        for name in datasets or []:
+            conditions.append("id IN (SELECT run FROM datasets WHERE name=?)")
+            parameters.append(name)
+
+        query = ("SELECT directory, name, rid, start_time, run_time, file, "
+                 "class_name, repo_rev, artiq_version FROM runs")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY start_time DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [Run(os.path.join(self.results_dir, directory, name), *row)
+                for directory, name, *row in self.db.execute(query,
+                                                             parameters)]
+
+    def get_datasets(self, path):
+        """Returns the datasets recorded for a results file, as a list of
+        :class:`Dataset`. ``value`` is ``None`` for non-scalar datasets."""
+        directory, name = os.path.split(os.path.relpath(path,
+                                                        self.results_dir))
+        return [Dataset(name, bool(archived), tuple(json.loads(shape)),
+                        dtype, value)
+                for name, archived, shape, dtype, value in self.db.execute(
+                    "SELECT d.name, archived, shape, dtype, value "
+                    "FROM datasets d JOIN runs r ON d.run=r.id "
+                    "WHERE r.directory=? AND r.name=?",
+                    (directory.replace(os.sep, "/"), name))]
+
+
+def parse_query(text):
+    """Parses a search string into keyword arguments of
+    :meth:`ResultsCatalogue.find`.
+
+    The string is a whitespace-separated list of terms: an integer is a
+    RID, ``class=NAME``, ``file=SUBSTRING``, ``rev=REV`` and
+    ``dataset=NAME`` select the corresponding fields, and ``NAME=VALUE``
+    selects an argument value (given in PYON). Any other word is searched
+    in the experiment file and class names.
+    """
+    query = dict()
+    for term in text.split():
+        key, sep, value = term.partition("=")
+        if not sep:
+            if term.isdigit():
+                query["rid"] = int(term)
+            else:
+                query["text"] = term
+        elif key == "class":
+            query["class_name"] = value
+        elif key == "file":
+            query["file"] = value
+        elif key == "rev":
+            query["repo_rev"] = value
+        elif key == "dataset":
+            query.setdefault("datasets", []).append(value)
+        else:
+            try:
+                value = pyon.decode(value)
+            except:
+                pass
+            query.setdefault("arguments", dict())[key] = value
+    return query
@@ -47,6 +47,53 @@ def _mk_worker_method(name):
     return worker_method
 
 
+class WorkerCache:
+    """Keeps the worker processes of completed runs, so that later runs with
+    the same working directory and log level can reuse them instead of
+    starting a new process. Reused workers also keep their controller
+    clients and core device connection open (see
+    :meth:`~artiq.master.worker_db.DeviceManager.close_devices`).
+
+    :param size: maximum number of idle workers kept. If 0, workers are
+        never reused.
+    """
+    def __init__(self, worker_handlers, size=0):
+        self.worker_handlers = worker_handlers
+        self.size = size
+        self.idle = []  # (key, worker), least recently used first
+
+    def new_worker(self):
+        return Worker(self.worker_handlers)
+
+    def take(self, key):
+        """Returns an idle worker for runs with the given key, or ``None``."""
+        for i, (worker_key, worker) in enumerate(self.idle):
+            if (worker_key == key
+                    and worker.ipc.process.returncode is None):
+                del self.idle[i]
+                return worker
+        return None
+
+    async def release(self, key, worker):
+        """Keeps a worker that has completed a run for reuse, or closes it
+        if the cache is full."""
+        if (self.size
+                and not worker.closed.is_set()
+                and worker.ipc is not None
+                and worker.ipc.process.returncode is None):
+            worker.watchdogs.clear()
+            self.idle.append((key, worker))
+            if len(self.idle) <= self.size:
+                return
+            _, worker = self.idle.pop(0)
+        await worker.close()
+
+    async def close(self):
+        while self.idle:
+            _, worker = self.idle.pop()
+            await worker.close()
+
+
 class Run:
     def __init__(self, rid, pipeline_name,
                  wd, expid, priority, due_date, flush,
@@ -60,7 +107,10 @@ class Run:
         self.due_date = due_date
         self.flush = flush
 
-        self.worker = Worker(pool.worker_handlers)
+        self._worker_cache = pool.worker_cache
+        self._worker_key = (wd, expid.get("log_level"))
+        self.worker = self._worker_cache.new_worker()
+        self.reusable = False
         self.termination_requested = False
 
         self._status = RunStatus.pending
@@ -98,12 +148,20 @@ class Run:
 
     async def close(self):
         # called through pool
-        await self.worker.close()
+        if self.reusable:
+            await self._worker_cache.release(self._worker_key, self.worker)
+        else:
+            await self.worker.close()
         del self._notifier[self.rid]
 
     _build = _mk_worker_method("build")
 
     async def build(self):
+        if not self.worker.closed.is_set():
+            worker = self._worker_cache.take(self._worker_key)
+            if worker is not None:
+                logger.debug("reusing worker for RID %d", self.rid)
+                self.worker = worker
         await self._build(self.rid, self.pipeline_name,
                           self.wd, self.expid,
                           self.priority)
@@ -111,16 +169,20 @@ class Run:
     prepare = _mk_worker_method("prepare")
     run = _mk_worker_method("run")
     resume = _mk_worker_method("resume")
-    analyze = _mk_worker_method("analyze")
+    _analyze = _mk_worker_method("analyze")
+
+    async def analyze(self):
+        await self._analyze()
+        self.reusable = not self.worker.closed.is_set()
 
 
 class RunPool:
-    def __init__(self, ridc, worker_handlers, notifier, experiment_db, log_submissions):
+    def __init__(self, ridc, worker_cache, notifier, experiment_db, log_submissions):
         self.runs = dict()
         self.state_changed = Condition()
 
         self.ridc = ridc
-        self.worker_handlers = worker_handlers
+        self.worker_cache = worker_cache
         self.notifier = notifier
         self.experiment_db = experiment_db
         self.log_submissions = log_submissions
@@ -334,8 +396,8 @@ class AnalyzeStage(TaskObject):
 
 
 class Pipeline:
-    def __init__(self, ridc, deleter, worker_handlers, notifier, experiment_db, log_submissions):
-        self.pool = RunPool(ridc, worker_handlers, notifier, experiment_db, log_submissions)
+    def __init__(self, ridc, deleter, worker_cache, notifier, experiment_db, log_submissions):
+        self.pool = RunPool(ridc, worker_cache, notifier, experiment_db, log_submissions)
         self._prepare = PrepareStage(self.pool, deleter.delete)
         self._run = RunStage(self.pool, deleter.delete)
         self._analyze = AnalyzeStage(self.pool, deleter.delete)
@@ -406,11 +468,12 @@ class Deleter(TaskObject):
 
 
 class Scheduler:
-    def __init__(self, ridc, worker_handlers, experiment_db, log_submissions):
+    def __init__(self, ridc, worker_handlers, experiment_db, log_submissions,
+                 reuse_workers=0):
         self.notifier = Notifier(dict())
 
         self._pipelines = dict()
-        self._worker_handlers = worker_handlers
+        self._worker_cache = WorkerCache(worker_handlers, reuse_workers)
         self._experiment_db = experiment_db
         self._terminated = False
 
@@ -432,6 +495,7 @@ class Scheduler:
         await self._deleter.stop()
         if self._pipelines:
             logger.warning("some pipelines were not garbage-collected")
+        await self._worker_cache.close()
 
     def submit(self, pipeline_name, expid, priority=0, due_date=None, flush=False):
         """Submits a new run.
@@ -448,7 +512,7 @@ class Scheduler:
         except KeyError:
             logger.debug("creating pipeline '%s'", pipeline_name)
             pipeline = Pipeline(self._ridc, self._deleter,
-                                self._worker_handlers, self.notifier,
+                                self._worker_cache, self.notifier,
                                 self._experiment_db, self._log_submissions)
             self._pipelines[pipeline_name] = pipeline
             pipeline.start(loop=self._loop)
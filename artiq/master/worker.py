@@ -268,6 +268,8 @@ class Worker:
         self.rid = rid
         if "file" in expid:
             self.filename = os.path.basename(expid["file"])
+        else:
+            self.filename = None
         await self._create_process(expid["log_level"])
         await self._worker_action(
             {"action": "build",
@@ -5,9 +5,13 @@ standalone command line tools).
 """
 
 from operator import setitem
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 import importlib
 import logging
 import os
+import select
+import threading
 
 from sipyco.sync_struct import Notifier
 from sipyco.pc_rpc import AutoTarget, Client, BestEffortClient
@@ -21,6 +25,139 @@ class DummyDevice:
     pass
 
 
+class _ClientGroup:
+    # The connections of a worker to one controller target. The primary
+    # connection is shared by all devices that refer to the target, and
+    # additional connections are opened on demand for asynchronous calls,
+    # one per thread of the executor.
+    def __init__(self, factory, max_connections):
+        self.factory = factory
+        self.max_connections = max_connections
+        self.primary = factory()
+        self.primary._client_group = self
+        self.executor = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.secondary = []
+        # set while the clients are kept open between experiments
+        self.retained = False
+
+    def is_disconnected(self):
+        # Unlike BestEffortClient, Client does not reconnect. Detect
+        # controllers that have closed the connection (e.g. because they
+        # were restarted) before the client is used again.
+        if isinstance(self.primary, BestEffortClient):
+            return False
+        try:
+            readable, _, _ = select.select(
+                [self.primary._Client__socket], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def _call(self, name, args, kwargs):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.factory()
+            self.local.client = client
+            with self.lock:
+                self.secondary.append(client)
+        return getattr(client, name)(*args, **kwargs)
+
+    def submit(self, name, args, kwargs):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_connections,
+                thread_name_prefix="rpc_client")
+        return self.executor.submit(self._call, name, args, kwargs)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        for client in reversed([self.primary] + self.secondary):
+            try:
+                client.close_rpc()
+            except:
+                logger.warning("Exception raised when closing RPC client "
+                               "%r:", client, exc_info=True)
+
+
+class _AsyncCallMixin:
+    def call_async(self, name, *args, **kwargs):
+        """Calls the RPC method ``name`` of the controller in the background
+        and returns a :class:`concurrent.futures.Future` of its result.
+
+        The call is made on a separate connection to the controller, so
+        that calls to several controllers (or several calls to the same
+        controller) overlap instead of each waiting for the previous reply.
+        There is no ordering guarantee between asynchronous calls, nor
+        with synchronous calls."""
+        return self._client_group.submit(name, args, kwargs)
+
+
+class _PooledClient(_AsyncCallMixin, Client):
+    pass
+
+
+class _PooledBestEffortClient(_AsyncCallMixin, BestEffortClient):
+    pass
+
+
+class ClientPool:
+    """Controller RPC clients of a worker, shared between all the device
+    database entries that refer to the same controller target.
+
+    The clients support asynchronous calls through their ``call_async``
+    method.
+
+    :param max_connections: maximum number of connections used for
+        asynchronous calls, per controller target.
+    """
+    def __init__(self, max_connections=4):
+        self.max_connections = max_connections
+        self.groups = dict()
+
+    def get(self, best_effort, host, port, target_name, ssl_files=None):
+        """Returns the client for the given controller target, connecting
+        to it if necessary. ``ssl_files`` are the client certificate, client
+        key and server certificate files, if SSL is used."""
+        key = best_effort, host, port, target_name, ssl_files
+        group = self.groups.get(key)
+        if group is not None and group.retained:
+            group.retained = False
+            if group.is_disconnected():
+                logger.debug("controller %s:%s closed the connection, "
+                             "reconnecting", host, port)
+                group.close()
+                del self.groups[key]
+                group = None
+        if group is not None:
+            return group.primary
+
+        cls = _PooledBestEffortClient if best_effort else _PooledClient
+        ssl_config = None
+        if ssl_files is not None:
+            ssl_config = SimpleSSLConfig(*ssl_files)
+        group = _ClientGroup(
+            lambda: cls(host, port, target_name, ssl_config=ssl_config),
+            self.max_connections)
+        self.groups[key] = group
+        return group.primary
+
+    def retain(self):
+        """Marks the clients as kept open for a later experiment. Their
+        connection is checked before they are handed out again, and
+        clients disconnected by their controller are replaced."""
+        for group in self.groups.values():
+            group.retained = True
+
+    def close(self):
+        """Closes all clients."""
+        for group in reversed(self.groups.values()):
+            group.close()
+        self.groups.clear()
+
+
 def _create_device(desc, device_mgr, argument_overrides):
     ty = desc["type"]
     if ty == "local":
@@ -29,17 +166,13 @@ def _create_device(desc, device_mgr, argument_overrides):
         arguments = desc.get("arguments", {}) | argument_overrides
         return device_class(device_mgr, **arguments)
     elif ty == "controller":
-        if desc.get("best_effort", False):
-            cls = BestEffortClient
-        else:
-            cls = Client
         # Automatic target can be specified either by the absence of
         # the target_name parameter, or a None value.
         target_name = desc.get("target_name", None)
         if target_name is None:
             target_name = AutoTarget
         simple_ssl_config = desc.get("simple_ssl_config")
-        ssl_config = None
+        ssl_files = None
         if simple_ssl_config:
             ssl_dir = os.environ.get("ARTIQ_SSL_DIR")
             for key, filename in simple_ssl_config.items():
@@ -47,15 +180,17 @@ def _create_device(desc, device_mgr, argument_overrides):
                     if not ssl_dir:
                         raise ValueError("ARTIQ_SSL_DIR environment variable must be set when using {ARTIQ_SSL_DIR} in SSL certificate paths")
                     simple_ssl_config[key] = filename.format(ARTIQ_SSL_DIR=ssl_dir)
-            ssl_config = SimpleSSLConfig(simple_ssl_config["client_cert"], simple_ssl_config["client_key"], simple_ssl_config["server_cert"])
-        return cls(desc["host"], desc["port"], target_name, ssl_config=ssl_config)
+            ssl_files = (simple_ssl_config["client_cert"], simple_ssl_config["client_key"], simple_ssl_config["server_cert"])
+        return device_mgr.clients.get(desc.get("best_effort", False),
+                                      desc["host"], desc["port"], target_name,
+                                      ssl_files)
     elif ty == "controller_aux_target":
         controller = device_mgr.get_desc(desc["controller"])
-        if desc.get("best_effort", controller.get("best_effort", False)):
-            cls = BestEffortClient
-        else:
-            cls = Client
-        return cls(controller["host"], controller["port"], desc["target_name"])
+        best_effort = desc.get("best_effort",
+                               controller.get("best_effort", False))
+        return device_mgr.clients.get(best_effort,
+                                      controller["host"], controller["port"],
+                                      desc["target_name"])
     elif ty == "dummy":
         return DummyDevice()
     else:
@@ -66,13 +201,59 @@ class DeviceError(Exception):
     pass
 
 
+def _hashable(obj):
+    if isinstance(obj, dict):
+        return frozenset((k, _hashable(v)) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return tuple(_hashable(e) for e in obj)
+    else:
+        return obj
+
+
+def _device_key(desc, argument_overrides):
+    key = _hashable(desc), _hashable(argument_overrides)
+    try:
+        hash(key)
+    except TypeError:
+        key = repr(desc), repr(argument_overrides)
+    return key
+
+
+_no_overrides = dict()
+
+
+def _is_client(dev):
+    return isinstance(dev, (Client, BestEffortClient))
+
+
+def _close_device(dev):
+    try:
+        if hasattr(dev, "close"):
+            dev.close()
+    except:
+        logger.warning("Exception raised when closing device %r:",
+                       dev, exc_info=True)
+
+
 class DeviceManager:
     """Handles creation and destruction of local device drivers and controller
-    RPC clients."""
+    RPC clients.
+
+    Devices are shared between all names that resolve to the same
+    description (with the same argument overrides). Controller RPC clients
+    are shared between all descriptions that refer to the same controller
+    target (see :class:`ClientPool`)."""
     def __init__(self, ddb, virtual_devices=dict()):
         self.ddb = ddb
         self.virtual_devices = virtual_devices
-        self.active_devices = []
+        # (description, argument overrides) -> device, in creation order
+        self.active_devices = dict()
+        # devices kept open by close_devices(retain=True), same keys
+        self.retained_devices = dict()
+        # name -> (description, argument overrides, key), to avoid hashing
+        # the description again while the device database is unchanged
+        self.keys = dict()
+        self.clients = ClientPool()
         self.devarg_override = {}
 
     def get_device_db(self):
@@ -94,38 +275,73 @@ class DeviceManager:
             raise DeviceError("Failed to get description of device '{}'"
                               .format(name)) from e
 
-        for existing_desc, existing_dev in self.active_devices:
-            if desc == existing_desc:
-                return existing_dev
-
+        argument_overrides = self.devarg_override.get(name, _no_overrides)
+        cached = self.keys.get(name)
+        if (cached is not None and cached[0] is desc
+                and cached[1] is argument_overrides):
+            key = cached[2]
+        else:
+            key = _device_key(desc, argument_overrides)
+            self.keys[name] = desc, argument_overrides, key
         try:
-            dev = _create_device(desc, self, self.devarg_override.get(name, {}))
-        except Exception as e:
-            raise DeviceError("Failed to create device '{}'"
-                              .format(name)) from e
-        self.active_devices.append((desc, dev))
+            return self.active_devices[key]
+        except KeyError:
+            pass
+
+        dev = self.retained_devices.pop(key, None)
+        if dev is not None and hasattr(dev, "notify_reuse"):
+            try:
+                dev.notify_reuse()
+            except:
+                logger.warning("Exception raised when reusing device %r, "
+                               "creating it again:", dev, exc_info=True)
+                _close_device(dev)
+                dev = None
+        if dev is None:
+            try:
+                dev = _create_device(desc, self, argument_overrides)
+            except Exception as e:
+                raise DeviceError("Failed to create device '{}'"
+                                  .format(name)) from e
+        self.active_devices[key] = dev
         return dev
 
     def notify_run_end(self):
         """Sends a "end of Experiment run stage" notification to
         all active devices."""
-        for _desc, dev in self.active_devices:
+        for dev in {id(dev): dev
+                    for dev in self.active_devices.values()}.values():
             if hasattr(dev, "notify_run_end"):
                 dev.notify_run_end()
 
-    def close_devices(self):
+    def close_devices(self, retain=False):
         """Closes all active devices, in the opposite order as they were
-        requested."""
-        for _desc, dev in reversed(self.active_devices):
-            try:
-                if isinstance(dev, (Client, BestEffortClient)):
-                    dev.close_rpc()
-                elif hasattr(dev, "close"):
-                    dev.close()
-            except:
-                logger.warning("Exception raised when closing device %r:",
-                               dev, exc_info=True)
+        requested.
+
+        If ``retain`` is true, controller RPC clients and local devices
+        that support it (by defining a ``notify_reuse`` method) are kept
+        open instead, and handed out again by :meth:`get` when a later
+        request has the same description. ``notify_reuse`` is called before
+        a retained device is handed out. This allows workers that run
+        several experiments in sequence to avoid reconnecting to
+        controllers and to the core device for each experiment.
+        Otherwise, retained devices are closed as well."""
+        for key, dev in reversed(self.active_devices.items()):
+            if _is_client(dev):
+                # owned by the client pool
+                continue
+            if retain and hasattr(dev, "notify_reuse"):
+                self.retained_devices[key] = dev
+            else:
+                _close_device(dev)
         self.active_devices.clear()
+        if retain:
+            self.clients.retain()
+        else:
+            for dev in reversed(self.retained_devices.values()):
+                _close_device(dev)
+            self.retained_devices.clear()
+            self.clients.close()
 
 
 class DatasetManager:
@@ -134,6 +350,10 @@ class DatasetManager:
         self.local = dict()
         self.archive = dict()
         self.metadata = dict()
+        # datasets fetched in bulk from the master, key -> (value, metadata),
+        # kept until end_prefetch is called
+        self.prefetched = dict()
+        self.prefetch_enabled = True
 
         self.ddb = ddb
         self._broadcaster.publish = ddb.update
@@ -141,6 +361,7 @@ class DatasetManager:
     def set(self, key, value, metadata, broadcast, persist, archive):
         if persist:
             broadcast = True
+        self.prefetched.pop(key, None)
 
         if not (broadcast or archive):
             logger.warning(f"Dataset '{key}' will not be stored. Both 'broadcast' and 'archive' are set to False.")
@@ -179,11 +400,63 @@ class DatasetManager:
     def append_to(self, key, value):
         self._get_mutation_target(key).append(value)
 
+    def prefetch(self, keys=None, prefix=None):
+        """Fetches the given datasets, or all the datasets whose key starts
+        with ``prefix``, from the master in a single request, and returns
+        them as a dictionary of ``(value, metadata)`` tuples. Keys that do
+        not exist are ignored.
+
+        Until :meth:`end_prefetch` is called, later calls to :meth:`get`
+        and :meth:`get_metadata` return the fetched values, unless the
+        datasets are set again from this experiment. Changes made by the
+        master or by other experiments in the meantime are not seen."""
+        datasets = self.ddb.get_many(keys, prefix)
+        if self.prefetch_enabled:
+            self.prefetched.update(datasets)
+        return datasets
+
+    def end_prefetch(self):
+        """Discards the prefetched datasets, and stops keeping the datasets
+        fetched by :meth:`prefetch` and :meth:`get_many`. Every later read
+        of a dataset that is not stored locally gets its current value
+        from the master. The worker calls this before the run stage."""
+        self.prefetched.clear()
+        self.prefetch_enabled = False
+
+    def get_many(self, keys=None, prefix=None, archive=False):
+        """Returns a dictionary with the contents of the given datasets, or
+        of all the datasets whose key starts with ``prefix``. Datasets that
+        are not available locally are fetched with :meth:`prefetch`, and
+        those that do not exist are omitted."""
+        if prefix is not None:
+            fetched = self.prefetch(prefix=prefix)
+            keys = sorted({key for key in chain(self.local, fetched)
+                           if key.startswith(prefix)})
+        else:
+            missing = [key for key in keys
+                       if key not in self.local and key not in self.prefetched]
+            fetched = self.prefetch(missing) if missing else dict()
+        result = dict()
+        for key in keys:
+            if key in self.local:
+                result[key] = self.local[key]
+            elif key in fetched:
+                result[key] = self._archive(key, fetched[key][0], archive)
+            elif key in self.prefetched:
+                result[key] = self.get(key, archive)
+        return result
+
     def get(self, key, archive=False):
         if key in self.local:
             return self.local[key]
-        
-        data = self.ddb.get(key)
+
+        try:
+            data = self.prefetched[key][0]
+        except KeyError:
+            data = self.ddb.get(key)
+        return self._archive(key, data, archive)
+
+    def _archive(self, key, data, archive):
         if archive:
             if key in self.archive:
                 logger.warning("Dataset '%s' is already in archive, "
@@ -194,6 +467,8 @@ class DatasetManager:
     def get_metadata(self, key):
         if key in self.metadata:
             return self.metadata[key]
+        if key in self.prefetched:
+            return self.prefetched[key][1]
         return self.ddb.get_metadata(key)
 
     def write_hdf5(self, f):
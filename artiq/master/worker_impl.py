@@ -86,14 +86,56 @@ def make_parent_action(action):
 
 
 class ParentDeviceDB:
-    get_device_db = make_parent_action("get_device_db")
-    get = make_parent_action("get_device")
+    # Local copy of the device database of the master, with its aliases
+    # resolved, so that device lookups do not need a request to the master.
+    # The copy is checked against the master once per experiment, when it is
+    # first used, and only transferred again if the master has rescanned
+    # the device database in the meantime.
+    # Devices that are not in the snapshot are requested individually, which
+    # lets the parent provide devices of its own (e.g. the dummy devices of
+    # the browser) or raise the error.
+    _get_snapshot = staticmethod(make_parent_action("get_device_db_snapshot"))
+    _get_device = staticmethod(make_parent_action("get_device"))
+
+    def __init__(self):
+        self.version = None
+        self.device_db = dict()
+        self.aliases = dict()
+        self.stale = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def _sync(self):
+        if self.stale:
+            snapshot = self._get_snapshot(self.version)
+            if snapshot is not None:
+                self.version = snapshot["version"]
+                self.device_db = snapshot["device_db"]
+                self.aliases = snapshot["aliases"]
+            self.stale = False
+
+    def get_device_db(self):
+        self._sync()
+        return self.device_db
+
+    def get(self, key, resolve_alias=False):
+        self._sync()
+        if resolve_alias:
+            key = self.aliases.get(key, key)
+            if key is None:
+                raise ValueError("Device alias cycle")
+        try:
+            return self.device_db[key]
+        except KeyError:
+            return self._get_device(key, resolve_alias)
 
 
 class ParentDatasetDB:
     get = make_parent_action("get_dataset")
     update = make_parent_action("update_dataset")
     get_metadata = make_parent_action("get_dataset_metadata")
+    get_many = make_parent_action("get_datasets")
 
 
 class Watchdog:
@@ -211,6 +253,15 @@ class ExamineDatasetMgr:
     def get_metadata(key):
         return ParentDatasetDB.get_metadata(key)
 
+    @staticmethod
+    def prefetch(keys=None, prefix=None):
+        pass
+
+    @staticmethod
+    def get_many(keys=None, prefix=None, archive=False):
+        return {key: value for key, (value, _)
+                in ParentDatasetDB.get_many(keys, prefix).items()}
+
 
 def examine(device_mgr, dataset_mgr, file):
     previous_keys = set(sys.modules.keys())
@@ -303,6 +354,18 @@ def put_exception_report():
     put_object({"action": "exception"})
 
 
+def unload_modules(names, directories):
+    """Removes the modules among ``names`` that were loaded from any of
+    ``directories`` from the module cache, so that a worker running several
+    experiments in sequence picks up changes made to them."""
+    directories = tuple(os.path.join(os.path.abspath(d), "")
+                        for d in directories)
+    for name in names:
+        filename = getattr(sys.modules.get(name), "__file__", None)
+        if filename is not None and filename.startswith(directories):
+            del sys.modules[name]
+
+
 def main():
     global ipc
 
@@ -316,6 +379,9 @@ def main():
     exp = None
     exp_inst = None
     repository_path = None
+    experiment_dirs = set()
+    preloaded_modules = set()
+    initial_cwd = os.getcwd()
 
     def write_results():
         filename = "{:09}-{}.h5".format(rid, exp.__name__)
@@ -327,7 +393,8 @@ def main():
             f["run_time"] = run_time
             f["expid"] = pyon.encode(expid)
 
-    device_mgr = DeviceManager(ParentDeviceDB,
+    device_db = ParentDeviceDB()
+    device_mgr = DeviceManager(device_db,
                                virtual_devices={"scheduler": Scheduler(),
                                                 "ccb": CCB()})
     dataset_mgr = DatasetManager(ParentDatasetDB)
@@ -339,19 +406,30 @@ def main():
             obj = get_object()
             action = obj["action"]
             if action == "build":
+                if exp is not None:
+                    # The master reuses this worker for another experiment.
+                    dataset_mgr = DatasetManager(ParentDatasetDB)
+                    unload_modules(sys.modules.keys() - preloaded_modules,
+                                   experiment_dirs)
+                    experiment_dirs.clear()
+                    os.chdir(initial_cwd)
+                    run_time = None
+                preloaded_modules = set(sys.modules.keys())
+                device_db.invalidate()
                 start_time = time.time()
                 rid = obj["rid"]
                 expid = obj["expid"]
-                if "devarg_override" in expid:
-                    device_mgr.devarg_override = expid["devarg_override"]
+                device_mgr.devarg_override = expid.get("devarg_override", {})
                 if "file" in expid:
                     if obj["wd"] is not None:
                         # Using repository
                         experiment_file = os.path.join(obj["wd"], expid["file"])
                         repository_path = obj["wd"]
+                        experiment_dirs.add(repository_path)
                     else:
                         experiment_file = expid["file"]
                         repository_path = None
+                    experiment_dirs.add(os.path.dirname(experiment_file))
                     setup_diagnostics(experiment_file, repository_path)
                     exp = get_experiment_from_file(experiment_file, expid["class_name"])
                 else:
@@ -374,6 +452,7 @@ def main():
                 put_completed()
             elif action == "run":
                 run_time = time.time()
+                dataset_mgr.end_prefetch()
                 try:
                     exp_inst.run()
                 except:
@@ -398,7 +477,11 @@ def main():
                     # since it doesn't run the experiment and cannot have rid
                     if rid is not None:
                         write_results()
-
+                # The experiment is complete. Close the devices that cannot
+                # be reused in case the master keeps this worker for a later
+                # experiment; controller clients and the core device stay
+                # open until then.
+                device_mgr.close_devices(retain=True)
                 put_completed()
             elif action == "examine":
                 examine(ExamineDeviceMgr, ExamineDatasetMgr, obj["file"])
@@ -1,3 +1,4 @@
+import sys
 from random import Random
 import numpy
 
@@ -6,16 +7,25 @@ from artiq.sim import time
 
 
 class Core:
-    def __init__(self, dmgr):
+    """Simulated core device.
+
+    :param print_timeline: if true, the timeline of events of each kernel is
+        printed and cleared when the kernel returns. Otherwise, it is kept in
+        ``artiq.sim.time.manager.timeline`` for inspection with the methods
+        of :class:`artiq.sim.time.Timeline`, and must be cleared by the user.
+    """
+    def __init__(self, dmgr, print_timeline=True):
         self.ref_period = 1
+        self.print_timeline = print_timeline
         self._level = 0
 
     def run(self, k_function, k_args, k_kwargs):
         self._level += 1
         r = k_function.artiq_embedded.function(*k_args, **k_kwargs)
         self._level -= 1
-        if self._level == 0:
-            print(time.manager.format_timeline())
+        if self._level == 0 and self.print_timeline:
+            time.manager.timeline.write(sys.stdout)
+            print()
             time.manager.timeline.clear()
         return r
 
@@ -35,30 +45,30 @@ class Input:
 
     @kernel
     def gate_rising(self, duration):
-        time.manager.event(("gate_rising", self.name, duration))
+        time.manager.record("gate_rising", self.name, duration=duration)
         delay(duration)
 
     @kernel
     def gate_falling(self, duration):
-        time.manager.event(("gate_falling", self.name, duration))
+        time.manager.record("gate_falling", self.name, duration=duration)
         delay(duration)
 
     @kernel
     def gate_both(self, duration):
-        time.manager.event(("gate_both", self.name, duration))
+        time.manager.record("gate_both", self.name, duration=duration)
         delay(duration)
 
     @kernel
     def count(self, up_to_timestamp_mu):
         result = self.prng.randrange(0, 100)
-        time.manager.event(("count", self.name, result))
+        time.manager.record("count", self.name, result)
         return result
 
     @kernel
     def timestamp_mu(self, up_to_timestamp_mu):
         result = time.manager.get_time_mu()
         result += self.prng.randrange(100, 1000)
-        time.manager.event(("timestamp_mu", self.name, result))
+        time.manager.record("timestamp_mu", self.name, result)
         at_mu(result)
         return result
 
@@ -70,11 +80,11 @@ class Output:
 
     @kernel
     def set_o(self, value):
-        time.manager.event(("set", self.name, value))
+        time.manager.record("set", self.name, value)
 
     @kernel
     def pulse(self, duration):
-        time.manager.event(("pulse", self.name, duration))
+        time.manager.record("pulse", self.name, duration=duration)
         delay(duration)
 
     @kernel
@@ -93,7 +103,7 @@ class WaveOutput:
 
     @kernel
     def pulse(self, frequency, duration):
-        time.manager.event(("pulse", self.name, frequency, duration))
+        time.manager.record("pulse", self.name, frequency, duration)
         delay(duration)
 
 
@@ -104,4 +114,4 @@ class VoltageOutput:
 
     @kernel
     def set(self, value):
-        time.manager.event(("set_voltage", self.name, value))
+        time.manager.record("set_voltage", self.name, value)
@@ -0,0 +1,329 @@
+"""Execution of kernels as native code on the host.
+
+Unlike :mod:`artiq.sim.devices`, which runs kernels as plain Python, the
+:class:`Core` driver of this module stitches kernels with the ARTIQ compiler
+and JIT-compiles them for the host CPU. The regular core device drivers
+(TTL, SPI, ...) can therefore be used unchanged, and kernel-side
+computation runs at native speed.
+
+RTIO syscalls are serviced by a :class:`TimelineRecorder`, which records
+output events into an :class:`artiq.sim.time.Timeline` instead of sending
+them to gateware. Kernels that use RPCs, DMA, the core device cache or
+subkernels cannot be executed.
+
+Exceptions can only be raised and caught by kernels if the ARTIQ runtime
+support library built for the host (``libartiq_support``) is loaded. Its
+path is taken from the ``libartiq_support`` argument of :class:`Core`, or
+from the ``LIBARTIQ_SUPPORT`` environment variable. Native frames cannot be
+unwound into Python, so on platforms that support ``fork``, each kernel runs
+in a child process; an exception that the kernel does not catch (or any
+exception, without ``libartiq_support``) terminates that process and raises
+:class:`KernelError`. Elsewhere, it terminates the host process.
+"""
+
+import os
+import sys
+import ctypes
+import pickle
+import traceback
+from collections import defaultdict, deque
+
+from llvmlite import binding as llvm
+from pythonparser import diagnostic
+
+from artiq.compiler.module import Module
+from artiq.compiler.embedding import Stitcher
+from artiq.compiler.targets import NativeTarget
+from artiq.coredevice import core as core_driver
+from artiq.sim.time import Timeline
+
+
+class KernelError(Exception):
+    """Raised when a kernel executed on the host terminates because of an
+    exception it did not catch."""
+
+
+class _CList(ctypes.Structure):
+    # Layout of a TList(TInt32) passed by pointer
+    _fields_ = [("data", ctypes.POINTER(ctypes.c_int32)),
+                ("length", ctypes.c_int32)]
+
+
+class TimelineRecorder:
+    """Services the RTIO syscalls of JIT-compiled kernels.
+
+    Output events are recorded into :attr:`timeline`, in seconds, with the
+    name of the device of their channel (or the channel number, if it is
+    not known) as device. A write to address 0 is a ``set`` event, and a
+    write to another address ``a`` is a ``write_a`` event. The words of a
+    wide output are recorded as ``write_a_i`` events, ``i`` being the index
+    of the word.
+
+    :ivar timeline: the :class:`~artiq.sim.time.Timeline` of output events.
+    :param ref_period: duration of a machine unit, in seconds.
+    :param counter_step: amount (in machine units) by which the simulated
+        RTIO counter advances each time a kernel reads it.
+    :param channel_names: mapping from RTIO channel numbers to device names.
+    """
+    def __init__(self, ref_period=1e-9, counter_step=1000, channel_names={}):
+        # Kernels access the timeline cursor directly, with the most
+        # significant word at the lower address (as in the gateware).
+        self._now = (ctypes.c_uint32*2)()
+        self.ref_period = ref_period
+        self.counter = 0
+        self.counter_step = counter_step
+        self.channel_names = channel_names
+        self.timeline = Timeline()
+        self.inputs = defaultdict(deque)
+        self._input_data = dict()
+
+        self._callbacks = {
+            "rtio_init": ctypes.CFUNCTYPE(None)(self._rtio_init),
+            "rtio_get_counter": ctypes.CFUNCTYPE(ctypes.c_int64)(
+                self._rtio_get_counter),
+            "rtio_get_destination_status": ctypes.CFUNCTYPE(
+                ctypes.c_bool, ctypes.c_int32)(
+                    self._rtio_get_destination_status),
+            "rtio_output": ctypes.CFUNCTYPE(
+                None, ctypes.c_int32, ctypes.c_int32)(self._rtio_output),
+            "rtio_output_wide": ctypes.CFUNCTYPE(
+                None, ctypes.c_int32, ctypes.POINTER(_CList))(
+                    self._rtio_output_wide),
+            "rtio_input_timestamp": ctypes.CFUNCTYPE(
+                ctypes.c_int64, ctypes.c_int64, ctypes.c_int32)(
+                    self._rtio_input_timestamp),
+            "rtio_input_data": ctypes.CFUNCTYPE(
+                ctypes.c_int32, ctypes.c_int32)(self._rtio_input_data),
+        }
+
+    def get_time_mu(self):
+        return (self._now[0] << 32) | self._now[1]
+
+    def set_time_mu(self, t):
+        self._now[0] = (t >> 32) & 0xffffffff
+        self._now[1] = t & 0xffffffff
+
+    def inject(self, channel, timestamp_mu, data=0):
+        """Queues an input event, to be returned by
+        ``rtio_input_timestamp`` and ``rtio_input_data``."""
+        self.inputs[channel].append((timestamp_mu, data))
+
+    def clear(self):
+        self.timeline.clear()
+        self.inputs.clear()
+        self._input_data.clear()
+
+    def get_state(self):
+        """Returns what kernels change in the recorder, for
+        :meth:`set_state`."""
+        return (self.get_time_mu(), self.counter, self.timeline,
+                self.inputs, self._input_data)
+
+    def set_state(self, state):
+        now, self.counter, self.timeline, self.inputs, self._input_data = \
+            state
+        self.set_time_mu(now)
+
+    def symbols(self):
+        """Returns the addresses of the symbols defined by the recorder."""
+        symbols = {name: ctypes.cast(callback, ctypes.c_void_p).value
+                   for name, callback in self._callbacks.items()}
+        symbols["now"] = ctypes.addressof(self._now)
+        return symbols
+
+    def _rtio_init(self):
+        pass
+
+    def _rtio_get_counter(self):
+        self.counter += self.counter_step
+        return self.counter
+
+    def _rtio_get_destination_status(self, linkno):
+        return True
+
+    def _record(self, target, kind, data):
+        channel = (target >> 8) & 0xffffff
+        self.timeline.append(self.get_time_mu()*self.ref_period,
+                             self.channel_names.get(channel, str(channel)),
+                             kind, data)
+
+    def _rtio_output(self, target, data):
+        address = target & 0xff
+        self._record(target, "write_{}".format(address) if address else "set",
+                     data)
+
+    def _rtio_output_wide(self, target, data):
+        data = data.contents
+        for i in range(data.length):
+            self._record(target, "write_{}_{}".format(target & 0xff, i),
+                         data.data[i])
+
+    def _rtio_input_timestamp(self, timeout_mu, channel):
+        queue = self.inputs[channel]
+        if queue and queue[0][0] <= timeout_mu:
+            timestamp, data = queue.popleft()
+            self._input_data[channel] = data
+            return timestamp
+        return -1
+
+    def _rtio_input_data(self, channel):
+        data = self._input_data.pop(channel, None)
+        if data is None:
+            if self.inputs[channel]:
+                _, data = self.inputs[channel].popleft()
+            else:
+                data = 0
+        return data
+
+
+class _TerminateOnRaise:
+    # Fallback for kernels raising exceptions when libartiq_support is not
+    # loaded: nothing can unwind the native frames, so give up on the
+    # process running the kernel.
+    def __init__(self):
+        self.callbacks = {
+            "__artiq_raise": ctypes.CFUNCTYPE(None, ctypes.c_void_p)(
+                self._terminate),
+            "__artiq_resume": ctypes.CFUNCTYPE(None)(self._terminate),
+            "__artiq_end_catch": ctypes.CFUNCTYPE(None)(self._terminate),
+            "__artiq_personality": ctypes.CFUNCTYPE(ctypes.c_int32)(
+                self._terminate),
+        }
+
+    def _terminate(self, *args):
+        print("Kernel raised an exception, which cannot be handled "
+              "without libartiq_support", file=sys.stderr)
+        sys.stderr.flush()
+        os._exit(1)
+
+    def symbols(self):
+        return {name: ctypes.cast(callback, ctypes.c_void_p).value
+                for name, callback in self.callbacks.items()}
+
+
+class Core(core_driver.Core):
+    """Core device driver that executes kernels on the host.
+
+    :param ref_period: period of the simulated RTIO reference clock.
+    :param libartiq_support: path to the host build of the ARTIQ runtime
+        support library, needed for exception handling.
+    :param counter_step: see :class:`TimelineRecorder`.
+    """
+    def __init__(self, dmgr, ref_period=1e-9, ref_multiplier=8,
+                 libartiq_support=None, counter_step=1000,
+                 report_invariants=False):
+        core_driver.Core.__init__(self, dmgr, host=None,
+                                  ref_period=ref_period,
+                                  ref_multiplier=ref_multiplier,
+                                  report_invariants=report_invariants)
+        self.recorder = TimelineRecorder(ref_period, counter_step,
+                                         self.channel_names())
+
+        if libartiq_support is None:
+            libartiq_support = os.getenv("LIBARTIQ_SUPPORT")
+        if libartiq_support is not None:
+            llvm.load_library_permanently(libartiq_support)
+            self._fallback = None
+        else:
+            self._fallback = _TerminateOnRaise()
+
+    def compile(self, function, args, kwargs):
+        """Stitches a kernel and compiles it for the host. Returns a tuple
+        ``(module, target)`` of the optimized LLVM module and the
+        :class:`~artiq.compiler.targets.NativeTarget` it was compiled
+        with."""
+        try:
+            engine = core_driver._DiagnosticEngine(all_errors_are_fatal=True)
+            stitcher = Stitcher(engine=engine, core=self, dmgr=self.dmgr,
+                                print_as_rpc=False)
+            stitcher.stitch_call(function, args, kwargs)
+            stitcher.finalize()
+            module = Module(stitcher,
+                            ref_period=self.ref_period,
+                            attribute_writeback=False,
+                            remarks=self.report_invariants)
+            target = NativeTarget()
+            return target.compile(module), target
+        except diagnostic.Error as error:
+            raise core_driver.CompileError(error.diagnostic) from error
+
+    def _bind_symbols(self, llmodule):
+        symbols = self.recorder.symbols()
+        if self._fallback is not None:
+            symbols.update(self._fallback.symbols())
+        for name, address in symbols.items():
+            llvm.add_symbol(name, address)
+
+        process = ctypes.CDLL(None)
+        unresolved = [fn.name for fn in llmodule.functions
+                      if fn.is_declaration
+                      and not fn.name.startswith("llvm.")
+                      and fn.name not in symbols
+                      and not llvm.address_of_symbol(fn.name)
+                      and not hasattr(process, fn.name)]
+        if unresolved:
+            raise NotImplementedError(
+                "Kernel uses functions not available on the host: " +
+                ", ".join(sorted(unresolved)))
+
+    def run(self, function, args, kwargs):
+        llmodule, target = self.compile(function, args, kwargs)
+        self._bind_symbols(llmodule)
+
+        llmachine = llvm.Target.from_triple(target.triple).create_target_machine()
+        lljit = llvm.create_mcjit_compiler(llmodule, llmachine)
+        lljit.finalize_object()
+        entry = next(fn.name for fn in llmodule.functions
+                     if fn.name.endswith("__modinit__"))
+        entry = ctypes.CFUNCTYPE(None)(lljit.get_function_address(entry))
+        if hasattr(os, "fork"):
+            self._run_in_child(entry)
+        else:
+            entry()
+
+    def _run_in_child(self, entry):
+        # A kernel exception that is not caught terminates the process
+        # running the kernel, which must therefore not be this one. The
+        # child sends back the state of the recorder once the kernel has
+        # completed.
+        rfd, wfd = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                os.close(rfd)
+                entry()
+                with os.fdopen(wfd, "wb") as f:
+                    pickle.dump(self.recorder.get_state(), f)
+                status = 0
+            except:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+        os.close(wfd)
+        with os.fdopen(rfd, "rb") as f:
+            state = f.read()
+        _, status = os.waitpid(pid, 0)
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            self.recorder.set_state(pickle.loads(state))
+        else:
+            raise KernelError("Kernel terminated with an uncaught exception")
+
+    def precompile(self, function, *args, **kwargs):
+        raise NotImplementedError("Precompilation is not supported "
+                                  "by the host JIT")
+
+    def channel_names(self):
+        """Returns a mapping from RTIO channel numbers to device names, for
+        :class:`TimelineRecorder`."""
+        names = dict()
+        for name, desc in self.dmgr.get_device_db().items():
+            if isinstance(desc, dict) and desc.get("type") == "local":
+                channel = desc.get("arguments", {}).get("channel")
+                if isinstance(channel, int):
+                    names[channel] = name
+        return names
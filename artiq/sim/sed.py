@@ -0,0 +1,439 @@
+"""Event-level model of the RTIO output SED (scalable event dispatcher) lane
+distributor and FIFOs, for RTIO throughput planning.
+
+The model replays a stream of RTIO output events, in the order in which the
+CPU (or DMA engine) submits them, through the lane selection, underflow and
+sequence error logic of :class:`artiq.gateware.rtio.sed.lane_distributor.LaneDistributor`,
+and through the lane FIFOs of :class:`artiq.gateware.rtio.sed.fifos.FIFOs`,
+which are drained when the RTIO counter reaches the timestamp of their
+oldest event. The time at which each event is submitted is either given
+(e.g. from an analyzer dump) or modelled as a fixed interval between
+submissions, delayed by the stalls caused by full FIFOs.
+
+Times are in coarse RTIO cycles. Runs of events that do not underflow, cause
+sequence errors, fill a FIFO or force a lane switch are processed with numpy;
+the other events are stepped through one by one.
+
+Event streams can be obtained with :func:`events_from_analyzer_dump`,
+:func:`events_from_dma_trace` and :func:`events_from_timeline`.
+"""
+
+from collections import deque, namedtuple
+
+import numpy as np
+
+
+__all__ = ["STATUS_OK", "STATUS_UNDERFLOW", "STATUS_SEQUENCE_ERROR",
+           "STATUS_QUASHED", "SEDModel", "SEDReplay",
+           "EventStream", "events_from_analyzer_dump",
+           "events_from_dma_trace", "events_from_timeline"]
+
+
+#: The event was written into a lane.
+STATUS_OK = 0
+#: The event was dropped because its timestamp was too close to the RTIO
+#: counter. On hardware, this raises :exc:`RTIOUnderflow` in the kernel.
+STATUS_UNDERFLOW = 1
+#: The event was dropped because the selected lane already held a later or
+#: simultaneous event. This is reported asynchronously in the core log.
+STATUS_SEQUENCE_ERROR = 2
+#: The event was sent to a quash channel (e.g. the RTIO log channel), which
+#: is ignored by the lane distributor.
+STATUS_QUASHED = 3
+
+_STATUS_NAMES = ["ok", "underflow", "sequence error", "quashed"]
+
+#: RTIO output events, as arrays with one element per event in submission
+#: order. ``timestamp`` and ``write_time`` (the value of the RTIO counter
+#: when the event was submitted, or None if unknown) are in machine units.
+EventStream = namedtuple("EventStream", "channel timestamp write_time")
+
+
+class SEDReplay:
+    """Result of :meth:`SEDModel.replay`.
+
+    The following arrays have one element per event:
+
+    * ``lane``: lane the event was written into, or -1.
+    * ``status``: one of the ``STATUS_*`` constants.
+    * ``write_time``: time at which the event was submitted, in coarse RTIO
+      cycles.
+    * ``level``: number of events in the lane after the write, or 0.
+
+    The other attributes summarize the replay:
+
+    * ``lane_switches``: number of writes into a lane other than the
+      previous one, of which ``forced_switches`` were forced by a lane
+      reaching its high watermark.
+    * ``peak_level``: maximum number of events held by each lane.
+    * ``stall_cycles``: total time the submitter waited for a full lane.
+    """
+    def __init__(self, lane, status, write_time, level, lane_switches,
+                 forced_switches, peak_level, stall_cycles):
+        self.lane = lane
+        self.status = status
+        self.write_time = write_time
+        self.level = level
+        self.lane_switches = lane_switches
+        self.forced_switches = forced_switches
+        self.peak_level = peak_level
+        self.stall_cycles = stall_cycles
+
+    def count(self, status):
+        """Returns the number of events with the given status."""
+        return int(np.count_nonzero(self.status == status))
+
+    def errors(self):
+        """Returns the indices of the events that underflowed or caused a
+        sequence error."""
+        return np.flatnonzero((self.status == STATUS_UNDERFLOW)
+                              | (self.status == STATUS_SEQUENCE_ERROR))
+
+    def report(self):
+        """Returns a human-readable summary of the replay."""
+        lines = ["{} events".format(len(self.status))]
+        for status, name in enumerate(_STATUS_NAMES):
+            if status != STATUS_OK:
+                count = self.count(status)
+                if count:
+                    first = np.flatnonzero(self.status == status)[0]
+                    lines.append("{}: {} (first at event {})".format(
+                        name, count, first))
+        lines.append("lane switches: {} ({} forced)".format(
+            self.lane_switches, self.forced_switches))
+        lines.append("peak lane occupancy: {}".format(
+            " ".join(str(level) for level in self.peak_level)))
+        lines.append("stall cycles: {}".format(self.stall_cycles))
+        return "\n".join(lines)
+
+
+class SEDModel:
+    """Model of an SED core.
+
+    The parameters are those of :class:`artiq.gateware.rtio.sed.core.SED`.
+
+    :param compensation: Latency compensation of each channel in coarse RTIO
+        cycles, as a sequence indexed by channel or a dictionary (missing
+        channels have no compensation).
+    :param enable_spread: Whether to switch to the next lane when the
+        current lane reaches its high watermark (``sed_spread_enable`` core
+        device configuration key).
+    :param underflow_margin: Minimum difference, in coarse RTIO cycles,
+        between the timestamp of an event and the RTIO counter when the
+        event is submitted (12 for local RTIO, 16 for DRTIO satellites).
+    """
+    def __init__(self, lane_count=8, fifo_depth=128, fifo_high_watermark=1.0,
+                 compensation=None, glbl_fine_ts_width=3,
+                 enable_spread=False, quash_channels=(),
+                 underflow_margin=12):
+        if lane_count & (lane_count - 1):
+            raise ValueError("lane count must be a power of 2")
+        self.lane_count = lane_count
+        self.fifo_depth = fifo_depth
+        self.high_watermark = int(fifo_high_watermark*fifo_depth)
+        if not 0 < self.high_watermark <= fifo_depth:
+            raise ValueError("invalid FIFO high watermark")
+        if compensation is None:
+            compensation = dict()
+        elif not isinstance(compensation, dict):
+            compensation = dict(enumerate(compensation))
+        self.compensation = compensation
+        self.glbl_fine_ts_width = glbl_fine_ts_width
+        self.enable_spread = enable_spread
+        self.quash_channels = list(quash_channels)
+        self.underflow_margin = underflow_margin
+
+    def _compensate(self, channel):
+        compensation = np.zeros(len(channel), dtype=np.int64)
+        for c, value in self.compensation.items():
+            compensation[channel == c] = value
+        return compensation
+
+    def replay(self, channel, timestamp, write_time=None, write_interval=16,
+               start=None):
+        """Replays a stream of output events.
+
+        :param channel: RTIO channel of each event.
+        :param timestamp: Timestamp of each event in machine units.
+        :param write_time: RTIO counter value at which each event is
+            submitted if the submitter is never stalled, in machine units.
+            By default, events are submitted every ``write_interval`` coarse
+            RTIO cycles from ``start``.
+        :param write_interval: Time taken to submit an event, in coarse RTIO
+            cycles.
+        :param start: Time of the first submission in coarse RTIO cycles.
+            The default leaves the same slack as
+            :meth:`artiq.coredevice.core.Core.break_realtime` (125 us) before
+            the first event.
+        :return: :class:`SEDReplay`.
+        """
+        fine_ts_width = self.glbl_fine_ts_width
+        channel = np.asarray(channel, dtype=np.int64)
+        timestamp = np.asarray(timestamp, dtype=np.int64)
+        n = len(channel)
+        if timestamp.shape != (n,):
+            raise ValueError("channel and timestamp must have the same length")
+        coarse = (timestamp >> fine_ts_width) + self._compensate(channel)
+        if write_time is None:
+            if start is None:
+                start = int(timestamp[0] >> fine_ts_width) - 15625 if n else 0
+            issue = start + np.arange(n, dtype=np.int64)*write_interval
+        else:
+            issue = np.asarray(write_time, dtype=np.int64) >> fine_ts_width
+            if issue.shape != (n,):
+                raise ValueError("write times must have one element per "
+                                 "event")
+        return _Replay(self, coarse, issue,
+                       np.isin(channel, self.quash_channels)).run()
+
+
+class _Replay:
+    def __init__(self, model, coarse, issue, quashed):
+        self.lane_count = model.lane_count
+        self.depth = model.fifo_depth
+        self.high_watermark = model.high_watermark
+        self.spread = model.enable_spread
+        self.margin = model.underflow_margin
+        self.coarse = coarse
+        self.issue = issue
+        # for stepping through events one by one
+        self.coarse_list = coarse.tolist()
+        self.issue_list = issue.tolist()
+
+        n = len(coarse)
+        self.lane = np.full(n, -1, dtype=np.int64)
+        self.status = np.zeros(n, dtype=np.int8)
+        self.status[quashed] = STATUS_QUASHED
+        self.level = np.zeros(n, dtype=np.int64)
+        self.delay = np.zeros(n, dtype=np.int64)
+        self.active = np.flatnonzero(~quashed)
+
+        # Lane distributor registers, with their reset values
+        self.current_lane = 0
+        self.last_timestamp = 0
+        self.lane_timestamps = [0]*self.lane_count
+        self.force_lane_b = False
+        # Timestamps of the events in each FIFO, possibly including some
+        # that have already been read out
+        self.fifos = [deque() for _ in range(self.lane_count)]
+        # Submitter state: accumulated stall time, and time at which the
+        # current lane becomes writable again
+        self.stall = 0
+        self.ready = -(1 << 62)
+
+        self.lane_switches = 0
+        self.forced_switches = 0
+        self.peak_level = np.zeros(self.lane_count, dtype=np.int64)
+
+    def run(self):
+        position = 0
+        chunk = 1024
+        while position < len(self.active):
+            end = min(position + chunk, len(self.active))
+            accepted = self.run_vectorized(position, end)
+            position += accepted
+            if position == end:
+                chunk = min(2*chunk, 1 << 16)
+                continue
+            # the next event needs the full model; events that need it tend
+            # to be clustered, so the following ones are stepped through too
+            # if this happens early in the chunk
+            steps = 1 if accepted >= 8 else 64
+            chunk = max(chunk//2, 16)
+            for i in self.active[position:position + steps].tolist():
+                self.step(i)
+            position = min(position + steps, len(self.active))
+
+        stall = self.delay
+        if len(self.active):
+            # quashed events share the stall time of the preceding event
+            index = np.zeros(len(stall), dtype=np.int64)
+            index[self.active] = self.active
+            index = np.maximum.accumulate(index)
+            stall = np.where(index >= self.active[0], self.delay[index], 0)
+        write_time = self.issue + stall
+        return SEDReplay(self.lane, self.status, write_time, self.level,
+                         self.lane_switches, self.forced_switches,
+                         self.peak_level, self.stall)
+
+    def step(self, i):
+        issue = self.issue_list[i]
+        t = max(issue + self.stall, self.ready)
+        self.stall = t - issue
+        self.delay[i] = self.stall
+        timestamp = self.coarse_list[i]
+        natural_switch = timestamp <= self.last_timestamp
+        if self.force_lane_b or natural_switch:
+            lane = (self.current_lane + 1) % self.lane_count
+        else:
+            lane = self.current_lane
+        if timestamp <= t + self.margin:
+            self.status[i] = STATUS_UNDERFLOW
+            return
+        if timestamp <= self.lane_timestamps[lane]:
+            self.status[i] = STATUS_SEQUENCE_ERROR
+            return
+
+        fifo = self.fifos[lane]
+        while fifo and fifo[0] < t:
+            fifo.popleft()
+        # a lane only receives events while it is the current lane, and the
+        # submitter waits whenever the current lane is full, so the FIFO
+        # never overflows
+        fifo.append(timestamp)
+        self.lane[i] = lane
+        level = len(fifo)
+        self.level[i] = level
+        if level > self.peak_level[lane]:
+            self.peak_level[lane] = level
+
+        if lane != self.current_lane:
+            self.lane_switches += 1
+            if not natural_switch:
+                self.forced_switches += 1
+        self.current_lane = lane
+        self.last_timestamp = timestamp
+        self.lane_timestamps[lane] = timestamp
+        self.force_lane_b = self.spread and level >= self.high_watermark
+        if level >= self.depth:
+            # the submitter waits until the oldest event is read out
+            self.ready = fifo[0] + 1
+
+    def run_vectorized(self, start, end):
+        # Processes events under the assumption that none of them
+        # underflows, causes a sequence error, fills its lane or forces a
+        # lane switch, and returns the number of events for which this holds.
+        index = self.active[start:end]
+        timestamp = self.coarse[index]
+        issue = self.issue[index]
+        t = issue + np.maximum(self.stall,
+                               np.maximum.accumulate(self.ready - issue))
+
+        previous = np.empty_like(timestamp)
+        previous[0] = self.last_timestamp
+        previous[1:] = timestamp[:-1]
+        natural_switch = timestamp <= previous
+        switch = natural_switch.copy()
+        switch[0] |= self.force_lane_b
+        lane = (self.current_lane + np.cumsum(switch)) % self.lane_count
+
+        order = np.argsort(lane, kind="stable")
+        sorted_lane = lane[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_lane[1:] != sorted_lane[:-1]
+        lane_previous = np.empty_like(timestamp)
+        lane_previous[order[1:]] = timestamp[order[:-1]]
+        lane_previous[order[first]] = np.array(
+            self.lane_timestamps)[sorted_lane[first]]
+        bad = (timestamp <= t + self.margin) | (timestamp <= lane_previous)
+        accepted = int(np.argmax(bad)) if bad.any() else len(index)
+
+        # FIFO levels, over the events that are written
+        level = np.empty(accepted, dtype=np.int64)
+        for l in np.unique(lane[:accepted]).tolist():
+            in_lane = np.flatnonzero(lane[:accepted] == l)
+            fifo = np.array(self.fifos[l], dtype=np.int64)
+            timestamps = np.concatenate([fifo, timestamp[in_lane]])
+            level[in_lane] = (len(fifo) + 1 + np.arange(len(in_lane))
+                              - np.searchsorted(timestamps, t[in_lane]))
+        full = level >= (self.high_watermark if self.spread else self.depth)
+        if full.any():
+            accepted = int(np.argmax(full))
+        if not accepted:
+            return 0
+
+        level = level[:accepted]
+        lane = lane[:accepted]
+        timestamp = timestamp[:accepted]
+        index = index[:accepted]
+        self.lane[index] = lane
+        self.level[index] = level
+        self.delay[index] = t[:accepted] - self.issue[index]
+        self.stall = int(self.delay[index[-1]])
+        np.maximum.at(self.peak_level, lane, level)
+
+        lane_changes = lane != np.concatenate([[self.current_lane],
+                                               lane[:-1]])
+        self.lane_switches += int(np.count_nonzero(lane_changes))
+        self.forced_switches += int(lane_changes[0] and not natural_switch[0])
+        for l in np.unique(lane).tolist():
+            in_lane = timestamp[lane == l]
+            fifo = self.fifos[l]
+            fifo.extend(in_lane.tolist())
+            self.lane_timestamps[l] = int(in_lane[-1])
+        now = int(t[accepted - 1])
+        for fifo in self.fifos:
+            while fifo and fifo[0] < now:
+                fifo.popleft()
+        self.current_lane = int(lane[-1])
+        self.last_timestamp = int(timestamp[-1])
+        self.force_lane_b = False
+        return accepted
+
+
+def events_from_analyzer_dump(dump):
+    """Extracts the output events of a decoded analyzer dump (see
+    :func:`artiq.coredevice.comm_analyzer.decode_dump`), with the RTIO
+    counter values at which they were submitted.
+
+    Writes to the RTIO log channel are included; pass ``dump.log_channel``
+    in the ``quash_channels`` of the model to ignore them.
+    """
+    from artiq.coredevice.comm_analyzer import OutputMessage
+
+    messages = [m for m in dump.messages if isinstance(m, OutputMessage)]
+    return EventStream(
+        np.array([m.channel for m in messages], dtype=np.int64),
+        np.array([m.timestamp for m in messages], dtype=np.int64),
+        np.array([m.rtio_counter for m in messages], dtype=np.int64))
+
+
+def events_from_dma_trace(trace, timestamp=0):
+    """Extracts the output events of a DMA trace, in the format of
+    :func:`artiq.coredevice.dma.encode_trace`.
+
+    :param timestamp: Playback start time in machine units, added to the
+        timestamps of the trace.
+    """
+    trace = np.frombuffer(trace, dtype=np.uint8)
+    offsets = []
+    position = 0
+    while position < len(trace) and trace[position]:
+        offsets.append(position)
+        position += int(trace[position])
+    offsets = np.array(offsets, dtype=np.int64)
+    channel = np.zeros(len(offsets), dtype=np.int64)
+    for i in range(3):
+        channel |= trace[offsets + 1 + i].astype(np.int64) << 8*i
+    timestamps = np.zeros(len(offsets), dtype=np.uint64)
+    for i in range(8):
+        timestamps |= trace[offsets + 4 + i].astype(np.uint64) << np.uint64(8*i)
+    return EventStream(channel, timestamps.view(np.int64) + timestamp, None)
+
+
+def events_from_timeline(timeline, channels, ref_period=1e-9):
+    """Extracts the output events of a simulation timeline (see
+    :class:`artiq.sim.time.Timeline`), in the order in which they were
+    recorded.
+
+    A pulse becomes two events, at its start and at its end.
+
+    :param channels: Dictionary mapping the names of the simulated devices
+        to RTIO channels. The events of other devices are ignored.
+    :param ref_period: Duration of a machine unit in the units of the
+        timeline.
+    """
+    data = timeline.recorded()
+    device_channel = np.array([channels.get(name, -1)
+                               for name in timeline.devices], dtype=np.int64)
+    data = data[device_channel[data["device"]] >= 0]
+    pulse = np.array(["pulse" == kind for kind in timeline.kinds],
+                     dtype=bool)[data["kind"]]
+    # each event, followed by the end of the pulse for pulses
+    count = 1 + pulse
+    source = np.repeat(np.arange(len(data)), count)
+    end = np.zeros(len(source), dtype=bool)
+    end[np.cumsum(count)[pulse] - 1] = True
+    time = data["time"][source] + np.where(end, data["duration"][source], 0)
+    return EventStream(device_channel[data["device"][source]],
+                       np.rint(time/ref_period).astype(np.int64), None)
@@ -1,4 +1,4 @@
-from operator import itemgetter
+import numpy as np
 
 from artiq.language.units import *
 from artiq.language import core as core_language
@@ -24,10 +24,261 @@ class ParallelTimeContext:
             self.block_duration = amount
 
 
+EVENT_DTYPE = np.dtype([
+    ("time", np.float64),
+    ("device", np.int32),
+    ("kind", np.int32),
+    ("value", np.float64),
+    ("duration", np.float64),
+])
+
+PULSE_DTYPE = np.dtype([
+    ("start", np.float64),
+    ("duration", np.float64),
+    ("value", np.float64),
+])
+
+
+class Timeline:
+    """Simulated events, stored column-wise in growable numpy arrays.
+
+    Device names and event kinds are interned, and stored as indices into
+    :attr:`devices` and :attr:`kinds`. Events are kept in the order they
+    were recorded, which is not chronological in the presence of parallel
+    blocks; :meth:`events` and :meth:`pulses` sort them by time.
+
+    Event kinds are those used by :mod:`artiq.sim.devices` (``pulse``,
+    ``set``, ``set_voltage``, ``gate_rising``, ``count``...). ``value`` is
+    ``NaN`` for events without one, and ``duration`` is 0 for instantaneous
+    events.
+    """
+    def __init__(self, capacity=1024):
+        self.devices = []
+        self.kinds = []
+        self._device_ids = dict()
+        self._kind_ids = dict()
+        self._data = np.empty(capacity, EVENT_DTYPE)
+        self._length = 0
+        self._sorted = None
+
+    def __len__(self):
+        return self._length
+
+    def _intern(self, names, ids, name):
+        try:
+            return ids[name]
+        except KeyError:
+            ids[name] = len(names)
+            names.append(name)
+            return ids[name]
+
+    def append(self, time, device, kind, value=float("nan"), duration=0.0):
+        if self._length == len(self._data):
+            data = np.empty(2*len(self._data), EVENT_DTYPE)
+            data[:self._length] = self._data
+            self._data = data
+        self._data[self._length] = (
+            time,
+            self._intern(self.devices, self._device_ids, device),
+            self._intern(self.kinds, self._kind_ids, kind),
+            value, duration)
+        self._length += 1
+        self._sorted = None
+
+    def clear(self):
+        self._length = 0
+        self._sorted = None
+
+    def _chronological(self):
+        if self._sorted is None:
+            data = self._data[:self._length]
+            self._sorted = data[np.argsort(data["time"], kind="stable")]
+        return self._sorted
+
+    def recorded(self):
+        """Returns all events as a structured array (see :meth:`events`), in
+        the order in which they were recorded."""
+        return self._data[:self._length].copy()
+
+    def events(self, device=None, kind=None):
+        """Returns the events of ``device`` and of the given ``kind`` (all
+        events if ``None``) as a structured array sorted by time, with the
+        fields ``time``, ``device``, ``kind``, ``value`` and ``duration``."""
+        data = self._chronological()
+        mask = np.ones(len(data), bool)
+        for name, ids, field in ((device, self._device_ids, "device"),
+                                 (kind, self._kind_ids, "kind")):
+            if name is not None:
+                if name not in ids:
+                    return data[:0]
+                mask &= data[field] == ids[name]
+        return data[mask]
+
+    def times(self, device=None, kind=None):
+        """Returns the times of the matching events, see :meth:`events`."""
+        return self.events(device, kind)["time"]
+
+    def pulses(self, device):
+        """Returns the pulse train of ``device`` as a structured array with
+        the fields ``start``, ``duration`` and ``value``, sorted by start time.
+
+        Both ``pulse`` events and intervals during which the output was
+        ``set`` to a nonzero value are reported. A level still set at the
+        end of the timeline gives a pulse of infinite duration.
+        """
+        data = self.events(device)
+        kinds = data["kind"]
+
+        pulse_kind = self._kind_ids.get("pulse")
+        explicit = data[kinds == pulse_kind]
+        explicit_value = np.where(np.isnan(explicit["value"]),
+                                  1.0, explicit["value"])
+
+        set_kinds = [self._kind_ids[k] for k in ("set", "set_voltage")
+                     if k in self._kind_ids]
+        levels = data[np.isin(kinds, set_kinds)]
+        level_time = levels["time"]
+        level_value = levels["value"]
+        # one pulse per transition from zero (or a different level) to a
+        # nonzero level, ending at the next transition
+        change = np.ones(len(levels), bool)
+        change[1:] = level_value[1:] != level_value[:-1]
+        level_time = level_time[change]
+        level_value = level_value[change]
+        end = np.append(level_time[1:], np.inf)
+        high = level_value != 0
+
+        pulses = np.empty(len(explicit) + np.count_nonzero(high), PULSE_DTYPE)
+        n = len(explicit)
+        pulses["start"][:n] = explicit["time"]
+        pulses["duration"][:n] = explicit["duration"]
+        pulses["value"][:n] = explicit_value
+        pulses["start"][n:] = level_time[high]
+        pulses["duration"][n:] = end[high] - level_time[high]
+        pulses["value"][n:] = level_value[high]
+        return pulses[np.argsort(pulses["start"], kind="stable")]
+
+    def iter_lines(self):
+        """Yields the formatted lines of the timeline, in chronological
+        order."""
+        prev_time = 0*s
+        data = self._chronological()
+        for time, device, kind, value, duration in zip(
+                *(data[field].tolist() for field in EVENT_DTYPE.names)):
+            line = "@{:.9f} (+{:.9f}) {:16}{:16}".format(
+                time, time - prev_time, self.kinds[kind], self.devices[device])
+            if value == value:
+                line += "{:16}".format(str(value))
+            if duration:
+                line += "{:16}".format(str(duration))
+            yield line + "\n"
+            prev_time = time
+
+    def write(self, f):
+        for line in self.iter_lines():
+            f.write(line)
+
+    def format(self):
+        return "".join(self.iter_lines())
+
+    def to_target(self, manager, timescale=1e-12):
+        """Writes the timeline into a :mod:`artiq.coredevice.comm_analyzer`
+        manager (:class:`~artiq.coredevice.comm_analyzer.VCDManager` or
+        :class:`~artiq.coredevice.comm_analyzer.WaveformManager`).
+
+        Each device becomes a channel carrying its output level: binary if
+        the device only takes the values 0 and 1, analog otherwise. Events
+        that do not change an output level (gates, counts...) are written as
+        messages to a ``sim_events`` log channel. ``timescale`` is the time
+        unit of the exported data, in seconds.
+        """
+        from artiq.coredevice.comm_analyzer import WaveformType
+
+        data = self._chronological()
+        kind_ids = self._kind_ids
+        is_pulse = data["kind"] == kind_ids.get("pulse")
+        is_level = is_pulse | np.isin(
+            data["kind"], [kind_ids[k] for k in ("set", "set_voltage")
+                           if k in kind_ids])
+
+        # level transitions: the end of every pulse, and the start of every
+        # level event
+        values = np.where(np.isnan(data["value"]) & is_pulse,
+                          1.0, data["value"])
+        pulses = data[is_pulse]
+        t = np.concatenate([pulses["time"] + pulses["duration"],
+                            data["time"][is_level]])
+        device = np.concatenate([pulses["device"], data["device"][is_level]])
+        value = np.concatenate([np.zeros(len(pulses)), values[is_level]])
+        # pulse ends sort before level changes at the same time, so that
+        # back-to-back pulses keep the output high
+        order = np.lexsort((np.arange(len(t)), np.rint(t/timescale)))
+        t = np.rint(t[order]/timescale).astype(np.int64)
+        device = device[order]
+        value = value[order]
+
+        manager.set_timescale_ps(timescale*1e12)
+        channels = dict()
+        for i in np.unique(device):
+            name = self.devices[i]
+            device_values = value[device == i]
+            if np.all((device_values == 0) | (device_values == 1)):
+                channels[i] = (manager.get_channel(
+                    "sim/" + name, 1, ty=WaveformType.BIT), True)
+            else:
+                channels[i] = (manager.get_channel(
+                    "sim/" + name, 64, ty=WaveformType.ANALOG), False)
+        others = data[~is_level]
+        other_t = np.rint(others["time"]/timescale).astype(np.int64).tolist()
+        messages = [self._format_message(event) for event in others]
+        if messages:
+            log = manager.get_channel("sim_events",
+                                      8*max(map(len, messages)),
+                                      ty=WaveformType.LOG)
+        manager.set_time(0)
+        j = 0
+        for ti, di, vi in zip(t.tolist(), device.tolist(), value.tolist()):
+            while j < len(messages) and other_t[j] <= ti:
+                manager.set_time(other_t[j])
+                log.set_log(messages[j])
+                j += 1
+            manager.set_time(ti)
+            channel, binary = channels[di]
+            if binary:
+                channel.set_value("1" if vi else "0")
+            else:
+                channel.set_value_double(vi)
+        for j in range(j, len(messages)):
+            manager.set_time(other_t[j])
+            log.set_log(messages[j])
+        manager.set_end_time(max(t[-1:].tolist() + other_t[-1:], default=0))
+
+    def _format_message(self, event):
+        message = "{} {}".format(self.kinds[event["kind"]],
+                                 self.devices[event["device"]])
+        if event["value"] == event["value"]:
+            message += " {}".format(event["value"])
+        return message
+
+    def to_vcd(self, fileobj, timescale=1e-12):
+        """Exports the timeline as a VCD file, see :meth:`to_target`."""
+        from artiq.coredevice.comm_analyzer import VCDManager
+        self.to_target(VCDManager(fileobj), timescale)
+
+    def to_waveform_data(self, timescale=1e-12):
+        """Exports the timeline in the format of
+        :func:`artiq.coredevice.comm_analyzer.decoded_dump_to_waveform_data`,
+        see :meth:`to_target`."""
+        from artiq.coredevice.comm_analyzer import WaveformManager
+        manager = WaveformManager()
+        self.to_target(manager, timescale)
+        return manager.trace
+
+
 class Manager:
     def __init__(self):
         self.stack = [SequentialTimeContext(0*s)]
-        self.timeline = []
+        self.timeline = Timeline()
 
     def enter_sequential(self):
         new_context = SequentialTimeContext(self.get_time_mu())
@@ -55,19 +306,18 @@ class Manager:
 
     take_time = take_time_mu
 
+    def record(self, kind, device, value=float("nan"), duration=0.0):
+        """Records an event at the current time, see :class:`Timeline`."""
+        self.timeline.append(self.get_time_mu(), device, kind,
+                             value, duration)
+
     def event(self, description):
-        self.timeline.append((self.get_time_mu(), description))
+        """Records an event described by a tuple
+        ``(kind, device[, value][, duration])``."""
+        self.record(*description)
 
     def format_timeline(self):
-        r = ""
-        prev_time = 0*s
-        for time, description in sorted(self.timeline, key=itemgetter(0)):
-            r += "@{:.9f} (+{:.9f}) ".format(time, time-prev_time)
-            for item in description:
-                r += "{:16}".format(str(item))
-            r += "\n"
-            prev_time = time
-        return r
+        return self.timeline.format()
 
 manager = Manager()
 core_language.set_time_manager(manager)
@@ -0,0 +1,148 @@
+import io
+import os
+import random
+import struct
+import tempfile
+import unittest
+
+from artiq.coredevice.comm_analyzer import *
+from artiq.coredevice.analyzer_trace import *
+
+
+DEVICES = {
+    "core": {
+        "type": "local",
+        "module": "artiq.coredevice.core",
+        "class": "Core",
+        "arguments": {"host": "192.168.1.60", "ref_period": 1e-9}
+    },
+    "ttl0": {
+        "type": "local",
+        "module": "artiq.coredevice.ttl",
+        "class": "TTLOut",
+        "arguments": {"channel": 0}
+    },
+    "ttl1": {
+        "type": "local",
+        "module": "artiq.coredevice.ttl",
+        "class": "TTLInOut",
+        "arguments": {"channel": 1}
+    },
+    "led": "ttl0"
+}
+
+LOG_CHANNEL = 2
+
+
+def _message(message_type, channel=0, timestamp=0, rtio_counter=0,
+             address=0, data=0):
+    return struct.pack(">QIQQI", data, address, rtio_counter, timestamp,
+                       (channel << 2) | message_type.value)
+
+
+def _log_messages(timestamp, text):
+    text = text.encode() + b"\x1d"
+    text += bytes(-len(text) % 4)
+    return [_message(MessageType.output, LOG_CHANNEL, timestamp, timestamp,
+                     data=int.from_bytes(text[i:i + 4], "big"))
+            for i in range(0, len(text), 4)]
+
+
+def _make_dump(n, endian=">"):
+    rng = random.Random(0)
+    messages = []
+    timestamp = 1000
+    for i in range(n):
+        timestamp += rng.randrange(1, 100)
+        rtio_counter = timestamp - rng.randrange(-50, 1000)
+        channel = rng.randrange(2)
+        if channel and rng.random() < 0.5:
+            messages.append(_message(MessageType.input, channel, timestamp,
+                                     rtio_counter, data=rng.randrange(2)))
+        else:
+            messages.append(_message(MessageType.output, channel, timestamp,
+                                     rtio_counter, data=rng.randrange(2)))
+        if i % 100 == 0:
+            messages += _log_messages(timestamp, "sweep\x1e" + str(i))
+    messages.append(_message(
+        MessageType.exception, 0, rtio_counter=timestamp,
+        address=ExceptionType.o_underflow.value))
+    messages.append(_message(MessageType.stopped,
+                             rtio_counter=timestamp + 100))
+    messages = b"".join(messages)
+    return (b"E" if endian == ">" else b"e") + struct.pack(
+        endian + "IQbbb", len(messages), 2*len(messages), 0,
+        LOG_CHANNEL, 0) + messages
+
+
+class AnalyzerTraceCase(unittest.TestCase):
+    def test_round_trip(self):
+        for endian in ">", "<":
+            dump = _make_dump(1000, endian)
+            f = io.BytesIO()
+            dump_to_trace(dump, f, chunk_size=64)
+            self.assertTrue(is_trace(f.getvalue()))
+            self.assertLess(len(f.getvalue()), len(dump)//2)
+            with Trace(f.getvalue()) as trace:
+                self.assertEqual(trace.to_dump(), dump)
+                self.assertEqual(trace.decoded_dump(), decode_dump(dump))
+                self.assertEqual(trace.channels, [0, 1, LOG_CHANNEL])
+
+    def test_empty(self):
+        dump = _message(MessageType.stopped, rtio_counter=100)
+        dump = b"E" + struct.pack(">IQbbb", 32, 32, 0, 0, 0) + dump
+        f = io.BytesIO()
+        dump_to_trace(dump, f)
+        with Trace(f.getvalue()) as trace:
+            self.assertEqual(trace.channels, [])
+            self.assertEqual(trace.decoded_dump().messages,
+                             [StoppedMessage(100)])
+            self.assertEqual(trace.to_dump(), dump)
+        with self.assertRaises(ValueError):
+            Trace(f.getvalue()[:-1])
+        with self.assertRaises(ValueError):
+            Trace(dump)
+
+    def test_windowed_read(self):
+        dump = _make_dump(1000)
+        messages = decode_dump(dump).messages
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "trace")
+            with open(filename, "wb") as f:
+                dump_to_trace(dump, f, chunk_size=64)
+            with Trace(filename) as trace:
+                first, last = trace.time_range
+                start = first + (last - first)//3
+                end = first + 2*(last - first)//3
+                expected = [m for m in messages
+                            if isinstance(m, StoppedMessage)
+                            or (m.channel == 1
+                                and start <= get_message_time(m) < end)]
+                self.assertEqual(trace.messages([1], start, end), expected)
+                self.assertLess(len(trace.read([1], start, end)),
+                                trace.message_count//4)
+
+    def test_waveform_data(self):
+        dump = _make_dump(1000)
+        expected = decoded_dump_to_waveform_data(DEVICES, decode_dump(dump))
+        self.assertEqual(get_rtio_channels(DEVICES),
+                         {"ttl/ttl0": 0, "ttl/ttl1": 1})
+        f = io.BytesIO()
+        dump_to_trace(dump, f, chunk_size=64)
+        with Trace(f.getvalue()) as trace:
+            self.assertEqual(trace_to_waveform_data(DEVICES, trace),
+                             expected)
+            waveform_data = trace_to_waveform_data(
+                DEVICES, trace, ["ttl/ttl1", "logs/sweep"])
+            self.assertEqual(waveform_data["data"], {
+                "ttl/ttl1": expected["data"]["ttl/ttl1"],
+                "logs/sweep": expected["data"]["logs/sweep"]})
+            self.assertEqual(waveform_data["stopped_x"],
+                             expected["stopped_x"])
+            self.assertEqual(waveform_data["logs"], expected["logs"])
+
+            vcd = io.StringIO()
+            trace_to_vcd(vcd, DEVICES, trace)
+            expected_vcd = io.StringIO()
+            decoded_dump_to_vcd(expected_vcd, DEVICES, decode_dump(dump))
+            self.assertEqual(vcd.getvalue(), expected_vcd.getvalue())
@@ -0,0 +1,190 @@
+import os
+import tempfile
+import time
+import unittest
+
+import h5py
+import numpy as np
+from sipyco import pyon
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+from artiq.browser.files import (LAZY_LOAD_THRESHOLD, read_metadata,
+                                 index_results, format_metadata,
+                                 ThumbnailCache)
+
+
+def _png():
+    image = QtGui.QImage(4, 2, QtGui.QImage.Format.Format_RGB32)
+    image.fill(0)
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(buffer.data())
+
+
+def _write_results(filename, thumbnail=None):
+    with h5py.File(filename, "w") as f:
+        f["artiq_version"] = "9.0"
+        f["rid"] = 42
+        f["start_time"] = 1700000000
+        f["expid"] = pyon.encode({"file": "repository/exp.py",
+                                  "class_name": "Exp", "repo_rev": "abc"})
+        f["archive/a"] = 1
+        f["archive/both"] = 2
+        f["archive/large"] = np.zeros(LAZY_LOAD_THRESHOLD//8 + 1)
+        f["datasets/both"] = 3
+        f["datasets/group/b"] = [1., 2.]
+        f["datasets/group/b"].attrs["unit"] = "V"
+        if thumbnail is not None:
+            f["datasets/thumbnail"] = np.void(thumbnail)
+
+
+class ResultsCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "results.h5")
+        _write_results(self.filename)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read_metadata(self):
+        with h5py.File(self.filename, "r") as f:
+            metadata = read_metadata(f)
+        self.assertEqual(metadata["artiq_version"], "9.0")
+        self.assertEqual(metadata["rid"], 42)
+        self.assertEqual(metadata["file"], "repository/exp.py")
+        self.assertEqual(metadata["class_name"], "Exp")
+        self.assertEqual(metadata["repo_rev"], "abc")
+        self.assertEqual(metadata["start_time"].timestamp(), 1700000000)
+        self.assertIn("class_name: Exp\n", format_metadata(metadata))
+
+        with h5py.File(self.filename, "w") as f:
+            metadata = read_metadata(f)
+        self.assertEqual(set(metadata.values()), {"<none>"})
+
+    def test_index_results(self):
+        with h5py.File(self.filename, "r") as f:
+            small, large = index_results(f)
+        self.assertEqual(set(small), {"a", "both", "group/b"})
+        self.assertEqual(small["a"], (True, 1, {}))
+        # outputs take precedence over archived datasets
+        self.assertEqual(small["both"], (True, 3, {}))
+        persist, value, metadata = small["group/b"]
+        self.assertEqual(value.tolist(), [1., 2.])
+        self.assertEqual(metadata, {"unit": "V"})
+        self.assertEqual(large, {"large": "/archive/large"})
+
+
+class ThumbnailCacheCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = (QtWidgets.QApplication.instance()
+                   or QtWidgets.QApplication([]))
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, "cache")
+        self.filename = os.path.join(self.tmpdir.name, "results.h5")
+        self.cache = self.new_cache()
+
+    def tearDown(self):
+        self.cache.stop()
+        self.tmpdir.cleanup()
+
+    def new_cache(self, **kwargs):
+        cache = ThumbnailCache(self.cache_dir, **kwargs)
+        cache.read_h5_count = 0
+        read_h5 = cache._read_h5
+
+        def counting_read_h5(path):
+            cache.read_h5_count += 1
+            return read_h5(path)
+        cache._read_h5 = counting_read_h5
+        return cache
+
+    def info(self):
+        return QtCore.QFileInfo(self.filename)
+
+    def wait(self, cache=None):
+        cache = cache or self.cache
+        deadline = time.monotonic() + 10
+        while cache.pending:
+            self.assertLess(time.monotonic(), deadline)
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def set_mtime(self, mtime):
+        os.utime(self.filename, (mtime, mtime))
+
+    def test_thumbnail(self):
+        _write_results(self.filename, _png())
+        self.set_mtime(1000)
+        ready = []
+        self.cache.thumbnail_ready.connect(ready.append)
+        self.assertIsNone(self.cache.icon(self.info()))
+        self.assertIsNone(self.cache.tooltip(self.info()))
+        self.wait()
+        self.assertEqual(ready, [self.filename])
+        icon = self.cache.icon(self.info())
+        self.assertIsInstance(icon, QtGui.QIcon)
+        self.assertIn("rid: 42\n", self.cache.tooltip(self.info()))
+        self.assertEqual(self.cache.read_h5_count, 1)
+
+        # the file is modified
+        _write_results(self.filename)
+        self.set_mtime(2000)
+        self.assertIsNone(self.cache.icon(self.info()))
+        self.wait()
+        self.assertIsNone(self.cache.icon(self.info()))
+        self.assertIn("rid: 42\n", self.cache.tooltip(self.info()))
+        self.assertEqual(self.cache.read_h5_count, 2)
+
+        # a new instance reads both versions from the disk cache
+        cache = self.new_cache()
+        try:
+            self.assertIsNone(cache.tooltip(self.info()))
+            self.wait(cache)
+            self.assertIsNone(cache.icon(self.info()))
+            self.set_mtime(1000)
+            self.assertIsNone(cache.icon(self.info()))
+            self.wait(cache)
+            self.assertIsInstance(cache.icon(self.info()), QtGui.QIcon)
+            self.assertEqual(cache.read_h5_count, 0)
+        finally:
+            cache.stop()
+
+    def test_unreadable(self):
+        with open(self.filename, "wb") as f:
+            f.write(b"not HDF5")
+        self.set_mtime(1000)
+        for _ in range(3):
+            self.assertIsNone(self.cache.icon(self.info()))
+            self.assertIsNone(self.cache.tooltip(self.info()))
+            self.wait()
+        # not read again until the file is modified
+        self.assertEqual(self.cache.read_h5_count, 1)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+        _write_results(self.filename, _png())
+        self.set_mtime(2000)
+        self.cache.icon(self.info())
+        self.wait()
+        self.assertIsInstance(self.cache.icon(self.info()), QtGui.QIcon)
+        self.assertEqual(self.cache.read_h5_count, 2)
+
+    def test_eviction(self):
+        _write_results(self.filename)
+        self.cache.stop()
+        self.cache = self.new_cache(max_workers=1, max_cache_size=1000)
+        for mtime in range(20):
+            self.set_mtime(1000 + mtime)
+            self.cache.icon(self.info())
+            self.wait()
+        sizes = [os.path.getsize(os.path.join(self.cache_dir, name))
+                 for name in os.listdir(self.cache_dir)]
+        self.assertLess(len(sizes), 20)
+        self.assertLessEqual(sum(sizes), 1000)
+        self.assertEqual(self.cache.cache_size, sum(sizes))
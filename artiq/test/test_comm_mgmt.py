@@ -0,0 +1,110 @@
+import asyncio
+import binascii
+import os
+import struct
+import tempfile
+import unittest
+
+from artiq.coredevice.comm_mgmt import *
+
+
+class FakeDevice:
+    # Management interface of a core device and its DRTIO satellites,
+    # each with its own configuration.
+    def __init__(self):
+        self.config = dict()
+        self.flashed = []
+
+    async def handle(self, reader, writer):
+        assert await reader.readline() == b"ARTIQ management\n"
+        dest, = await reader.readexactly(1)
+        config = self.config.setdefault(dest, dict())
+        writer.write(b"e")
+
+        async def read_bytes():
+            length, = struct.unpack("<l", await reader.readexactly(4))
+            return await reader.readexactly(length)
+
+        try:
+            while True:
+                request = Request(*await reader.readexactly(1))
+                if request == Request.ConfigRead:
+                    key = (await read_bytes()).decode()
+                    if key in config:
+                        value = config[key]
+                        writer.write(struct.pack("<Bl", Reply.ConfigData.value,
+                                                 len(value)) + value)
+                    else:
+                        writer.write(bytes([Reply.Error.value]))
+                elif request == Request.ConfigWrite:
+                    key = (await read_bytes()).decode()
+                    config[key] = await read_bytes()
+                    writer.write(bytes([Reply.Success.value]))
+                elif request == Request.Flash:
+                    self.flashed.append(await read_bytes())
+                    writer.write(bytes([Reply.RebootImminent.value]))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+
+class CommMgmtCase(unittest.TestCase):
+    def test_flash_image(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bin_paths = []
+            for i, size in enumerate([0, 1, 100000]):
+                bin_paths.append(os.path.join(tmpdir, str(i)))
+                with open(bin_paths[-1], "wb") as f:
+                    f.write(os.urandom(size))
+
+            for paths in bin_paths[2:], bin_paths:
+                expected = b""
+                for filename in paths:
+                    with open(filename, "rb") as f:
+                        data = f.read()
+                    if len(paths) > 1:
+                        expected += struct.pack(">I", len(data))
+                    expected += data
+                expected += struct.pack(">I", binascii.crc32(expected))
+
+                length, chunks = flash_image(paths, ">", chunk_size=4096)
+                self.assertEqual(length, len(expected))
+                self.assertEqual(b"".join(chunks), expected)
+
+    def test_run_on_devices(self):
+        device = FakeDevice()
+
+        async def test():
+            server = await asyncio.start_server(device.handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            targets = [("127.0.0.1", 0), ("127.0.0.1", 1)]
+
+            async def write(mgmt):
+                await mgmt.config_write("dest", str(mgmt.drtio_dest).encode())
+            await run_on_devices(targets, write, port)
+            device.config[1]["only_1"] = b""
+
+            async def read(mgmt):
+                return [await mgmt.config_read("dest"),
+                        await mgmt.config_read("only_1")]
+            results = await run_on_devices(targets, read, port)
+
+            with tempfile.NamedTemporaryFile(delete=False) as f:
+                f.write(b"firmware")
+            try:
+                async with AsyncCommMgmt("127.0.0.1", port) as mgmt:
+                    await mgmt.flash([f.name])
+            finally:
+                os.unlink(f.name)
+
+            server.close()
+            await server.wait_closed()
+            return results
+
+        results = asyncio.run(test())
+        self.assertIsInstance(results[0], IOError)
+        self.assertEqual(results[1], [b"1", b""])
+        self.assertEqual(device.flashed, [
+            b"firmware" + struct.pack("<I", binascii.crc32(b"firmware"))])
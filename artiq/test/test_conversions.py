@@ -0,0 +1,179 @@
+"""Compare the vectorized host implementations of driver unit conversions
+with the portable ones."""
+
+import unittest
+
+import numpy as np
+
+from artiq.language.core import kernel
+from artiq.coredevice.core import Core
+from artiq.compiler.module import Module
+from artiq.compiler.embedding import Stitcher
+from artiq.coredevice.ad9910 import AD9910
+from artiq.coredevice.ad9912 import AD9912
+from artiq.coredevice.urukul import CPLD
+from artiq.coredevice.suservo import Channel as SUServoChannel
+from artiq.coredevice import ad53xx
+from artiq.coredevice.fastino import Fastino
+
+
+def _outcome(f, *args):
+    try:
+        return "ok", f(*args)
+    except Exception as e:
+        return "error", type(e)
+
+
+def _portable(function):
+    # The portable implementation of a function decorated with
+    # host_vectorized, bound to the same instance if it is a method.
+    if hasattr(function, "__self__"):
+        return function.__func__.__wrapped__.__get__(function.__self__)
+    return function.__wrapped__
+
+
+def _make(cls, **attributes):
+    obj = object.__new__(cls)
+    obj.__dict__.update(attributes)
+    return obj
+
+
+class ConversionCase(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(42)
+
+    def values(self, low, high, factor, n=200):
+        """Random values in ``[low, high]``, of which some are exact ties for
+        rounding after multiplication by ``factor``, and sometimes one is
+        out of range or not finite."""
+        values = self.rng.uniform(low, high, n)
+        ties = (self.rng.integers(low*factor, high*factor, n) + 0.5)/factor
+        values = np.where(self.rng.random(n) < 0.3, ties, values)
+        if self.rng.random() < 0.3:
+            values[self.rng.integers(n)] = self.rng.choice(
+                [np.nan, np.inf, -np.inf, 2*low - 1, 2*high + 1])
+        return values.tolist()
+
+    def assertElementwise(self, method, values):
+        scalar = _portable(method)
+        for _ in range(50):
+            x = values()
+            expected = [_outcome(scalar, v) for v in x]
+            errors = [r for status, r in expected if status == "error"]
+            outcome = _outcome(method, x)
+            if errors:
+                self.assertEqual(outcome, ("error", errors[0]))
+            else:
+                self.assertEqual(outcome[0], "ok")
+                np.testing.assert_array_equal(
+                    outcome[1], [r for _, r in expected])
+
+    def assertInPlace(self, method, inputs, length):
+        for _ in range(50):
+            args = inputs()
+            expected_out = [0]*length
+            expected = _outcome(_portable(method), *args, expected_out)
+            out = [0]*length
+            outcome = _outcome(method, *args, out)
+            if expected[0] == "error":
+                self.assertEqual(outcome, expected)
+            else:
+                self.assertEqual(outcome[0], "ok")
+            self.assertEqual(out, expected_out)
+
+    def test_ad9910(self):
+        dds = _make(AD9910, ftw_per_hz=(1 << 32)/1e9)
+        self.assertElementwise(dds.frequency_to_ftw,
+                               lambda: self.values(0, 500e6, 4.294967296))
+        self.assertElementwise(dds.turns_to_pow,
+                               lambda: self.values(-2, 2, 0x10000))
+        self.assertElementwise(dds.amplitude_to_asf,
+                               lambda: self.values(0, 1, 0x3fff))
+
+        self.assertInPlace(dds.frequency_to_ram,
+                           lambda: [self.values(0, 500e6, 4.294967296, 64)], 64)
+        self.assertInPlace(dds.turns_to_ram,
+                           lambda: [self.values(-2, 2, 0x10000, 64)], 64)
+        self.assertInPlace(dds.amplitude_to_ram,
+                           lambda: [self.values(0, 1, 0x3fff, 64)], 64)
+        self.assertInPlace(
+            dds.turns_amplitude_to_ram,
+            lambda: [self.values(-2, 2, 0x10000, 64),
+                     self.values(0, 1, 0x3fff, 64)], 64)
+        # input shorter than the RAM
+        self.assertInPlace(dds.frequency_to_ram,
+                           lambda: [[1e6]*10], 16)
+
+    def test_ad9912(self):
+        dds = _make(AD9912, ftw_per_hz=(1 << 48)/1e9)
+        self.assertElementwise(dds.frequency_to_ftw,
+                               lambda: self.values(0, 1e9, 281474.976710656))
+        self.assertElementwise(dds.turns_to_pow,
+                               lambda: self.values(-2, 2, 0x10000))
+
+    def test_urukul(self):
+        cpld = _make(CPLD)
+        self.assertElementwise(cpld.att_to_mu, lambda: self.values(0, 31.5, 8))
+
+    def test_suservo(self):
+        channel = _make(SUServoChannel)
+        self.assertElementwise(channel.dds_offset_to_mu,
+                               lambda: self.values(-1, 1, 1 << 17))
+
+    def test_ad53xx(self):
+        self.assertElementwise(ad53xx.voltage_to_mu,
+                               lambda: self.values(-10, 10, 3276.8))
+
+    def test_fastino(self):
+        fastino = _make(Fastino)
+        self.assertElementwise(fastino.voltage_to_mu,
+                               lambda: self.values(-10, 10, 3276.8))
+        for n in 32, 7:
+            self.assertInPlace(
+                fastino.voltage_group_to_mu,
+                lambda: [self.values(-10, 10, 3276.8, n)], (n + 1)//2)
+        self.assertInPlace(
+            fastino.voltage_group_to_mu,
+            lambda: [[1.]*8], 2)
+
+
+class _ConversionKernels:
+    def __init__(self, core, **devices):
+        self.core = core
+        self.__dict__.update(devices)
+
+    @kernel
+    def run(self):
+        ram = [0]*4
+        self.ad9910.frequency_to_ftw(1e6)
+        self.ad9910.turns_to_pow(0.5)
+        self.ad9910.amplitude_to_asf(0.5)
+        self.ad9910.frequency_to_ram([1e6]*4, ram)
+        self.ad9910.turns_to_ram([0.5]*4, ram)
+        self.ad9910.amplitude_to_ram([0.5]*4, ram)
+        self.ad9910.turns_amplitude_to_ram([0.5]*4, [0.5]*4, ram)
+        self.ad9912.frequency_to_ftw(1e6)
+        self.ad9912.turns_to_pow(0.5)
+        self.cpld.att_to_mu(10.)
+        self.suservo_channel.dds_offset_to_mu(0.5)
+        ad53xx.voltage_to_mu(1.)
+        self.fastino.voltage_to_mu(1.)
+        self.fastino.voltage_group_to_mu([1.]*4, [0]*2)
+
+
+class KernelConversionCase(unittest.TestCase):
+    def test_stitch(self):
+        # The decorated conversions are still compiled from their portable
+        # implementation.
+        core = Core({}, host=None, ref_period=1e-9)
+        kernels = _ConversionKernels(
+            core,
+            ad9910=_make(AD9910, ftw_per_hz=(1 << 32)/1e9),
+            ad9912=_make(AD9912, ftw_per_hz=(1 << 48)/1e9),
+            cpld=_make(CPLD),
+            suservo_channel=_make(SUServoChannel),
+            fastino=_make(Fastino))
+        stitcher = Stitcher(core=core, dmgr={"core": core})
+        stitcher.stitch_call(kernels.run, (), {})
+        stitcher.finalize()
+        Module(stitcher, ref_period=core.ref_period)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import unittest
+
+from artiq.coredevice import corelog
+from artiq.coredevice.corelog import *
+from artiq.frontend.aqctl_corelog import CoreLog
+
+
+LOG = """\
+[     0.000010s]  INFO(runtime): ARTIQ runtime starting...
+[     1.500000s] DEBUG(runtime::rtio_mgt::drtio): [DEST#1] link up
+[     2.000000s] ERROR(runtime::session): session aborted: connection reset
+  backtrace:
+    0x4000
+[     2.100000s]  WARN(runtime::moninj): no
+"""
+
+
+class CoreLogCase(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_log(LOG), [
+            (0.00001, logging.INFO, "runtime", "ARTIQ runtime starting..."),
+            (1.5, logging.DEBUG, "runtime::rtio_mgt::drtio",
+             "[DEST#1] link up"),
+            (2., logging.ERROR, "runtime::session",
+             "session aborted: connection reset\n  backtrace:\n    0x4000"),
+            (2.1, logging.WARNING, "runtime::moninj", "no")])
+        self.assertEqual(parse_log("garbage\n" + LOG)[0],
+                         (None, logging.INFO, "", "garbage"))
+        self.assertEqual(parse_log(""), [])
+
+    def test_store(self):
+        records = parse_log(LOG)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = LogStore(tmpdir, segment_size=100, max_segments=3)
+            for t in range(5):
+                store.append(records, timestamp=10. + t)
+            store.append(records[:1], timestamp=12.)
+            store.close()
+            self.assertEqual(len(store.segments), 3)
+            self.assertEqual(len(os.listdir(tmpdir)), 6)
+
+            store = LogStore(tmpdir)
+            self.assertEqual(store.last_timestamp, 14.)
+            self.assertEqual(
+                store.query(start=14.),
+                [(14.,) + record for record in records + records[:1]])
+            self.assertEqual(
+                [(r[0], r[2]) for r in
+                 store.query(end=14., level=logging.WARNING)],
+                [(12., logging.ERROR), (12., logging.WARNING),
+                 (13., logging.ERROR), (13., logging.WARNING)])
+            self.assertEqual(
+                [r[0] for r in store.query(module="runtime.rtio_mgt")],
+                [12., 13., 14.])
+            self.assertEqual(
+                [(r[0], r[3]) for r in store.query(limit=2)],
+                [(14., "runtime::moninj"), (14., "runtime")])
+            self.assertEqual(store.query(limit=0), [])
+            # the device times order the records received together
+            self.assertEqual([r[1] for r in store.query(start=13., end=14.)],
+                             [0.00001, 1.5, 2., 2.1])
+            store.append(parse_log("garbage"), timestamp=15.)
+            self.assertEqual(store.query(start=15.),
+                             [(15., None, logging.INFO, "", "garbage")])
+            store.close()
+
+    def test_index(self):
+        records = parse_log(LOG)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = LogStore(tmpdir)
+            for t in range(100):
+                store.append(records if t % 10 == 0 else records[:2],
+                             timestamp=float(t))
+            decoded = []
+            decode_records = corelog._decode_records
+
+            def counting_decode_records(data):
+                result = decode_records(data)
+                decoded.extend(result)
+                return result
+            corelog._decode_records = counting_decode_records
+            try:
+                result = store.query(start=40., end=45.)
+                self.assertEqual([r[0] for r in result],
+                                 [40.]*4 + [41., 41., 42., 42., 43., 43.,
+                                            44., 44.])
+                self.assertEqual(decoded, result)
+                del decoded[:]
+
+                result = store.query(level=logging.ERROR)
+                self.assertEqual([r[0] for r in result],
+                                 [float(t) for t in range(0, 100, 10)])
+                self.assertEqual(len(decoded), 40)
+            finally:
+                corelog._decode_records = decode_records
+
+            # a segment without index is decoded entirely
+            store.close()
+            os.unlink(store.segments[0][1] + ".index")
+            store = LogStore(tmpdir)
+            self.assertEqual(store.last_timestamp, 99.)
+            self.assertEqual(len(store.query(start=40., end=45.)), 12)
+            store.close()
+
+    def test_query_rpc(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = LogStore(tmpdir)
+            store.append(parse_log(LOG), timestamp=1.)
+            threads = []
+            query = store.query
+
+            def threaded_query(*args):
+                threads.append(threading.current_thread())
+                return query(*args)
+            store.query = threaded_query
+            result = asyncio.run(CoreLog(store).query(level=logging.ERROR))
+            self.assertEqual([r[3] for r in result], ["runtime::session"])
+            self.assertIsNot(threads[0], threading.current_thread())
+            store.close()
@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+
+from artiq.dashboard.waveform import _LevelOfDetail
+
+
+def _buckets(x, y, level):
+    # brute force aggregation of the samples into buckets of width 2**level
+    result = dict()
+    for xi, yi in zip(x.tolist(), y.tolist()):
+        b = xi >> level
+        if b in result:
+            first_x, ymin, ymax, _, count = result[b]
+            result[b] = (first_x, min(ymin, yi), max(ymax, yi), yi, count + 1)
+        else:
+            result[b] = (xi, yi, yi, yi, 1)
+    return [result[b] for b in sorted(result)]
+
+
+class LevelOfDetailCase(unittest.TestCase):
+    def check(self, x, y):
+        lod = _LevelOfDetail(x, y)
+        n = len(x)
+        for level, *columns in lod.levels:
+            self.assertEqual(list(zip(*(c.tolist() for c in columns))),
+                             _buckets(x, y, level))
+            # each stored level at least halves the number of buckets
+            self.assertLessEqual(2*len(columns[0]), n)
+            n = len(columns[0])
+        self.assertLess(sum(len(l[1]) for l in lod.levels), len(x))
+        if len(x) > 1:
+            self.assertEqual(len(lod.levels[-1][1]), 1)
+        return lod
+
+    def test_levels(self):
+        rng = np.random.default_rng(0)
+        y = rng.random(2000)
+        self.check(np.arange(2000, dtype=np.int64)*3, y)
+        self.check(np.cumsum(rng.integers(1, 1001, 2000)), y)
+        # bursts of closely spaced samples
+        gaps = np.where(rng.random(2000) < 0.01,
+                        rng.integers(10**5, 10**6, 2000),
+                        rng.integers(1, 4, 2000))
+        self.check(np.cumsum(gaps), y)
+        self.check(np.array([5], dtype=np.int64), y[:1])
+
+    def test_size(self):
+        rng = np.random.default_rng(1)
+        x = np.cumsum(rng.integers(1, 1001, 200000))
+        lod = _LevelOfDetail(x, rng.random(len(x)))
+        self.assertLess(sum(len(l[1]) for l in lod.levels), len(x))
+
+    def test_visible(self):
+        rng = np.random.default_rng(2)
+        x = np.cumsum(rng.integers(1, 1001, 20000))
+        y = rng.random(len(x))
+        lod = _LevelOfDetail(x, y)
+        npixels = 100
+        paths = set()
+        for xmin, xmax in ((0, int(x[-1])), (int(x[5000]), int(x[15000])),
+                           (int(x[100]) + 1, int(x[300]))):
+            px, py, raw = lod.visible(xmin, xmax, npixels)
+            paths.add(raw)
+            if raw:
+                # the sample held at the left edge, then those in the window
+                inside = [i for i in range(len(x)) if xmin <= x[i] <= xmax]
+                expected = [max(inside[0] - 1, 0)] + inside
+                self.assertEqual(px.tolist()[:len(expected)],
+                                 x[expected].tolist())
+                continue
+            width = (xmax - xmin)/npixels
+            level = max(l for l, *_ in lod.levels if 2**l <= width)
+            buckets = _buckets(x, y, level)
+            first = [b[0] for b in buckets]
+            i = max(np.searchsorted(first, xmin, "right") - 1, 0)
+            j = np.searchsorted(first, xmax, "right") + 1
+            buckets = buckets[i:j]
+            self.assertEqual(px.tolist(),
+                             [b[0] for b in buckets for _ in range(3)])
+            self.assertEqual(py.tolist(),
+                             [v for b in buckets for v in b[1:4]])
+        self.assertEqual(paths, {True, False})
@@ -12,10 +12,19 @@ from artiq.master.worker_db import DatasetManager
 class MockDatasetDB:
     def __init__(self):
         self.data = dict()
+        self.requests = 0
 
     def get(self, key):
+        self.requests += 1
         return self.data[key][1]
 
+    def get_many(self, keys=None, prefix=None):
+        self.requests += 1
+        if keys is None:
+            keys = [key for key in self.data if key.startswith(prefix)]
+        return {key: (self.data[key][1], self.data[key][2])
+                for key in keys if key in self.data}
+
     def get_metadata(self, key):
         return self.data[key][2]
 
@@ -29,6 +38,14 @@ class MockDatasetDB:
         del self.data[key]
 
 
+class PrefetchExperiment(EnvExperiment):
+    prefetch_datasets = ["a", "b", "missing"]
+
+    def build(self):
+        self.a = self.get_dataset("a")
+        self.b = self.get_dataset("b")
+
+
 class TestExperiment(EnvExperiment):
     def get(self, key):
         return self.get_dataset(key)
@@ -132,3 +149,46 @@ class ExperimentDatasetCase(unittest.TestCase):
         self.assertEqual(self.dataset_db.get_metadata(KEY), {})
 
 
+
+    def test_get_many(self):
+        for i, key in enumerate(["calib.a", "calib.b", "other"]):
+            self.dataset_db.data[key] = True, i, {"unit": "V"}
+        self.exp.set("calib.c", 3)
+        self.dataset_db.requests = 0
+
+        self.assertEqual(self.exp.get_datasets(prefix="calib."),
+                         {"calib.a": 0, "calib.b": 1, "calib.c": 3})
+        self.assertEqual(self.exp.get_datasets(["other", "calib.a", "x"]),
+                         {"other": 2, "calib.a": 0})
+        self.assertEqual(self.exp.get_metadata("other"), {"unit": "V"})
+        self.assertEqual(self.dataset_db.requests, 2)
+        self.assertEqual(self.dataset_mgr.archive,
+                         {"calib.a": 0, "calib.b": 1, "other": 2})
+
+        self.exp.set("other", 4, broadcast=True)
+        self.assertEqual(self.exp.get("other"), 4)
+        with self.assertRaises(ValueError):
+            self.exp.get_datasets()
+
+    def test_prefetch(self):
+        self.dataset_db.data.update({"a": (True, 1, {}), "b": (True, 2, {})})
+        exp = PrefetchExperiment((None, self.dataset_mgr, None, None))
+        self.assertEqual((exp.a, exp.b), (1, 2))
+        self.assertEqual(self.dataset_db.requests, 1)
+
+    def test_prefetch_invalidation(self):
+        self.dataset_db.data.update({"a": (True, 1, {}), "b": (True, 2, {})})
+        exp = PrefetchExperiment((None, self.dataset_mgr, None, None))
+        self.dataset_db.data["a"] = True, 10, {}
+        self.dataset_db.data["b"] = True, 20, {}
+        # values are kept during build and prepare
+        self.assertEqual(exp.get_dataset("a"), 1)
+        self.assertEqual(exp.get_datasets(["b"]), {"b": 2})
+
+        # and read from the master from the run stage on
+        self.dataset_mgr.end_prefetch()
+        self.assertEqual(exp.get_dataset("a"), 10)
+        self.assertEqual(exp.get_datasets(["a", "b"]), {"a": 10, "b": 20})
+        self.dataset_db.data["b"] = True, 30, {}
+        self.assertEqual(exp.get_dataset("b"), 30)
+        self.assertEqual(exp.get_datasets(prefix="b"), {"b": 30})
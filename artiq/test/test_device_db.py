@@ -1,11 +1,18 @@
 """Test device DB interface"""
 
+import asyncio
 import os
+import socket
+import threading
+import time
 import unittest
 import tempfile
 from pathlib import Path
 
-from artiq.master.databases import DeviceDB
+from sipyco.pc_rpc import Server
+
+from artiq.master.databases import DeviceDB, resolve_aliases
+from artiq.master.worker_db import DeviceManager
 from artiq.tools import file_import
 
 
@@ -20,6 +27,8 @@ device_db = {
 
     "core_alias": "core",
     "unresolved_alias": "dummy",
+
+    "dummy_device": {"type": "dummy"},
 }
 """
 
@@ -111,8 +120,214 @@ device_db["core_log"] = {
 
         self.assertEqual(self.ddb.get("core_log")["type"], "controller")
 
+    def test_aliases(self):
+        self.assertEqual(
+            resolve_aliases({"a": "b", "b": "c", "c": {"type": "dummy"},
+                             "d": "e", "e": "d", "f": "f", "g": "d"}),
+            {"a": "c", "b": "c", "d": None, "e": None, "f": None, "g": None})
+        self.assertEqual(self.ddb.get_aliases(),
+                         {"core_alias": "core", "unresolved_alias": "dummy"})
+
+    def test_snapshot(self):
+        snapshot = self.ddb.get_snapshot()
+        self.assertEqual(snapshot["device_db"], self.ddb.get_device_db())
+        self.assertEqual(snapshot["aliases"], self.ddb.get_aliases())
+        self.assertIsNone(self.ddb.get_snapshot(snapshot["version"]))
+
+        self.ddb.scan()
+        self.assertIsNotNone(self.ddb.get_snapshot(snapshot["version"]))
+
     def test_get_ddb(self):
         ddb = self.ddb.get_device_db()
         raw = file_import(self.ddb_file.name).device_db
 
         self.assertEqual(ddb, raw)
+
+
+class TestDeviceManager(unittest.TestCase):
+    def setUp(self):
+        self.ddb_file = tempfile.NamedTemporaryFile(
+            mode="w+", suffix=".py", delete=False
+        )
+        print(DUMMY_DDB_FILE, file=self.ddb_file, flush=True)
+
+        self.dmgr = DeviceManager(DeviceDB(self.ddb_file.name))
+
+    def tearDown(self):
+        self.dmgr.close_devices()
+        self.ddb_file.close()
+        os.unlink(self.ddb_file.name)
+
+    def test_get_alias(self):
+        self.assertIs(self.dmgr.get("core"), self.dmgr.get("core_alias"))
+
+    def test_argument_override(self):
+        core = self.dmgr.get("core")
+        self.dmgr.devarg_override = {"core": {"ref_period": 2e-9}}
+        self.assertIsNot(self.dmgr.get("core"), core)
+        self.assertEqual(self.dmgr.get("core").ref_period, 2e-9)
+
+    def test_retain(self):
+        core = self.dmgr.get("core")
+        dummy = self.dmgr.get("dummy_device")
+        self.dmgr.close_devices(retain=True)
+        self.assertIs(self.dmgr.get("core"), core)
+        self.assertIsNot(self.dmgr.get("dummy_device"), dummy)
+
+        self.dmgr.close_devices()
+        self.assertIsNot(self.dmgr.get("core"), core)
+
+    def test_retain_core_reboot(self):
+        core = self.dmgr.get("core")
+        core.first_run = False
+        core.comm.socket, device = socket.socketpair()
+        self.dmgr.close_devices(retain=True)
+        self.assertIs(self.dmgr.get("core"), core)
+        self.assertFalse(core.first_run)
+
+        # the core device closes the connection while the worker is idle
+        device.close()
+        self.dmgr.close_devices(retain=True)
+        self.assertIs(self.dmgr.get("core"), core)
+        self.assertFalse(hasattr(core.comm, "socket"))
+        self.assertTrue(core.first_run)
+
+
+CONTROLLER_DDB_FILE = """
+device_db = {{
+    "ctl": {{
+        "type": "controller",
+        "host": "127.0.0.1",
+        "port": {port},
+        "target_name": "a",
+        "command": "aqctl_test -p {{port}}",
+    }},
+    "ctl_alias": "ctl",
+    "ctl_same_target": {{
+        "type": "controller",
+        "host": "127.0.0.1",
+        "port": {port},
+        "target_name": "a",
+    }},
+    "ctl_aux_a": {{
+        "type": "controller_aux_target",
+        "controller": "ctl_alias",
+        "target_name": "a",
+    }},
+    "ctl_aux_b": {{
+        "type": "controller_aux_target",
+        "controller": "ctl",
+        "target_name": "b",
+    }},
+}}
+"""
+
+
+class _Target:
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+    async def sleep(self, duration):
+        await asyncio.sleep(duration)
+        return duration
+
+    def fail(self):
+        raise ValueError(self.name)
+
+
+class TestClientPool(unittest.TestCase):
+    def setUp(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.port = port
+
+        self.loop = asyncio.new_event_loop()
+        self.server = Server({"a": _Target("a"), "b": _Target("b")},
+                             allow_parallel=True)
+        self.loop.run_until_complete(self.server.start("127.0.0.1", port))
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+        self.ddb_file = tempfile.NamedTemporaryFile(
+            mode="w+", suffix=".py", delete=False
+        )
+        print(CONTROLLER_DDB_FILE.format(port=port), file=self.ddb_file,
+              flush=True)
+        self.dmgr = DeviceManager(DeviceDB(self.ddb_file.name))
+
+    def tearDown(self):
+        self.dmgr.close_devices()
+        self.ddb_file.close()
+        os.unlink(self.ddb_file.name)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+
+    def test_shared_clients(self):
+        ctl = self.dmgr.get("ctl")
+        for name in "ctl_alias", "ctl_same_target", "ctl_aux_a":
+            self.assertIs(self.dmgr.get(name), ctl)
+        ctl_b = self.dmgr.get("ctl_aux_b")
+        self.assertIsNot(ctl_b, ctl)
+        self.assertEqual(len(self.dmgr.clients.groups), 2)
+        self.assertEqual(ctl.get_name(), "a")
+        self.assertEqual(ctl_b.get_name(), "b")
+
+    def test_call_async(self):
+        ctl = self.dmgr.get("ctl")
+        ctl_b = self.dmgr.get("ctl_aux_b")
+        t0 = time.monotonic()
+        futures = [ctl.call_async("sleep", 0.5) for _ in range(4)]
+        futures.append(ctl_b.call_async("sleep", duration=0.5))
+        self.assertEqual([f.result() for f in futures], [0.5]*5)
+        # the calls overlap
+        self.assertLess(time.monotonic() - t0, 1.5)
+
+        future = ctl_b.call_async("fail")
+        with self.assertRaises(ValueError):
+            future.result()
+        self.assertEqual(ctl_b.call_async("get_name").result(), "b")
+        # the primary connection is still usable
+        self.assertEqual(ctl.get_name(), "a")
+
+    def test_close(self):
+        ctl = self.dmgr.get("ctl")
+        ctl.call_async("get_name").result()
+        group = ctl._client_group
+        self.dmgr.close_devices(retain=True)
+        self.assertIs(self.dmgr.get("ctl_aux_a"), ctl)
+        self.assertEqual(ctl.get_name(), "a")
+        self.assertEqual(ctl.call_async("get_name").result(), "a")
+
+        self.dmgr.close_devices()
+        self.assertEqual(self.dmgr.clients.groups, dict())
+        for client in [group.primary] + group.secondary:
+            with self.assertRaises(Exception):
+                client.get_name()
+        self.assertIsNot(self.dmgr.get("ctl"), ctl)
+        self.assertEqual(self.dmgr.get("ctl").get_name(), "a")
+
+    def test_controller_restart(self):
+        ctl = self.dmgr.get("ctl")
+        ctl_b = self.dmgr.get("ctl_aux_b")
+        self.assertEqual(ctl.get_name(), "a")
+        self.dmgr.close_devices(retain=True)
+        # still connected
+        self.assertIs(self.dmgr.get("ctl"), ctl)
+        self.dmgr.close_devices(retain=True)
+
+        asyncio.run_coroutine_threadsafe(
+            self.server.stop(), self.loop).result()
+        asyncio.run_coroutine_threadsafe(
+            self.server.start("127.0.0.1", self.port), self.loop).result()
+        ctl2 = self.dmgr.get("ctl")
+        self.assertIsNot(ctl2, ctl)
+        self.assertEqual(ctl2.get_name(), "a")
+        self.assertEqual(ctl2.call_async("get_name").result(), "a")
+        self.assertIsNot(self.dmgr.get("ctl_aux_b"), ctl_b)
+        self.assertEqual(len(self.dmgr.clients.groups), 2)
@@ -0,0 +1,95 @@
+import os
+import stat
+import tempfile
+import unittest
+
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+from artiq.master.experiments import GitBackend
+
+
+def _tree_contents(root):
+    contents = dict()
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root)
+            if os.path.islink(path):
+                contents[name] = ("link", os.readlink(path))
+            else:
+                with open(path, "rb") as f:
+                    contents[name] = (
+                        bool(os.stat(path).st_mode & stat.S_IXUSR), f.read())
+    return contents
+
+
+@unittest.skipIf(pygit2 is None, "pygit2 is not installed")
+class GitBackendCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.repo = pygit2.init_repository(self.tmpdir.name)
+        self.signature = pygit2.Signature("test", "test@example.com")
+        self.revs = []
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def commit(self, files, message):
+        builders = {"": self.repo.TreeBuilder()}
+        for name, content in sorted(files.items()):
+            mode = pygit2.GIT_FILEMODE_BLOB
+            if isinstance(content, tuple):
+                mode, content = content
+            blob = self.repo.create_blob(content)
+            directory, _, filename = name.rpartition("/")
+            builders.setdefault(directory, self.repo.TreeBuilder())
+            builders[directory].insert(filename, blob, mode)
+        for directory in sorted(builders, key=len, reverse=True):
+            if directory:
+                parent, _, name = directory.rpartition("/")
+                tree = builders[directory].write()
+                builders.setdefault(parent, self.repo.TreeBuilder())
+                builders[parent].insert(name, tree, pygit2.GIT_FILEMODE_TREE)
+        tree = builders[""].write()
+        parents = [self.repo.head.target] if self.revs else []
+        rev = self.repo.create_commit("HEAD", self.signature, self.signature,
+                                      message, tree, parents)
+        self.revs.append(str(rev))
+
+    def test_checkout_cache(self):
+        self.commit({"a.py": b"1", "d/b.py": b"2", "d/e/c.py": b"3",
+                     "x": b"file"}, "first")
+        self.commit({"a.py": b"10", "d/b.py": b"2", "d": b"",
+                     "x/y.py": (pygit2.GIT_FILEMODE_BLOB_EXECUTABLE, b"4"),
+                     "l": (pygit2.GIT_FILEMODE_LINK, b"a.py")}, "second")
+        self.commit({"a.py": b"1"}, "third")
+        self.commit({"a.py": b"1", "b.py": b"5"}, "fourth")
+
+        backend = GitBackend(self.tmpdir.name, cache_size=2)
+        reference = dict()
+        for rev in self.revs:
+            path, message, _ = backend.request_rev(rev)
+            reference[rev] = message, _tree_contents(path)
+            backend.release_rev(rev)
+        self.assertEqual(len(backend.checkouts), 2)
+        self.assertEqual(len({co.path for co in backend.checkouts.values()}),
+                         2)
+
+        # all checkouts after the first two are updates of earlier ones
+        for rev in self.revs[::-1] + self.revs:
+            path, message, _ = backend.request_rev(rev)
+            self.assertEqual((message, _tree_contents(path)), reference[rev])
+            backend.release_rev(rev)
+        self.assertEqual(reference[self.revs[1]][1]["x/y.py"], (True, b"4"))
+
+        path, _, rev = backend.request_rev("HEAD")
+        self.assertEqual(rev, self.revs[-1])
+        backend.close()
+        self.assertEqual(list(backend.checkouts), [rev])
+        backend.release_rev(rev)
+        backend.close()
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,60 @@
+import logging
+import unittest
+from unittest import mock
+
+from artiq.master.log import LogBroadcaster, log_batch_channel
+
+
+class LogBroadcasterCase(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.broadcaster = LogBroadcaster(
+            lambda channel, obj: self.sent.append((channel, obj)),
+            rate=10., burst=5., report_period=1.)
+
+    def batches(self, level):
+        channel = log_batch_channel(level)
+        return [obj for c, obj in self.sent if c == channel]
+
+    def test_channels(self):
+        self.assertEqual(log_batch_channel(5), "log_batch_0")
+        self.assertEqual(log_batch_channel(logging.INFO), "log_batch_20")
+        self.assertEqual(log_batch_channel(25), "log_batch_20")
+        self.assertEqual(log_batch_channel(logging.CRITICAL), "log_batch_40")
+
+        records = [(logging.DEBUG, "master", 0., "a"),
+                   (logging.WARNING, "master", 0., "b")]
+        for record in records:
+            self.broadcaster.put(record)
+        self.broadcaster.flush()
+        self.assertEqual(self.batches(logging.NOTSET), [records])
+        self.assertEqual(self.batches(logging.INFO), [records[1:]])
+        self.assertEqual(self.batches(logging.ERROR), [])
+        self.assertEqual([obj for c, obj in self.sent if c == "log"], records)
+
+    def test_rate_limit(self):
+        with mock.patch("time.monotonic") as monotonic:
+            monotonic.return_value = 100.
+            for source in "worker(1)", "worker(2)":
+                for i in range(20):
+                    self.broadcaster.put((logging.INFO, source, 0., str(i)))
+            self.broadcaster.put((logging.ERROR, "worker(1)", 0., "error"))
+            monotonic.return_value = 100.5
+            for i in range(20):
+                self.broadcaster.put((logging.INFO, "worker(1)", 0., str(i)))
+            monotonic.return_value = 101.
+            self.broadcaster.flush()
+
+        batch, = self.batches(logging.NOTSET)
+        messages = [(source, message) for _, source, _, message in batch]
+        self.assertEqual(
+            messages[:16],
+            [("worker(1)", str(i)) for i in range(5)]
+            + [("worker(2)", str(i)) for i in range(5)]
+            + [("worker(1)", "error")]
+            + [("worker(1)", str(i)) for i in range(5)])
+        self.assertEqual(messages[16:], [
+            ("worker(1)", "artiq.master.log:30 log messages suppressed "
+                          "by the rate limit of the master"),
+            ("worker(2)", "artiq.master.log:15 log messages suppressed "
+                          "by the rate limit of the master")])
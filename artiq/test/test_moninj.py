@@ -0,0 +1,131 @@
+import asyncio
+import unittest
+
+from artiq.coredevice.comm_moninj import (CommMonInj, TTLOverride,
+                                          encode_monitor_batch,
+                                          decode_monitor_batch)
+from artiq.frontend.aqctl_moninj_proxy import MonitorMux, ProxyServer
+
+
+class FakeCoreComm:
+    # The connection of the proxy to the core device
+    def __init__(self):
+        self.requests = []
+
+    def monitor_probe(self, enable, channel, probe):
+        self.requests.append(("monitor_probe", enable, channel, probe))
+
+    def monitor_injection(self, enable, channel, overrd):
+        self.requests.append(("monitor_injection", enable, channel, overrd))
+
+    def inject(self, channel, override, value):
+        self.requests.append(("inject", channel, override, value))
+
+    def get_injection_status(self, channel, override):
+        self.requests.append(("get_injection_status", channel, override))
+
+
+async def _old_proxy(reader, writer):
+    # a proxy (or core device) that only speaks the original protocol
+    try:
+        if await reader.readline() == b"ARTIQ moninj\n":
+            await reader.read()
+    finally:
+        writer.close()
+
+
+class MonInjCase(unittest.TestCase):
+    def test_batch_round_trip(self):
+        events = [(0, 0, 1), (1, 2, -1), (2**31 - 1, 127, 2**63 - 1),
+                  (-2**31, -128, -2**63)]
+        frame = encode_monitor_batch(events)
+        self.assertEqual(frame[0], 2)
+        self.assertEqual(int.from_bytes(frame[1:5], "little"), len(events))
+        self.assertEqual(len(frame), 5 + 13*len(events))
+        self.assertEqual(decode_monitor_batch(frame[5:]), events)
+        self.assertEqual(encode_monitor_batch([]), b"\x02" + bytes(4))
+        self.assertEqual(decode_monitor_batch(b""), [])
+
+    def run_proxy(self, client_cb, handler=None, batch=True):
+        mux = MonitorMux()
+        mux.comm_moninj = FakeCoreComm()
+        proxy = ProxyServer(mux, batch_period=0.01)
+        received = []
+        comm = CommMonInj(
+            lambda *args: received.append(("monitor",) + args),
+            lambda *args: received.append(("injection_status",) + args))
+
+        async def test():
+            server = await asyncio.start_server(
+                handler or proxy._handle_connection_cr, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            await comm.connect("127.0.0.1", port, batch=batch)
+            try:
+                await client_cb(comm, mux)
+            finally:
+                await comm.close()
+                # let the proxy see the disconnection
+                await asyncio.sleep(0.05)
+                server.close()
+                await server.wait_closed()
+
+        asyncio.run(test())
+        return comm, mux, received
+
+    def test_batched(self):
+        async def client_cb(comm, mux):
+            comm.monitor_probe(True, 1, 0)
+            comm.monitor_injection(True, 1, TTLOverride.en.value)
+            comm.inject(1, TTLOverride.level.value, 1)
+            comm.get_injection_status(1, TTLOverride.en.value)
+            await asyncio.sleep(0.05)
+            # coalesced into the latest value
+            for value in range(10):
+                mux.monitor_cb(1, 0, value)
+            await asyncio.sleep(0.05)
+            # sent before the injection status that follows it
+            mux.monitor_cb(1, 0, 10)
+            mux.injection_status_cb(1, TTLOverride.en.value, 1)
+            mux.monitor_cb(1, 0, 11)
+            await asyncio.sleep(0.05)
+
+        comm, mux, received = self.run_proxy(client_cb)
+        self.assertEqual(comm.protocol_version, 2)
+        self.assertEqual(mux.comm_moninj.requests, [
+            ("monitor_probe", True, 1, 0),
+            ("monitor_injection", True, 1, 0),
+            ("inject", 1, 1, 1),
+            ("get_injection_status", 1, 0),
+            ("monitor_probe", False, 1, 0),
+            ("monitor_injection", False, 1, 0)])
+        self.assertEqual(received, [
+            ("monitor", 1, 0, 9),
+            ("monitor", 1, 0, 10),
+            ("injection_status", 1, 0, 1),
+            ("monitor", 1, 0, 11)])
+
+    def test_unbatched(self):
+        async def client_cb(comm, mux):
+            comm.monitor_probe(True, 1, 0)
+            comm.monitor_injection(True, 1, TTLOverride.en.value)
+            await asyncio.sleep(0.05)
+            for value in range(3):
+                mux.monitor_cb(1, 0, value)
+            mux.injection_status_cb(1, TTLOverride.en.value, 1)
+            await asyncio.sleep(0.05)
+
+        comm, mux, received = self.run_proxy(client_cb, batch=False)
+        self.assertEqual(comm.protocol_version, 1)
+        self.assertEqual(received, [
+            ("monitor", 1, 0, 0),
+            ("monitor", 1, 0, 1),
+            ("monitor", 1, 0, 2),
+            ("injection_status", 1, 0, 1)])
+
+    def test_negotiation_fallback(self):
+        async def client_cb(comm, mux):
+            await asyncio.sleep(0.05)
+            self.assertFalse(comm.wait_terminate().done())
+
+        comm, _, _ = self.run_proxy(client_cb, _old_proxy)
+        self.assertEqual(comm.protocol_version, 1)
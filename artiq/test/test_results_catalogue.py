@@ -0,0 +1,88 @@
+import os
+import unittest
+import tempfile
+
+import h5py
+import numpy as np
+from sipyco import pyon
+
+from artiq.master.results_catalogue import ResultsCatalogue, parse_query
+
+
+def write_result(results_dir, hour, rid, class_name, arguments, datasets):
+    directory = os.path.join(results_dir, "2024-01-01", hour)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "{:09}-{}.h5".format(rid, class_name))
+    with h5py.File(path, "w") as f:
+        for k, v in datasets.items():
+            f["datasets/" + k] = v
+        f["archive/calibration"] = 1.5
+        f["artiq_version"] = "9.0"
+        f["rid"] = rid
+        f["start_time"] = 1704067200.0 + rid
+        f["run_time"] = 1704067200.0 + rid + 1
+        f["expid"] = pyon.encode({
+            "file": "repository/" + class_name.lower() + ".py",
+            "class_name": class_name,
+            "arguments": arguments,
+            "log_level": 30,
+            "repo_rev": "abc",
+        })
+    return path
+
+
+class ResultsCatalogueCase(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.results_dir = tmpdir.name
+        # rescan modified directories immediately
+        self.catalogue = ResultsCatalogue(self.results_dir, settle_time=-1)
+        self.addCleanup(self.catalogue.close)
+
+        write_result(self.results_dir, "10", 1, "Scan", {"npoints": 10},
+                     {"counts": np.arange(10), "mean": 4.5})
+        write_result(self.results_dir, "10", 2, "Scan", {"npoints": 20},
+                     {"counts": np.arange(20), "mean": 9.5})
+        write_result(self.results_dir, "11", 3, "Calibrate",
+                     {"target": "ttl0"}, {"offset": 0.25})
+        self.assertEqual(self.catalogue.update(), 3)
+
+    def rids(self, **kwargs):
+        return [run.rid for run in self.catalogue.find(**kwargs)]
+
+    def test_find(self):
+        self.assertEqual(self.rids(), [3, 2, 1])
+        self.assertEqual(self.rids(rid=2), [2])
+        self.assertEqual(self.rids(class_name="Scan"), [2, 1])
+        self.assertEqual(self.rids(file="calibrate"), [3])
+        self.assertEqual(self.rids(arguments={"npoints": 10}), [1])
+        self.assertEqual(self.rids(arguments={"target": "ttl0"}), [3])
+        self.assertEqual(self.rids(datasets=["counts"]), [2, 1])
+        self.assertEqual(self.rids(since=1704067202.0), [3, 2])
+        self.assertEqual(self.rids(limit=1), [3])
+        self.assertEqual(self.rids(text="calib"), [3])
+        self.assertEqual(self.rids(**parse_query("scan npoints=20")),
+                         [2])
+
+    def test_datasets(self):
+        path = self.catalogue.find(rid=2)[0].path
+        self.assertTrue(os.path.exists(path))
+        datasets = {d.name: d for d in self.catalogue.get_datasets(path)}
+        self.assertEqual(datasets["counts"].shape, (20, ))
+        self.assertIsNone(datasets["counts"].value)
+        self.assertEqual(datasets["mean"].value, 9.5)
+        self.assertTrue(datasets["calibration"].archived)
+
+    def test_incremental(self):
+        self.assertEqual(self.catalogue.update(), 0)
+
+        path = write_result(self.results_dir, "11", 4, "Calibrate",
+                            {"target": "ttl1"}, {"offset": 0.5})
+        self.assertEqual(self.catalogue.update(), 1)
+        self.assertEqual(self.rids(class_name="Calibrate"), [4, 3])
+
+        os.unlink(path)
+        self.catalogue.update()
+        self.assertEqual(self.rids(class_name="Calibrate"), [3])
+        self.assertEqual(self.rids(arguments={"target": "ttl1"}), [])
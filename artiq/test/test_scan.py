@@ -0,0 +1,90 @@
+import random
+import unittest
+
+import numpy as np
+
+from artiq.language.scan import (NoScan, RangeScan, CenterScan, ExplicitScan,
+                                 MultiScanManager)
+
+
+class ScanCase(unittest.TestCase):
+    def test_range(self):
+        self.assertEqual(list(RangeScan(0, 10, 0)), [])
+        self.assertEqual(list(RangeScan(3, 10, 1)), [3])
+        self.assertEqual(list(RangeScan(0, 10, 6)), [0, 2, 4, 6, 8, 10])
+        self.assertEqual(len(RangeScan(0, 10, 6)), 6)
+
+    def test_center(self):
+        self.assertEqual(list(CenterScan(5, 4, 1)), [5, 4, 6, 3, 7])
+        self.assertEqual(len(CenterScan(5, 4, 1)), 5)
+        self.assertEqual(list(CenterScan(5, 4, 0)), [])
+        self.assertEqual(len(CenterScan(0, 3, -1)), 0)
+        self.assertEqual(list(CenterScan(0, 3, -1)), [])
+
+    def test_randomize(self):
+        for scan, ordered in (
+                (RangeScan(0, 99, 100, randomize=True, seed=42),
+                 RangeScan(0, 99, 100)),
+                (CenterScan(0, 100, 1, randomize=True, seed=42),
+                 CenterScan(0, 100, 1)),
+                (RangeScan(0, 1, 3, randomize=True),
+                 RangeScan(0, 1, 3))):
+            points = list(scan)
+            self.assertEqual(sorted(points), sorted(ordered))
+            # the order does not change between iterations
+            self.assertEqual(points, list(scan))
+        self.assertNotEqual(
+            list(RangeScan(0, 99, 100, randomize=True, seed=42)),
+            list(RangeScan(0, 99, 100)))
+        self.assertEqual(
+            list(RangeScan(0, 99, 100, randomize=True, seed=42)),
+            list(RangeScan(0, 99, 100, randomize=True, seed=42)))
+
+    def test_randomize_statistics(self):
+        # the order must not be correlated with the index, e.g. to
+        # decorrelate scans from slow drifts
+        for n in 1000, 200001:
+            for seed in range(3):
+                order = RangeScan(0, n - 1, n, randomize=True,
+                                  seed=seed).as_array()
+                index = np.arange(n)
+                self.assertEqual(sorted(order), list(index))
+                self.assertLess(abs(np.corrcoef(order, index)[0, 1]),
+                                5/np.sqrt(n))
+                self.assertLess(np.mean(np.abs(np.diff(order)) == 1), 0.01)
+                self.assertAlmostEqual(np.mean(order % 2 == index % 2),
+                                       0.5, delta=0.05)
+        # small scans keep the order of earlier versions
+        points = list(range(10))
+        random.Random(3).shuffle(points)
+        self.assertEqual(list(RangeScan(0, 9, 10, randomize=True, seed=3)),
+                         points)
+
+    def test_sequence(self):
+        scan = RangeScan(0, 10, 11, randomize=True, seed=1)
+        points = list(scan)
+        self.assertEqual(scan.sequence, points)
+        scan.sequence[0] = -1
+        self.assertEqual(next(iter(scan)), -1)
+
+    def test_as_array(self):
+        for scan in (NoScan(1.5, 3),
+                     RangeScan(0, 1, 1000, randomize=True, seed=3),
+                     RangeScan(0, 1, 1),
+                     CenterScan(1, 3, 0.25, randomize=True, seed=3),
+                     ExplicitScan([1, 5, 2])):
+            np.testing.assert_allclose(scan.as_array(), list(scan))
+
+
+class MultiScanManagerCase(unittest.TestCase):
+    def test_points(self):
+        msm = MultiScanManager(("a", RangeScan(0, 1, 2)),
+                               ("b", ExplicitScan([5, 6, 7])))
+        points = [(p.a, p.b) for p in msm]
+        self.assertEqual(points, [(0, 5), (0, 6), (0, 7),
+                                  (1, 5), (1, 6), (1, 7)])
+        self.assertEqual(len(msm), 6)
+        np.testing.assert_equal(msm.as_array(), points)
+        point = next(iter(msm))
+        self.assertEqual(point.attr, {"a", "b"})
+        self.assertEqual(repr(point), "<ScanPoint a=0.0 b=5>")
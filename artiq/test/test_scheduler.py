@@ -1,6 +1,7 @@
 import unittest
 import logging
 import asyncio
+import os
 import sys
 from time import time, sleep
 
@@ -30,6 +31,11 @@ class BackgroundExperiment(EnvExperiment):
                              broadcast=True, archive=False)
 
 
+class PIDExperiment(EnvExperiment):
+    def run(self):
+        self.set_dataset("pid", os.getpid(), broadcast=True, archive=False)
+
+
 class CheckPauseBackgroundExperiment(EnvExperiment):
     def build(self):
         self.setattr_device("scheduler")
@@ -315,5 +321,53 @@ class SchedulerCase(unittest.TestCase):
         loop.run_until_complete(done.wait())
         loop.run_until_complete(scheduler.stop())
 
+    def test_reuse_workers(self):
+        loop = self.loop
+
+        pids = []
+        def update_dataset(mod):
+            self.assertEqual(mod["key"], "pid")
+            pids.append(mod["value"][1])
+
+        for reuse_workers in 0, 1:
+            del pids[:]
+            scheduler = Scheduler(_RIDCounter(0),
+                                  {"update_dataset": update_dataset},
+                                  None, None, reuse_workers=reuse_workers)
+            expid = _get_expid("PIDExperiment")
+            expid_debug = dict(expid, log_level=logging.DEBUG)
+
+            deleted = asyncio.Event()
+            def notify(mod):
+                if mod["action"] == "delitem":
+                    deleted.set()
+            scheduler.notifier.publish = notify
+
+            scheduler.start(loop=loop)
+            # one run after the other, so that idle workers can be reused,
+            # and last with a log level that requires another worker
+            for e in expid, expid, expid, expid_debug:
+                deleted.clear()
+                scheduler.submit("main", e, 0, None, False)
+                loop.run_until_complete(deleted.wait())
+                # do not submit to the pipeline being garbage-collected
+                loop.run_until_complete(scheduler._deleter.join())
+            idle = [worker for _, worker in scheduler._worker_cache.idle]
+            loop.run_until_complete(scheduler.stop())
+
+            self.assertEqual(len(pids), 4)
+            if reuse_workers:
+                self.assertEqual(pids[0], pids[1])
+                self.assertEqual(pids[1], pids[2])
+                self.assertNotEqual(pids[2], pids[3])
+                # the least recently used worker was closed
+                self.assertEqual(len(idle), 1)
+            else:
+                self.assertEqual(len(set(pids)), 4)
+                self.assertEqual(idle, [])
+            self.assertEqual(scheduler._worker_cache.idle, [])
+            for worker in idle:
+                self.assertTrue(worker.closed.is_set())
+
     def tearDown(self):
         self.loop.close()
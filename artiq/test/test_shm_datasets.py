@@ -0,0 +1,260 @@
+import asyncio
+import copy
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from artiq.gui.shm_datasets import *
+from artiq.gui.applets import AppletIPCServer
+from artiq.applets.simple import AppletIPCClient, dataset_appends
+
+
+class SharedDatasetCase(unittest.TestCase):
+    def setUp(self):
+        self.store = SharedDatasetStore()
+        self.reader = SharedDatasetReader()
+
+    def tearDown(self):
+        self.reader.close()
+        self.store.close()
+
+    def test_eligible(self):
+        self.assertTrue(is_shm_eligible(np.zeros(SHM_THRESHOLD)))
+        self.assertFalse(is_shm_eligible(np.zeros(16)))
+        self.assertFalse(is_shm_eligible(np.array(["a"]*SHM_THRESHOLD)))
+        self.assertFalse(is_shm_eligible([0.0]*SHM_THRESHOLD))
+
+    def test_publish(self):
+        value = np.arange(20000, dtype=np.int32).reshape(100, 200)
+        ref = self.store.publish("x", value)
+        resolved = self.reader.resolve("x", ref)
+        np.testing.assert_equal(resolved, value)
+        self.assertEqual(resolved.dtype, value.dtype)
+
+        # the reader owns its copy
+        value2 = value + 1
+        ref2 = self.store.publish("x", value2)
+        self.assertEqual(ref2["name"], ref["name"])
+        np.testing.assert_equal(resolved, value)
+        np.testing.assert_equal(self.reader.resolve("x", ref2), value2)
+
+    def test_shared_mod(self):
+        value = np.zeros(10000)
+        mod = {"action": "setitem", "path": ["x", 1], "key": 0, "value": 1}
+        ref = self.store.publish("x", value, mod)
+        value[0] = 1
+        # another applet server forwarding the same mod
+        self.assertEqual(self.store.publish("x", value, mod), ref)
+        self.assertEqual(self.reader.resolve("x", ref)[0], 0)
+
+    def test_init_unchanged(self):
+        value = np.zeros(10000)
+        ref = self.store.publish("x", value)
+        # the initial values sent to other applets
+        self.assertEqual(self.store.publish("x", value), ref)
+        self.assertEqual(self.store.publish("x", value.copy()), ref)
+        self.assertNotEqual(self.store.publish("x", value.astype(np.int64)),
+                            ref)
+
+    def test_overwritten(self):
+        value = np.zeros(10000)
+        ref = self.store.publish("x", value)
+        self.store.publish("x", value + 1)
+        self.store.publish("x", value + 2)
+        with self.assertRaises(StaleSharedDataset):
+            self.reader.resolve("x", ref)
+        # the previous version is still readable
+        ref = self.store.publish("x", value + 3)
+        self.store.publish("x", value + 4)
+        np.testing.assert_equal(self.reader.resolve("x", ref), value + 3)
+
+    def test_grow(self):
+        ref = self.store.publish("x", np.zeros(10000))
+        np.testing.assert_equal(self.reader.resolve("x", ref), 0)
+        ref_small = self.store.publish("x", np.ones(10000))
+        ref_large = self.store.publish("x", np.full(20000, 2.0))
+        self.assertNotEqual(ref_large["name"], ref_small["name"])
+        # the old segment is mapped by the reader, but no longer written to
+        np.testing.assert_equal(self.reader.resolve("x", ref_small), 1)
+        np.testing.assert_equal(self.reader.resolve("x", ref_large), 2)
+        self.assertEqual(list(self.reader.mappings), [ref_large["name"]])
+
+    def test_attach_released(self):
+        ref_small = self.store.publish("x", np.zeros(10000))
+        ref_large = self.store.publish("x", np.zeros(20000))
+        # the notification naming the old segment was still queued when
+        # the dashboard released it
+        with self.assertRaises(StaleSharedDataset):
+            self.reader.resolve("x", ref_small)
+        np.testing.assert_equal(self.reader.resolve("x", ref_large), 0)
+
+        self.store.discard("x")
+        with self.assertRaises(StaleSharedDataset):
+            SharedDatasetReader().resolve("x", ref_large)
+
+    def test_struct(self):
+        struct = {"x": (True, None, {"unit": "V"}), "y": (False, 1, {})}
+        ref = self.store.publish("x", np.ones(10000))
+        self.reader.resolve_struct(struct, {"x": ref})
+        self.assertEqual(struct["x"][0], True)
+        np.testing.assert_equal(struct["x"][1], 1)
+        self.assertEqual(struct["x"][2], {"unit": "V"})
+        self.assertEqual(struct["y"], (False, 1, {}))
+        self.reader.discard("x")
+        self.assertEqual(self.reader.mappings, dict())
+
+
+class _Server(AppletIPCServer):
+    def __init__(self, dataset_sub, shm_store):
+        AppletIPCServer.__init__(self, dataset_sub, None, None, shm_store)
+        self.to_client = asyncio.Queue()
+        self.to_server = asyncio.Queue()
+
+    def write_pyon(self, obj):
+        self.to_client.put_nowait(copy.deepcopy(obj))
+
+    async def read_pyon(self):
+        return await self.to_server.get()
+
+
+class _Client(AppletIPCClient):
+    def __init__(self, server):
+        AppletIPCClient.__init__(self, "")
+        self.server = server
+        # holds back the processing of parent messages
+        self.gate = asyncio.Event()
+        self.mods = []
+        self.set_close_cb(lambda: None)
+
+    def write_pyon(self, obj):
+        self.server.to_server.put_nowait(copy.deepcopy(obj))
+
+    async def read_pyon(self):
+        await self.gate.wait()
+        return await self.server.to_client.get()
+
+    def init(self, data):
+        self.data = data
+        return data
+
+    def subscribe(self, datasets, *, loop):
+        AppletIPCClient.subscribe(self, datasets, self.init, self.mods.append,
+                                  loop=loop)
+
+
+class AppletTransportCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.store = SharedDatasetStore()
+        self.dataset_sub = SimpleNamespace(
+            model=SimpleNamespace(backing_store={
+                "x": (False, np.zeros(10000), {}),
+                "y": (True, 1, {})}),
+            notify_cbs=[])
+        self.server = _Server(self.dataset_sub, self.store)
+        self.server.start_server(None, loop=self.loop)
+        self.client = _Client(self.server)
+
+    def tearDown(self):
+        self.client.listen_task.cancel()
+        self.loop.run_until_complete(self.server.stop_server())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.client.shm_reader.close()
+        self.store.close()
+        self.loop.close()
+
+    def set(self, key, value):
+        persist, _, metadata = self.dataset_sub.model.backing_store[key]
+        self.dataset_sub.model.backing_store[key] = (persist, value, metadata)
+        mod = {"action": "setitem", "path": [], "key": key,
+               "value": (persist, value, metadata)}
+        for cb in self.dataset_sub.notify_cbs:
+            cb(mod)
+
+    def append(self, key, value, x):
+        # as forwarded by the dashboard once applied to its model
+        persist, _, metadata = self.dataset_sub.model.backing_store[key]
+        self.dataset_sub.model.backing_store[key] = (persist, value, metadata)
+        mod = {"action": "append", "path": [key, 1], "x": x}
+        for cb in self.dataset_sub.notify_cbs:
+            cb(mod)
+
+    def sync(self):
+        self.client.gate.set()
+
+        async def wait():
+            while (not self.server.to_client.empty()
+                   or not self.server.to_server.empty()):
+                await asyncio.sleep(0)
+            await asyncio.sleep(0)
+        self.loop.run_until_complete(wait())
+
+    def test_mods(self):
+        self.client.subscribe({"x", "y"}, loop=self.loop)
+        self.sync()
+        np.testing.assert_equal(self.client.data["x"][1], 0)
+        self.assertEqual(self.client.data["y"], (True, 1, {}))
+        self.set("x", np.ones(10000))
+        self.set("y", 2)
+        self.sync()
+        np.testing.assert_equal(self.client.data["x"][1], 1)
+        self.assertEqual(self.client.data["y"], (True, 2, {}))
+        self.assertEqual([mod["action"] for mod in self.client.mods],
+                         ["init", "setitem", "setitem"])
+
+    def test_resync_overwritten(self):
+        self.client.subscribe({"x", "y"}, loop=self.loop)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        # the applet lags behind by more than one version
+        self.set("x", np.ones(10000))
+        self.set("x", np.full(10000, 2.0))
+        self.sync()
+        np.testing.assert_equal(self.client.data["x"][1], 2)
+        self.assertEqual([mod["action"] for mod in self.client.mods],
+                         ["init"])
+        self.set("x", np.full(10000, 3.0))
+        self.sync()
+        np.testing.assert_equal(self.client.data["x"][1], 3)
+
+    def test_resync_grown(self):
+        self.client.subscribe({"x"}, loop=self.loop)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.set("x", np.ones(20000))
+        self.sync()
+        np.testing.assert_equal(self.client.data["x"][1], np.ones(20000))
+        self.assertEqual([mod["action"] for mod in self.client.mods],
+                         ["init"])
+
+    def test_appends(self):
+        self.dataset_sub.model.backing_store["l"] = (False, [], {})
+        self.client.subscribe({"x", "l"}, loop=self.loop)
+        self.sync()
+        self.assertIsNone(dataset_appends(self.client.mods, "x"))
+        del self.client.mods[:]
+
+        x = np.zeros(10000)
+        for i in range(3):
+            x = np.append(x, i)
+            self.append("x", x, i)
+            self.append("l", list(range(i + 1)), i)
+            self.sync()
+        self.assertEqual(dataset_appends(self.client.mods, "x"), 3)
+        self.assertEqual(dataset_appends(self.client.mods, "l"), 3)
+        self.assertEqual(dataset_appends(self.client.mods, "y"), 0)
+        np.testing.assert_equal(self.client.data["x"][1], x)
+        self.assertEqual(self.client.data["l"][1], [0, 1, 2])
+        del self.client.mods[:]
+
+        self.set("x", np.ones(10003))
+        self.sync()
+        self.assertIsNone(dataset_appends(self.client.mods, "x"))
+
+    def test_close(self):
+        self.client.subscribe({"x"}, loop=self.loop)
+        self.sync()
+        self.assertEqual(len(self.client.shm_reader.mappings), 1)
+        self.client.writer = SimpleNamespace(close=lambda: None)
+        self.client.close()
+        self.assertEqual(self.client.shm_reader.mappings, dict())
@@ -0,0 +1,142 @@
+"""Test execution of kernels on the host with artiq.sim.jit"""
+
+import os
+import unittest
+import tempfile
+
+import numpy as np
+
+from artiq.experiment import *
+from artiq.master.databases import DeviceDB
+from artiq.master.worker_db import DeviceManager
+from artiq.sim.jit import KernelError
+from artiq.sim.sed import events_from_timeline
+
+
+DUMMY_DDB_FILE = """
+device_db = {
+    "core": {
+        "type": "local",
+        "module": "artiq.sim.jit",
+        "class": "Core",
+        "arguments": {"ref_period": 1e-09},
+    },
+    "ttl_out": {
+        "type": "local",
+        "module": "artiq.coredevice.ttl",
+        "class": "TTLOut",
+        "arguments": {"channel": 0},
+    },
+    "ttl_in": {
+        "type": "local",
+        "module": "artiq.coredevice.ttl",
+        "class": "TTLInOut",
+        "arguments": {"channel": 1},
+    },
+}
+"""
+
+
+class _Pulses(EnvExperiment):
+    def build(self):
+        self.setattr_device("core")
+        self.setattr_device("ttl_out")
+
+    @kernel
+    def run(self):
+        self.core.reset()
+        for i in range(3):
+            self.ttl_out.pulse_mu(100)
+            delay_mu(50)
+
+
+class _Count(EnvExperiment):
+    def build(self):
+        self.setattr_device("core")
+        self.setattr_device("ttl_in")
+        self.setattr_device("ttl_out")
+
+    @kernel
+    def run(self):
+        self.core.reset()
+        t_end = self.ttl_in.gate_rising_mu(1000)
+        n = self.ttl_in.count(t_end)
+        for i in range(n):
+            self.ttl_out.pulse_mu(10)
+
+
+class _Raise(EnvExperiment):
+    def build(self):
+        self.setattr_device("core")
+        self.setattr_device("ttl_out")
+
+    @kernel
+    def run(self):
+        self.core.reset()
+        self.ttl_out.on()
+        raise ValueError
+
+
+class _RPC(EnvExperiment):
+    def build(self):
+        self.setattr_device("core")
+
+    def report(self, x):
+        pass
+
+    @kernel
+    def run(self):
+        self.report(1)
+
+
+class SimJITCase(unittest.TestCase):
+    def setUp(self):
+        # use delete=False and manual cleanup for Windows compatibility
+        with tempfile.NamedTemporaryFile(mode="w+", suffix=".py",
+                                         delete=False) as f:
+            f.write(DUMMY_DDB_FILE)
+        self.addCleanup(os.unlink, f.name)
+        self.dmgr = DeviceManager(DeviceDB(f.name))
+        self.core = self.dmgr.get("core")
+
+    def execute(self, cls):
+        cls((self.dmgr, None, None, {})).run()
+
+    def outputs(self, device):
+        events = self.core.recorder.timeline.events(device, "set")
+        return list(zip(np.rint(events["time"]/1e-9).astype(int).tolist(),
+                        events["value"].astype(int).tolist()))
+
+    def test_pulses(self):
+        self.execute(_Pulses)
+        outputs = self.outputs("ttl_out")
+        start = outputs[0][0]
+        self.assertEqual(outputs, [
+            (start, 1), (start + 100, 0),
+            (start + 150, 1), (start + 250, 0),
+            (start + 300, 1), (start + 400, 0)])
+        timeline = self.core.recorder.timeline
+        pulses = timeline.pulses("ttl_out")
+        np.testing.assert_allclose(pulses["duration"], 100e-9)
+        events = events_from_timeline(timeline, {"ttl_out": 0})
+        self.assertEqual(events.timestamp.tolist(),
+                         [t for t, _ in outputs])
+
+    def test_inputs(self):
+        for t in (10, 20, 1 << 62):
+            self.core.recorder.inject(1, t)
+        self.execute(_Count)
+        # the last event is after the end of the gate
+        self.assertEqual(len(self.outputs("ttl_out")), 4)
+
+    def test_exception(self):
+        with self.assertRaises(KernelError):
+            self.execute(_Raise)
+        # the events of kernels that did not complete are not recorded
+        self.assertEqual(self.outputs("ttl_out"), [])
+        self.execute(_Pulses)
+        self.assertEqual(len(self.outputs("ttl_out")), 6)
+
+    def test_rpc(self):
+        with self.assertRaises(NotImplementedError):
+            self.execute(_RPC)
@@ -0,0 +1,113 @@
+import unittest
+import random
+
+import numpy as np
+
+from artiq.coredevice.dma import encode_trace
+from artiq.sim import time as sim_time
+from artiq.sim.sed import *
+from artiq.sim.sed import _Replay
+
+
+def _random_events(rng, n, channels=16):
+    # mostly increasing timestamps, with simultaneous events and rewinds
+    events = []
+    timestamp = 80
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.2:
+            timestamp -= rng.randrange(64)
+        elif r < 0.7:
+            timestamp += rng.randrange(1, 32)
+        events.append((rng.randrange(channels), max(timestamp, 0)))
+    return events
+
+
+class TestSEDModel(unittest.TestCase):
+    def test_stall(self):
+        model = SEDModel(lane_count=1, fifo_depth=4, glbl_fine_ts_width=0)
+        replay = model.replay([0]*8, [100*(k + 1) for k in range(8)],
+                              write_interval=1, start=0)
+        self.assertEqual(replay.status.tolist(), [STATUS_OK]*8)
+        self.assertEqual(replay.write_time.tolist(),
+                         [0, 1, 2, 3, 101, 201, 301, 401])
+        self.assertEqual(replay.level.tolist(), [1, 2, 3, 4, 4, 4, 4, 4])
+        self.assertEqual(replay.stall_cycles, 394)
+        self.assertEqual(replay.peak_level.tolist(), [4])
+
+    def test_underflow_after_stall(self):
+        model = SEDModel(lane_count=1, fifo_depth=2, glbl_fine_ts_width=0)
+        replay = model.replay([0]*3, [100, 105, 110], write_interval=1,
+                              start=0)
+        self.assertEqual(replay.status.tolist(),
+                         [STATUS_OK, STATUS_OK, STATUS_UNDERFLOW])
+        self.assertEqual(replay.write_time.tolist(), [0, 1, 101])
+        self.assertEqual(replay.errors().tolist(), [2])
+
+    def test_spread(self):
+        model = SEDModel(lane_count=4, fifo_depth=8, fifo_high_watermark=0.5,
+                         glbl_fine_ts_width=0, enable_spread=True)
+        replay = model.replay([0]*12, [1000 + k for k in range(12)],
+                              write_interval=1, start=0)
+        self.assertEqual(replay.lane.tolist(), [0]*4 + [1]*4 + [2]*4)
+        self.assertEqual((replay.lane_switches, replay.forced_switches),
+                         (2, 2))
+
+    def test_quash(self):
+        model = SEDModel(lane_count=2, glbl_fine_ts_width=0,
+                         quash_channels=[7])
+        replay = model.replay([0, 7, 0], [1000, 10, 1001],
+                              write_interval=1, start=0)
+        self.assertEqual(replay.status.tolist(),
+                         [STATUS_OK, STATUS_QUASHED, STATUS_OK])
+        self.assertEqual(replay.lane.tolist(), [0, -1, 0])
+
+    def test_vectorized(self):
+        # the vectorized path matches stepping through every event
+        rng = random.Random(1)
+        events = _random_events(rng, 5000)
+        channel = np.array([c for c, _ in events])
+        coarse = np.array([t for _, t in events])*20
+        issue = np.arange(len(events))*8 - 200
+        for spread in False, True:
+            model = SEDModel(lane_count=4, fifo_depth=16,
+                             fifo_high_watermark=0.75, enable_spread=spread,
+                             quash_channels=[3])
+            quashed = channel == 3
+            vectorized = _Replay(model, coarse, issue, quashed)
+            vectorized.run()
+            reference = _Replay(model, coarse, issue, quashed)
+            for i in reference.active.tolist():
+                reference.step(i)
+            for field in "lane", "status", "level", "delay":
+                np.testing.assert_array_equal(getattr(vectorized, field),
+                                              getattr(reference, field))
+            self.assertEqual(vectorized.lane_switches,
+                             reference.lane_switches)
+            self.assertEqual(vectorized.forced_switches,
+                             reference.forced_switches)
+            np.testing.assert_array_equal(vectorized.peak_level,
+                                          reference.peak_level)
+            status = vectorized.status
+            self.assertGreater(np.count_nonzero(status == STATUS_OK), 1000)
+            self.assertGreater(
+                np.count_nonzero(status == STATUS_SEQUENCE_ERROR), 0)
+
+    def test_dma_trace(self):
+        trace = encode_trace([8, 16, 0], [1, 0x123456, 2], 0, [0, 1, 2])
+        events = events_from_dma_trace(trace + b"\x00", timestamp=1000)
+        self.assertEqual(events.channel.tolist(), [1, 0x123456, 2])
+        self.assertEqual(events.timestamp.tolist(), [1008, 1016, 1000])
+        self.assertIsNone(events.write_time)
+        for channel, address in (-1, 0), (1 << 24, 0), (1, -1), (1, 256):
+            with self.assertRaises(ValueError):
+                encode_trace([0, 8], [1, channel], address, 0)
+
+    def test_timeline(self):
+        timeline = sim_time.Timeline()
+        timeline.append(10e-9, "ttl0", "pulse", duration=8e-9)
+        timeline.append(0, "ttl1", "set", 1.)
+        timeline.append(4e-9, "other", "set", 1.)
+        events = events_from_timeline(timeline, {"ttl0": 4, "ttl1": 5})
+        self.assertEqual(events.channel.tolist(), [4, 4, 5])
+        self.assertEqual(events.timestamp.tolist(), [10, 18, 0])
@@ -0,0 +1,82 @@
+"""Test the timeline recorded by artiq.sim"""
+
+import io
+import unittest
+
+import numpy as np
+
+from artiq.experiment import *
+from artiq.sim import devices, time
+
+
+class _Pulses(EnvExperiment):
+    def build(self):
+        self.setattr_device("core")
+        self.setattr_device("ttl")
+        self.setattr_device("dds")
+        self.setattr_device("gate")
+
+    @kernel
+    def run(self):
+        with parallel:
+            with sequential:
+                for i in range(3):
+                    self.ttl.pulse(1*us)
+                    delay(1*us)
+            self.dds.pulse(100*MHz, 2*us)
+        self.gate.gate_rising(1*us)
+        self.ttl.on()
+        delay(2*us)
+        self.ttl.off()
+
+
+class SimTimelineCase(unittest.TestCase):
+    def setUp(self):
+        self.timeline = time.manager.timeline
+        self.timeline.clear()
+        self.addCleanup(self.timeline.clear)
+
+        dmgr = dict()
+        dmgr["core"] = devices.Core(dmgr, print_timeline=False)
+        dmgr["ttl"] = devices.Output(dmgr, "ttl")
+        dmgr["dds"] = devices.WaveOutput(dmgr, "dds")
+        dmgr["gate"] = devices.Input(dmgr, "gate")
+        self.t0 = time.manager.get_time_mu()
+        _Pulses((dmgr, None, None, {})).run()
+
+    def test_events(self):
+        self.assertEqual(len(self.timeline), 7)
+        events = self.timeline.events()
+        self.assertTrue(np.all(np.diff(events["time"]) >= 0))
+        np.testing.assert_allclose(
+            self.timeline.times("gate", "gate_rising") - self.t0, [6*us])
+        self.assertEqual(len(self.timeline.events("missing")), 0)
+
+    def test_pulses(self):
+        ttl = self.timeline.pulses("ttl")
+        np.testing.assert_allclose(ttl["start"] - self.t0,
+                                   [0, 2*us, 4*us, 7*us])
+        np.testing.assert_allclose(ttl["duration"], [1*us]*3 + [2*us])
+        np.testing.assert_array_equal(ttl["value"], [1, 1, 1, 1])
+
+        dds = self.timeline.pulses("dds")
+        self.assertEqual(len(dds), 1)
+        self.assertEqual(dds["value"][0], 100*MHz)
+        self.assertAlmostEqual(dds["duration"][0], 2*us)
+
+    def test_format(self):
+        lines = self.timeline.format().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertIn("gate_rising", lines[4])
+
+    def test_export(self):
+        trace = self.timeline.to_waveform_data(timescale=1e-9)
+        ttl = trace["data"]["sim/ttl"]
+        start = round(self.t0*1e9)
+        self.assertEqual(ttl[:2], [(start, "1"), (start + 1000, "0")])
+        self.assertEqual(trace["data"]["sim/dds"][0], (start, 100*MHz))
+        self.assertIn("sim_events", trace["logs"])
+
+        vcd = io.StringIO()
+        self.timeline.to_vcd(vcd, timescale=1e-9)
+        self.assertIn("$var wire 1", vcd.getvalue())
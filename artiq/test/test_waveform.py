@@ -0,0 +1,126 @@
+import unittest
+
+import numpy as np
+
+from artiq.coredevice.waveform import *
+
+
+_MASK48 = (1 << 48) - 1
+_MASK32 = (1 << 32) - 1
+
+
+def _signed16(value):
+    return ((value + 0x8000) & 0xffff) - 0x8000
+
+
+def _reference_dcbias(durations, coefficients):
+    # Cycle by cycle model of artiq.gateware.shuttler.Volt
+    out = []
+    for i, duration in enumerate(durations):
+        a0, a1, a2, a3 = (int(c) for c in coefficients[4*i:4*i + 4])
+        v = [(a0 & 0xffff) << 32, (a1 & _MASK32) << 16,
+             a2 & _MASK48, a3 & _MASK48]
+        for _ in range(duration):
+            out.append(_signed16(v[0] >> 32))
+            v = [(v[0] + v[1]) & _MASK48, (v[1] + v[2]) & _MASK48,
+                 (v[2] + v[3]) & _MASK48, v[3]]
+    return out
+
+
+def _reference_phase(durations, coefficients, clear):
+    # Cycle by cycle model of the phase accumulators of
+    # artiq.gateware.shuttler.Dds
+    out = []
+    za = z1 = 0
+    for i, duration in enumerate(durations):
+        c0, c1, c2 = (int(c) for c in coefficients[7*i + 4:7*i + 7])
+        za = 0 if clear else (za + z1) & _MASK32
+        z1, z2 = c1 & _MASK32, c2 & _MASK32
+        for j in range(duration):
+            out.append(((za >> 16) + c0) & 0xffff)
+            if j != duration - 1:
+                za, z1 = (za + z1) & _MASK32, (z1 + z2) & _MASK32
+    return out
+
+
+class ShuttlerCase(unittest.TestCase):
+    def test_dcbias(self):
+        t = np.linspace(0, 20e-6, 2501)
+        v = 5*np.sin(2*np.pi*1e5*t) + 2*np.exp(-t/5e-6)
+        tolerance = 1e-3
+        segments = compile_dcbias(t, v, tolerance)
+        n = int(segments.durations.sum())
+        self.assertEqual(n, 2501)
+        self.assertLess(len(segments.durations), n//100)
+        self.assertTrue(np.all(segments.durations >= 10))
+
+        output = play_dcbias(segments)
+        self.assertEqual(output.tolist(),
+                         _reference_dcbias(*segments))
+        target = np.interp(np.arange(n)*SHUTTLER_PERIOD, t, v)
+        self.assertLessEqual(np.abs(output*(20/(1 << 16)) - target).max(),
+                             tolerance)
+
+    def test_dcbias_cubic(self):
+        t = np.linspace(0, 40e-6, 5001)
+        v = -8 + 2e14*t**3
+        segments = compile_dcbias(t, v, 1e-3)
+        self.assertEqual(len(segments.durations), 1)
+        self.assertEqual(len(compile_dcbias(t[:3], v[:3], 1e-3).durations),
+                         1)
+
+    def test_dcbias_errors(self):
+        t = np.linspace(0, 1e-6, 126)
+        with self.assertRaises(ValueError):
+            compile_dcbias(t, np.full_like(t, 11.), 1e-3)
+        noise = np.random.default_rng(0).uniform(-1, 1, len(t))
+        with self.assertRaises(ValueError):
+            compile_dcbias(t, noise, 1e-4)
+        segments = compile_dcbias(t, noise, 2e-4, min_duration=1)
+        self.assertLessEqual(
+            np.abs(play_dcbias(segments)*(20/(1 << 16)) - noise).max(), 2e-4)
+
+    def test_dds(self):
+        t = np.linspace(0, 10e-6, 1251)
+        amplitude = 1 + 0.5*np.sin(2*np.pi*2e5*t)
+        phase = 1e6*t + 2e11*t**2
+        for clear in True, False:
+            segments = compile_dds(t, amplitude, phase, 1e-3, 1e-4,
+                                   clear=clear)
+            self.assertEqual(segments.coefficients.shape,
+                             (7*len(segments.durations),))
+            n = int(segments.durations.sum())
+            amplitude_mu, phase_mu = play_dds(segments, clear)
+            self.assertEqual(phase_mu.tolist(),
+                             _reference_phase(*segments, clear))
+            grid = np.arange(n)*SHUTTLER_PERIOD
+            error = (amplitude_mu*(20/(1 << 16)*SHUTTLER_CORDIC_GAIN)
+                     - np.interp(grid, t, amplitude))
+            self.assertLessEqual(np.abs(error).max(), 1e-3)
+            error = (phase_mu/(1 << 16) - np.interp(grid, t, phase)
+                     + .5) % 1 - .5
+            self.assertLessEqual(np.abs(error).max(), 1e-4)
+
+
+class PhaserCase(unittest.TestCase):
+    def test_window_to_mu(self):
+        iq_mu, rate, shift = phaser_window_to_mu(
+            [(1., 0.), (-1., .5), (0., -1.)], period=4e-9, order=3)
+        self.assertEqual((rate, shift), (1, 0))
+        self.assertEqual(iq_mu.tolist(),
+                         [0x7fff, (0x4000 << 16) | 0x8001, -0x7fff << 16])
+
+        iq_mu, rate, shift = phaser_window_to_mu(
+            np.array([1 + 0j]), period=40e-9, order=2)
+        self.assertEqual((rate, shift), (10, 6))
+        self.assertEqual(iq_mu.tolist(), [round(0x7fff/(100/64))])
+
+    def test_compile_window(self):
+        t = np.linspace(0, 20e-6, 1001)
+        iq = np.exp(-((t - 10e-6)/3e-6)**2)*np.exp(2j*np.pi*1e5*t)
+        iq_mu, rate, shift = compile_phaser_window(t, iq)
+        self.assertEqual(rate, 5)
+        self.assertEqual(len(iq_mu), 1001)
+        iq_mu, rate, shift = compile_phaser_window(t, iq, max_length=1000)
+        self.assertEqual(rate, 6)
+        self.assertLessEqual(len(iq_mu), 1000)
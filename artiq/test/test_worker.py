@@ -6,6 +6,7 @@ from time import sleep
 
 from artiq.experiment import *
 from artiq.master.worker import *
+from artiq.master.worker_db import DummyDevice
 
 
 class SimpleExperiment(EnvExperiment):
@@ -52,6 +53,17 @@ class WatchdogTimeoutInBuild(EnvExperiment):
         pass
 
 
+class DeviceExperiment(EnvExperiment):
+    def build(self):
+        self.setattr_device("ttl0")
+
+    def run(self):
+        if not isinstance(self.ttl0, DummyDevice):
+            raise TypeError
+        if not isinstance(self.get_device("led"), DummyDevice):
+            raise TypeError
+
+
 async def _call_worker(worker, expid):
     try:
         await worker.build(0, "main", None, expid, 0)
@@ -67,14 +79,14 @@ class WorkerCase(unittest.TestCase):
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
 
-    def _run_experiment(self, class_name):
+    def _run_experiment(self, class_name, handlers=dict()):
         expid = {
             "log_level": logging.WARNING,
             "file": sys.modules[__name__].__file__,
             "class_name": class_name,
             "arguments": dict()
         }
-        worker = Worker({})
+        worker = Worker(handlers)
         self.loop.run_until_complete(_call_worker(worker, expid))
 
     def test_simple_run(self):
@@ -88,6 +100,11 @@ class WorkerCase(unittest.TestCase):
             self.assertIn("Terminating with exception (TypeError)",
                           logs.output[-1])
 
+    def test_browser_devices(self):
+        # the browser gives dummy devices to the experiments it examines
+        from artiq.browser.experiments import dummy_device_db_handlers
+        self._run_experiment("DeviceExperiment", dummy_device_db_handlers)
+
     def test_watchdog_no_timeout(self):
         self._run_experiment("WatchdogNoTimeout")
 
@@ -34,6 +34,7 @@ console_scripts = [
     "artiq_route = artiq.frontend.artiq_route:main",
     "artiq_run = artiq.frontend.artiq_run:main",
     "artiq_flash = artiq.frontend.artiq_flash:main",
+    "artiq_results = artiq.frontend.artiq_results:main",
     "aqctl_coreanalyzer_proxy = artiq.frontend.aqctl_coreanalyzer_proxy:main",
     "aqctl_corelog = artiq.frontend.aqctl_corelog:main",
     "aqctl_moninj_proxy = artiq.frontend.aqctl_moninj_proxy:main",